@@ -0,0 +1,305 @@
+"""
+Bandeja de salida persistente de notarizaciones pendientes.
+
+Cuando el servidor no está disponible, los hashes a notarizar se guardan en
+una cola SQLite en disco en lugar de perderse. Un hilo de fondo la vacía en
+cuanto el servidor vuelve a responder: envía lotes de solicitudes
+simultáneas, espera con retroceso exponencial mientras el servidor sigue
+caído o saturado, y guarda cada recibo en cuanto llega.
+
+Cada entrada conserva su clave de idempotencia entre reintentos y reinicios
+de la aplicación. El servidor recuerda esas claves solo en memoria y durante
+un tiempo limitado (NOTARIO_IDEMPOTENCIA_TTL), así que no bastan si el
+servidor se reinicia o el corte dura más: antes de reenviar una entrada que
+ya se intentó, se consulta /consultar/{hash} y, si el servidor ya emitió un
+recibo equivalente después de encolarla, se guarda ese en lugar de pedir otro.
+La comparación usa el reloj local con un margen (MARGEN_RELOJ), de modo que
+un desfase mayor entre relojes puede producir un recibo repetido.
+"""
+
+import os
+import random
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from client.cliente_api import ErrorApi
+from client.notarizacion_lote import guardar_recibo_respuesta
+from shared.indice_recibos import timestamp_a_micros
+from shared.motor_hash import MODO_PLANO
+
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS pendientes (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    hash TEXT NOT NULL,
+    curva TEXT NOT NULL,
+    modo_hash TEXT,
+    bloque_hash INTEGER,
+    archivo_original TEXT NOT NULL,
+    clave_idempotencia TEXT NOT NULL,
+    creado REAL NOT NULL,
+    intentos INTEGER NOT NULL DEFAULT 0,
+    estado TEXT NOT NULL DEFAULT 'pendiente',
+    ultimo_error TEXT
+);
+CREATE INDEX IF NOT EXISTS pendientes_estado ON pendientes (estado, id);
+"""
+
+# Errores tras los que el servidor puede aceptar la misma solicitud más tarde
+ESTADOS_TRANSITORIOS = (429, 500, 502, 503, 504)
+
+# Segundos de desfase tolerados entre el reloj local y el del servidor al
+# buscar un recibo ya emitido para una entrada
+MARGEN_RELOJ = 60.0
+
+
+def es_error_transitorio(error):
+    """Indica si una solicitud fallida debe reintentarse más tarde."""
+    if isinstance(error, ErrorApi):
+        return error.estado in ESTADOS_TRANSITORIOS
+    return isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout,
+                              OSError))
+
+
+def espera_sugerida(error):
+    """Segundos indicados por la cabecera Retry-After del error, o 0."""
+    try:
+        return max(float(getattr(error, 'reintentar_en', None)), 0.0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+class BandejaSalida:
+    """
+    Cola en disco de hashes pendientes de notarizar, vaciada en segundo plano.
+
+    Las entradas se envían en orden de llegada. Un error permanente (p. ej.
+    400 o 409) marca la entrada como fallida en lugar de borrarla, para que
+    nunca desaparezca un documento sin aviso.
+    """
+
+    def __init__(self, ruta_db, cliente, directorio_recibos, lote=8,
+                 espera_inicial=2.0, espera_maxima=300.0, al_cambiar=None, al_recibir=None):
+        """
+        Args:
+            ruta_db (str): Archivo SQLite de la cola (se crea si no existe)
+            cliente (ClienteNotario): Cliente del API
+            directorio_recibos (str): Dónde guardar los recibos recibidos
+            lote (int): Solicitudes simultáneas por lote
+            espera_inicial (float): Primera espera tras un fallo transitorio, en segundos
+            espera_maxima (float): Tope del retroceso exponencial, en segundos
+            al_cambiar (callable, optional): Se llama sin argumentos cada vez que
+                                             cambia la cola
+            al_recibir (callable, optional): Se llama con (archivo_original, ruta_recibo)
+                                             por cada recibo guardado
+
+        Los callbacks se llaman desde el hilo de fondo.
+        """
+        directorio = os.path.dirname(os.path.abspath(ruta_db))
+        os.makedirs(directorio, exist_ok=True)
+        os.makedirs(directorio_recibos, exist_ok=True)
+        self.cliente = cliente
+        self.directorio_recibos = directorio_recibos
+        self.lote = lote
+        self.espera_inicial = espera_inicial
+        self.espera_maxima = espera_maxima
+        self.al_cambiar = al_cambiar
+        self.al_recibir = al_recibir
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(ruta_db, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=FULL")
+        self._db.executescript(ESQUEMA)
+        self._despertar = threading.Event()
+        self._detener = threading.Event()
+        self._hilo = None
+        self._fallos_seguidos = 0
+        self.proximo_intento = 0.0
+
+    def encolar(self, hash_hex, curva, archivo_original, modo_hash=None, bloque_hash=None,
+                clave_idempotencia=None):
+        """
+        Añade un hash a la cola y despierta al hilo de envío.
+
+        Args:
+            hash_hex (str): Hash a notarizar
+            curva (str): Curva con la que firmar
+            archivo_original (str): Nombre del archivo, para el recibo
+            modo_hash (str, optional): Modo de hash del recibo
+            bloque_hash (int, optional): Tamaño de bloque del modo árbol
+            clave_idempotencia (str, optional): Clave ya usada en un envío directo
+                                                fallido (cuenta como un intento);
+                                                si no, se genera una
+
+        Returns:
+            int: Identificador de la entrada
+        """
+        with self._lock:
+            cursor = self._db.execute(
+                "INSERT INTO pendientes (hash, curva, modo_hash, bloque_hash, archivo_original, "
+                "clave_idempotencia, creado, intentos) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (hash_hex, curva, modo_hash, bloque_hash, archivo_original,
+                 clave_idempotencia or str(uuid.uuid4()), time.time(),
+                 1 if clave_idempotencia else 0)
+            )
+            self._db.commit()
+        self._notificar()
+        # Sin adelantar el retroceso: si el servidor está caído, esperar igualmente
+        self._despertar.set()
+        return cursor.lastrowid
+
+    def pendientes(self):
+        """Número de entradas pendientes de envío."""
+        with self._lock:
+            return self._db.execute(
+                "SELECT COUNT(*) FROM pendientes WHERE estado = 'pendiente'").fetchone()[0]
+
+    def fallidas(self):
+        """
+        Entradas rechazadas definitivamente por el servidor.
+
+        Returns:
+            list: dicts con id, hash, archivo_original y ultimo_error
+        """
+        with self._lock:
+            filas = self._db.execute(
+                "SELECT id, hash, archivo_original, ultimo_error FROM pendientes "
+                "WHERE estado = 'fallido' ORDER BY id").fetchall()
+        return [{"id": f[0], "hash": f[1], "archivo_original": f[2], "ultimo_error": f[3]}
+                for f in filas]
+
+    def descartar(self, id_entrada):
+        """Elimina una entrada de la cola."""
+        with self._lock:
+            self._db.execute("DELETE FROM pendientes WHERE id = ?", (id_entrada,))
+            self._db.commit()
+        self._notificar()
+
+    def iniciar(self):
+        """Arranca el hilo que vacía la cola."""
+        if self._hilo is None:
+            self._hilo = threading.Thread(target=self._ciclo, name='bandeja-salida', daemon=True)
+            self._hilo.start()
+
+    def despertar(self):
+        """Reintenta ya, sin esperar al fin del retroceso (p. ej. al reconectar)."""
+        self.proximo_intento = 0.0
+        self._despertar.set()
+
+    def detener(self, timeout=5):
+        """Detiene el hilo de envío y cierra la cola; lo pendiente queda en disco."""
+        self._detener.set()
+        self._despertar.set()
+        if self._hilo is not None:
+            self._hilo.join(timeout)
+            if self._hilo.is_alive():
+                return  # Un envío sigue en curso; el proceso termina igualmente
+        with self._lock:
+            self._db.close()
+
+    def _notificar(self):
+        if self.al_cambiar is not None:
+            self.al_cambiar()
+
+    def _siguiente_lote(self):
+        with self._lock:
+            return self._db.execute(
+                "SELECT id, hash, curva, modo_hash, bloque_hash, archivo_original, clave_idempotencia, "
+                "creado, intentos FROM pendientes WHERE estado = 'pendiente' ORDER BY id LIMIT ?", (self.lote,)
+            ).fetchall()
+
+    def _enviar(self, entrada):
+        """Envía una entrada; devuelve (entrada, respuesta, error)."""
+        _, hash_hex, curva, modo_hash, bloque_hash, _, clave, creado, intentos = entrada
+        try:
+            if intentos:
+                # Un intento anterior pudo firmarse sin que llegara la respuesta
+                emitido = self._recibo_emitido(hash_hex, curva, modo_hash, bloque_hash, creado)
+                if emitido is not None:
+                    return entrada, emitido, None
+            return entrada, self.cliente.notarizar(hash_hex, curva, clave_idempotencia=clave,
+                                                   modo_hash=modo_hash, bloque_hash=bloque_hash), None
+        except Exception as e:
+            return entrada, None, e
+
+    def _recibo_emitido(self, hash_hex, curva, modo_hash, bloque_hash, creado):
+        """Recibo equivalente emitido por el servidor desde que se encoló la entrada, o None."""
+        if modo_hash in (None, MODO_PLANO):
+            modo_hash = bloque_hash = None
+        desde = int((creado - MARGEN_RELOJ) * 1_000_000)
+        for recibo in self.cliente.consultar(hash_hex)['recibos']:
+            if (recibo.get('curva', 'SECP256R1') == curva and recibo.get('modo_hash') == modo_hash
+                    and recibo.get('bloque_hash') == bloque_hash
+                    and timestamp_a_micros(recibo.get('timestamp')) >= desde):
+                return recibo
+        return None
+
+    def _ciclo(self):
+        with ThreadPoolExecutor(max_workers=self.lote, thread_name_prefix='bandeja-envio') as envios:
+            while not self._detener.is_set():
+                espera = self.proximo_intento - time.time()
+                if espera > 0:
+                    self._despertar.wait(espera)
+                    self._despertar.clear()
+                    continue
+
+                entradas = self._siguiente_lote()
+                if not entradas:
+                    self._despertar.wait()
+                    self._despertar.clear()
+                    continue
+
+                reintentar_en = None
+                for entrada, data, error in envios.map(self._enviar, entradas):
+                    if error is None:
+                        error = self._recibo_recibido(entrada, data)
+                        if error is None:
+                            continue
+                    if es_error_transitorio(error):
+                        self._anotar_error(entrada, error, 'pendiente')
+                        reintentar_en = max(reintentar_en or 0.0, espera_sugerida(error))
+                    else:
+                        self._anotar_error(entrada, error, 'fallido')
+
+                if reintentar_en is None:
+                    self._fallos_seguidos = 0
+                else:
+                    # Servidor caído o saturado: retroceso exponencial con fluctuación
+                    # para que muchos clientes no reintenten a la vez
+                    self._fallos_seguidos += 1
+                    espera = min(self.espera_inicial * 2 ** (self._fallos_seguidos - 1), self.espera_maxima)
+                    espera = max(espera * random.uniform(0.8, 1.2), reintentar_en)
+                    self.proximo_intento = time.time() + espera
+                self._notificar()
+
+    def _recibo_recibido(self, entrada, data):
+        """Guarda el recibo y retira la entrada; devuelve el error si no se pudo guardar."""
+        id_entrada, archivo_original = entrada[0], entrada[5]
+        try:
+            ruta_recibo = guardar_recibo_respuesta(data, archivo_original, self.directorio_recibos)
+        except OSError as e:
+            # Sin recibo en disco la entrada sigue pendiente; la clave de
+            # idempotencia hará que el reenvío devuelva el mismo recibo
+            return e
+        with self._lock:
+            self._db.execute("DELETE FROM pendientes WHERE id = ?", (id_entrada,))
+            self._db.commit()
+        print(f"📬 Recibo de la bandeja de salida guardado: {os.path.basename(ruta_recibo)}")
+        if self.al_recibir is not None:
+            self.al_recibir(archivo_original, ruta_recibo)
+        return None
+
+    def _anotar_error(self, entrada, error, estado):
+        with self._lock:
+            self._db.execute(
+                "UPDATE pendientes SET intentos = intentos + 1, estado = ?, ultimo_error = ? WHERE id = ?",
+                (estado, str(error), entrada[0])
+            )
+            self._db.commit()
+        if estado == 'fallido':
+            print(f"❌ Notarización rechazada para {entrada[5]}: {error}")
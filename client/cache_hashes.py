@@ -0,0 +1,164 @@
+"""
+Caché persistente de hashes de archivos.
+
+Guarda en SQLite el hash de cada archivo junto con su identidad en disco
+(dispositivo, inodo, tamaño, mtime_ns y ctime_ns). Un archivo sin cambios se
+resuelve sin releerlo; cualquier diferencia en la identidad invalida la
+entrada. La caché se limita a un número de entradas y descarta primero las
+menos usadas recientemente.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+
+from shared.motor_hash import hashear_segun_modo, MODO_PLANO
+
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS hashes (
+    ruta TEXT NOT NULL,
+    algoritmo TEXT NOT NULL,
+    dispositivo INTEGER NOT NULL,
+    inodo INTEGER NOT NULL,
+    tamano INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    ctime_ns INTEGER NOT NULL,
+    hash TEXT NOT NULL,
+    usado REAL NOT NULL,
+    PRIMARY KEY (ruta, algoritmo)
+);
+CREATE INDEX IF NOT EXISTS hashes_usado ON hashes (usado);
+"""
+
+
+def identidad_archivo(estado):
+    """Identidad de un archivo a partir de su os.stat()."""
+    return (estado.st_dev, estado.st_ino, estado.st_size, estado.st_mtime_ns, estado.st_ctime_ns)
+
+
+class CacheHashes:
+    """Hashes de archivos cacheados en SQLite con expulsión LRU."""
+
+    def __init__(self, ruta_db, max_entradas=10000, margen_reciente=2.0):
+        """
+        Args:
+            ruta_db (str): Archivo SQLite (se crea si no existe)
+            max_entradas (int): Entradas máximas antes de expulsar las menos usadas
+            margen_reciente (float): No se cachean archivos modificados hace menos de
+                                     estos segundos, porque una escritura en el mismo
+                                     tick de mtime no cambiaría su identidad
+        """
+        directorio = os.path.dirname(os.path.abspath(ruta_db))
+        os.makedirs(directorio, exist_ok=True)
+        self.max_entradas = max_entradas
+        self.margen_reciente = margen_reciente
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(ruta_db, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(ESQUEMA)
+        self.aciertos = 0
+        self.fallos = 0
+
+    def buscar(self, ruta, algoritmo='sha256'):
+        """
+        Hash cacheado de un archivo si su identidad no ha cambiado.
+
+        Args:
+            ruta (str): Ruta del archivo
+            algoritmo (str): Algoritmo del hash
+
+        Returns:
+            str: Hash en hexadecimal, o None si no está o ha cambiado
+        """
+        ruta = os.path.abspath(ruta)
+        identidad = identidad_archivo(os.stat(ruta))
+        with self._lock:
+            fila = self._db.execute(
+                "SELECT dispositivo, inodo, tamano, mtime_ns, ctime_ns, hash FROM hashes "
+                "WHERE ruta = ? AND algoritmo = ?", (ruta, algoritmo)
+            ).fetchone()
+            if fila is None or tuple(fila[:5]) != identidad:
+                self.fallos += 1
+                return None
+            self._db.execute("UPDATE hashes SET usado = ? WHERE ruta = ? AND algoritmo = ?",
+                             (time.time(), ruta, algoritmo))
+            self._db.commit()
+            self.aciertos += 1
+            return fila[5]
+
+    def guardar(self, ruta, estado, hash_hex, algoritmo='sha256'):
+        """
+        Guarda el hash de un archivo con la identidad que tenía al hashearlo.
+
+        Args:
+            ruta (str): Ruta del archivo
+            estado (os.stat_result): Estado del archivo antes de hashearlo
+            hash_hex (str): Hash calculado
+            algoritmo (str): Algoritmo del hash
+        """
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO hashes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (os.path.abspath(ruta), algoritmo, *identidad_archivo(estado), hash_hex, time.time())
+            )
+            sobrantes = self._db.execute("SELECT COUNT(*) FROM hashes").fetchone()[0] - self.max_entradas
+            if sobrantes > 0:
+                self._db.execute(
+                    "DELETE FROM hashes WHERE rowid IN "
+                    "(SELECT rowid FROM hashes ORDER BY usado LIMIT ?)", (sobrantes,)
+                )
+            self._db.commit()
+
+    def hashear(self, ruta, progreso=None, cancelado=None, forzar=False,
+                modo_hash=None, bloque_hash=None):
+        """
+        Hash de un archivo, desde la caché si no ha cambiado.
+
+        Args:
+            ruta (str): Ruta del archivo
+            progreso (callable, optional): Ver `hashear_segun_modo`
+            cancelado (callable, optional): Ver `hashear_segun_modo`
+            forzar (bool): Recalcular aunque haya un hash cacheado
+            modo_hash (str, optional): Modo de hash (por defecto SHA-256 plano)
+            bloque_hash (int, optional): Tamaño de bloque del modo árbol
+
+        Returns:
+            str: Hash en hexadecimal
+        """
+        # Cada modo de hash (y tamaño de bloque) es una entrada distinta
+        algoritmo = MODO_PLANO if modo_hash in (None, MODO_PLANO) else f"{modo_hash}/{bloque_hash}"
+        if not forzar:
+            hash_hex = self.buscar(ruta, algoritmo)
+            if hash_hex is not None:
+                return hash_hex
+
+        antes = os.stat(ruta)
+        hash_hex = hashear_segun_modo(ruta, modo_hash, bloque_hash, progreso=progreso, cancelado=cancelado)
+        despues = os.stat(ruta)
+        # Solo cachear si el archivo no cambió mientras se leía y no es demasiado reciente
+        if identidad_archivo(antes) == identidad_archivo(despues) \
+                and time.time() - antes.st_mtime >= self.margen_reciente:
+            self.guardar(ruta, antes, hash_hex, algoritmo)
+        return hash_hex
+
+    def invalidar(self, ruta=None):
+        """Elimina la entrada de un archivo, o todas si no se indica ruta."""
+        with self._lock:
+            if ruta is None:
+                self._db.execute("DELETE FROM hashes")
+            else:
+                self._db.execute("DELETE FROM hashes WHERE ruta = ?", (os.path.abspath(ruta),))
+            self._db.commit()
+
+    def estadisticas(self):
+        """Entradas, aciertos y fallos de la caché."""
+        with self._lock:
+            entradas = self._db.execute("SELECT COUNT(*) FROM hashes").fetchone()[0]
+        return {"entradas": entradas, "aciertos": self.aciertos, "fallos": self.fallos}
+
+    def cerrar(self):
+        """Cierra la base de datos."""
+        with self._lock:
+            self._db.close()
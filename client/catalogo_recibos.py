@@ -0,0 +1,254 @@
+"""
+Catálogo local de los recibos guardados en receipts/.
+
+Indexa en SQLite cada recibo por hash, nombre de archivo, curva y timestamp,
+de modo que buscar el recibo de un documento es una consulta indexada en
+lugar de abrir cientos de miles de JSON. El catálogo se actualiza de forma
+incremental: `registrar` añade un recibo recién guardado y `sincronizar`
+solo vuelve a leer los archivos nuevos o modificados (por mtime y tamaño) y
+retira los que ya no existen.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+
+from shared.crypto_utils import es_archivo_recibo
+
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS recibos (
+    id INTEGER PRIMARY KEY,
+    nombre TEXT NOT NULL UNIQUE,
+    hash TEXT NOT NULL,
+    archivo TEXT NOT NULL,
+    curva TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    modo_hash TEXT,
+    bloque_hash INTEGER,
+    mtime_ns INTEGER NOT NULL,
+    tamano INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS recibos_hash ON recibos (hash);
+CREATE INDEX IF NOT EXISTS recibos_archivo ON recibos (archivo COLLATE NOCASE);
+-- Índice de cobertura en el orden de la lista: los filtros por nombre, hash o
+-- curva lo recorren sin saltar a la tabla
+CREATE INDEX IF NOT EXISTS recibos_lista ON recibos (timestamp DESC, id DESC, archivo, curva, hash);
+"""
+
+_COLUMNAS = ('id', 'nombre', 'hash', 'archivo', 'curva', 'timestamp', 'modo_hash', 'bloque_hash')
+
+
+class CatalogoRecibos:
+    """Índice SQLite de los recibos de un directorio."""
+
+    def __init__(self, ruta_db, directorio_recibos):
+        """
+        Args:
+            ruta_db (str): Archivo SQLite del catálogo (se crea si no existe)
+            directorio_recibos (str): Directorio de recibos a indexar
+        """
+        directorio = os.path.dirname(os.path.abspath(ruta_db))
+        os.makedirs(directorio, exist_ok=True)
+        self.directorio_recibos = directorio_recibos
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(ruta_db, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(ESQUEMA)
+
+    def _fila_recibo(self, nombre, estado):
+        """Lee un recibo y devuelve su fila del catálogo, o None si no es válido."""
+        try:
+            with open(os.path.join(self.directorio_recibos, nombre), 'r', encoding='utf-8') as f:
+                recibo = json.load(f)
+            return (nombre, recibo['hash'].lower(), recibo.get('archivo_original', ''),
+                    recibo.get('curva', 'SECP256R1'), recibo['timestamp'],
+                    recibo.get('modo_hash'), recibo.get('bloque_hash'),
+                    estado.st_mtime_ns, estado.st_size)
+        except (OSError, ValueError, KeyError, TypeError, AttributeError):
+            return None
+
+    def _guardar_filas(self, filas):
+        self._db.executemany(
+            "INSERT INTO recibos (nombre, hash, archivo, curva, timestamp, modo_hash, bloque_hash, "
+            "mtime_ns, tamano) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (nombre) DO UPDATE SET hash = excluded.hash, archivo = excluded.archivo, "
+            "curva = excluded.curva, timestamp = excluded.timestamp, modo_hash = excluded.modo_hash, "
+            "bloque_hash = excluded.bloque_hash, mtime_ns = excluded.mtime_ns, tamano = excluded.tamano",
+            filas
+        )
+
+    def registrar(self, ruta_recibo):
+        """
+        Añade o actualiza un recibo recién guardado.
+
+        Args:
+            ruta_recibo (str): Ruta del recibo dentro del directorio de recibos
+
+        Returns:
+            bool: True si se indexó
+        """
+        nombre = os.path.basename(ruta_recibo)
+        try:
+            fila = self._fila_recibo(nombre, os.stat(os.path.join(self.directorio_recibos, nombre)))
+        except OSError:
+            return False
+        if fila is None:
+            return False
+        with self._lock:
+            self._guardar_filas([fila])
+            self._db.commit()
+        return True
+
+    def sincronizar(self, lote=5000):
+        """
+        Pone el catálogo al día con el directorio de recibos.
+
+        Solo se leen los recibos nuevos o cuyo mtime o tamaño cambió.
+
+        Args:
+            lote (int): Recibos por transacción
+
+        Returns:
+            dict: Recibos añadidos o actualizados, eliminados e ignorados (no válidos)
+        """
+        with self._lock:
+            conocidos = {nombre: (mtime_ns, tamano) for nombre, mtime_ns, tamano in
+                         self._db.execute("SELECT nombre, mtime_ns, tamano FROM recibos")}
+
+        actualizados = ignorados = 0
+        filas = []
+        presentes = set()
+        if os.path.isdir(self.directorio_recibos):
+            with os.scandir(self.directorio_recibos) as entradas:
+                for entrada in entradas:
+                    if not es_archivo_recibo(entrada.name) or not entrada.is_file():
+                        continue
+                    presentes.add(entrada.name)
+                    estado = entrada.stat()
+                    if conocidos.get(entrada.name) == (estado.st_mtime_ns, estado.st_size):
+                        continue
+                    fila = self._fila_recibo(entrada.name, estado)
+                    if fila is None:
+                        ignorados += 1
+                        continue
+                    filas.append(fila)
+                    if len(filas) >= lote:
+                        with self._lock:
+                            self._guardar_filas(filas)
+                            self._db.commit()
+                        actualizados += len(filas)
+                        filas = []
+
+        eliminados = [(nombre,) for nombre in conocidos if nombre not in presentes]
+        with self._lock:
+            self._guardar_filas(filas)
+            self._db.executemany("DELETE FROM recibos WHERE nombre = ?", eliminados)
+            self._db.commit()
+        actualizados += len(filas)
+        return {"actualizados": actualizados, "eliminados": len(eliminados), "ignorados": ignorados}
+
+    def _filtro(self, texto, curva):
+        """Cláusula WHERE para un texto de búsqueda y una curva."""
+        condiciones, parametros = [], []
+        texto = (texto or '').strip()
+        if texto:
+            prefijo = texto.lower()
+            if len(prefijo) >= 4 and all(c in '0123456789abcdef' for c in prefijo):
+                # Un prefijo hexadecimal busca por hash (usa el índice) o por nombre
+                condiciones.append("((hash >= ? AND hash < ?) OR archivo LIKE ? ESCAPE '\\')")
+                parametros += [prefijo, prefijo + 'g']
+            else:
+                condiciones.append("archivo LIKE ? ESCAPE '\\'")
+            escapado = texto.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+            parametros.append(f"%{escapado}%")
+        if curva:
+            condiciones.append("curva = ?")
+            parametros.append(curva)
+        return (" WHERE " + " AND ".join(condiciones)) if condiciones else "", parametros
+
+    def buscar_ids(self, texto='', curva=None):
+        """
+        Identificadores de los recibos que coinciden, del más reciente al más antiguo.
+
+        Devolver solo los ids permite a una lista virtualizada pedir después
+        las filas visibles con `filas`.
+
+        Args:
+            texto (str): Fragmento del nombre del archivo o prefijo del hash
+            curva (str, optional): Solo recibos de esta curva
+
+        Returns:
+            list: ids de los recibos
+        """
+        where, parametros = self._filtro(texto, curva)
+        with self._lock:
+            return [fila[0] for fila in self._db.execute(
+                f"SELECT id FROM recibos{where} ORDER BY timestamp DESC, id DESC", parametros)]
+
+    def filas(self, ids):
+        """
+        Datos de los recibos indicados, en el mismo orden.
+
+        Args:
+            ids (list): ids devueltos por `buscar_ids`
+
+        Returns:
+            list: dicts con id, nombre, hash, archivo, curva, timestamp, modo_hash y bloque_hash
+        """
+        if not ids:
+            return []
+        with self._lock:
+            filas = self._db.execute(
+                f"SELECT {', '.join(_COLUMNAS)} FROM recibos WHERE id IN ({', '.join('?' * len(ids))})",
+                list(ids)
+            ).fetchall()
+        por_id = {fila[0]: dict(zip(_COLUMNAS, fila)) for fila in filas}
+        return [por_id[i] for i in ids if i in por_id]
+
+    def por_hash(self, hash_hex):
+        """
+        Recibos de un hash, del más reciente al más antiguo.
+
+        Args:
+            hash_hex (str): Hash (o raíz Merkle) del documento
+
+        Returns:
+            list: dicts como los de `filas`, con la ruta del recibo en 'ruta'
+        """
+        with self._lock:
+            filas = self._db.execute(
+                f"SELECT {', '.join(_COLUMNAS)} FROM recibos WHERE hash = ? "
+                "ORDER BY timestamp DESC, id DESC", (hash_hex.lower(),)
+            ).fetchall()
+        recibos = [dict(zip(_COLUMNAS, fila)) for fila in filas]
+        for recibo in recibos:
+            recibo['ruta'] = os.path.join(self.directorio_recibos, recibo['nombre'])
+        return recibos
+
+    def modos_arbol(self, archivo):
+        """
+        Modos de hash en árbol usados en los recibos de un nombre de archivo.
+
+        Args:
+            archivo (str): Nombre del archivo original
+
+        Returns:
+            list: Pares (modo_hash, bloque_hash) distintos
+        """
+        with self._lock:
+            return self._db.execute(
+                "SELECT DISTINCT modo_hash, bloque_hash FROM recibos "
+                "WHERE archivo = ? COLLATE NOCASE AND modo_hash IS NOT NULL", (archivo,)
+            ).fetchall()
+
+    def total(self):
+        """Número de recibos catalogados."""
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM recibos").fetchone()[0]
+
+    def cerrar(self):
+        """Cierra la base de datos."""
+        with self._lock:
+            self._db.close()
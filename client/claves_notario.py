@@ -0,0 +1,217 @@
+"""
+Caché local de las claves públicas del notario.
+
+Permite verificar recibos en el propio cliente, sin servidor: la clave pública
+de cada curva se descarga una vez, se guarda en disco y se fija (pin) por su
+huella SHA-256. Las descargas posteriores (refresco) deben coincidir con la
+huella fijada; si no, la clave nueva se rechaza y se sigue usando la fijada.
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+
+from cryptography.hazmat.primitives.asymmetric import ec
+
+from shared.crypto_utils import NotarioCrypto, CURVAS_SOPORTADAS
+
+
+class HuellaNoCoincideError(Exception):
+    """La clave descargada no coincide con la huella fijada para la curva."""
+
+    def __init__(self, curva, esperada, recibida):
+        self.curva = curva
+        self.esperada = esperada
+        self.recibida = recibida
+        super().__init__(
+            f"La clave pública {curva} del servidor no coincide con la huella fijada "
+            f"({recibida[:16]}... en lugar de {esperada[:16]}...)"
+        )
+
+
+class CacheClavesNotario:
+    """
+    Claves públicas del notario por curva, cacheadas en disco con huella fijada.
+
+    `huellas.json` guarda por curva la huella fijada y la fecha de la última
+    descarga. Se puede rellenar de antemano para fijar huellas conocidas; si
+    no, la primera descarga fija la huella (trust on first use).
+    """
+
+    def __init__(self, directorio, descargar, ttl=86400):
+        """
+        Args:
+            directorio (str): Directorio de la caché (se crea si no existe)
+            descargar (callable): Función curva -> clave pública PEM del servidor
+            ttl (float): Segundos tras los que se intenta refrescar una clave
+        """
+        self.directorio = directorio
+        self.descargar = descargar
+        self.ttl = ttl
+        os.makedirs(directorio, exist_ok=True)
+        self._lock = threading.Lock()
+        self._notarios = {}
+        self._estado = self._leer_estado()
+
+    def _ruta_estado(self):
+        return os.path.join(self.directorio, 'huellas.json')
+
+    def _ruta_clave(self, curva):
+        return os.path.join(self.directorio, f'notario_public_{curva.lower()}.pem')
+
+    def _leer_estado(self):
+        if not os.path.exists(self._ruta_estado()):
+            return {}
+        with open(self._ruta_estado(), 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def _guardar_estado(self):
+        temporal = self._ruta_estado() + '.tmp'
+        with open(temporal, 'w', encoding='utf-8') as f:
+            json.dump(self._estado, f, indent=2)
+        os.replace(temporal, self._ruta_estado())
+
+    def huella(self, curva):
+        """Huella fijada para una curva (None si aún no hay)."""
+        return self._estado.get(curva, {}).get('huella')
+
+    def _importar(self, curva, pem):
+        """Crea el verificador de una curva comprobando que la clave es de esa curva."""
+        notario = NotarioCrypto(curva=curva)
+        notario.importar_clave_publica_str(pem)
+        clave = notario.public_key
+        if not isinstance(clave, ec.EllipticCurvePublicKey) \
+                or not isinstance(clave.curve, CURVAS_SOPORTADAS[curva]['curva']):
+            raise ValueError(f"La clave recibida no es de la curva {curva}")
+        return notario
+
+    def _cargar_local(self, curva):
+        """Carga la clave cacheada si existe y coincide con su huella."""
+        if not os.path.exists(self._ruta_clave(curva)):
+            return None
+        with open(self._ruta_clave(curva), 'r', encoding='utf-8') as f:
+            notario = self._importar(curva, f.read())
+        if notario.huella_clave_publica() != self.huella(curva):
+            print(f"⚠️  La clave cacheada {curva} no coincide con su huella; se descarta")
+            return None
+        return notario
+
+    def _caducada(self, curva):
+        return time.time() - self._estado.get(curva, {}).get('descargada', 0) > self.ttl
+
+    def refrescar(self, curva):
+        """
+        Descarga la clave de una curva y la guarda si respeta la huella fijada.
+
+        Args:
+            curva (str): Nombre de la curva
+
+        Returns:
+            NotarioCrypto: Verificador con la clave descargada
+
+        Raises:
+            HuellaNoCoincideError: Si la clave no coincide con la huella fijada
+        """
+        notario = self._importar(curva, self.descargar(curva))
+        huella = notario.huella_clave_publica()
+        fijada = self.huella(curva)
+        if fijada is not None and fijada != huella:
+            raise HuellaNoCoincideError(curva, fijada, huella)
+
+        with open(self._ruta_clave(curva), 'w', encoding='utf-8') as f:
+            f.write(notario.exportar_clave_publica_str())
+        self._estado[curva] = {"huella": huella, "descargada": time.time()}
+        self._guardar_estado()
+        self._notarios[curva] = notario
+        return notario
+
+    def obtener(self, curva):
+        """
+        Obtiene el verificador local de una curva.
+
+        Usa la clave cacheada; si no la hay o está caducada intenta
+        descargarla. Sin conexión se sigue usando la cacheada.
+
+        Args:
+            curva (str): Nombre de la curva
+
+        Returns:
+            NotarioCrypto: Verificador, o None si la clave es desconocida
+
+        Raises:
+            HuellaNoCoincideError: Si el servidor presenta otra clave y no hay
+                                   una clave fijada con la que verificar
+        """
+        if curva not in CURVAS_SOPORTADAS:
+            return None
+
+        with self._lock:
+            notario = self._notarios.get(curva)
+            if notario is None:
+                notario = self._cargar_local(curva)
+                if notario is not None:
+                    self._notarios[curva] = notario
+
+            if notario is None or self._caducada(curva):
+                try:
+                    notario = self.refrescar(curva)
+                except HuellaNoCoincideError as e:
+                    if notario is None:
+                        raise
+                    print(f"⚠️  {e}; se mantiene la clave fijada", file=sys.stderr)
+                except Exception as e:
+                    # Sin conexión: seguir con la clave cacheada (si la hay)
+                    print(f"⚠️  No se pudo refrescar la clave {curva}: {e}", file=sys.stderr)
+            return notario
+
+    def olvidar(self, curva):
+        """Elimina la clave y la huella fijada de una curva (rotación legítima de claves)."""
+        with self._lock:
+            self._notarios.pop(curva, None)
+            self._estado.pop(curva, None)
+            self._guardar_estado()
+            if os.path.exists(self._ruta_clave(curva)):
+                os.remove(self._ruta_clave(curva))
+
+
+def verificar_firma_recibo(recibo, claves_notario, cliente):
+    """
+    Verifica la firma de un recibo.
+
+    Verifica localmente con la clave pública cacheada del notario; el
+    servidor solo se consulta si la clave de la curva es desconocida.
+
+    Args:
+        recibo (dict): Recibo a verificar
+        claves_notario (CacheClavesNotario): Claves públicas cacheadas
+        cliente (ClienteNotario): Cliente del API para verificar en el servidor
+
+    Returns:
+        tuple: (valido, verificado_por)
+    """
+    # Obtener curva del recibo (por defecto SECP256R1 para compatibilidad)
+    curva = recibo.get('curva', 'SECP256R1')
+    solicitud = {
+        "timestamp": recibo['timestamp'],
+        "hash": recibo['hash'].lower(),
+        "firma": recibo['firma'],
+        "curva": curva
+    }
+    if recibo.get('secuencia') is not None:
+        solicitud['secuencia'] = recibo['secuencia']
+        solicitud['anterior'] = recibo['anterior']
+    if recibo.get('modo_hash') is not None:
+        solicitud['modo_hash'] = recibo['modo_hash']
+        solicitud['bloque_hash'] = recibo['bloque_hash']
+    if recibo.get('version') is not None:
+        solicitud['version'] = recibo['version']
+    if recibo.get('codificacion_firma') is not None:
+        solicitud['codificacion_firma'] = recibo['codificacion_firma']
+
+    notario_local = claves_notario.obtener(curva)
+    if notario_local is not None:
+        return (notario_local.verificar_firma(solicitud),
+                f"localmente (huella {notario_local.huella_clave_publica()[:16]}...)")
+    return cliente.verificar(solicitud)['valido'], "por el servidor"
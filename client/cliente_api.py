@@ -0,0 +1,134 @@
+"""
+Cliente HTTP del API del Notario Digital.
+Todas las operaciones comparten una sesión con pool de conexiones keep-alive,
+de modo que las solicitudes repetidas reutilizan la conexión TCP.
+"""
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class ErrorApi(Exception):
+    """El servidor respondió con un código de error."""
+
+    def __init__(self, estado, detalle, reintentar_en=None):
+        """
+        Args:
+            estado (int): Código HTTP de la respuesta
+            detalle (str): Mensaje de error del servidor
+            reintentar_en (str, optional): Valor de la cabecera Retry-After
+        """
+        self.estado = estado
+        self.detalle = detalle
+        self.reintentar_en = reintentar_en
+        super().__init__(f"HTTP {estado}: {detalle}")
+
+
+class ClienteNotario:
+    """
+    Cliente del API del notario sobre una sesión `requests` reutilizable.
+
+    Es seguro usarlo desde varios hilos: el pool de urllib3 reparte las
+    conexiones abiertas entre las solicitudes concurrentes.
+    """
+
+    def __init__(self, url_base="http://127.0.0.1:8000", timeout=10, conexiones=8):
+        """
+        Args:
+            url_base (str): URL del servidor API
+            timeout (float): Timeout por defecto de cada solicitud en segundos
+            conexiones (int): Conexiones keep-alive máximas en el pool
+        """
+        self.url_base = url_base.rstrip('/')
+        self.timeout = timeout
+        self.sesion = requests.Session()
+        adaptador = HTTPAdapter(pool_connections=1, pool_maxsize=conexiones)
+        self.sesion.mount('http://', adaptador)
+        self.sesion.mount('https://', adaptador)
+
+    def _solicitar(self, metodo, ruta, timeout=None, **kwargs):
+        """Envía una solicitud y devuelve el JSON de la respuesta o lanza `ErrorApi`."""
+        response = self.sesion.request(metodo, f"{self.url_base}{ruta}",
+                                       timeout=timeout or self.timeout, **kwargs)
+        if response.status_code != 200:
+            try:
+                detalle = response.json().get('detail', 'Error desconocido')
+            except ValueError:
+                detalle = response.text or 'Error desconocido'
+            raise ErrorApi(response.status_code, detalle, response.headers.get('Retry-After'))
+        return response.json()
+
+    def salud(self):
+        """Estado del servidor (GET /health)."""
+        return self._solicitar('GET', '/health', timeout=2)
+
+    def clave_publica(self, curva):
+        """
+        Obtiene la clave pública del notario para una curva.
+
+        Returns:
+            str: Clave pública en formato PEM
+        """
+        return self._solicitar('GET', f'/clave-publica/{curva}', timeout=5)['clave_publica']
+
+    def notarizar(self, hash_hex, curva="SECP256R1", clave_idempotencia=None,
+                  modo_hash=None, bloque_hash=None):
+        """
+        Notariza un hash.
+
+        Args:
+            hash_hex (str): Hash SHA-256 en hexadecimal
+            curva (str): Curva con la que firmar
+            clave_idempotencia (str, optional): Cabecera Idempotency-Key para reintentos seguros
+            modo_hash (str, optional): Modo de hash ('arbol-sha256'); por defecto SHA-256 plano
+            bloque_hash (int, optional): Tamaño de bloque del modo árbol
+
+        Returns:
+            dict: Recibo devuelto por el servidor
+        """
+        cabeceras = {'Idempotency-Key': clave_idempotencia} if clave_idempotencia else None
+        solicitud = {"hash": hash_hex, "curva": curva}
+        if modo_hash is not None:
+            solicitud["modo_hash"] = modo_hash
+            solicitud["bloque_hash"] = bloque_hash
+        return self._solicitar('POST', '/notarizar', json=solicitud, headers=cabeceras)
+
+    def verificar(self, recibo):
+        """
+        Verifica un recibo en el servidor.
+
+        Args:
+            recibo (dict): Recibo con timestamp, hash, firma, curva y campos de cadena opcionales
+
+        Returns:
+            dict: Respuesta con {valido, mensaje, detalles}
+        """
+        campos = ('timestamp', 'hash', 'firma', 'curva', 'secuencia', 'anterior',
+                  'modo_hash', 'bloque_hash', 'version', 'codificacion_firma')
+        return self._solicitar('POST', '/verificar',
+                               json={c: recibo[c] for c in campos if recibo.get(c) is not None})
+
+    def consultar(self, hash_hex):
+        """Recibos emitidos para un hash (GET /consultar/{hash})."""
+        return self._solicitar('GET', f'/consultar/{hash_hex}')
+
+    def dividir_fragmentos(self, token, prefijos=(), max_mb=None, timeout=600):
+        """
+        Pide al servidor que divida fragmentos de su almacén en línea.
+
+        Args:
+            token (str): Token de administración (NOTARIO_ADMIN_TOKEN del servidor)
+            prefijos (iterable): Prefijos de los fragmentos a dividir
+            max_mb (float, optional): Divide los fragmentos mayores de N MB
+            timeout (float): Timeout en segundos (copiar un fragmento grande tarda)
+
+        Returns:
+            dict: Respuesta con {divididos, fragmentos}
+        """
+        return self._solicitar('POST', '/admin/fragmentos/dividir', timeout=timeout,
+                               json={"prefijos": list(prefijos), "max_mb": max_mb},
+                               headers={'X-Admin-Token': token})
+
+    def cerrar(self):
+        """Cierra las conexiones del pool."""
+        self.sesion.close()
@@ -0,0 +1,330 @@
+"""
+Cliente de línea de comandos del Notario Digital.
+
+Notariza y verifica archivos sin interfaz gráfica, para scripts y trabajos
+por lotes. Usa el mismo cliente del API, motor de hashing, caché de hashes y
+formato de recibos que la aplicación de escritorio.
+
+Cada subcomando escribe en la salida estándar un objeto JSON por línea (uno
+por archivo, recibo o curva) y los avisos en la salida de errores. El código
+de salida es 0 si todo fue bien, 1 si algún elemento falló y 2 si no se pudo
+contactar con el servidor.
+
+Uso:
+    python client/notario_cli.py notarizar informe.pdf datos/*.csv
+    find docs -name '*.pdf' | python client/notario_cli.py notarizar -
+    python client/notario_cli.py verificar receipts/recibo_*.json --documentos docs/
+    python client/notario_cli.py clave-publica SECP256R1 SECP256K1
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+
+# Al arrancar solo se importan módulos ligeros: requests, cryptography y el
+# resto se importan dentro de cada subcomando, y Tk/PIL nunca
+RAIZ = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.append(RAIZ)
+
+URL_POR_DEFECTO = os.environ.get('NOTARIO_URL', 'http://127.0.0.1:8000')
+DIRECTORIO_CACHE = os.path.join(RAIZ, 'cache')
+
+_lock_salida = threading.Lock()
+
+
+def emitir(objeto):
+    """Escribe un objeto JSON en una línea de la salida estándar."""
+    linea = json.dumps(objeto, ensure_ascii=False)
+    with _lock_salida:
+        sys.stdout.write(linea + '\n')
+        sys.stdout.flush()
+
+
+def leer_lista(argumentos):
+    """
+    Expande la lista de argumentos: '-' se sustituye por las líneas de stdin.
+
+    Las líneas se leen a medida que se consumen, así que una lista larga no
+    se carga entera en memoria.
+
+    Args:
+        argumentos (list): Rutas indicadas en la línea de comandos
+
+    Yields:
+        str: Rutas, sin líneas vacías
+    """
+    for argumento in argumentos:
+        if argumento == '-':
+            for linea in sys.stdin:
+                if linea.strip():
+                    yield linea.rstrip('\r\n')
+        else:
+            yield argumento
+
+
+def servidor_inaccesible(error):
+    """Indica si un error se debe a que no se pudo contactar con el servidor."""
+    import requests
+    return isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout))
+
+
+def en_paralelo(funcion, elementos, hilos):
+    """
+    Aplica una función a cada elemento con concurrencia acotada.
+
+    Como mucho hay 2 * hilos elementos en vuelo, así que una lista larga leída
+    de stdin no se encola entera en memoria.
+
+    Yields:
+        Resultado de cada elemento, en orden de finalización
+    """
+    from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+    with ThreadPoolExecutor(max_workers=hilos) as pool:
+        pendientes = set()
+        for elemento in elementos:
+            if len(pendientes) >= 2 * hilos:
+                hechos, pendientes = wait(pendientes, return_when=FIRST_COMPLETED)
+                for futuro in hechos:
+                    yield futuro.result()
+            pendientes.add(pool.submit(funcion, elemento))
+        for futuro in pendientes:
+            yield futuro.result()
+
+
+def abrir_cache_hashes(args):
+    """Caché de hashes compartida con la aplicación de escritorio (None con --sin-cache)."""
+    if args.sin_cache:
+        return None
+    from client.cache_hashes import CacheHashes
+    return CacheHashes(os.path.join(DIRECTORIO_CACHE, 'hashes.sqlite3'))
+
+
+def abrir_claves_notario(cliente):
+    """Claves públicas del notario cacheadas y fijadas, como en la aplicación de escritorio."""
+    from client.claves_notario import CacheClavesNotario
+    return CacheClavesNotario(os.path.join(DIRECTORIO_CACHE, 'claves_notario'), cliente.clave_publica)
+
+
+def comando_notarizar(args):
+    """Notariza archivos y guarda sus recibos."""
+    from shared.crypto_utils import CURVAS_SOPORTADAS, HashCancelado
+    from shared.motor_hash import validar_modo_hash, MODO_ARBOL
+    from client.cliente_api import ClienteNotario
+    from client.notarizacion_lote import NotarizadorLote
+
+    if args.curva not in CURVAS_SOPORTADAS:
+        print(f"❌ Curva no soportada: {args.curva}. Curvas disponibles: {list(CURVAS_SOPORTADAS)}",
+              file=sys.stderr)
+        return 2
+    modo_hash, bloque_hash = (MODO_ARBOL, args.bloque) if args.arbol else (None, None)
+    try:
+        validar_modo_hash(modo_hash, bloque_hash)
+    except ValueError as e:
+        print(f"❌ {e}", file=sys.stderr)
+        return 2
+
+    cliente = ClienteNotario(args.servidor, conexiones=args.concurrencia)
+    try:
+        # Sin servidor cada archivo agotaría sus reintentos: fallar antes de hashear
+        cliente.salud()
+    except Exception as e:
+        print(f"❌ Servidor no disponible en {args.servidor}: {e}", file=sys.stderr)
+        return 2
+
+    lote = NotarizadorLote(cliente, args.recibos, args.curva,
+                           hilos_hash=args.hilos, envios_concurrentes=args.concurrencia,
+                           modo_hash=modo_hash, bloque_hash=bloque_hash,
+                           cache_hashes=abrir_cache_hashes(args))
+
+    def resultado(archivo, entrada, error):
+        if entrada is not None:
+            emitir({"archivo": archivo, "ok": True, "hash": entrada["hash"],
+                    "recibo": os.path.join(args.recibos, entrada["recibo"])})
+        elif isinstance(error, HashCancelado):
+            emitir({"archivo": archivo, "ok": False, "error": "cancelado"})
+        else:
+            emitir({"archivo": archivo, "ok": False, "error": str(error) or type(error).__name__})
+
+    # El lote necesita la lista completa para calcular el total de bytes
+    archivos = [(ruta, ruta) for ruta in leer_lista(args.archivos)]
+    cancelar = threading.Event()
+    salida = {}
+    hilo = threading.Thread(
+        target=lambda: salida.update(lote.notarizar_archivos(archivos, cancelado=cancelar.is_set,
+                                                             resultado=resultado)),
+        daemon=True
+    )
+    hilo.start()
+    try:
+        # El lote corre en otro hilo para que Ctrl+C pueda cancelarlo limpiamente
+        while hilo.is_alive():
+            hilo.join(0.2)
+    except KeyboardInterrupt:
+        print("⏹️  Cancelando: se esperan los envíos en curso...", file=sys.stderr)
+        cancelar.set()
+        hilo.join()
+    finally:
+        cliente.cerrar()
+
+    print(f"✅ {salida.get('notarizados', 0)} notarizados • {len(salida.get('errores', []))} errores • "
+          f"{salida.get('cancelados', 0)} cancelados • {salida.get('segundos', 0):.2f} s", file=sys.stderr)
+    return 0 if salida and salida["notarizados"] == salida["archivos"] else 1
+
+
+def comando_verificar(args):
+    """Verifica recibos y, opcionalmente, que los documentos no han cambiado."""
+    from shared.crypto_utils import cargar_recibo
+    from shared.motor_hash import validar_modo_hash, hashear_segun_modo
+    from client.cliente_api import ClienteNotario
+    from client.claves_notario import verificar_firma_recibo
+
+    recibos = leer_lista(args.recibos)
+    if args.archivo:
+        recibos = list(recibos)
+        if len(recibos) != 1:
+            print("❌ --archivo solo se admite con un único recibo; usa --documentos", file=sys.stderr)
+            return 2
+
+    cliente = ClienteNotario(args.servidor, conexiones=args.concurrencia)
+    claves = abrir_claves_notario(cliente)
+    cache_hashes = abrir_cache_hashes(args)
+
+    def verificar(ruta_recibo):
+        salida = {"recibo": ruta_recibo}
+        try:
+            recibo = cargar_recibo(ruta_recibo)
+            documento = args.archivo
+            if documento is None and args.documentos:
+                documento = os.path.join(args.documentos, recibo.get('archivo_original', ''))
+            if documento is not None:
+                # El documento se rehashea con el mismo modo con el que se notarizó
+                modo_hash, bloque_hash = recibo.get('modo_hash'), recibo.get('bloque_hash')
+                validar_modo_hash(modo_hash, bloque_hash)
+                if cache_hashes is not None:
+                    hash_archivo = cache_hashes.hashear(documento, modo_hash=modo_hash, bloque_hash=bloque_hash)
+                else:
+                    hash_archivo = hashear_segun_modo(documento, modo_hash, bloque_hash)
+                salida["archivo"] = documento
+                salida["hash_coincide"] = hash_archivo.lower() == recibo['hash'].lower()
+            valido, verificado_por = verificar_firma_recibo(recibo, claves, cliente)
+            salida["firma_valida"] = valido
+            salida["verificado_por"] = verificado_por
+            salida["ok"] = valido and salida.get("hash_coincide", True)
+        except Exception as e:
+            salida["ok"] = False
+            salida["error"] = str(e) or type(e).__name__
+            if servidor_inaccesible(e):
+                salida["sin_servidor"] = True
+        return salida
+
+    validos = fallidos = sin_servidor = 0
+    try:
+        for salida in en_paralelo(verificar, recibos, args.concurrencia):
+            sin_servidor += salida.pop("sin_servidor", False)
+            emitir(salida)
+            if salida["ok"]:
+                validos += 1
+            else:
+                fallidos += 1
+    finally:
+        cliente.cerrar()
+
+    print(f"{'✅' if not fallidos else '❌'} {validos} válidos • {fallidos} con fallos", file=sys.stderr)
+    if sin_servidor:
+        # Los recibos sin clave cacheada necesitan al servidor para verificarse
+        print(f"❌ {sin_servidor} recibos sin verificar: servidor no disponible en {args.servidor}",
+              file=sys.stderr)
+        return 2
+    return 0 if not fallidos else 1
+
+
+def comando_clave_publica(args):
+    """Muestra la clave pública del notario y su huella fijada."""
+    from client.cliente_api import ClienteNotario
+
+    cliente = ClienteNotario(args.servidor)
+    claves = abrir_claves_notario(cliente)
+    fallos = 0
+    inaccesible = None
+    try:
+        for curva in args.curvas:
+            try:
+                notario = claves.obtener(curva.upper())
+            except Exception as e:
+                notario, error = None, str(e)
+            else:
+                error = "Curva no soportada o clave no disponible"
+            if notario is None and inaccesible is None:
+                # Sin clave cacheada: distinguir un servidor caído de una curva desconocida
+                try:
+                    cliente.salud()
+                    inaccesible = False
+                except Exception as e:
+                    inaccesible = str(e) or type(e).__name__
+            if notario is None:
+                fallos += 1
+                emitir({"curva": curva, "ok": False,
+                        "error": f"Servidor no disponible: {inaccesible}" if inaccesible else error})
+            elif args.pem:
+                sys.stdout.write(notario.exportar_clave_publica_str())
+            else:
+                emitir({"curva": curva.upper(), "ok": True,
+                        "huella": notario.huella_clave_publica(),
+                        "clave_publica": notario.exportar_clave_publica_str()})
+    finally:
+        cliente.cerrar()
+    if inaccesible:
+        print(f"❌ Servidor no disponible en {args.servidor}: {inaccesible}", file=sys.stderr)
+        return 2
+    return 0 if not fallos else 1
+
+
+def crear_parser():
+    parser = argparse.ArgumentParser(description="Notario Digital sin interfaz gráfica")
+    parser.add_argument('--servidor', default=URL_POR_DEFECTO,
+                        help="URL del servidor (por defecto: $NOTARIO_URL o http://127.0.0.1:8000)")
+    subparsers = parser.add_subparsers(dest='comando', required=True)
+
+    notarizar = subparsers.add_parser('notarizar', help="Notariza archivos")
+    notarizar.add_argument('archivos', nargs='+', help="Archivos a notarizar ('-' lee la lista de stdin)")
+    notarizar.add_argument('--curva', default='SECP256R1', help="Curva con la que firmar")
+    notarizar.add_argument('--recibos', default=os.path.join(RAIZ, 'receipts'),
+                           help="Directorio donde guardar los recibos (por defecto: receipts/)")
+    notarizar.add_argument('--arbol', action='store_true',
+                           help="Hash en árbol de Merkle por bloques, en paralelo")
+    notarizar.add_argument('--bloque', type=int, default=4 * 1024 * 1024,
+                           help="Tamaño de bloque del hash en árbol en bytes (por defecto: 4 MiB)")
+    notarizar.add_argument('--hilos', type=int, default=None, help="Hilos de hashing")
+    notarizar.add_argument('--concurrencia', type=int, default=4, help="Solicitudes simultáneas al servidor")
+    notarizar.add_argument('--sin-cache', action='store_true', help="No usar la caché de hashes")
+    notarizar.set_defaults(funcion=comando_notarizar)
+
+    verificar = subparsers.add_parser('verificar', help="Verifica recibos")
+    verificar.add_argument('recibos', nargs='+', help="Recibos JSON ('-' lee la lista de stdin)")
+    verificar.add_argument('--archivo', default=None, help="Documento original (con un único recibo)")
+    verificar.add_argument('--documentos', default=None,
+                           help="Directorio con los documentos originales, según su archivo_original")
+    verificar.add_argument('--concurrencia', type=int, default=4, help="Recibos verificados a la vez")
+    verificar.add_argument('--sin-cache', action='store_true', help="No usar la caché de hashes")
+    verificar.set_defaults(funcion=comando_verificar)
+
+    clave = subparsers.add_parser('clave-publica', help="Muestra la clave pública del notario")
+    clave.add_argument('curvas', nargs='*', default=['SECP256R1'], help="Curvas (por defecto: SECP256R1)")
+    clave.add_argument('--pem', action='store_true', help="Escribe solo la clave en formato PEM")
+    clave.set_defaults(funcion=comando_clave_publica)
+    return parser
+
+
+def main():
+    args = crear_parser().parse_args()
+    if getattr(args, 'concurrencia', 1) < 1:
+        print("❌ --concurrencia debe ser al menos 1", file=sys.stderr)
+        return 2
+    return args.funcion(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -10,12 +10,26 @@ import os
 import sys
 import requests
 import json
+import threading
+import time
+import uuid
 from datetime import datetime
 from pathlib import Path
 
 # Agregar el directorio shared al path
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
-from shared.crypto_utils import NotarioCrypto, guardar_recibo, cargar_recibo, CURVAS_SOPORTADAS
+from shared.crypto_utils import NotarioCrypto, HashCancelado, cargar_recibo, CURVAS_SOPORTADAS
+from client.claves_notario import CacheClavesNotario, HuellaNoCoincideError, verificar_firma_recibo
+from client.cliente_api import ClienteNotario, ErrorApi
+from client.segundo_plano import TareasSegundoPlano
+from client.notarizacion_lote import NotarizadorLote, guardar_recibo_respuesta
+from client.cache_hashes import CacheHashes
+from client.bandeja_salida import BandejaSalida, es_error_transitorio
+from client.catalogo_recibos import CatalogoRecibos
+from shared.motor_hash import validar_modo_hash, MODO_ARBOL, BLOQUE_ARBOL
+
+# Filas visibles en la lista virtualizada del catálogo de recibos
+FILAS_CATALOGO = 20
 
 
 class NotarioDigitalApp:
@@ -34,9 +48,18 @@ class NotarioDigitalApp:
         
         # Configuración del servidor API
         self.api_url = "http://127.0.0.1:8000"
+        # Sesión HTTP con conexiones keep-alive compartida por todas las acciones
+        self.cliente = ClienteNotario(self.api_url)
+        # La red se usa desde hilos de trabajo; los resultados vuelven a Tk con after()
+        self.tareas = TareasSegundoPlano(self.root)
         self.archivo_actual = None
         self.hash_actual = None
+        # Modo de hash con el que se calculó hash_actual (None = SHA-256 plano)
+        self.modo_hash_actual = None
+        self.bloque_hash_actual = None
         self.recibo_actual = None
+        # Evento de cancelación del hash en curso (None si no se está hasheando)
+        self.hash_en_curso = None
         
         # Curva seleccionada (por defecto SECP256R1)
         self.curva_seleccionada = "SECP256R1"
@@ -52,11 +75,50 @@ class NotarioDigitalApp:
         self.keys_dir = os.path.join(os.path.dirname(__file__), '..', 'keys')
         os.makedirs(self.keys_dir, exist_ok=True)
         
+        # Claves públicas del notario cacheadas para verificar sin servidor
+        self.claves_notario = CacheClavesNotario(
+            os.path.join(os.path.dirname(__file__), '..', 'cache', 'claves_notario'),
+            self.cliente.clave_publica
+        )
+        
+        # Hashes de archivos ya calculados: un archivo sin cambios no se relee
+        self.cache_hashes = CacheHashes(
+            os.path.join(os.path.dirname(__file__), '..', 'cache', 'hashes.sqlite3')
+        )
+        self.forzar_rehash = tk.BooleanVar(value=False)
+        # Hash en árbol de Merkle por bloques, calculado en paralelo
+        self.modo_arbol = tk.BooleanVar(value=False)
+        
+        # Notarizaciones pendientes mientras el servidor no responde; se envían
+        # solas al reconectar y sobreviven a un reinicio de la aplicación
+        self.bandeja = BandejaSalida(
+            os.path.join(os.path.dirname(__file__), '..', 'cache', 'bandeja_salida.sqlite3'),
+            self.cliente, self.receipts_dir,
+            al_cambiar=lambda: self.tareas.publicar(self._actualizar_bandeja),
+            al_recibir=lambda archivo, ruta: self.tareas.publicar(self._recibo_de_bandeja, archivo, ruta)
+        )
+        
+        # Catálogo de los recibos de receipts/ para buscarlos por hash o nombre
+        self.catalogo = CatalogoRecibos(
+            os.path.join(os.path.dirname(__file__), '..', 'cache', 'catalogo_recibos.sqlite3'),
+            self.receipts_dir
+        )
+        # Lista virtualizada: solo las filas visibles existen en el Treeview
+        self.catalogo_ids = []
+        self.catalogo_inicio = 0
+        self.catalogo_seleccion = None
+        self._busqueda_programada = None
+        
         # Configurar estilo
         self.configurar_estilo()
         
         # Crear interfaz
         self.crear_interfaz()
+        self._actualizar_bandeja()
+        self.bandeja.iniciar()
+        
+        # Poner el catálogo al día con receipts/ (solo lee los recibos nuevos o cambiados)
+        self.sincronizar_catalogo()
         
         # Verificar conexión con servidor
         self.root.after(100, self.verificar_servidor)
@@ -331,6 +393,7 @@ class NotarioDigitalApp:
         notebook = ttk.Notebook(notebook_container)
         notebook.grid(row=0, column=0, sticky='nsew')
         main_frame.rowconfigure(1, weight=1)
+        self.notebook = notebook
         
         # Pestaña 1: Notarizar
         self.crear_tab_notarizar(notebook)
@@ -338,10 +401,13 @@ class NotarioDigitalApp:
         # Pestaña 2: Verificar
         self.crear_tab_verificar(notebook)
         
-        # Pestaña 3: Gestión de Llaves
+        # Pestaña 3: Catálogo de recibos
+        self.crear_tab_recibos(notebook)
+        
+        # Pestaña 4: Gestión de Llaves
         self.crear_tab_gestion_llaves(notebook)
         
-        # Pestaña 4: Información
+        # Pestaña 5: Información
         self.crear_tab_info(notebook)
         
         # ==================== BARRA DE ESTADO PROFESIONAL ====================
@@ -375,6 +441,32 @@ class NotarioDigitalApp:
                                fg=self.color_text,
                                anchor='w')
         status_label.pack(side=tk.LEFT, fill=tk.X, expand=True)
+        
+        # Progreso del cálculo de hash (visible solo mientras se hashea)
+        self.progreso_frame = tk.Frame(status_container, bg='white')
+        self.progreso_hash = ttk.Progressbar(self.progreso_frame, mode='determinate',
+                                             length=220, maximum=100)
+        self.progreso_hash.pack(side=tk.LEFT, padx=(0, 10))
+        self.progreso_var = tk.StringVar()
+        tk.Label(self.progreso_frame,
+                textvariable=self.progreso_var,
+                font=self.font_normal,
+                bg='white',
+                fg=self.color_text).pack(side=tk.LEFT, padx=(0, 10))
+        tk.Button(self.progreso_frame,
+                 text="✖ Cancelar",
+                 command=self.cancelar_hash,
+                 font=self.font_normal,
+                 relief=tk.FLAT,
+                 cursor='hand2').pack(side=tk.LEFT)
+        
+        # Notarizaciones en la bandeja de salida (visible solo si hay pendientes)
+        self.bandeja_var = tk.StringVar()
+        self.bandeja_label = tk.Label(status_container,
+                                      textvariable=self.bandeja_var,
+                                      font=self.font_normal,
+                                      bg='white',
+                                      fg=self.color_warning)
     
     def crear_tab_notarizar(self, notebook):
         """Crea la pestaña de notarización con diseño centrado, redondeado y dinámico."""
@@ -489,6 +581,20 @@ class NotarioDigitalApp:
                                     relief='flat')
         btn_seleccionar.pack()
         
+        self.btn_carpeta = tk.Button(content1,
+                                     text="🗂️  Notarizar Carpeta Completa",
+                                     command=self.notarizar_carpeta,
+                                     font=('Segoe UI', 10, 'bold'),
+                                     foreground=self.color_primary,
+                                     background=self.color_card,
+                                     activebackground=self.color_bg,
+                                     borderwidth=0,
+                                     padx=20,
+                                     pady=8,
+                                     cursor='hand2',
+                                     relief='flat')
+        self.btn_carpeta.pack(pady=(12, 0))
+        
         # ========== CARD 2: Hash SHA-256 ==========
         card2_body = crear_card(scrollable_frame, "PASO 2: Hash Criptográfico", 
                                 self.color_accent, "🔐", pady_top=20)
@@ -511,6 +617,23 @@ class NotarioDigitalApp:
                                                    highlightthickness=0)
         self.hash_text.pack(fill=tk.X)
         
+        tk.Checkbutton(card2_body,
+                      text="Recalcular el hash aunque el archivo no haya cambiado",
+                      variable=self.forzar_rehash,
+                      font=('Segoe UI', 9),
+                      foreground=self.color_text_secondary,
+                      background=self.color_card,
+                      activebackground=self.color_card).pack(pady=(10, 0), anchor='w')
+        
+        tk.Checkbutton(card2_body,
+                      text="Hash en árbol (paralelo, archivos muy grandes)",
+                      variable=self.modo_arbol,
+                      command=self.recalcular_hash_actual,
+                      font=('Segoe UI', 9),
+                      foreground=self.color_text_secondary,
+                      background=self.color_card,
+                      activebackground=self.color_card).pack(pady=(2, 0), anchor='w')
+        
         # ========== CARD 3: Notarizar ==========
         card3_body = crear_card(scrollable_frame, "PASO 3: Notarizar Documento", 
                                 self.color_success, "✍️", pady_top=20)
@@ -574,6 +697,7 @@ class NotarioDigitalApp:
         """Crea la pestaña de verificación."""
         tab = ttk.Frame(notebook, padding="15")
         notebook.add(tab, text="✓ Verificar Recibo")
+        self.tab_verificar = tab
         
         # Sección: Cargar recibo
         ttk.Label(tab, text="1. Cargar Recibo Digital", style='Header.TLabel').grid(
@@ -601,7 +725,10 @@ class NotarioDigitalApp:
         
         self.archivo_verificar_label = ttk.Label(tab, text="Ningún archivo seleccionado", 
                                                 style='Info.TLabel')
-        self.archivo_verificar_label.grid(row=4, column=0, columnspan=2, sticky=tk.W, pady=5)
+        self.archivo_verificar_label.grid(row=4, column=0, sticky=tk.W, pady=5)
+        
+        ttk.Checkbutton(tab, text="Recalcular hash (ignorar caché)",
+                       variable=self.forzar_rehash).grid(row=4, column=1, sticky=tk.E, padx=10, pady=5)
         
         ttk.Button(tab, text="📂 Seleccionar Archivo", 
                   command=self.seleccionar_archivo_verificar,
@@ -633,6 +760,66 @@ class NotarioDigitalApp:
         tab.columnconfigure(0, weight=1)
         tab.rowconfigure(8, weight=1)
     
+    def crear_tab_recibos(self, notebook):
+        """Crea la pestaña del catálogo de recibos con búsqueda."""
+        tab = ttk.Frame(notebook, padding="15")
+        notebook.add(tab, text="📚 Recibos")
+        
+        ttk.Label(tab, text="Catálogo de Recibos", style='Header.TLabel').grid(
+            row=0, column=0, columnspan=5, sticky=tk.W, pady=(0, 10)
+        )
+        
+        # Búsqueda por nombre de archivo o prefijo de hash, y filtro de curva
+        ttk.Label(tab, text="🔍 Buscar:", style='Info.TLabel').grid(row=1, column=0, sticky=tk.W)
+        self.busqueda_var = tk.StringVar()
+        self.busqueda_var.trace_add('write', lambda *_: self._programar_busqueda())
+        ttk.Entry(tab, textvariable=self.busqueda_var, width=40).grid(
+            row=1, column=1, sticky=(tk.W, tk.E), padx=10
+        )
+        self.filtro_curva_var = tk.StringVar(value="Todas")
+        filtro_curva = ttk.Combobox(tab, textvariable=self.filtro_curva_var,
+                                    values=["Todas"] + list(CURVAS_SOPORTADAS),
+                                    state='readonly', width=14)
+        filtro_curva.bind('<<ComboboxSelected>>', lambda e: self._programar_busqueda())
+        filtro_curva.grid(row=1, column=2, padx=(0, 10))
+        ttk.Button(tab, text="🔄 Reindexar",
+                  command=self.sincronizar_catalogo,
+                  style='Secondary.TButton').grid(row=1, column=3, padx=(0, 10))
+        self.catalogo_total_var = tk.StringVar(value="⏳ Indexando recibos...")
+        ttk.Label(tab, textvariable=self.catalogo_total_var, style='Info.TLabel').grid(
+            row=1, column=4, sticky=tk.E
+        )
+        
+        # Lista virtualizada: el Treeview tiene siempre FILAS_CATALOGO filas y la
+        # barra de desplazamiento se controla a mano sobre la lista completa de ids
+        marco = ttk.Frame(tab)
+        marco.grid(row=2, column=0, columnspan=5, sticky=(tk.W, tk.E, tk.N), pady=10)
+        marco.columnconfigure(0, weight=1)
+        columnas = ('archivo', 'timestamp', 'curva', 'hash')
+        self.lista_recibos = ttk.Treeview(marco, columns=columnas, show='headings',
+                                          height=FILAS_CATALOGO, selectmode='browse')
+        for columna, titulo, ancho in (('archivo', "Archivo", 280), ('timestamp', "Timestamp", 220),
+                                       ('curva', "Curva", 100), ('hash', "Hash", 200)):
+            self.lista_recibos.heading(columna, text=titulo)
+            self.lista_recibos.column(columna, width=ancho, stretch=(columna == 'archivo'))
+        self.lista_recibos.grid(row=0, column=0, sticky=(tk.W, tk.E))
+        self.scroll_recibos = ttk.Scrollbar(marco, orient=tk.VERTICAL, command=self._desplazar_catalogo)
+        self.scroll_recibos.grid(row=0, column=1, sticky=(tk.N, tk.S))
+        
+        self.lista_recibos.bind('<<TreeviewSelect>>', self._seleccion_catalogo)
+        self.lista_recibos.bind('<Double-1>', lambda e: self.usar_recibo_catalogo())
+        self.lista_recibos.bind('<Return>', lambda e: self.usar_recibo_catalogo())
+        for evento in ('<MouseWheel>', '<Button-4>', '<Button-5>'):
+            self.lista_recibos.bind(evento, self._rueda_catalogo)
+        for tecla, paso in (('<Down>', 1), ('<Up>', -1), ('<Next>', FILAS_CATALOGO), ('<Prior>', -FILAS_CATALOGO)):
+            self.lista_recibos.bind(tecla, lambda e, paso=paso: self._mover_seleccion_catalogo(paso))
+        
+        ttk.Button(tab, text="✓ Usar para verificar",
+                  command=self.usar_recibo_catalogo,
+                  style='Primary.TButton').grid(row=3, column=0, columnspan=5, pady=5)
+        
+        tab.columnconfigure(1, weight=1)
+    
     def crear_tab_gestion_llaves(self, notebook):
         """Crea la pestaña de gestión de llaves criptográficas."""
         tab = ttk.Frame(notebook, padding="15")
@@ -1049,16 +1236,37 @@ Versión 2.0 - Soporte Multi-Curva
         info_text.config(state=tk.DISABLED)
     
     def verificar_servidor(self):
-        """Verifica la conexión con el servidor API."""
-        try:
-            response = requests.get(f"{self.api_url}/health", timeout=2)
-            if response.status_code == 200:
-                self.status_var.set("🟢 Conectado al servidor • Listo para operar")
-                self.status_indicator.config(fg=self.color_success)
-            else:
-                self.status_var.set("⚠️ Servidor respondió con error")
-                self.status_indicator.config(fg=self.color_warning)
-        except requests.exceptions.ConnectionError:
+        """Verifica en segundo plano la conexión con el servidor API."""
+        self.tareas.ejecutar(self.cliente.salud,
+                             al_terminar=self._servidor_conectado,
+                             al_fallar=self._servidor_no_disponible)
+    
+    def _servidor_conectado(self, _salud):
+        self.status_var.set("🟢 Conectado al servidor • Listo para operar")
+        self.status_indicator.config(fg=self.color_success)
+        # Enviar ya lo pendiente en lugar de esperar al fin del retroceso
+        self.bandeja.despertar()
+    
+    def _actualizar_bandeja(self):
+        """Muestra en la barra de estado cuántas notarizaciones esperan en la bandeja."""
+        pendientes = self.bandeja.pendientes()
+        if pendientes:
+            self.bandeja_var.set(f"📤 {pendientes} pendiente{'s' if pendientes != 1 else ''} de envío")
+            self.bandeja_label.pack(side=tk.RIGHT, padx=(10, 0))
+        else:
+            self.bandeja_label.pack_forget()
+    
+    def _recibo_de_bandeja(self, archivo, ruta_recibo):
+        self.catalogo.registrar(ruta_recibo)
+        self._programar_busqueda()
+        self.status_var.set(f"📬 Recibo recibido para {archivo} • {os.path.basename(ruta_recibo)}")
+        self.status_indicator.config(fg=self.color_success)
+    
+    def _servidor_no_disponible(self, error):
+        if isinstance(error, ErrorApi):
+            self.status_var.set("⚠️ Servidor respondió con error")
+            self.status_indicator.config(fg=self.color_warning)
+        elif isinstance(error, requests.exceptions.ConnectionError):
             self.status_var.set("🔴 No conectado • Inicia el servidor con: python server/api_server.py")
             self.status_indicator.config(fg=self.color_danger)
             messagebox.showwarning(
@@ -1067,10 +1275,137 @@ Versión 2.0 - Soporte Multi-Curva
                 "Asegúrate de iniciar el servidor ejecutando:\n"
                 "python server/api_server.py"
             )
-        except Exception as e:
-            self.status_var.set(f"❌ Error: {str(e)}")
+        else:
+            self.status_var.set(f"❌ Error: {str(error)}")
             self.status_indicator.config(fg=self.color_danger)
     
+    def _mostrar_error_solicitud(self, error, operacion):
+        """
+        Muestra el error de una solicitud fallida al servidor.
+        
+        Args:
+            error (Exception): Excepción recibida del hilo de trabajo
+            operacion (str): Operación para el mensaje de estado ("notarización", "verificación")
+        """
+        if isinstance(error, ErrorApi) and error.estado == 503:
+            reintentar_en = error.reintentar_en or '?'
+            messagebox.showwarning("Servidor saturado",
+                                 "El servidor está atendiendo demasiadas solicitudes.\n\n"
+                                 f"Intenta de nuevo en {reintentar_en} segundos.")
+            self.status_var.set(f"⚠️ Servidor saturado • Reintenta en {reintentar_en} s")
+            self.status_indicator.config(fg=self.color_warning)
+            return
+        
+        if isinstance(error, ErrorApi):
+            messagebox.showerror("Error", f"Error del servidor: {error.detalle}")
+            self.status_var.set(f"❌ Error en {operacion}")
+        elif isinstance(error, requests.exceptions.ConnectionError):
+            messagebox.showerror("Error de Conexión", 
+                               "No se puede conectar al servidor.\n"
+                               "Asegúrate de que el servidor esté ejecutándose.")
+            self.status_var.set("❌ Error de conexión")
+        else:
+            messagebox.showerror("Error", f"Error: {str(error)}")
+            self.status_var.set(f"❌ Error en {operacion}")
+        self.status_indicator.config(fg=self.color_danger)
+    
+    def cerrar(self):
+        """Libera los hilos de trabajo y las conexiones antes de cerrar la ventana."""
+        self.tareas.cerrar()
+        self.bandeja.detener()
+        self.cliente.cerrar()
+        self.cache_hashes.cerrar()
+        self.catalogo.cerrar()
+        self.root.destroy()
+    
+    def calcular_hash_en_segundo_plano(self, ruta, al_terminar, al_fallar,
+                                       modo_hash=None, bloque_hash=None):
+        """
+        Calcula el hash de un archivo en un hilo de trabajo mostrando el progreso.
+        
+        Solo hay un cálculo activo: iniciar otro cancela el anterior. Los errores
+        y la cancelación se notifican aquí; `al_fallar` solo debe restaurar el
+        estado de la pestaña que inició el cálculo.
+        
+        Args:
+            ruta (str): Archivo a hashear
+            al_terminar (callable): Recibe el hash hexadecimal, en el hilo de Tk
+            al_fallar (callable): Recibe la excepción, en el hilo de Tk
+            modo_hash (str, optional): Modo de hash (por defecto SHA-256 plano)
+            bloque_hash (int, optional): Tamaño de bloque del modo árbol
+        """
+        cancelar = self._iniciar_progreso()
+        inicio = time.monotonic()
+        ultimo_aviso = [0.0]
+        
+        def progreso(leidos, total):
+            # Limitar los avisos a la interfaz a ~10 por segundo
+            ahora = time.monotonic()
+            if ahora - ultimo_aviso[0] >= 0.1 or leidos == total:
+                ultimo_aviso[0] = ahora
+                self.tareas.publicar(self._mostrar_progreso_hash, cancelar, leidos, total, ahora - inicio)
+        
+        def terminado(hash_hex):
+            if self.hash_en_curso is not cancelar:
+                # Cálculo reemplazado por otro: solo restaurar la pestaña que lo inició
+                al_fallar(HashCancelado(ruta))
+                return
+            self._ocultar_progreso_hash()
+            al_terminar(hash_hex)
+        
+        def fallido(error):
+            if self.hash_en_curso is not cancelar:
+                al_fallar(error)
+                return
+            self._ocultar_progreso_hash()
+            if isinstance(error, HashCancelado):
+                self.status_var.set("⏹️ Cálculo de hash cancelado")
+                self.status_indicator.config(fg=self.color_warning)
+            else:
+                messagebox.showerror("Error", f"Error calculando hash: {str(error)}")
+                self.status_var.set("❌ Error calculando hash")
+                self.status_indicator.config(fg=self.color_danger)
+            al_fallar(error)
+        
+        tipo = "en árbol" if modo_hash == MODO_ARBOL else "SHA-256"
+        self.status_var.set(f"⏳ Calculando hash {tipo} de {os.path.basename(ruta)}...")
+        self.status_indicator.config(fg=self.color_warning)
+        # La caché de hashes resuelve al instante los archivos sin cambios
+        self.tareas.ejecutar(self.cache_hashes.hashear, ruta,
+                             progreso=progreso, cancelado=cancelar.is_set,
+                             forzar=self.forzar_rehash.get(),
+                             modo_hash=modo_hash, bloque_hash=bloque_hash,
+                             al_terminar=terminado, al_fallar=fallido)
+    
+    def _iniciar_progreso(self):
+        """Cancela la tarea con progreso en curso y muestra la barra para una nueva."""
+        if self.hash_en_curso is not None:
+            self.hash_en_curso.set()
+        cancelar = threading.Event()
+        self.hash_en_curso = cancelar
+        self.progreso_hash['value'] = 0
+        self.progreso_var.set("")
+        self.progreso_frame.pack(side=tk.RIGHT)
+        return cancelar
+    
+    def _mostrar_progreso_hash(self, cancelar, leidos, total, transcurrido):
+        if self.hash_en_curso is not cancelar:
+            return
+        self.progreso_hash['value'] = 100 * leidos / total if total else 100
+        velocidad = leidos / transcurrido if transcurrido > 0 else 0
+        restante = (total - leidos) / velocidad if velocidad else 0
+        self.progreso_var.set(f"{leidos / 1e6:,.0f}/{total / 1e6:,.0f} MB • "
+                              f"{velocidad / 1e6:,.1f} MB/s • ETA {restante:,.0f} s")
+    
+    def _ocultar_progreso_hash(self):
+        self.hash_en_curso = None
+        self.progreso_frame.pack_forget()
+    
+    def cancelar_hash(self):
+        """Cancela el cálculo de hash en curso."""
+        if self.hash_en_curso is not None:
+            self.hash_en_curso.set()
+    
     def seleccionar_archivo(self):
         """Permite al usuario seleccionar un archivo para notarizar."""
         filename = filedialog.askopenfilename(
@@ -1088,82 +1423,104 @@ Versión 2.0 - Soporte Multi-Curva
                 foreground=self.color_success,
                 font=self.font_subheader
             )
-            
-            self.status_var.set("⏳ Calculando hash SHA-256...")
-            self.status_indicator.config(fg=self.color_warning)
-            
-            # Calcular hash
-            try:
-                self.hash_actual = self.crypto.calcular_hash_archivo(filename)
-                
-                # Mostrar hash con formato
-                self.hash_text.config(state=tk.NORMAL)
-                self.hash_text.delete('1.0', tk.END)
-                self.hash_text.insert('1.0', self.hash_actual)
-                self.hash_text.config(state=tk.DISABLED)
-                
-                # Habilitar botón de notarizar
-                self.btn_notarizar.config(state=tk.NORMAL, 
-                                         background=self.color_success,
-                                         activebackground='#059669')
-                
-                self.status_var.set(f"✅ Hash calculado • Archivo listo para notarizar")
-                self.status_indicator.config(fg=self.color_success)
-                
-            except Exception as e:
-                messagebox.showerror("Error", f"Error calculando hash: {str(e)}")
-                self.status_var.set("❌ Error calculando hash")
-                self.status_indicator.config(fg=self.color_danger)
+            self.recalcular_hash_actual()
+    
+    def recalcular_hash_actual(self):
+        """Calcula el hash del archivo a notarizar con el modo seleccionado."""
+        if not self.archivo_actual:
+            return
+        
+        # El hash anterior ya no corresponde al archivo o al modo seleccionado
+        self.hash_actual = None
+        self.btn_notarizar.config(state=tk.DISABLED)
+        self.hash_text.config(state=tk.NORMAL)
+        self.hash_text.delete('1.0', tk.END)
+        self.hash_text.config(state=tk.DISABLED)
+        
+        if self.modo_arbol.get():
+            modo_hash, bloque_hash = MODO_ARBOL, BLOQUE_ARBOL
+        else:
+            modo_hash, bloque_hash = None, None
+        self.calcular_hash_en_segundo_plano(
+            self.archivo_actual,
+            al_terminar=lambda hash_hex: self._hash_calculado(hash_hex, modo_hash, bloque_hash),
+            al_fallar=lambda error: None,
+            modo_hash=modo_hash, bloque_hash=bloque_hash
+        )
+    
+    def _hash_calculado(self, hash_hex, modo_hash=None, bloque_hash=None):
+        """Muestra el hash del archivo a notarizar y habilita la notarización."""
+        self.hash_actual = hash_hex
+        self.modo_hash_actual = modo_hash
+        self.bloque_hash_actual = bloque_hash
+        
+        # Mostrar hash con formato
+        self.hash_text.config(state=tk.NORMAL)
+        self.hash_text.delete('1.0', tk.END)
+        self.hash_text.insert('1.0', self.hash_actual)
+        self.hash_text.config(state=tk.DISABLED)
+        
+        # Habilitar botón de notarizar
+        self.btn_notarizar.config(state=tk.NORMAL, 
+                                 background=self.color_success,
+                                 activebackground='#059669')
+        
+        self.status_var.set(f"✅ Hash calculado • Archivo listo para notarizar")
+        self.status_indicator.config(fg=self.color_success)
     
     def notarizar_documento(self):
-        """Envía el hash al servidor para notarizar."""
+        """Envía el hash al servidor para notarizar (en segundo plano)."""
         if not self.hash_actual:
             messagebox.showwarning("Advertencia", "Primero selecciona un archivo")
             return
         
+        self.status_var.set("⏳ Notarizando documento...")
+        self.status_indicator.config(fg=self.color_warning)
+        self.btn_notarizar.config(state=tk.DISABLED)
+        
+        # Fijar el archivo ahora: el usuario puede elegir otro mientras llega la respuesta
+        archivo = self.archivo_actual
+        # La misma clave de idempotencia sirve si la solicitud acaba en la bandeja de
+        # salida: si el servidor llegó a firmarla, el reenvío devuelve el mismo recibo
+        solicitud = {
+            "hash_hex": self.hash_actual,
+            "curva": self.curva_seleccionada,
+            "modo_hash": self.modo_hash_actual,
+            "bloque_hash": self.bloque_hash_actual,
+            "clave_idempotencia": str(uuid.uuid4())
+        }
+        self.tareas.ejecutar(self.cliente.notarizar, **solicitud,
+                             al_terminar=lambda data: self._notarizacion_completada(data, archivo),
+                             al_fallar=lambda error: self._notarizacion_fallida(error, solicitud, archivo))
+    
+    def _notarizacion_completada(self, data, archivo):
+        """Guarda y muestra el recibo devuelto por el servidor."""
+        self.btn_notarizar.config(state=tk.NORMAL)
+        nombre_archivo = os.path.basename(archivo)
+        curva = data.get('curva', 'SECP256R1')
         try:
-            self.status_var.set("⏳ Notarizando documento...")
-            self.status_indicator.config(fg=self.color_warning)
-            
-            # Enviar solicitud al servidor con la curva seleccionada
-            response = requests.post(
-                f"{self.api_url}/notarizar",
-                json={
-                    "hash": self.hash_actual,
-                    "curva": self.curva_seleccionada
-                },
-                timeout=10
-            )
-            
-            if response.status_code == 200:
-                data = response.json()
-                
-                # Guardar recibo
-                timestamp_str = data['timestamp'].replace(':', '-').replace('.', '-')
-                nombre_archivo = os.path.basename(self.archivo_actual)
-                curva = data.get('curva', 'SECP256R1')
-                nombre_recibo = f"recibo_{nombre_archivo}_{curva}_{timestamp_str}.json"
-                ruta_recibo = os.path.join(self.receipts_dir, nombre_recibo)
-                
-                recibo = {
-                    "timestamp": data['timestamp'],
-                    "hash": data['hash'],
-                    "firma": data['firma'],
-                    "curva": curva,
-                    "archivo_original": nombre_archivo
-                }
-                
-                guardar_recibo(recibo, ruta_recibo)
-                
-                info_curva = CURVAS_SOPORTADAS.get(curva, {})
-                nombre_curva = info_curva.get('nombre', curva)
-                
-                # Mostrar resultado con formato moderno
-                resultado = f"""
+            # Guardar recibo
+            ruta_recibo = guardar_recibo_respuesta(data, nombre_archivo, self.receipts_dir)
+        except Exception as e:
+            self._notarizacion_fallida(e)
+            return
+        nombre_recibo = os.path.basename(ruta_recibo)
+        self.catalogo.registrar(ruta_recibo)
+        self._programar_busqueda()
+        
+        info_curva = CURVAS_SOPORTADAS.get(curva, {})
+        nombre_curva = info_curva.get('nombre', curva)
+        if data.get('modo_hash') == MODO_ARBOL:
+            tipo_hash = f"Raíz Merkle (bloques de {data['bloque_hash'] // 1024} KiB)"
+        else:
+            tipo_hash = "Hash SHA-256"
+        
+        # Mostrar resultado con formato moderno
+        resultado = f"""
 ✅ DOCUMENTO NOTARIZADO EXITOSAMENTE
 
 📁 Archivo: {nombre_archivo}
-🔐 Hash SHA-256: {data['hash']}
+🔐 {tipo_hash}: {data['hash']}
 ⏰ Timestamp: {data['timestamp']}
 📊 Curva: {nombre_curva}
 ✍️ Firma Digital: {data['firma'][:64]}...
@@ -1174,34 +1531,120 @@ Versión 2.0 - Soporte Multi-Curva
 ⚠️ IMPORTANTE: Guarda este recibo en un lugar seguro.
 Es la prueba de que este documento existía en este momento.
 """
-                
-                self.resultado_notarizar.config(state=tk.NORMAL)
-                self.resultado_notarizar.delete('1.0', tk.END)
-                self.resultado_notarizar.insert('1.0', resultado)
-                self.resultado_notarizar.config(state=tk.DISABLED)
-                
-                self.status_var.set(f"✅ Documento notarizado con {nombre_curva}")
-                self.status_indicator.config(fg=self.color_success)
-                messagebox.showinfo("¡Éxito!", 
-                                  f"✅ Documento notarizado con {nombre_curva}\n\n"
-                                  f"📄 Recibo guardado:\n{nombre_recibo}")
-                
-            else:
-                error = response.json().get('detail', 'Error desconocido')
-                messagebox.showerror("Error", f"Error del servidor: {error}")
-                self.status_var.set("❌ Error en notarización")
-                self.status_indicator.config(fg=self.color_danger)
-                
-        except requests.exceptions.ConnectionError:
-            messagebox.showerror("Error de Conexión", 
-                               "No se puede conectar al servidor.\n"
-                               "Asegúrate de que el servidor esté ejecutándose.")
-            self.status_var.set("❌ Error de conexión")
-            self.status_indicator.config(fg=self.color_danger)
+        
+        self.resultado_notarizar.config(state=tk.NORMAL)
+        self.resultado_notarizar.delete('1.0', tk.END)
+        self.resultado_notarizar.insert('1.0', resultado)
+        self.resultado_notarizar.config(state=tk.DISABLED)
+        
+        self.status_var.set(f"✅ Documento notarizado con {nombre_curva}")
+        self.status_indicator.config(fg=self.color_success)
+        messagebox.showinfo("¡Éxito!", 
+                          f"✅ Documento notarizado con {nombre_curva}\n\n"
+                          f"📄 Recibo guardado:\n{nombre_recibo}")
+    
+    def _notarizacion_fallida(self, error, solicitud=None, archivo=None):
+        self.btn_notarizar.config(state=tk.NORMAL)
+        if solicitud is None or not es_error_transitorio(error):
+            self._mostrar_error_solicitud(error, "notarización")
+            return
+        
+        # Servidor caído o saturado: dejar el documento en la bandeja de salida
+        nombre_archivo = os.path.basename(archivo)
+        try:
+            self.bandeja.encolar(archivo_original=nombre_archivo, **solicitud)
         except Exception as e:
-            messagebox.showerror("Error", f"Error: {str(e)}")
-            self.status_var.set("❌ Error en notarización")
-            self.status_indicator.config(fg=self.color_danger)
+            self._mostrar_error_solicitud(e, "notarización")
+            return
+        self.status_var.set(f"📤 Servidor no disponible • {nombre_archivo} queda en la bandeja de salida")
+        self.status_indicator.config(fg=self.color_warning)
+        messagebox.showinfo("Notarización pendiente",
+                            f"📤 El servidor no está disponible.\n\n"
+                            f"{nombre_archivo} queda en la bandeja de salida y se notarizará "
+                            f"automáticamente en cuanto el servidor responda. El recibo se "
+                            f"guardará en receipts/.")
+    
+    def notarizar_carpeta(self):
+        """Notariza todos los archivos de una carpeta (hash en paralelo, envíos acotados)."""
+        directorio = filedialog.askdirectory(title="Seleccionar carpeta para notarizar")
+        if not directorio:
+            return
+        
+        cancelar = self._iniciar_progreso()
+        if self.modo_arbol.get():
+            modo_hash, bloque_hash = MODO_ARBOL, BLOQUE_ARBOL
+        else:
+            modo_hash, bloque_hash = None, None
+        lote = NotarizadorLote(self.cliente, self.receipts_dir, self.curva_seleccionada,
+                               modo_hash=modo_hash, bloque_hash=bloque_hash,
+                               cache_hashes=self.cache_hashes)
+        inicio = time.monotonic()
+        ultimo_aviso = [0.0]
+        
+        def progreso(hechos, total, bytes_hechos, bytes_totales):
+            ahora = time.monotonic()
+            if ahora - ultimo_aviso[0] >= 0.1 or hechos == total:
+                ultimo_aviso[0] = ahora
+                self.tareas.publicar(self._mostrar_progreso_lote, cancelar, hechos, total,
+                                     bytes_hechos, bytes_totales, ahora - inicio)
+        
+        self.btn_carpeta.config(state=tk.DISABLED)
+        self.status_var.set(f"⏳ Notarizando carpeta {os.path.basename(directorio)}...")
+        self.status_indicator.config(fg=self.color_warning)
+        self.tareas.ejecutar(lote.ejecutar, directorio, progreso=progreso, cancelado=cancelar.is_set,
+                             al_terminar=lambda resumen: self._lote_terminado(cancelar, resumen),
+                             al_fallar=lambda error: self._lote_fallido(cancelar, error))
+    
+    def _mostrar_progreso_lote(self, cancelar, hechos, total, bytes_hechos, bytes_totales, transcurrido):
+        if self.hash_en_curso is not cancelar:
+            return
+        self.status_var.set(f"⏳ Notarizando carpeta • {hechos}/{total} archivos")
+        self._mostrar_progreso_hash(cancelar, bytes_hechos, bytes_totales, transcurrido)
+    
+    def _lote_terminado(self, cancelar, resumen):
+        """Muestra el resumen de la notarización de una carpeta."""
+        if self.hash_en_curso is cancelar:
+            self._ocultar_progreso_hash()
+        self.btn_carpeta.config(state=tk.NORMAL)
+        self.sincronizar_catalogo()
+        
+        errores = "\n".join(f"• {e['archivo']}: {e['error']}" for e in resumen['errores'][:20])
+        if len(resumen['errores']) > 20:
+            errores += f"\n• ... y {len(resumen['errores']) - 20} más"
+        velocidad = resumen['bytes'] / resumen['segundos'] / 1e6 if resumen['segundos'] else 0
+        resultado = f"""
+🗂️ NOTARIZACIÓN DE CARPETA {'COMPLETADA' if not resumen['cancelados'] else 'INTERRUMPIDA'}
+
+📁 Carpeta: {resumen['directorio']}
+📊 Curva: {resumen['curva']}
+✅ Notarizados: {resumen['notarizados']} de {resumen['archivos']}
+❌ Errores: {len(resumen['errores'])}
+⏹️ Sin procesar (cancelados): {resumen['cancelados']}
+⏱️ Duración: {resumen['segundos']:.1f} s • {velocidad:.1f} MB/s
+
+📄 Recibos guardados en receipts/
+🧾 Resumen: cache/lotes/{os.path.basename(resumen['ruta_resumen'])}
+{errores}
+"""
+        self.resultado_notarizar.config(state=tk.NORMAL)
+        self.resultado_notarizar.delete('1.0', tk.END)
+        self.resultado_notarizar.insert('1.0', resultado)
+        self.resultado_notarizar.config(state=tk.DISABLED)
+        
+        if resumen['errores'] or resumen['cancelados']:
+            self.status_var.set(f"⚠️ Carpeta notarizada parcialmente • {resumen['notarizados']}/{resumen['archivos']}")
+            self.status_indicator.config(fg=self.color_warning)
+        else:
+            self.status_var.set(f"✅ Carpeta notarizada • {resumen['notarizados']} recibos")
+            self.status_indicator.config(fg=self.color_success)
+    
+    def _lote_fallido(self, cancelar, error):
+        if self.hash_en_curso is cancelar:
+            self._ocultar_progreso_hash()
+        self.btn_carpeta.config(state=tk.NORMAL)
+        messagebox.showerror("Error", f"Error notarizando la carpeta: {str(error)}")
+        self.status_var.set("❌ Error notarizando la carpeta")
+        self.status_indicator.config(fg=self.color_danger)
     
     def cargar_recibo_archivo(self):
         """Carga un recibo digital desde un archivo JSON."""
@@ -1211,19 +1654,25 @@ Es la prueba de que este documento existía en este momento.
         )
         
         if filename:
-            try:
-                self.recibo_actual = cargar_recibo(filename)
-                nombre_recibo = os.path.basename(filename)
-                self.recibo_label.config(text=f"✓ {nombre_recibo}",
-                                        foreground=self.color_success,
-                                        font=self.font_subheader)
-                self.status_var.set("✅ Recibo cargado correctamente")
-                self.status_indicator.config(fg=self.color_success)
-                self.actualizar_estado_verificar()
-            except Exception as e:
-                messagebox.showerror("Error", f"Error cargando recibo: {str(e)}")
-                self.status_var.set("❌ Error cargando recibo")
-                self.status_indicator.config(fg=self.color_danger)
+            self._cargar_recibo(filename)
+    
+    def _cargar_recibo(self, filename, mensaje="✅ Recibo cargado correctamente"):
+        """Carga un recibo para verificarlo; devuelve True si se pudo leer."""
+        try:
+            self.recibo_actual = cargar_recibo(filename)
+        except Exception as e:
+            messagebox.showerror("Error", f"Error cargando recibo: {str(e)}")
+            self.status_var.set("❌ Error cargando recibo")
+            self.status_indicator.config(fg=self.color_danger)
+            return False
+        nombre_recibo = os.path.basename(filename)
+        self.recibo_label.config(text=f"✓ {nombre_recibo}",
+                                foreground=self.color_success,
+                                font=self.font_subheader)
+        self.status_var.set(mensaje)
+        self.status_indicator.config(fg=self.color_success)
+        self.actualizar_estado_verificar()
+        return True
     
     def seleccionar_archivo_verificar(self):
         """Selecciona el archivo a verificar contra el recibo."""
@@ -1241,6 +1690,140 @@ Es la prueba de que este documento existía en este momento.
             self.status_var.set("✅ Archivo seleccionado para verificar")
             self.status_indicator.config(fg=self.color_success)
             self.actualizar_estado_verificar()
+            self.localizar_recibo(filename)
+    
+    def localizar_recibo(self, ruta):
+        """
+        Busca en el catálogo el recibo de un archivo por su hash y lo carga.
+        
+        Prueba primero el SHA-256 plano y después los modos en árbol con los
+        que se haya notarizado algún archivo del mismo nombre.
+        """
+        modos = [(None, None)] + self.catalogo.modos_arbol(os.path.basename(ruta))
+        
+        def probar(indice):
+            modo_hash, bloque_hash = modos[indice]
+            self.calcular_hash_en_segundo_plano(
+                ruta,
+                al_terminar=lambda hash_hex: comprobar(indice, hash_hex),
+                al_fallar=lambda error: None,
+                modo_hash=modo_hash, bloque_hash=bloque_hash
+            )
+        
+        def comprobar(indice, hash_hex):
+            if getattr(self, 'archivo_verificar', None) != ruta:
+                return  # El usuario eligió otro archivo mientras tanto
+            modo_hash = modos[indice][0]
+            for recibo in self.catalogo.por_hash(hash_hex):
+                if recibo['modo_hash'] == modo_hash and recibo['bloque_hash'] == modos[indice][1]:
+                    self._cargar_recibo(recibo['ruta'],
+                                        f"📚 Recibo encontrado en el catálogo • {recibo['timestamp']}")
+                    return
+            if indice + 1 < len(modos):
+                probar(indice + 1)
+            else:
+                self.status_var.set("ℹ️ No hay recibo de este archivo en el catálogo • Cárgalo manualmente")
+                self.status_indicator.config(fg=self.color_warning)
+        
+        probar(0)
+    
+    def sincronizar_catalogo(self):
+        """Pone al día el catálogo con receipts/ en segundo plano y refresca la lista."""
+        self.catalogo_total_var.set("⏳ Indexando recibos...")
+        self.tareas.ejecutar(self.catalogo.sincronizar,
+                             al_terminar=lambda _: self.buscar_recibos(),
+                             al_fallar=lambda e: self.catalogo_total_var.set(f"❌ Error indexando: {e}"))
+    
+    def _filtro_catalogo(self):
+        curva = self.filtro_curva_var.get()
+        return self.busqueda_var.get(), (None if curva == "Todas" else curva)
+    
+    def _programar_busqueda(self):
+        """Busca cuando el usuario deja de escribir."""
+        if self._busqueda_programada is not None:
+            self.root.after_cancel(self._busqueda_programada)
+        self._busqueda_programada = self.root.after(200, self.buscar_recibos)
+    
+    def buscar_recibos(self):
+        """Consulta el catálogo con el filtro actual en segundo plano."""
+        self._busqueda_programada = None
+        filtro = self._filtro_catalogo()
+        self.tareas.ejecutar(self.catalogo.buscar_ids, *filtro,
+                             al_terminar=lambda ids: self._mostrar_busqueda(filtro, ids),
+                             al_fallar=lambda e: self.catalogo_total_var.set(f"❌ Error en la búsqueda: {e}"))
+    
+    def _mostrar_busqueda(self, filtro, ids):
+        if filtro != self._filtro_catalogo():
+            return  # Resultado de una búsqueda ya reemplazada
+        self.catalogo_ids = ids
+        self.catalogo_inicio = 0
+        self.catalogo_total_var.set(f"{len(ids):,} de {self.catalogo.total():,} recibos")
+        self._pintar_catalogo()
+    
+    def _pintar_catalogo(self):
+        """Rellena el Treeview con las filas visibles desde catalogo_inicio."""
+        total = len(self.catalogo_ids)
+        self.catalogo_inicio = max(0, min(self.catalogo_inicio, total - FILAS_CATALOGO))
+        visibles = self.catalogo_ids[self.catalogo_inicio:self.catalogo_inicio + FILAS_CATALOGO]
+        self.lista_recibos.delete(*self.lista_recibos.get_children())
+        for fila in self.catalogo.filas(visibles):
+            self.lista_recibos.insert('', tk.END, iid=str(fila['id']), values=(
+                fila['archivo'], fila['timestamp'], fila['curva'], fila['hash'][:24] + "..."
+            ))
+        if str(self.catalogo_seleccion) in self.lista_recibos.get_children():
+            self.lista_recibos.selection_set(str(self.catalogo_seleccion))
+            self.lista_recibos.focus(str(self.catalogo_seleccion))
+        if total:
+            self.scroll_recibos.set(self.catalogo_inicio / total,
+                                    min(1.0, (self.catalogo_inicio + FILAS_CATALOGO) / total))
+        else:
+            self.scroll_recibos.set(0.0, 1.0)
+    
+    def _desplazar_catalogo(self, accion, cantidad, unidad=None):
+        """Comando de la barra de desplazamiento ('moveto' o 'scroll')."""
+        if accion == 'moveto':
+            self.catalogo_inicio = int(float(cantidad) * len(self.catalogo_ids))
+        elif accion == 'scroll':
+            paso = FILAS_CATALOGO if unidad == 'pages' else 1
+            self.catalogo_inicio += int(cantidad) * paso
+        self._pintar_catalogo()
+    
+    def _rueda_catalogo(self, event):
+        hacia_arriba = event.num == 4 or getattr(event, 'delta', 0) > 0
+        self._desplazar_catalogo('scroll', -3 if hacia_arriba else 3, 'units')
+        return 'break'
+    
+    def _seleccion_catalogo(self, event=None):
+        seleccion = self.lista_recibos.selection()
+        if seleccion:
+            self.catalogo_seleccion = int(seleccion[0])
+    
+    def _mover_seleccion_catalogo(self, paso):
+        """Mueve la selección con el teclado desplazando la ventana visible si hace falta."""
+        if not self.catalogo_ids:
+            return 'break'
+        try:
+            actual = self.catalogo_ids.index(self.catalogo_seleccion)
+        except ValueError:
+            actual = self.catalogo_inicio - (1 if paso > 0 else 0)
+        nuevo = max(0, min(len(self.catalogo_ids) - 1, actual + paso))
+        if nuevo < self.catalogo_inicio:
+            self.catalogo_inicio = nuevo
+        elif nuevo >= self.catalogo_inicio + FILAS_CATALOGO:
+            self.catalogo_inicio = nuevo - FILAS_CATALOGO + 1
+        self.catalogo_seleccion = self.catalogo_ids[nuevo]
+        self._pintar_catalogo()
+        return 'break'
+    
+    def usar_recibo_catalogo(self):
+        """Carga el recibo seleccionado en la pestaña de verificación."""
+        filas = self.catalogo.filas([self.catalogo_seleccion]) if self.catalogo_seleccion else []
+        if not filas:
+            messagebox.showwarning("Advertencia", "Selecciona un recibo de la lista")
+            return
+        if self._cargar_recibo(os.path.join(self.receipts_dir, filas[0]['nombre']),
+                               f"📚 Recibo del catálogo cargado • {filas[0]['archivo']}"):
+            self.notebook.select(self.tab_verificar)
     
     def actualizar_estado_verificar(self):
         """Actualiza el estado del botón de verificar."""
@@ -1256,16 +1839,33 @@ Es la prueba de que este documento existía en este momento.
             messagebox.showwarning("Advertencia", "Carga un recibo y selecciona un archivo")
             return
         
+        # Fijar recibo y archivo: pueden cambiar mientras se calcula el hash
+        recibo = dict(self.recibo_actual)
+        archivo = self.archivo_verificar
+        # El archivo se rehashea con el mismo modo con el que se notarizó
+        modo_hash = recibo.get('modo_hash')
+        bloque_hash = recibo.get('bloque_hash')
         try:
-            self.status_var.set("⏳ Verificando recibo...")
-            self.status_indicator.config(fg=self.color_warning)
-            
-            # Calcular hash del archivo
-            hash_archivo = self.crypto.calcular_hash_archivo(self.archivo_verificar)
-            
-            # Verificar que el hash coincida
-            if hash_archivo.lower() != self.recibo_actual['hash'].lower():
-                resultado = f"""
+            validar_modo_hash(modo_hash, bloque_hash)
+        except ValueError as e:
+            messagebox.showerror("Error", f"Recibo no válido: {e}")
+            return
+        self.btn_verificar.config(state=tk.DISABLED)
+        self.calcular_hash_en_segundo_plano(
+            archivo,
+            al_terminar=lambda hash_archivo: self._comparar_hash_recibo(recibo, archivo, hash_archivo),
+            al_fallar=lambda error: self.btn_verificar.config(state=tk.NORMAL),
+            modo_hash=modo_hash, bloque_hash=bloque_hash
+        )
+    
+    def _comparar_hash_recibo(self, recibo, archivo, hash_archivo):
+        """Compara el hash del archivo con el del recibo y, si coincide, verifica la firma."""
+        self.status_var.set("⏳ Verificando recibo...")
+        self.status_indicator.config(fg=self.color_warning)
+        
+        # Verificar que el hash coincida
+        if hash_archivo.lower() != recibo['hash'].lower():
+            resultado = f"""
 ❌ VERIFICACIÓN FALLIDA
 
 El archivo NO corresponde al recibo.
@@ -1274,56 +1874,60 @@ El archivo NO corresponde al recibo.
 {hash_archivo}
 
 📄 Hash en el recibo: 
-{self.recibo_actual['hash']}
+{recibo['hash']}
 
 ⚠️ POSIBLES CAUSAS:
 • El archivo ha sido modificado
 • El recibo no corresponde a este archivo
 • El archivo está corrupto
 """
-                self.resultado_verificar.config(state=tk.NORMAL)
-                self.resultado_verificar.delete('1.0', tk.END)
-                self.resultado_verificar.insert('1.0', resultado)
-                self.resultado_verificar.config(state=tk.DISABLED)
-                
-                self.status_var.set("❌ Verificación fallida • Hash no coincide")
-                self.status_indicator.config(fg=self.color_danger)
-                messagebox.showwarning("Verificación Fallida", 
-                                     "❌ El archivo NO corresponde al recibo.\n\n"
-                                     "El hash no coincide.")
-                return
-            
-            # Obtener curva del recibo (por defecto SECP256R1 para compatibilidad)
-            curva = self.recibo_actual.get('curva', 'SECP256R1')
-            info_curva = CURVAS_SOPORTADAS.get(curva, {})
-            nombre_curva = info_curva.get('nombre', curva)
+            self.resultado_verificar.config(state=tk.NORMAL)
+            self.resultado_verificar.delete('1.0', tk.END)
+            self.resultado_verificar.insert('1.0', resultado)
+            self.resultado_verificar.config(state=tk.DISABLED)
             
-            # Enviar a servidor para verificar firma
-            response = requests.post(
-                f"{self.api_url}/verificar",
-                json={
-                    "timestamp": self.recibo_actual['timestamp'],
-                    "hash": self.recibo_actual['hash'],
-                    "firma": self.recibo_actual['firma'],
-                    "curva": curva
-                },
-                timeout=10
-            )
-            
-            if response.status_code == 200:
-                data = response.json()
-                
-                if data['valido']:
-                    resultado = f"""
+            self.status_var.set("❌ Verificación fallida • Hash no coincide")
+            self.status_indicator.config(fg=self.color_danger)
+            self.btn_verificar.config(state=tk.NORMAL)
+            messagebox.showwarning("Verificación Fallida", 
+                                 "❌ El archivo NO corresponde al recibo.\n\n"
+                                 "El hash no coincide.")
+            return
+        
+        # La firma se comprueba en segundo plano: puede requerir descargar la clave
+        # pública o consultar al servidor
+        self.tareas.ejecutar(self._verificar_firma, recibo,
+                             al_terminar=lambda r: self._mostrar_verificacion(recibo, archivo, *r),
+                             al_fallar=self._verificacion_fallida)
+    
+    def _verificar_firma(self, recibo):
+        """
+        Verifica la firma de un recibo (se ejecuta en un hilo de trabajo).
+        
+        Returns:
+            tuple: (valido, verificado_por)
+        """
+        return verificar_firma_recibo(recibo, self.claves_notario, self.cliente)
+    
+    def _mostrar_verificacion(self, recibo, archivo, valido, verificado_por):
+        """Muestra el resultado de la verificación de la firma."""
+        self.btn_verificar.config(state=tk.NORMAL)
+        curva = recibo.get('curva', 'SECP256R1')
+        info_curva = CURVAS_SOPORTADAS.get(curva, {})
+        nombre_curva = info_curva.get('nombre', curva)
+        
+        if valido:
+            resultado = f"""
 ✅ RECIBO AUTÉNTICO Y VÁLIDO
 
 El recibo es legítimo y el archivo no ha sido alterado.
 
-📁 Archivo: {os.path.basename(self.archivo_verificar)}
-🔐 Hash SHA-256: {self.recibo_actual['hash']}
-⏰ Timestamp: {self.recibo_actual['timestamp']}
+📁 Archivo: {os.path.basename(archivo)}
+🔐 Hash SHA-256: {recibo['hash']}
+⏰ Timestamp: {recibo['timestamp']}
 📊 Curva: {nombre_curva}
 ✍️ Firma Digital: ✓ Verificada
+🔎 Verificación: {verificado_por}
 
 🔐 CONFIRMACIÓN:
 • El archivo existía en la fecha indicada
@@ -1333,22 +1937,23 @@ El recibo es legítimo y el archivo no ha sido alterado.
 
 ✓ Este documento tiene validez probatoria.
 """
-                    self.status_var.set(f"✅ Recibo VÁLIDO ({nombre_curva}) • Documento auténtico")
-                    self.status_indicator.config(fg=self.color_success)
-                    messagebox.showinfo("Verificación Exitosa", 
-                                      f"✅ RECIBO AUTÉNTICO\n\n"
-                                      f"El documento es válido y no ha sido alterado.\n\n"
-                                      f"Curva: {nombre_curva}")
-                else:
-                    resultado = f"""
+            self.status_var.set(f"✅ Recibo VÁLIDO ({nombre_curva}) • Documento auténtico")
+            self.status_indicator.config(fg=self.color_success)
+            messagebox.showinfo("Verificación Exitosa", 
+                              f"✅ RECIBO AUTÉNTICO\n\n"
+                              f"El documento es válido y no ha sido alterado.\n\n"
+                              f"Curva: {nombre_curva}")
+        else:
+            resultado = f"""
 ❌ RECIBO INVÁLIDO
 
 La firma digital NO es válida.
 
-🔐 Hash: {self.recibo_actual['hash']}
-⏰ Timestamp: {self.recibo_actual['timestamp']}
+🔐 Hash: {recibo['hash']}
+⏰ Timestamp: {recibo['timestamp']}
 📊 Curva: {nombre_curva}
 ✍️ Firma: ❌ NO verificada
+🔎 Verificación: {verificado_por}
 
 ⚠️ ADVERTENCIA:
 • El recibo ha sido alterado
@@ -1357,40 +1962,35 @@ La firma digital NO es válida.
 
 NO confíes en este recibo.
 """
-                    self.status_var.set("❌ Recibo INVÁLIDO • Firma no verificada")
-                    self.status_indicator.config(fg=self.color_danger)
-                    messagebox.showerror("Verificación Fallida", 
-                                       f"❌ RECIBO INVÁLIDO\n\n"
-                                       f"La firma digital no es válida.\n"
-                                       f"Curva: {nombre_curva}")
-                
-                self.resultado_verificar.config(state=tk.NORMAL)
-                self.resultado_verificar.delete('1.0', tk.END)
-                self.resultado_verificar.insert('1.0', resultado)
-                self.resultado_verificar.config(state=tk.DISABLED)
-                
-            else:
-                error = response.json().get('detail', 'Error desconocido')
-                messagebox.showerror("Error", f"Error del servidor: {error}")
-                self.status_var.set("❌ Error en verificación")
-                self.status_indicator.config(fg=self.color_danger)
-                
-        except requests.exceptions.ConnectionError:
-            messagebox.showerror("Error de Conexión", 
-                               "No se puede conectar al servidor.\n"
-                               "Asegúrate de que el servidor esté ejecutándose.")
-            self.status_var.set("❌ Error de conexión")
+            self.status_var.set("❌ Recibo INVÁLIDO • Firma no verificada")
             self.status_indicator.config(fg=self.color_danger)
-        except Exception as e:
-            messagebox.showerror("Error", f"Error: {str(e)}")
-            self.status_var.set("❌ Error en verificación")
+            messagebox.showerror("Verificación Fallida", 
+                               f"❌ RECIBO INVÁLIDO\n\n"
+                               f"La firma digital no es válida.\n"
+                               f"Curva: {nombre_curva}")
+        
+        self.resultado_verificar.config(state=tk.NORMAL)
+        self.resultado_verificar.delete('1.0', tk.END)
+        self.resultado_verificar.insert('1.0', resultado)
+        self.resultado_verificar.config(state=tk.DISABLED)
+    
+    def _verificacion_fallida(self, error):
+        self.btn_verificar.config(state=tk.NORMAL)
+        if isinstance(error, HuellaNoCoincideError):
+            messagebox.showerror("Clave del notario no confiable",
+                               f"❌ {error}\n\n"
+                               "No se verificará con una clave distinta de la fijada.")
+            self.status_var.set("❌ Clave del notario no coincide con la huella fijada")
             self.status_indicator.config(fg=self.color_danger)
+            return
+        self._mostrar_error_solicitud(error, "verificación")
 
 
 def main():
     """Función principal para iniciar la aplicación."""
     root = tk.Tk()
     app = NotarioDigitalApp(root)
+    root.protocol("WM_DELETE_WINDOW", app.cerrar)
     root.mainloop()
 
 
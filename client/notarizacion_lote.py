@@ -0,0 +1,262 @@
+"""
+Notarización por lotes de carpetas completas.
+
+Recorre un árbol de directorios, calcula los hashes en paralelo y los envía
+al servidor con concurrencia acotada. Cada archivo lleva su propia clave de
+idempotencia, de modo que los reintentos tras un 503 o un corte de conexión
+reciben el recibo original en lugar de uno nuevo, mientras el servidor
+recuerde la clave (en memoria, hasta que se reinicia o pasa su TTL).
+"""
+
+import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import requests
+
+from shared.crypto_utils import HashCancelado, guardar_recibo, nombre_archivo_recibo
+from shared.motor_hash import hashear_segun_modo
+from client.cliente_api import ErrorApi
+
+
+# Los resúmenes de lote se guardan fuera de receipts/, que solo contiene recibos
+DIRECTORIO_RESUMENES = os.path.join(os.path.dirname(__file__), '..', 'cache', 'lotes')
+
+
+def guardar_recibo_respuesta(data, archivo_original, directorio):
+    """
+    Guarda en disco el recibo devuelto por /notarizar.
+
+    Args:
+        data (dict): Respuesta del servidor
+        archivo_original (str): Nombre o ruta relativa del archivo notarizado
+        directorio (str): Directorio de recibos
+
+    Returns:
+        str: Ruta del recibo guardado
+    """
+    recibo = {
+        "timestamp": data['timestamp'],
+        "hash": data['hash'],
+        "firma": data['firma'],
+        "curva": data.get('curva', 'SECP256R1'),
+        "archivo_original": archivo_original
+    }
+    # Conservar la posición en la cadena y en el registro de transparencia
+    for campo in ('secuencia', 'anterior', 'indice_log', 'modo_hash', 'bloque_hash', 'version',
+                  'codificacion_firma'):
+        if data.get(campo) is not None:
+            recibo[campo] = data[campo]
+
+    ruta_recibo = os.path.join(directorio, nombre_archivo_recibo(recibo))
+    guardar_recibo(recibo, ruta_recibo)
+    return ruta_recibo
+
+
+def listar_archivos(directorio):
+    """
+    Recorre un árbol de directorios en orden, omitiendo archivos y carpetas ocultos.
+
+    Yields:
+        str: Ruta de cada archivo regular
+    """
+    for raiz, carpetas, archivos in os.walk(directorio):
+        carpetas[:] = sorted(c for c in carpetas if not c.startswith('.'))
+        for nombre in sorted(archivos):
+            ruta = os.path.join(raiz, nombre)
+            if not nombre.startswith('.') and os.path.isfile(ruta):
+                yield ruta
+
+
+def _segundos_reintento(valor, por_defecto=1.0):
+    """Interpreta la cabecera Retry-After (en segundos)."""
+    try:
+        return max(float(valor), 0.0)
+    except (TypeError, ValueError):
+        return por_defecto
+
+
+class NotarizadorLote:
+    """
+    Notariza todos los archivos de una carpeta.
+
+    Los hashes se calculan en un pool de hilos (hashlib libera el GIL) y los
+    envíos en otro pool más pequeño. Una ventana acotada de archivos en vuelo
+    limita la memoria independientemente del tamaño de la carpeta.
+    """
+
+    def __init__(self, cliente, directorio_recibos, curva="SECP256R1",
+                 hilos_hash=None, envios_concurrentes=4, reintentos=5,
+                 modo_hash=None, bloque_hash=None, cache_hashes=None, directorio_resumenes=None):
+        """
+        Args:
+            cliente (ClienteNotario): Cliente del API
+            directorio_recibos (str): Dónde guardar los recibos
+            curva (str): Curva con la que notarizar
+            hilos_hash (int, optional): Hilos de hashing (por defecto, núcleos disponibles)
+            envios_concurrentes (int): Solicitudes simultáneas al servidor
+            reintentos (int): Reintentos por archivo ante 503 o errores de conexión
+            modo_hash (str, optional): Modo de hash (por defecto SHA-256 plano)
+            bloque_hash (int, optional): Tamaño de bloque del modo árbol
+            cache_hashes (CacheHashes, optional): Caché de hashes de archivos
+            directorio_resumenes (str, optional): Dónde guardar el resumen de cada
+                                                  ejecución (por defecto, cache/lotes/)
+        """
+        self.cliente = cliente
+        self.directorio_recibos = directorio_recibos
+        self.curva = curva
+        self.hilos_hash = hilos_hash or min(8, os.cpu_count() or 1)
+        self.envios_concurrentes = envios_concurrentes
+        self.reintentos = reintentos
+        self.modo_hash = modo_hash
+        self.bloque_hash = bloque_hash
+        self.cache_hashes = cache_hashes
+        self.directorio_resumenes = directorio_resumenes or DIRECTORIO_RESUMENES
+        os.makedirs(directorio_recibos, exist_ok=True)
+
+    def _hashear(self, ruta, cancelado):
+        """Hash de un archivo con el modo del lote, desde la caché si la hay."""
+        if self.cache_hashes is not None:
+            return self.cache_hashes.hashear(ruta, cancelado=cancelado,
+                                             modo_hash=self.modo_hash, bloque_hash=self.bloque_hash)
+        return hashear_segun_modo(ruta, self.modo_hash, self.bloque_hash, cancelado=cancelado)
+
+    def _notarizar(self, hash_hex):
+        """Envía un hash reintentando con la misma clave de idempotencia."""
+        clave = str(uuid.uuid4())
+        for intento in range(self.reintentos + 1):
+            try:
+                return self.cliente.notarizar(hash_hex, self.curva, clave_idempotencia=clave,
+                                              modo_hash=self.modo_hash, bloque_hash=self.bloque_hash)
+            except ErrorApi as e:
+                if e.estado != 503 or intento == self.reintentos:
+                    raise
+                espera = _segundos_reintento(e.reintentar_en)
+            except requests.exceptions.ConnectionError:
+                if intento == self.reintentos:
+                    raise
+                espera = min(2 ** intento, 30)
+            time.sleep(espera)
+
+    def ejecutar(self, directorio, progreso=None, cancelado=None):
+        """
+        Notariza los archivos de una carpeta y escribe un resumen de la ejecución.
+
+        Args:
+            directorio (str): Carpeta a recorrer
+            progreso (callable, optional): Se llama con (hechos, total, bytes_hechos, bytes_totales)
+            cancelado (callable, optional): Devuelve True para dejar de enviar archivos
+
+        Returns:
+            dict: Resumen con los recibos emitidos, los errores y la ruta del resumen
+        """
+        archivos = [(ruta, os.path.relpath(ruta, directorio)) for ruta in listar_archivos(directorio)]
+        resumen = {"directorio": os.path.abspath(directorio),
+                   **self.notarizar_archivos(archivos, progreso=progreso, cancelado=cancelado)}
+
+        nombre = f"resumen_lote_{resumen['fin'].replace(':', '-').replace('.', '-')}.json"
+        os.makedirs(self.directorio_resumenes, exist_ok=True)
+        resumen["ruta_resumen"] = os.path.join(self.directorio_resumenes, nombre)
+        with open(resumen["ruta_resumen"], 'w', encoding='utf-8') as f:
+            json.dump(resumen, f, indent=2, ensure_ascii=False)
+        return resumen
+
+    def notarizar_archivos(self, archivos, progreso=None, cancelado=None, resultado=None):
+        """
+        Notariza una lista de archivos.
+
+        Args:
+            archivos (list): Pares (ruta, nombre con el que guardar el recibo)
+            progreso (callable, optional): Se llama con (hechos, total, bytes_hechos, bytes_totales)
+            cancelado (callable, optional): Devuelve True para dejar de enviar archivos
+            resultado (callable, optional): Se llama por archivo con (nombre, entrada, error);
+                                            entrada es None si el archivo falló
+
+        Returns:
+            dict: Resumen con los recibos emitidos y los errores
+        """
+        cancelado = cancelado or (lambda: False)
+        total = len(archivos)
+        bytes_totales = 0
+        for ruta, _ in archivos:
+            try:
+                bytes_totales += os.path.getsize(ruta)
+            except OSError:
+                pass  # Se notifica como error al hashearlo
+
+        resumen = {
+            "curva": self.curva,
+            "inicio": datetime.utcnow().isoformat() + "Z",
+            "archivos": total,
+            "bytes": bytes_totales,
+            "notarizados": 0,
+            "recibos": [],
+            "errores": []
+        }
+        lock = threading.Lock()
+        hechos = [0, 0]  # archivos, bytes
+        ventana = threading.BoundedSemaphore(2 * (self.hilos_hash + self.envios_concurrentes))
+        inicio = time.monotonic()
+
+        def terminar(relativa, tamano, entrada=None, error=None):
+            with lock:
+                hechos[0] += 1
+                hechos[1] += tamano
+                if entrada is not None:
+                    resumen["notarizados"] += 1
+                    resumen["recibos"].append(entrada)
+                elif not isinstance(error, HashCancelado):
+                    resumen["errores"].append({"archivo": relativa, "error": str(error)})
+                avance = (hechos[0], total, hechos[1], bytes_totales)
+            ventana.release()
+            if resultado is not None:
+                resultado(relativa, entrada, error)
+            if progreso is not None:
+                progreso(*avance)
+
+        def enviar(relativa, tamano, hash_hex):
+            try:
+                if cancelado():
+                    raise HashCancelado(relativa)
+                data = self._notarizar(hash_hex)
+                ruta_recibo = guardar_recibo_respuesta(data, relativa, self.directorio_recibos)
+                terminar(relativa, tamano, entrada={
+                    "archivo": relativa,
+                    "hash": hash_hex,
+                    "recibo": os.path.basename(ruta_recibo)
+                })
+            except Exception as e:
+                terminar(relativa, tamano, error=e)
+
+        def hashear(ruta, relativa):
+            tamano = 0
+            try:
+                tamano = os.path.getsize(ruta)
+                hash_hex = self._hashear(ruta, cancelado)
+            except Exception as e:
+                terminar(relativa, tamano, error=e)
+                return
+            envios.submit(enviar, relativa, tamano, hash_hex)
+
+        hasheadores = ThreadPoolExecutor(max_workers=self.hilos_hash, thread_name_prefix='lote-hash')
+        envios = ThreadPoolExecutor(max_workers=self.envios_concurrentes, thread_name_prefix='lote-envio')
+        try:
+            for ruta, relativa in archivos:
+                if cancelado():
+                    break
+                ventana.acquire()
+                hasheadores.submit(hashear, ruta, relativa)
+        finally:
+            # Los hasheadores encolan envíos: cerrarlos primero
+            hasheadores.shutdown(wait=True)
+            envios.shutdown(wait=True)
+
+        resumen["recibos"].sort(key=lambda r: r["archivo"])
+        resumen["cancelados"] = total - resumen["notarizados"] - len(resumen["errores"])
+        resumen["fin"] = datetime.utcnow().isoformat() + "Z"
+        resumen["segundos"] = round(time.monotonic() - inicio, 3)
+        return resumen
@@ -0,0 +1,80 @@
+"""
+Tareas en segundo plano para la interfaz tkinter.
+
+Las operaciones lentas (red, disco) se ejecutan en un pool de hilos. tkinter
+no es seguro entre hilos, así que los hilos de trabajo solo encolan sus
+callbacks y el hilo de Tk vacía la cola periódicamente con `after()`.
+"""
+
+import queue
+from concurrent.futures import ThreadPoolExecutor
+
+
+class TareasSegundoPlano:
+    """Pool de hilos cuyos resultados se entregan en el hilo de Tk."""
+
+    def __init__(self, root, hilos=4, intervalo_ms=30):
+        """
+        Args:
+            root (tk.Tk): Ventana principal
+            hilos (int): Hilos de trabajo
+            intervalo_ms (int): Cada cuánto revisa Tk la cola de callbacks
+        """
+        self.root = root
+        self.intervalo_ms = intervalo_ms
+        self._ejecutor = ThreadPoolExecutor(max_workers=hilos, thread_name_prefix='notario-gui')
+        self._cola = queue.SimpleQueue()
+        self._activo = True
+        self.root.after(self.intervalo_ms, self._procesar)
+
+    def ejecutar(self, funcion, *args, al_terminar=None, al_fallar=None, **kwargs):
+        """
+        Ejecuta una función en un hilo de trabajo.
+
+        Args:
+            funcion (callable): Función a ejecutar fuera del hilo de Tk
+            al_terminar (callable, optional): Recibe el resultado, en el hilo de Tk
+            al_fallar (callable, optional): Recibe la excepción, en el hilo de Tk
+
+        Returns:
+            concurrent.futures.Future: Futuro de la tarea
+        """
+        futuro = self._ejecutor.submit(funcion, *args, **kwargs)
+
+        def entregar(f):
+            if f.cancelled():
+                return
+            error = f.exception()
+            if error is None:
+                if al_terminar is not None:
+                    self.publicar(al_terminar, f.result())
+            elif al_fallar is not None:
+                self.publicar(al_fallar, error)
+            else:
+                print(f"❌ Error en tarea de fondo: {error}")
+
+        futuro.add_done_callback(entregar)
+        return futuro
+
+    def publicar(self, callback, *args):
+        """Encola un callback para el hilo de Tk (se puede llamar desde cualquier hilo)."""
+        self._cola.put((callback, args))
+
+    def _procesar(self):
+        """Ejecuta en el hilo de Tk los callbacks pendientes."""
+        while True:
+            try:
+                callback, args = self._cola.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                callback(*args)
+            except Exception as e:
+                print(f"❌ Error en callback de la interfaz: {e}")
+        if self._activo:
+            self.root.after(self.intervalo_ms, self._procesar)
+
+    def cerrar(self):
+        """Deja de entregar callbacks y libera los hilos."""
+        self._activo = False
+        self._ejecutor.shutdown(wait=False)
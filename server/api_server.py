@@ -3,10 +3,14 @@ Servidor API del Notario Digital.
 Proporciona endpoints para notarizar y verificar documentos digitales.
 """
 
-from fastapi import FastAPI, HTTPException, status
+from fastapi import FastAPI, HTTPException, Header, Response, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, Field
 from typing import Optional
+import asyncio
+import hmac
+import json
 import os
 import sys
 from datetime import datetime
@@ -15,6 +19,15 @@ import uvicorn
 # Agregar el directorio shared al path
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 from shared.crypto_utils import NotarioCrypto, CURVAS_SOPORTADAS
+from shared.motor_hash import validar_modo_hash, MODO_PLANO
+from shared.almacen_recibos import AlmacenRecibos
+from shared.cadena_recibos import CadenaRecibos
+from shared.transparencia import RegistroTransparencia, hoja_recibo, firmar_cabeza
+from server.metricas import Metricas
+from server.control_admision import ControlAdmision, ColaLlenaError
+from server.deduplicacion import Deduplicador, ConflictoIdempotenciaError
+from server.filtro_notarizados import FiltroNotarizados
+from server.replicacion import ReplicadorRecibos
 
 
 # Modelos de datos
@@ -22,6 +35,8 @@ class NotarizarRequest(BaseModel):
     """Request para notarizar un hash."""
     hash: str = Field(..., description="Hash SHA-256 del archivo en formato hexadecimal")
     curva: Optional[str] = Field("SECP256R1", description="Curva elíptica a utilizar")
+    modo_hash: Optional[str] = Field(None, description="Modo de hash: 'sha256' (por defecto) o 'arbol-sha256'")
+    bloque_hash: Optional[int] = Field(None, description="Tamaño de bloque en bytes del modo 'arbol-sha256'")
     
     class Config:
         json_schema_extra = {
@@ -38,6 +53,13 @@ class NotarizarResponse(BaseModel):
     hash: str = Field(..., description="Hash del archivo notarizado")
     firma: str = Field(..., description="Firma digital en base64")
     curva: str = Field(..., description="Curva elíptica utilizada")
+    secuencia: Optional[int] = Field(None, description="Número de secuencia (modo encadenado)")
+    anterior: Optional[str] = Field(None, description="Digest del recibo anterior (modo encadenado)")
+    indice_log: Optional[int] = Field(None, description="Índice del recibo en el registro de transparencia")
+    modo_hash: Optional[str] = Field(None, description="Modo de hash (solo si no es SHA-256 plano)")
+    bloque_hash: Optional[int] = Field(None, description="Tamaño de bloque del modo de hash")
+    version: Optional[int] = Field(None, description="Versión del mensaje firmado (solo si no es la 1)")
+    codificacion_firma: Optional[str] = Field(None, description="Codificación de la firma (solo si no es DER)")
     mensaje: str = Field(..., description="Mensaje de confirmación")
 
 
@@ -47,6 +69,13 @@ class VerificarRequest(BaseModel):
     hash: str = Field(..., description="Hash del archivo")
     firma: str = Field(..., description="Firma digital en base64")
     curva: Optional[str] = Field("SECP256R1", description="Curva elíptica utilizada")
+    secuencia: Optional[int] = Field(None, description="Número de secuencia (modo encadenado)")
+    anterior: Optional[str] = Field(None, description="Digest del recibo anterior (modo encadenado)")
+    modo_hash: Optional[str] = Field(None, description="Modo de hash (solo si no es SHA-256 plano)")
+    bloque_hash: Optional[int] = Field(None, description="Tamaño de bloque del modo de hash")
+    version: Optional[int] = Field(None, description="Versión del mensaje firmado (1 si no se indica)")
+    codificacion_firma: Optional[str] = Field(None, description="Codificación de la firma ('der' si no se indica)")
+    indice_log: Optional[int] = Field(None, description="Índice en el registro de transparencia (solo para pruebas de inclusión)")
     
     class Config:
         json_schema_extra = {
@@ -72,6 +101,53 @@ class ClavePublicaResponse(BaseModel):
     curva: str = Field(..., description="Curva elíptica de la clave")
 
 
+class ConsultarResponse(BaseModel):
+    """Response de la consulta de un hash notarizado."""
+    hash: str = Field(..., description="Hash consultado")
+    notarizado: bool = Field(..., description="Indica si existe al menos un recibo para el hash")
+    recibos: list = Field(..., description="Recibos emitidos para el hash")
+    fuente: str = Field(..., description="'filtro' si se descartó en memoria, 'almacen' si se leyó el registro")
+
+
+class CabezaArbolResponse(BaseModel):
+    """Cabeza firmada del registro de transparencia."""
+    tamano: int = Field(..., description="Número de recibos en el árbol")
+    raiz: str = Field(..., description="Raíz de Merkle en hexadecimal")
+    timestamp: str = Field(..., description="Timestamp ISO 8601 de la firma")
+    curva: str = Field(..., description="Curva de la clave que firma")
+    firma: str = Field(..., description="Firma ECDSA en base64 de 'STH|tamano|raiz|timestamp'")
+
+
+class InclusionResponse(BaseModel):
+    """Prueba de inclusión de un recibo."""
+    indice: int = Field(..., description="Índice de la hoja")
+    tamano: int = Field(..., description="Tamaño del árbol de la prueba")
+    hoja: str = Field(..., description="Hash de la hoja en hexadecimal")
+    raiz: str = Field(..., description="Raíz del árbol de ese tamaño")
+    ruta: list = Field(..., description="Hashes hermanos en hexadecimal, de la hoja hacia la raíz")
+
+
+class ConsistenciaResponse(BaseModel):
+    """Prueba de consistencia entre dos tamaños del árbol."""
+    primero: int = Field(..., description="Tamaño anterior")
+    segundo: int = Field(..., description="Tamaño posterior")
+    raiz_primero: str = Field(..., description="Raíz del árbol anterior")
+    raiz_segundo: str = Field(..., description="Raíz del árbol posterior")
+    prueba: list = Field(..., description="Hashes de la prueba en hexadecimal")
+
+
+class DividirRequest(BaseModel):
+    """Request para dividir fragmentos del almacén en línea."""
+    prefijos: list = Field(default_factory=list, description="Prefijos de los fragmentos a dividir")
+    max_mb: Optional[float] = Field(None, description="Divide (recursivamente) los fragmentos mayores de N MB")
+
+
+class DividirResponse(BaseModel):
+    """Response de la división de fragmentos."""
+    divididos: list = Field(..., description="Prefijos divididos, en orden")
+    fragmentos: dict = Field(..., description="Tamaño en bytes de cada fragmento tras dividir")
+
+
 class CurvasResponse(BaseModel):
     """Response con las curvas disponibles."""
     curvas: dict = Field(..., description="Diccionario de curvas soportadas")
@@ -97,7 +173,63 @@ app.add_middleware(
 notario_instances = {}  # Cache de instancias por curva
 
 # Ruta de la clave privada
-KEYS_DIR = os.path.join(os.path.dirname(__file__), '..', 'keys')
+KEYS_DIR = os.environ.get('NOTARIO_CLAVES_DIR', os.path.join(os.path.dirname(__file__), '..', 'keys'))
+
+# Modo réplica: nodo de solo verificación con claves públicas, alimentado
+# siguiendo el registro de recibos del primario
+MODO_REPLICA = os.environ.get('NOTARIO_MODO', 'primario').lower() == 'replica'
+REPLICA_ORIGEN = os.environ.get('NOTARIO_REPLICA_ORIGEN')
+REPLICA_INTERVALO = float(os.environ.get('NOTARIO_REPLICA_INTERVALO', '0.5'))
+replicador: Optional[ReplicadorRecibos] = None
+
+# Directorio de datos del servidor (registro de recibos, filtro de Bloom)
+DATOS_DIR = os.environ.get('NOTARIO_DATOS_DIR', os.path.join(os.path.dirname(__file__), '..', 'datos'))
+
+# Token de las operaciones de administración (sin él, desactivadas)
+ADMIN_TOKEN = os.environ.get('NOTARIO_ADMIN_TOKEN')
+
+# Métricas del servidor
+metricas = Metricas()
+
+# Almacén de recibos fragmentado por prefijo del hash y filtro de Bloom
+# delante de él (se crean al iniciar)
+almacen_recibos: Optional[AlmacenRecibos] = None
+filtro_notarizados: Optional[FiltroNotarizados] = None
+
+# Registro de transparencia (árbol de Merkle) y su última cabeza firmada
+registro_transparencia: Optional[RegistroTransparencia] = None
+cabeza_firmada: Optional[dict] = None
+STH_CURVA = os.environ.get('NOTARIO_STH_CURVA', 'SECP256R1')
+STH_INTERVALO = float(os.environ.get('NOTARIO_STH_INTERVALO', '60'))
+
+# Modo encadenado: cada recibo firma su secuencia y el digest del anterior
+MODO_ENCADENADO = os.environ.get('NOTARIO_ENCADENADO', '0').lower() in ('1', 'true', 'si', 'sí')
+cadena_recibos: Optional[CadenaRecibos] = None
+
+# Versión del mensaje firmado de los recibos nuevos: 1 (texto "hash|timestamp|...")
+# o 2 (binario canónico). La verificación acepta ambas.
+VERSION_RECIBO = int(os.environ.get('NOTARIO_VERSION_RECIBO', '1'))
+
+# Codificación de las firmas nuevas: 'der' (ASN.1, longitud variable) o 'raw'
+# (r||s de anchura fija por curva). La verificación acepta ambas.
+CODIFICACION_FIRMA = os.environ.get('NOTARIO_CODIFICACION_FIRMA', 'der').lower()
+
+# Control de admisión: cola acotada delante de la firma, con límite por curva.
+# La espera máxima por defecto queda por debajo del timeout de 10 s del cliente.
+control_admision = ControlAdmision(
+    concurrencia_por_curva=int(os.environ.get('NOTARIO_CONCURRENCIA_CURVA', os.cpu_count() or 4)),
+    max_cola=int(os.environ.get('NOTARIO_MAX_COLA', '64')),
+    espera_maxima=float(os.environ.get('NOTARIO_ESPERA_MAXIMA', '5')),
+    metricas=metricas
+)
+
+# Deduplicación de solicitudes idénticas (hash, curva) dentro de una ventana.
+# Con ventana 0 solo se atienden las claves de idempotencia.
+deduplicador = Deduplicador(
+    ventana=float(os.environ.get('NOTARIO_DEDUPE_VENTANA', '0')),
+    ttl_idempotencia=float(os.environ.get('NOTARIO_IDEMPOTENCIA_TTL', '86400')),
+    metricas=metricas
+)
 
 
 def obtener_notario(curva: str = "SECP256R1") -> NotarioCrypto:
@@ -114,8 +246,14 @@ def obtener_notario(curva: str = "SECP256R1") -> NotarioCrypto:
         raise ValueError(f"Curva no soportada: {curva}")
     
     if curva not in notario_instances:
-        notario_instances[curva] = NotarioCrypto(curva=curva)
-        inicializar_notario_curva(curva)
+        notario_instances[curva] = NotarioCrypto(curva=curva, version_recibo=VERSION_RECIBO,
+                                                codificacion_firma=CODIFICACION_FIRMA)
+        try:
+            inicializar_notario_curva(curva)
+        except Exception:
+            # No dejar en caché una instancia sin claves
+            del notario_instances[curva]
+            raise
     
     return notario_instances[curva]
 
@@ -135,7 +273,13 @@ def inicializar_notario_curva(curva: str, password: Optional[str] = None):
     
     notario = notario_instances[curva]
     
-    if os.path.exists(private_key_path):
+    if MODO_REPLICA:
+        # La réplica nunca tiene acceso a la clave privada
+        if not os.path.exists(public_key_path):
+            raise FileNotFoundError(f"Falta la clave pública {curva} en la réplica: {public_key_path}")
+        notario.cargar_clave_publica(public_key_path)
+        print(f"📂 Clave pública {curva} cargada (modo réplica)")
+    elif os.path.exists(private_key_path):
         # Cargar clave existente
         print(f"📂 Cargando clave privada {curva} desde {private_key_path}")
         try:
@@ -155,13 +299,183 @@ def inicializar_notario_curva(curva: str, password: Optional[str] = None):
         print(f"   - Pública: {public_key_path}")
 
 
+def registrar_recibo(recibo: dict):
+    """
+    Registra un recibo emitido en el registro de transparencia, el filtro
+    de Bloom y el almacén de recibos.
+    
+    Args:
+        recibo (dict): Recibo firmado; recibe el campo `indice_log`
+    """
+    recibo["indice_log"] = registro_transparencia.anexar(hoja_recibo(recibo))
+    
+    # El filtro se actualiza antes que el registro: nunca niega un hash registrado
+    filtro_notarizados.registrar(recibo["hash"])
+    almacen_recibos.agregar(recibo)
+
+
+def emitir_recibo(notario: NotarioCrypto, hash_hex: str,
+                  modo_hash: Optional[str] = None, bloque_hash: Optional[int] = None) -> dict:
+    """
+    Firma un hash con el timestamp actual y registra el recibo emitido.
+    
+    Args:
+        notario (NotarioCrypto): Instancia de la curva
+        hash_hex (str): Hash normalizado en minúsculas
+        modo_hash (str, optional): Modo de hash no plano ya validado
+        bloque_hash (int, optional): Tamaño de bloque del modo de hash
+        
+    Returns:
+        dict: Recibo firmado
+    """
+    if cadena_recibos is not None:
+        # El timestamp se toma dentro del lock de la cadena para que sea monótono
+        return cadena_recibos.emitir(notario, hash_hex, None, registrar_recibo,
+                                     modo_hash=modo_hash, bloque_hash=bloque_hash)
+    
+    timestamp = datetime.utcnow().isoformat() + "Z"
+    recibo = notario.firmar_hash(hash_hex, timestamp, modo_hash=modo_hash, bloque_hash=bloque_hash)
+    registrar_recibo(recibo)
+    return recibo
+
+
+async def firmar_con_admision(notario: NotarioCrypto, curva: str, hash_hex: str,
+                              modo_hash: Optional[str] = None, bloque_hash: Optional[int] = None) -> dict:
+    """
+    Firma un hash respetando el control de admisión de la curva.
+    
+    Args:
+        notario (NotarioCrypto): Instancia de la curva
+        curva (str): Nombre de la curva
+        hash_hex (str): Hash normalizado en minúsculas
+        modo_hash (str, optional): Modo de hash no plano ya validado
+        bloque_hash (int, optional): Tamaño de bloque del modo de hash
+        
+    Returns:
+        dict: Recibo firmado
+    """
+    # Esperar turno de firma (rechaza con 503 si la cola está llena)
+    async with control_admision.admitir(curva):
+        # Firmar y registrar fuera del event loop
+        return await run_in_threadpool(emitir_recibo, notario, hash_hex, modo_hash, bloque_hash)
+
+
+def ruta_cabeza_firmada() -> str:
+    """Ruta del archivo con la última cabeza firmada."""
+    return os.path.join(DATOS_DIR, 'transparencia', 'sth.json')
+
+
+def actualizar_cabeza_firmada() -> dict:
+    """
+    Firma la cabeza actual del árbol si ha crecido desde la última firma.
+    
+    Returns:
+        dict: Última cabeza firmada
+    """
+    global cabeza_firmada
+    
+    if cabeza_firmada is None or cabeza_firmada["tamano"] != registro_transparencia.tamano:
+        cabeza = firmar_cabeza(obtener_notario(STH_CURVA), registro_transparencia)
+        with open(ruta_cabeza_firmada() + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(cabeza, f, indent=2)
+        os.replace(ruta_cabeza_firmada() + '.tmp', ruta_cabeza_firmada())
+        cabeza_firmada = cabeza
+    return cabeza_firmada
+
+
+async def firmar_cabezas_periodicamente():
+    """Tarea de fondo que firma la cabeza del árbol cada STH_INTERVALO segundos."""
+    while True:
+        await asyncio.sleep(STH_INTERVALO)
+        try:
+            await run_in_threadpool(actualizar_cabeza_firmada)
+        except Exception as e:
+            print(f"❌ Error firmando la cabeza del árbol: {e}")
+
+
+def rechazar_en_replica():
+    """Lanza un 403 si el servidor es una réplica de solo verificación."""
+    if MODO_REPLICA:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Nodo en modo réplica: solo verificación. Notarice contra el servidor primario."
+        )
+
+
 @app.on_event("startup")
 async def startup_event():
     """Evento de inicio del servidor."""
+    global almacen_recibos, filtro_notarizados, cadena_recibos
+    global registro_transparencia, cabeza_firmada, replicador
+    
     print("=" * 60)
     print("🏛️  NOTARIO DIGITAL - Servidor API v2.0")
     print("=" * 60)
     
+    if MODO_REPLICA and not REPLICA_ORIGEN:
+        raise RuntimeError("El modo réplica requiere NOTARIO_REPLICA_ORIGEN (almacén del primario)")
+    
+    # Almacén de recibos; una réplica parte de un único fragmento y repite
+    # las divisiones del primario
+    tamano_maximo_mb = float(os.environ.get('NOTARIO_FRAGMENTO_MAX_MB', '0'))
+    almacen_recibos = AlmacenRecibos(
+        os.path.join(DATOS_DIR, 'recibos'),
+        fragmentos=1 if MODO_REPLICA else int(os.environ.get('NOTARIO_FRAGMENTOS', '16')),
+        tamano_maximo=int(tamano_maximo_mb * 1024 * 1024) if tamano_maximo_mb and not MODO_REPLICA else None,
+        fsync=os.environ.get('NOTARIO_FSYNC', '0').lower() in ('1', 'true', 'si', 'sí'),
+        limite_buffer_indice=int(os.environ.get('NOTARIO_INDICE_BUFFER', '50000'))
+    )
+    registro_plano = os.path.join(DATOS_DIR, 'recibos.jsonl')
+    if os.path.exists(registro_plano) and not MODO_REPLICA and almacen_recibos.tamano() == 0:
+        importados = almacen_recibos.importar(registro_plano)
+        os.replace(registro_plano, registro_plano + '.migrado')
+        print(f"📦 {importados} recibos migrados del registro plano al almacén fragmentado")
+    print(f"🗄️  Almacén de recibos: {len(almacen_recibos.prefijos())} fragmentos")
+    
+    # Filtro de Bloom delante del almacén (se completa en segundo plano)
+    filtro_notarizados = FiltroNotarizados(
+        almacen_recibos,
+        os.path.join(DATOS_DIR, 'filtro_bloom.bin'),
+        capacidad=int(os.environ.get('NOTARIO_BLOOM_CAPACIDAD', '1000000')),
+        tasa_falsos_positivos=float(os.environ.get('NOTARIO_BLOOM_FP', '0.001')),
+        metricas=metricas
+    )
+    filtro_notarizados.iniciar()
+    
+    if MODO_REPLICA:
+        if os.path.abspath(REPLICA_ORIGEN) == os.path.abspath(almacen_recibos.directorio):
+            raise RuntimeError("La réplica necesita su propio NOTARIO_DATOS_DIR, distinto del primario")
+        replicador = ReplicadorRecibos(
+            REPLICA_ORIGEN,
+            almacen_recibos,
+            filtro_notarizados,
+            intervalo=REPLICA_INTERVALO,
+            metricas=metricas
+        )
+        replicador.iniciar()
+        print(f"🪞 Modo réplica: siguiendo {REPLICA_ORIGEN} (solo verificación)")
+        
+        # Cargar las claves públicas disponibles
+        for curva in CURVAS_SOPORTADAS:
+            try:
+                obtener_notario(curva)
+            except FileNotFoundError:
+                pass
+        print(f"🔓 Curvas verificables: {', '.join(notario_instances.keys()) or 'ninguna'}")
+        print("=" * 60)
+        return
+    
+    # Registro de transparencia: se abre sin reconstruir el árbol
+    registro_transparencia = RegistroTransparencia(os.path.join(DATOS_DIR, 'transparencia'))
+    if os.path.exists(ruta_cabeza_firmada()):
+        with open(ruta_cabeza_firmada(), 'r', encoding='utf-8') as f:
+            cabeza_firmada = json.load(f)
+    print(f"🌳 Registro de transparencia: {registro_transparencia.tamano} recibos")
+    
+    if MODO_ENCADENADO:
+        cadena_recibos = CadenaRecibos.desde_registro(almacen_recibos)
+        print(f"🔗 Modo encadenado activo (siguiente secuencia: {cadena_recibos.secuencia})")
+    
     # Leer contraseña de variable de entorno (opcional)
     password = os.environ.get('NOTARIO_KEY_PASSWORD')
     if password:
@@ -171,24 +485,49 @@ async def startup_event():
     print(f"Inicializando curva por defecto: SECP256R1")
     obtener_notario("SECP256R1")
     
+    # Cabeza firmada inicial y firma periódica
+    actualizar_cabeza_firmada()
+    asyncio.get_running_loop().create_task(firmar_cabezas_periodicamente())
+    
     print("🚀 Servidor listo para recibir solicitudes")
     print(f"📋 Curvas disponibles: {', '.join(CURVAS_SOPORTADAS.keys())}")
     print("=" * 60)
 
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Evento de apagado: persiste el filtro de Bloom y cierra el registro."""
+    if replicador is not None:
+        replicador.detener()
+    if filtro_notarizados is not None:
+        filtro_notarizados.guardar()
+        print("💾 Filtro de Bloom guardado")
+    if almacen_recibos is not None:
+        almacen_recibos.cerrar()
+    if registro_transparencia is not None:
+        registro_transparencia.cerrar()
+
+
 @app.get("/", tags=["Info"])
 async def root():
     """Endpoint raíz con información del servicio."""
     return {
         "servicio": "Notario Digital API",
         "version": "2.0.0",
+        "modo": "replica" if MODO_REPLICA else "primario",
         "descripcion": "Servicio de notarización digital usando criptografía ECDSA con múltiples curvas",
         "curvas_soportadas": list(CURVAS_SOPORTADAS.keys()),
         "endpoints": {
             "POST /notarizar": "Notariza un hash de archivo",
             "POST /verificar": "Verifica un recibo digital",
             "GET /clave-publica/{curva}": "Obtiene la clave pública del notario para una curva",
-            "GET /curvas": "Lista todas las curvas disponibles"
+            "GET /consultar/{hash}": "Indica si un hash ya fue notarizado",
+            "GET /curvas": "Lista todas las curvas disponibles",
+            "GET /transparencia/sth": "Cabeza firmada del registro de transparencia",
+            "GET /transparencia/inclusion/{indice}": "Prueba de inclusión de un recibo",
+            "POST /transparencia/inclusion": "Prueba de inclusión a partir del recibo",
+            "GET /transparencia/consistencia": "Prueba de consistencia entre dos tamaños",
+            "GET /metricas": "Métricas de operación del servidor"
         }
     }
 
@@ -233,8 +572,9 @@ async def obtener_clave_publica(curva: str = "SECP256R1"):
         )
 
 
-@app.post("/notarizar", response_model=NotarizarResponse, tags=["Notario"])
-async def notarizar(request: NotarizarRequest):
+@app.post("/notarizar", response_model=NotarizarResponse, response_model_exclude_none=True, tags=["Notario"])
+async def notarizar(request: NotarizarRequest, response: Response,
+                    idempotency_key: Optional[str] = Header(None)):
     """
     Notariza un hash de archivo usando una curva específica.
     
@@ -243,10 +583,13 @@ async def notarizar(request: NotarizarRequest):
     
     Args:
         request: Solicitud con el hash del archivo y la curva
+        idempotency_key: Cabecera `Idempotency-Key` opcional; un reintento con
+                         la misma clave recibe el recibo original
         
     Returns:
         Recibo digital con timestamp, firma y curva utilizada
     """
+    rechazar_en_replica()
     try:
         # Validar curva
         curva = request.curva or "SECP256R1"
@@ -263,27 +606,61 @@ async def notarizar(request: NotarizarRequest):
                 detail="Hash inválido. Debe ser SHA-256 en formato hexadecimal (64 caracteres)"
             )
         
+        # Validar el modo de hash; el SHA-256 plano no se anota en el recibo
+        try:
+            validar_modo_hash(request.modo_hash, request.bloque_hash)
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+        modo_hash = None if request.modo_hash in (None, MODO_PLANO) else request.modo_hash
+        bloque_hash = request.bloque_hash if modo_hash else None
+        
         # Obtener notario para la curva
         notario = obtener_notario(curva)
         
-        # Obtener timestamp actual
-        timestamp = datetime.utcnow().isoformat() + "Z"
-        
-        # Firmar el hash con timestamp
-        recibo = notario.firmar_hash(request.hash.lower(), timestamp)
+        # Firmar, o reutilizar el recibo de una solicitud idéntica
+        hash_hex = request.hash.lower()
+        recibo, origen = await deduplicador.resolver(
+            hash_hex,
+            curva,
+            lambda: firmar_con_admision(notario, curva, hash_hex, modo_hash, bloque_hash),
+            clave_idempotencia=idempotency_key,
+            variante=(modo_hash, bloque_hash)
+        )
         
-        print(f"📝 Hash notarizado con {curva}: {request.hash[:16]}... en {timestamp}")
+        if origen:
+            response.headers["X-Notario-Deduplicado"] = origen
+            print(f"♻️  Recibo reutilizado ({origen}) con {curva}: {request.hash[:16]}...")
+        else:
+            print(f"📝 Hash notarizado con {curva}: {request.hash[:16]}... en {recibo['timestamp']}")
         
         return NotarizarResponse(
             timestamp=recibo["timestamp"],
             hash=recibo["hash"],
             firma=recibo["firma"],
             curva=recibo["curva"],
+            secuencia=recibo.get("secuencia"),
+            anterior=recibo.get("anterior"),
+            indice_log=recibo.get("indice_log"),
+            modo_hash=recibo.get("modo_hash"),
+            bloque_hash=recibo.get("bloque_hash"),
+            version=recibo.get("version"),
+            codificacion_firma=recibo.get("codificacion_firma"),
             mensaje=f"Documento notarizado exitosamente usando {curva}"
         )
         
     except HTTPException:
         raise
+    except ConflictoIdempotenciaError as e:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=str(e)
+        )
+    except ColaLlenaError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e),
+            headers={"Retry-After": str(e.reintentar_en)}
+        )
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -326,6 +703,16 @@ async def verificar(request: VerificarRequest):
             "firma": request.firma,
             "curva": curva
         }
+        if request.secuencia is not None:
+            recibo["secuencia"] = request.secuencia
+            recibo["anterior"] = request.anterior
+        if request.modo_hash not in (None, MODO_PLANO):
+            recibo["modo_hash"] = request.modo_hash
+            recibo["bloque_hash"] = request.bloque_hash
+        if request.version is not None:
+            recibo["version"] = request.version
+        if request.codificacion_firma is not None:
+            recibo["codificacion_firma"] = request.codificacion_firma
         
         # Verificar la firma
         es_valido = notario.verificar_firma(recibo)
@@ -360,6 +747,174 @@ async def verificar(request: VerificarRequest):
         )
 
 
+@app.get("/consultar/{hash_hex}", response_model=ConsultarResponse, tags=["Notario"])
+async def consultar(hash_hex: str):
+    """
+    Indica si un hash ya fue notarizado y devuelve sus recibos.
+    
+    La consulta pasa primero por un filtro de Bloom en memoria: los hashes
+    que nunca se notarizaron se descartan sin leer el registro.
+    
+    Args:
+        hash_hex: Hash SHA-256 en formato hexadecimal
+    """
+    if len(hash_hex) != 64 or not all(c in '0123456789abcdefABCDEF' for c in hash_hex):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Hash inválido. Debe ser SHA-256 en formato hexadecimal (64 caracteres)"
+        )
+    
+    recibos, fuente = await run_in_threadpool(filtro_notarizados.consultar, hash_hex)
+    return ConsultarResponse(
+        hash=hash_hex.lower(),
+        notarizado=bool(recibos),
+        recibos=recibos,
+        fuente=fuente
+    )
+
+
+@app.get("/transparencia/sth", response_model=CabezaArbolResponse, tags=["Transparencia"])
+async def obtener_cabeza_firmada():
+    """
+    Obtiene la última cabeza firmada del registro de transparencia.
+    
+    La cabeza se vuelve a firmar periódicamente cuando el árbol crece.
+    """
+    rechazar_en_replica()
+    return CabezaArbolResponse(**cabeza_firmada)
+
+
+def _prueba_inclusion(indice: int, tamano: Optional[int]) -> InclusionResponse:
+    """Construye la respuesta de inclusión validando los parámetros."""
+    try:
+        tamano = registro_transparencia.tamano if tamano is None else tamano
+        ruta = registro_transparencia.prueba_inclusion(indice, tamano)
+        raiz = registro_transparencia.raiz(tamano)
+        hoja = registro_transparencia.hoja(indice)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    return InclusionResponse(
+        indice=indice,
+        tamano=tamano,
+        hoja=hoja.hex(),
+        raiz=raiz.hex(),
+        ruta=[nodo.hex() for nodo in ruta]
+    )
+
+
+@app.get("/transparencia/inclusion/{indice}", response_model=InclusionResponse, tags=["Transparencia"])
+async def obtener_prueba_inclusion(indice: int, tamano: Optional[int] = None):
+    """
+    Prueba de inclusión de la hoja `indice` en el árbol de tamaño `tamano`.
+    
+    Args:
+        indice: Índice del recibo (campo `indice_log`)
+        tamano: Tamaño del árbol (por defecto, el de la última cabeza firmada)
+    """
+    rechazar_en_replica()
+    tamano = cabeza_firmada["tamano"] if tamano is None else tamano
+    return await run_in_threadpool(_prueba_inclusion, indice, tamano)
+
+
+@app.post("/transparencia/inclusion", response_model=InclusionResponse, tags=["Transparencia"])
+async def obtener_prueba_inclusion_recibo(request: VerificarRequest, tamano: Optional[int] = None):
+    """
+    Prueba de inclusión a partir del propio recibo.
+    
+    Comprueba la hoja del recibo en su `indice_log` y en el de los recibos
+    del almacén con el mismo hash, sin recorrer el registro, y devuelve su
+    prueba.
+    
+    Args:
+        request: Recibo emitido por el notario
+        tamano: Tamaño del árbol (por defecto, el de la última cabeza firmada)
+    """
+    rechazar_en_replica()
+    recibo = {campo: valor for campo, valor in request.model_dump().items() if valor is not None}
+    candidatos = [request.indice_log] if request.indice_log is not None else []
+    almacenados = await run_in_threadpool(almacen_recibos.buscar, request.hash)
+    candidatos += [r['indice_log'] for r in almacenados if r.get('indice_log') is not None]
+    indice = await run_in_threadpool(registro_transparencia.localizar_hoja, hoja_recibo(recibo), candidatos)
+    if indice is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="El recibo no está en el registro de transparencia"
+        )
+    tamano = cabeza_firmada["tamano"] if tamano is None else tamano
+    if indice >= tamano:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"El recibo aún no está cubierto por la cabeza firmada (tamaño {tamano})"
+        )
+    return await run_in_threadpool(_prueba_inclusion, indice, tamano)
+
+
+@app.get("/transparencia/consistencia", response_model=ConsistenciaResponse, tags=["Transparencia"])
+async def obtener_prueba_consistencia(primero: int, segundo: Optional[int] = None):
+    """
+    Prueba de que el árbol de tamaño `segundo` extiende al de tamaño `primero`.
+    
+    Args:
+        primero: Tamaño anterior del árbol
+        segundo: Tamaño posterior (por defecto, el de la última cabeza firmada)
+    """
+    rechazar_en_replica()
+    segundo = cabeza_firmada["tamano"] if segundo is None else segundo
+    
+    def construir():
+        try:
+            prueba = registro_transparencia.prueba_consistencia(primero, segundo)
+            return ConsistenciaResponse(
+                primero=primero,
+                segundo=segundo,
+                raiz_primero=registro_transparencia.raiz(primero).hex(),
+                raiz_segundo=registro_transparencia.raiz(segundo).hex(),
+                prueba=[nodo.hex() for nodo in prueba]
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    
+    return await run_in_threadpool(construir)
+
+
+@app.post("/admin/fragmentos/dividir", response_model=DividirResponse, tags=["Administración"])
+async def dividir_fragmentos(request: DividirRequest, x_admin_token: Optional[str] = Header(None)):
+    """
+    Divide fragmentos del almacén sin detener el servidor.
+    
+    Es la forma de refragmentar un almacén en uso: el servidor tiene el
+    bloqueo exclusivo del directorio y las escrituras en el resto de
+    fragmentos continúan durante la copia. Requiere la cabecera
+    X-Admin-Token con el valor de NOTARIO_ADMIN_TOKEN.
+    """
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN,
+                            detail="Administración desactivada: defina NOTARIO_ADMIN_TOKEN")
+    if not hmac.compare_digest(x_admin_token or '', ADMIN_TOKEN):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Token de administración inválido")
+    if MODO_REPLICA:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN,
+                            detail="Nodo en modo réplica: repite las divisiones del primario")
+    
+    def dividir():
+        divididos = []
+        try:
+            for prefijo in request.prefijos:
+                almacen_recibos.dividir(str(prefijo).lower())
+                divididos.append(str(prefijo).lower())
+            if request.max_mb:
+                divididos.extend(almacen_recibos.dividir_mayores(int(request.max_mb * 1024 * 1024)))
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+        print(f"🪓 Fragmentos divididos a petición: {', '.join(p or '(raíz)' for p in divididos) or 'ninguno'}")
+        return DividirResponse(
+            divididos=divididos,
+            fragmentos={p: almacen_recibos.tamano_fragmento(p) for p in almacen_recibos.prefijos()}
+        )
+    
+    return await run_in_threadpool(dividir)
+
+
 @app.get("/health", tags=["Info"])
 async def health_check():
     """Verifica el estado del servidor."""
@@ -369,18 +924,55 @@ async def health_check():
     
     return {
         "status": "healthy",
+        "modo": "replica" if MODO_REPLICA else "primario",
         "timestamp": datetime.utcnow().isoformat() + "Z",
         "curvas_inicializadas": list(notario_instances.keys()),
         "claves_disponibles": claves_disponibles
     }
 
 
+@app.get("/metricas", tags=["Info"])
+async def obtener_metricas():
+    """
+    Obtiene las métricas de operación del servidor.
+    
+    Incluye el tiempo de espera en la cola de firma por curva,
+    solicitudes admitidas/rechazadas, ocupación actual de la cola,
+    aciertos de deduplicación, saturación del filtro de Bloom, el último
+    eslabón de la cadena (modo encadenado) y, en una réplica, el retraso de
+    replicación respecto al primario.
+    """
+    return {
+        "timestamp": datetime.utcnow().isoformat() + "Z",
+        "admision": {
+            "concurrencia_por_curva": control_admision.concurrencia_por_curva,
+            "max_cola": control_admision.max_cola,
+            "espera_maxima": control_admision.espera_maxima
+        },
+        "deduplicacion": {
+            "activa": deduplicador.activo,
+            "ventana": deduplicador.ventana
+        },
+        "filtro_bloom": filtro_notarizados.estadisticas() if filtro_notarizados else None,
+        "almacen": almacen_recibos.estadisticas() if almacen_recibos else None,
+        "cadena": dict(zip(("ultima_secuencia", "ultimo_digest"), cadena_recibos.extremo()))
+        if cadena_recibos else None,
+        "replicacion": {
+            "origen": replicador.origen,
+            "retraso_bytes": replicador.pendientes,
+            "retraso_segundos": replicador.retraso_segundos(),
+            "recibos_replicados": replicador.replicados
+        } if replicador else None,
+        **metricas.exportar()
+    }
+
+
 if __name__ == "__main__":
     # Configuración del servidor
     print("\n🚀 Iniciando servidor Notario Digital...\n")
     uvicorn.run(
         app,
         host="127.0.0.1",
-        port=8000,
+        port=int(os.environ.get('NOTARIO_PUERTO', '8000')),
         log_level="info"
     )
@@ -0,0 +1,129 @@
+"""
+Control de admisión para las operaciones de firma del Notario Digital.
+Limita la concurrencia de firmas por curva y acota la cola de espera,
+rechazando rápidamente las solicitudes cuando el servidor está saturado.
+"""
+
+import asyncio
+import math
+import time
+from contextlib import asynccontextmanager
+
+
+class ColaLlenaError(Exception):
+    """Se lanza cuando una solicitud no puede ser admitida a tiempo."""
+
+    def __init__(self, curva, reintentar_en, motivo="cola llena"):
+        self.curva = curva
+        self.reintentar_en = reintentar_en
+        self.motivo = motivo
+        super().__init__(f"Servidor saturado para {curva} ({motivo}). Reintenta en {reintentar_en} s")
+
+
+class ControlAdmision:
+    """
+    Cola acotada delante de la firma con límite de concurrencia por curva.
+
+    Cada curva tiene su propio semáforo (firmas simultáneas) y su propia cola
+    de espera. Si la cola está llena, o si la espera supera `espera_maxima`,
+    la solicitud se rechaza con `ColaLlenaError` en lugar de acumular latencia.
+    """
+
+    def __init__(self, concurrencia_por_curva=4, max_cola=64, espera_maxima=5.0, metricas=None):
+        """
+        Args:
+            concurrencia_por_curva (int): Firmas simultáneas permitidas por curva
+            max_cola (int): Solicitudes en espera permitidas por curva
+            espera_maxima (float): Segundos máximos de espera en la cola
+            metricas (Metricas, optional): Registro donde publicar las métricas
+        """
+        if concurrencia_por_curva < 1:
+            raise ValueError("La concurrencia por curva debe ser al menos 1")
+        if max_cola < 0:
+            raise ValueError("El tamaño máximo de la cola no puede ser negativo")
+
+        self.concurrencia_por_curva = concurrencia_por_curva
+        self.max_cola = max_cola
+        self.espera_maxima = espera_maxima
+        self.metricas = metricas
+        self._estados = {}
+
+    def _estado(self, curva):
+        """Obtiene (o crea dentro del event loop) el estado de una curva."""
+        estado = self._estados.get(curva)
+        if estado is None:
+            estado = {
+                "semaforo": asyncio.Semaphore(self.concurrencia_por_curva),
+                "en_cola": 0,
+                "en_proceso": 0,
+                # Media móvil exponencial de la duración de una firma (segundos)
+                "duracion_media": 0.01,
+            }
+            self._estados[curva] = estado
+        return estado
+
+    def estimar_reintento(self, curva):
+        """
+        Estima en cuántos segundos conviene reintentar (cabecera Retry-After).
+
+        Returns:
+            int: Segundos de espera sugeridos (mínimo 1)
+        """
+        estado = self._estado(curva)
+        rondas = (estado["en_cola"] + estado["en_proceso"]) / self.concurrencia_por_curva
+        return max(1, math.ceil(rondas * estado["duracion_media"]))
+
+    def _publicar(self, curva, estado):
+        if self.metricas is not None:
+            self.metricas.establecer("admision_en_cola", estado["en_cola"], curva)
+            self.metricas.establecer("admision_en_proceso", estado["en_proceso"], curva)
+
+    def _rechazar(self, curva, motivo):
+        if self.metricas is not None:
+            self.metricas.incrementar("admision_rechazadas", etiqueta=curva)
+        return ColaLlenaError(curva, self.estimar_reintento(curva), motivo)
+
+    @asynccontextmanager
+    async def admitir(self, curva):
+        """
+        Reserva un turno de firma para la curva indicada.
+
+        Uso:
+            async with control.admitir("SECP256R1"):
+                ...  # firmar
+
+        Raises:
+            ColaLlenaError: Si la cola está llena o la espera excede el máximo
+        """
+        estado = self._estado(curva)
+
+        if estado["en_cola"] >= self.max_cola and estado["semaforo"].locked():
+            raise self._rechazar(curva, "cola llena")
+
+        estado["en_cola"] += 1
+        self._publicar(curva, estado)
+        inicio_espera = time.perf_counter()
+        try:
+            await asyncio.wait_for(estado["semaforo"].acquire(), timeout=self.espera_maxima)
+        except asyncio.TimeoutError:
+            raise self._rechazar(curva, "tiempo de espera agotado")
+        finally:
+            estado["en_cola"] -= 1
+            self._publicar(curva, estado)
+
+        espera = time.perf_counter() - inicio_espera
+        if self.metricas is not None:
+            self.metricas.observar("admision_espera_cola_segundos", espera, curva)
+            self.metricas.incrementar("admision_admitidas", etiqueta=curva)
+
+        estado["en_proceso"] += 1
+        self._publicar(curva, estado)
+        inicio_proceso = time.perf_counter()
+        try:
+            yield
+        finally:
+            duracion = time.perf_counter() - inicio_proceso
+            estado["duracion_media"] = 0.8 * estado["duracion_media"] + 0.2 * duracion
+            estado["en_proceso"] -= 1
+            estado["semaforo"].release()
+            self._publicar(curva, estado)
@@ -0,0 +1,147 @@
+"""
+Deduplicación de solicitudes de notarización.
+Agrupa solicitudes idénticas (hash, curva) en una sola operación de firma
+y soporta claves de idempotencia para que los reintentos reciban el recibo original.
+"""
+
+import asyncio
+import time
+from collections import OrderedDict
+
+
+class ConflictoIdempotenciaError(Exception):
+    """Se lanza cuando una clave de idempotencia se reutiliza con otra solicitud."""
+
+
+class Deduplicador:
+    """
+    Comparte una única firma entre solicitudes idénticas.
+
+    - Solicitudes con el mismo (hash, curva) que llegan mientras otra está
+      en vuelo esperan su resultado en lugar de firmar de nuevo.
+    - Dentro de `ventana` segundos desde la primera solicitud, las repetidas
+      reciben el mismo recibo ya emitido.
+    - Una clave de idempotencia devuelve siempre el recibo original durante
+      `ttl_idempotencia` segundos, aunque la ventana esté desactivada.
+    """
+
+    def __init__(self, ventana=0.0, ttl_idempotencia=86400.0, max_entradas=100000, metricas=None):
+        """
+        Args:
+            ventana (float): Segundos durante los que se reutiliza un recibo (0 desactiva)
+            ttl_idempotencia (float): Segundos que se recuerda una clave de idempotencia
+            max_entradas (int): Máximo de entradas recordadas por cada tabla
+            metricas (Metricas, optional): Registro donde publicar aciertos
+        """
+        self.ventana = ventana
+        self.ttl_idempotencia = ttl_idempotencia
+        self.max_entradas = max_entradas
+        self.metricas = metricas
+        # (hash, curva) -> (instante, futuro)
+        self._recientes = OrderedDict()
+        # clave -> (instante, (hash, curva), futuro)
+        self._idempotencia = OrderedDict()
+
+    @property
+    def activo(self):
+        """Indica si el modo de deduplicación por ventana está activo."""
+        return self.ventana > 0
+
+    def _purgar(self, ahora):
+        """Elimina entradas caducadas (las tablas están ordenadas por llegada)."""
+        while len(self._recientes) > self.max_entradas:
+            self._recientes.popitem(last=False)
+        # Las firmas en vuelo no se eliminan, pero tampoco detienen la purga
+        # de las entradas caducadas que vienen detrás
+        caducadas = []
+        for clave, (instante, futuro) in self._recientes.items():
+            if ahora - instante <= self.ventana:
+                break
+            if futuro.done():
+                caducadas.append(clave)
+        for clave in caducadas:
+            del self._recientes[clave]
+
+        while self._idempotencia:
+            instante, _, _ = next(iter(self._idempotencia.values()))
+            caducada = ahora - instante > self.ttl_idempotencia
+            if not caducada and len(self._idempotencia) <= self.max_entradas:
+                break
+            self._idempotencia.popitem(last=False)
+
+    def _acierto(self, origen):
+        if self.metricas is not None:
+            self.metricas.incrementar("deduplicacion_aciertos", etiqueta=origen)
+
+    async def resolver(self, hash_hex, curva, firmar, clave_idempotencia=None, variante=None):
+        """
+        Devuelve el recibo para (hash, curva), firmando solo si es necesario.
+
+        Args:
+            hash_hex (str): Hash normalizado en minúsculas
+            curva (str): Curva elíptica
+            firmar (callable): Función sin argumentos que devuelve una corrutina con el recibo
+            clave_idempotencia (str, optional): Clave enviada por el cliente
+            variante (tuple, optional): Parámetros adicionales que distinguen
+                                        solicitudes con el mismo (hash, curva)
+
+        Returns:
+            tuple: (recibo, origen) donde origen es None si se firmó ahora, o
+                   'idempotencia', 'en_vuelo' o 'ventana' si se reutilizó
+
+        Raises:
+            ConflictoIdempotenciaError: Si la clave ya se usó con otro hash o curva
+        """
+        clave = (hash_hex, curva, variante)
+        ahora = time.monotonic()
+        self._purgar(ahora)
+
+        if clave_idempotencia:
+            entrada = self._idempotencia.get(clave_idempotencia)
+            if entrada is not None:
+                if entrada[1] != clave:
+                    raise ConflictoIdempotenciaError(
+                        "La clave de idempotencia ya se utilizó con otro hash o curva"
+                    )
+                self._acierto("idempotencia")
+                return await asyncio.shield(entrada[2]), "idempotencia"
+
+        if self.activo:
+            entrada = self._recientes.get(clave)
+            if entrada is not None and entrada[1].done() and ahora - entrada[0] > self.ventana:
+                # Recibo fuera de la ventana: se vuelve a firmar
+                del self._recientes[clave]
+                entrada = None
+            if entrada is not None:
+                instante, futuro = entrada
+                origen = "ventana" if futuro.done() else "en_vuelo"
+                self._acierto(origen)
+                if clave_idempotencia:
+                    self._idempotencia[clave_idempotencia] = (ahora, clave, futuro)
+                return await asyncio.shield(futuro), origen
+
+        futuro = asyncio.get_running_loop().create_future()
+        if self.activo:
+            self._recientes[clave] = (ahora, futuro)
+        if clave_idempotencia:
+            self._idempotencia[clave_idempotencia] = (ahora, clave, futuro)
+        if self.metricas is not None:
+            self.metricas.incrementar("deduplicacion_firmas")
+
+        try:
+            recibo = await firmar()
+        except BaseException as e:
+            # No recordar fallos: la siguiente solicitud vuelve a intentarlo
+            if self._recientes.get(clave, (None, None))[1] is futuro:
+                del self._recientes[clave]
+            if clave_idempotencia and self._idempotencia.get(clave_idempotencia, (None, None, None))[2] is futuro:
+                del self._idempotencia[clave_idempotencia]
+            if isinstance(e, Exception):
+                futuro.set_exception(e)
+                futuro.exception()  # Marcar como recuperada para evitar avisos del event loop
+            else:
+                futuro.cancel()
+            raise
+
+        futuro.set_result(recibo)
+        return recibo, None
@@ -0,0 +1,156 @@
+"""
+Filtro de Bloom delante del registro de recibos del servidor.
+Descarta en memoria las consultas de hashes que nunca se notarizaron y solo
+recurre al almacenamiento cuando el filtro responde "quizás".
+"""
+
+import os
+import threading
+import time
+
+from shared.filtro_bloom import FiltroBloom
+
+
+# Intentos de reconstrucción antes de dar el filtro por fallido, y espera
+# inicial entre ellos (se duplica en cada intento)
+INTENTOS_RECONSTRUCCION = 5
+ESPERA_RECONSTRUCCION = 1.0
+
+
+class FiltroNotarizados:
+    """
+    Frente de consultas "¿ya fue notarizado?" sobre un `AlmacenRecibos`.
+
+    Al iniciar se carga el filtro persistido si sus parámetros coinciden y
+    cubre exactamente el almacén actual; si no, se reconstruye en segundo
+    plano. Mientras la reconstrucción no termina, las consultas van al almacén.
+    Si la reconstrucción falla (un fragmento dividido durante el recorrido,
+    una línea ilegible) se reintenta; agotados los intentos, el filtro queda
+    marcado como fallido en `estadisticas()` y las consultas siguen yendo al
+    almacén.
+    """
+
+    def __init__(self, registro, ruta_filtro, capacidad=1000000,
+                 tasa_falsos_positivos=0.001, metricas=None):
+        """
+        Args:
+            registro (AlmacenRecibos): Almacenamiento de recibos emitidos
+            ruta_filtro (str): Archivo donde persistir el filtro al apagar
+            capacidad (int): Número esperado de hashes notarizados
+            tasa_falsos_positivos (float): Tasa objetivo de falsos positivos
+            metricas (Metricas, optional): Registro donde publicar las métricas
+        """
+        self.registro = registro
+        self.ruta_filtro = ruta_filtro
+        self.capacidad = capacidad
+        self.tasa_falsos_positivos = tasa_falsos_positivos
+        self.metricas = metricas
+        self.filtro = FiltroBloom(capacidad, tasa_falsos_positivos)
+        self.listo = threading.Event()
+        self.intentos_fallidos = 0
+        self.error = None
+        self.fallido = False
+        self._hilo = None
+
+    def iniciar(self):
+        """Carga el filtro persistido y lanza la reconstrucción en segundo plano."""
+        if os.path.exists(self.ruta_filtro):
+            try:
+                filtro = FiltroBloom.cargar(self.ruta_filtro)
+                if not filtro.compatible(self.capacidad, self.tasa_falsos_positivos):
+                    print("⚠️  Parámetros del filtro de Bloom cambiaron; se reconstruirá completo")
+                elif filtro.desplazamiento != self.registro.tamano():
+                    # Apagado no limpio: el filtro no cubre el almacén actual
+                    print("⚠️  El filtro de Bloom no está al día con el almacén; se reconstruirá completo")
+                else:
+                    self.filtro = filtro
+                    self.listo.set()
+            except (OSError, ValueError) as e:
+                print(f"⚠️  No se pudo cargar el filtro de Bloom ({e}); se reconstruirá completo")
+
+        if self.listo.is_set():
+            print(f"🌸 Filtro de Bloom cargado: {self.filtro.elementos} hashes")
+            return
+        self._hilo = threading.Thread(target=self._reconstruir, name="reconstruir-bloom", daemon=True)
+        self._hilo.start()
+
+    def _reconstruir(self):
+        """Inserta en el filtro todos los recibos del almacén, reintentando si falla."""
+        espera = ESPERA_RECONSTRUCCION
+        while True:
+            try:
+                self._recorrer_almacen()
+                return
+            except Exception as e:
+                # Lo ya insertado sigue siendo válido: un filtro de Bloom solo acumula
+                self.intentos_fallidos += 1
+                self.error = f"{type(e).__name__}: {e}"
+                if self.intentos_fallidos >= INTENTOS_RECONSTRUCCION:
+                    self.fallido = True
+                    print(f"❌ Reconstrucción del filtro de Bloom abandonada tras "
+                          f"{self.intentos_fallidos} intentos: {self.error}")
+                    return
+                print(f"⚠️  Error reconstruyendo el filtro de Bloom ({self.error}); "
+                      f"reintento en {espera:g} s")
+                time.sleep(espera)
+                espera *= 2
+
+    def _recorrer_almacen(self):
+        inicio = time.perf_counter()
+        insertados = 0
+        for _, recibo in self.registro.iterar():
+            self.filtro.agregar(recibo['hash'])
+            insertados += 1
+        self.listo.set()
+        duracion = time.perf_counter() - inicio
+        if self.metricas is not None:
+            self.metricas.observar("bloom_reconstruccion_segundos", duracion)
+        print(f"🌸 Filtro de Bloom listo: {insertados} recibos recorridos en {duracion:.2f} s")
+
+    def registrar(self, hash_hex):
+        """Agrega un hash recién notarizado (llamar antes de anexarlo al registro)."""
+        self.filtro.agregar(hash_hex.lower())
+
+    def consultar(self, hash_hex):
+        """
+        Busca los recibos de un hash consultando primero el filtro.
+
+        Args:
+            hash_hex (str): Hash en formato hexadecimal
+
+        Returns:
+            tuple: (recibos, fuente) donde fuente es 'filtro' si se descartó en
+                   memoria o 'almacen' si hubo que leer el registro
+        """
+        hash_hex = hash_hex.lower()
+        if self.listo.is_set() and hash_hex not in self.filtro:
+            self._contar("descartadas")
+            return [], "filtro"
+
+        recibos = self.registro.buscar(hash_hex)
+        if self.listo.is_set():
+            self._contar("almacen" if recibos else "falsos_positivos")
+        else:
+            self._contar("sin_filtro")
+        return recibos, "almacen"
+
+    def _contar(self, resultado):
+        if self.metricas is not None:
+            self.metricas.incrementar("bloom_consultas", etiqueta=resultado)
+
+    def guardar(self):
+        """Persiste el filtro si ya cubre todo el almacén (llamar con las escrituras detenidas)."""
+        if not self.listo.is_set():
+            return
+        self.filtro.desplazamiento = self.registro.tamano()
+        self.filtro.guardar(self.ruta_filtro)
+
+    def estadisticas(self):
+        """Estado del filtro para el endpoint de métricas."""
+        return {
+            "listo": self.listo.is_set(),
+            "fallido": self.fallido,
+            "intentos_fallidos": self.intentos_fallidos,
+            "ultimo_error": self.error,
+            **self.filtro.estadisticas()
+        }
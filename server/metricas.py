@@ -0,0 +1,115 @@
+"""
+Registro de métricas del servidor del Notario Digital.
+Mantiene contadores, indicadores y resúmenes de latencia en memoria
+y los expone como un diccionario serializable a JSON.
+"""
+
+import threading
+from collections import deque
+
+
+class Metricas:
+    """
+    Registro thread-safe de métricas del servidor.
+
+    Cada métrica se identifica por un nombre y, opcionalmente, por una
+    etiqueta (por ejemplo, la curva elíptica).
+    """
+
+    def __init__(self, ventana_resumen=1024):
+        """
+        Inicializa el registro vacío.
+
+        Args:
+            ventana_resumen (int): Número de observaciones recientes que se
+                                   conservan por resumen para calcular percentiles
+        """
+        self._lock = threading.Lock()
+        self._contadores = {}
+        self._indicadores = {}
+        self._resumenes = {}
+        self.ventana_resumen = ventana_resumen
+
+    def incrementar(self, nombre, valor=1, etiqueta=None):
+        """Incrementa un contador."""
+        with self._lock:
+            clave = (nombre, etiqueta)
+            self._contadores[clave] = self._contadores.get(clave, 0) + valor
+
+    def establecer(self, nombre, valor, etiqueta=None):
+        """Establece el valor actual de un indicador."""
+        with self._lock:
+            self._indicadores[(nombre, etiqueta)] = valor
+
+    def observar(self, nombre, valor, etiqueta=None):
+        """Registra una observación (por ejemplo, una latencia en segundos)."""
+        with self._lock:
+            clave = (nombre, etiqueta)
+            resumen = self._resumenes.get(clave)
+            if resumen is None:
+                resumen = {
+                    "cuenta": 0,
+                    "suma": 0.0,
+                    "maximo": 0.0,
+                    "recientes": deque(maxlen=self.ventana_resumen),
+                }
+                self._resumenes[clave] = resumen
+            resumen["cuenta"] += 1
+            resumen["suma"] += valor
+            resumen["maximo"] = max(resumen["maximo"], valor)
+            resumen["recientes"].append(valor)
+
+    def obtener(self, nombre, etiqueta=None):
+        """Devuelve el valor de un contador o indicador (0 si no existe)."""
+        with self._lock:
+            clave = (nombre, etiqueta)
+            if clave in self._indicadores:
+                return self._indicadores[clave]
+            return self._contadores.get(clave, 0)
+
+    def exportar(self):
+        """
+        Exporta todas las métricas.
+
+        Returns:
+            dict: {contadores, indicadores, resumenes}, agrupados por nombre y etiqueta
+        """
+        with self._lock:
+            return {
+                "contadores": self._agrupar(self._contadores),
+                "indicadores": self._agrupar(self._indicadores),
+                "resumenes": self._agrupar({
+                    clave: self._resumir(resumen)
+                    for clave, resumen in self._resumenes.items()
+                }),
+            }
+
+    @staticmethod
+    def _agrupar(valores):
+        """Agrupa {(nombre, etiqueta): valor} en {nombre: valor | {etiqueta: valor}}."""
+        agrupado = {}
+        for (nombre, etiqueta), valor in sorted(valores.items(), key=lambda kv: (kv[0][0], str(kv[0][1]))):
+            if etiqueta is None:
+                agrupado[nombre] = valor
+            else:
+                agrupado.setdefault(nombre, {})[etiqueta] = valor
+        return agrupado
+
+    @staticmethod
+    def _resumir(resumen):
+        """Calcula media y percentiles de un resumen."""
+        recientes = sorted(resumen["recientes"])
+
+        def percentil(p):
+            if not recientes:
+                return 0.0
+            return recientes[min(len(recientes) - 1, int(p * len(recientes)))]
+
+        return {
+            "cuenta": resumen["cuenta"],
+            "media": resumen["suma"] / resumen["cuenta"] if resumen["cuenta"] else 0.0,
+            "p50": percentil(0.50),
+            "p95": percentil(0.95),
+            "p99": percentil(0.99),
+            "maximo": resumen["maximo"],
+        }
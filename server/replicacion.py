@@ -0,0 +1,159 @@
+"""
+Replicación del almacén de recibos hacia nodos de solo verificación.
+Una réplica sigue (tail) los fragmentos append-only del servidor primario y
+copia cada recibo a su almacén local y a su filtro de Bloom.
+"""
+
+import json
+import os
+import threading
+import time
+
+from shared.registro_recibos import leer_registro
+from shared.almacen_recibos import leer_manifiesto, nombre_fragmento
+
+
+class ReplicadorRecibos:
+    """
+    Sigue los fragmentos del primario y los copia byte a byte al almacén local.
+
+    Como la copia es idéntica, el tamaño de cada fragmento local es exactamente
+    el desplazamiento consumido del fragmento de origen: la réplica reanuda tras
+    un reinicio sin guardar estado adicional. Cuando el primario divide un
+    fragmento, la réplica repite la misma división (determinista) sobre su copia.
+    """
+
+    def __init__(self, origen, almacen, filtro, intervalo=0.5, lote=1000, metricas=None):
+        """
+        Args:
+            origen (str): Directorio del almacén del servidor primario
+            almacen (AlmacenRecibos): Almacén local de la réplica
+            filtro (FiltroNotarizados): Filtro de Bloom local
+            intervalo (float): Segundos entre sondeos cuando no hay datos nuevos
+            lote (int): Recibos máximos aplicados por escritura
+            metricas (Metricas, optional): Registro donde publicar el retraso
+        """
+        self.origen = origen
+        self.almacen = almacen
+        self.filtro = filtro
+        self.intervalo = intervalo
+        self.lote = lote
+        self.metricas = metricas
+        self.replicados = 0
+        self.pendientes = 0
+        # Último instante en que la réplica estaba al día con el origen
+        self.ultimo_al_dia = time.time()
+        self._detener = threading.Event()
+        self._hilo = None
+
+    def iniciar(self):
+        """Lanza el hilo de replicación."""
+        self._hilo = threading.Thread(target=self._ejecutar, name="replicacion", daemon=True)
+        self._hilo.start()
+
+    def detener(self):
+        """Detiene el hilo de replicación."""
+        self._detener.set()
+        if self._hilo is not None:
+            self._hilo.join(timeout=5)
+
+    def _ejecutar(self):
+        while not self._detener.is_set():
+            try:
+                aplicados = self.sincronizar()
+            except Exception as e:
+                print(f"❌ Error de replicación: {e}")
+                aplicados = 0
+            if not aplicados:
+                self._detener.wait(self.intervalo)
+
+    def sincronizar(self):
+        """
+        Aplica los recibos nuevos del origen.
+
+        Returns:
+            int: Número de recibos aplicados
+        """
+        prefijos_origen = leer_manifiesto(self.origen)
+        if prefijos_origen is None:
+            self._publicar()
+            return 0
+        self._reproducir_divisiones(prefijos_origen)
+
+        aplicados = 0
+        for prefijo in prefijos_origen:
+            ruta = os.path.join(self.origen, nombre_fragmento(prefijo))
+            try:
+                aplicados += self._sincronizar_fragmento(prefijo, ruta)
+            except FileNotFoundError:
+                # El primario dividió el fragmento mientras se leía: siguiente ronda
+                continue
+
+        self.replicados += aplicados
+        self._publicar()
+        return aplicados
+
+    def _reproducir_divisiones(self, prefijos_origen):
+        """Divide los fragmentos locales que el primario ya dividió."""
+        while True:
+            pendientes = [p for p in self.almacen.prefijos()
+                          if p not in prefijos_origen
+                          and any(o.startswith(p) for o in prefijos_origen)]
+            if not pendientes:
+                break
+            for prefijo in pendientes:
+                self.almacen.dividir(prefijo)
+
+        locales = set(self.almacen.prefijos())
+        if not set(prefijos_origen) <= locales:
+            raise RuntimeError("Los fragmentos de la réplica no coinciden con los del primario")
+
+    def _sincronizar_fragmento(self, prefijo, ruta):
+        desde = self.almacen.tamano_fragmento(prefijo)
+        tamano_origen = os.path.getsize(ruta)
+        if tamano_origen < desde:
+            raise RuntimeError(
+                f"El fragmento de origen '{prefijo}' ({tamano_origen} bytes) es menor "
+                f"que la copia local ({desde} bytes)"
+            )
+
+        aplicados = 0
+        bloque = []
+        for _, linea in leer_registro(ruta, desde):
+            recibo = json.loads(linea)
+            # El filtro se actualiza antes que el almacén (nunca niega un hash registrado)
+            self.filtro.registrar(recibo['hash'])
+            bloque.append(linea)
+            if len(bloque) >= self.lote:
+                self.almacen.anexar_lineas(prefijo, bloque)
+                aplicados += len(bloque)
+                bloque = []
+        if bloque:
+            self.almacen.anexar_lineas(prefijo, bloque)
+            aplicados += len(bloque)
+        return aplicados
+
+    def retraso_segundos(self):
+        """Segundos desde la última vez que la réplica estuvo al día (0 si lo está)."""
+        if self.pendientes <= 0:
+            return 0.0
+        return time.time() - self.ultimo_al_dia
+
+    def _publicar(self):
+        """Actualiza el retraso respecto al origen y lo publica en las métricas."""
+        pendientes = 0
+        for prefijo in leer_manifiesto(self.origen) or []:
+            ruta = os.path.join(self.origen, nombre_fragmento(prefijo))
+            try:
+                pendientes += max(0, os.path.getsize(ruta) - self.almacen.tamano_fragmento(prefijo))
+            except (FileNotFoundError, KeyError):
+                # Fragmento recién dividido en el primario o aún no reproducido aquí
+                continue
+        self.pendientes = pendientes
+        if self.pendientes == 0:
+            self.ultimo_al_dia = time.time()
+
+        if self.metricas is not None:
+            self.metricas.establecer("replicacion_retraso_bytes", self.pendientes)
+            self.metricas.establecer("replicacion_retraso_segundos", self.retraso_segundos())
+            self.metricas.establecer("replicacion_recibos_replicados", self.replicados)
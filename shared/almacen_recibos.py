@@ -0,0 +1,561 @@
+"""
+Almacenamiento de recibos fragmentado por prefijo del hash del documento.
+
+Cada fragmento es un `RegistroRecibos` independiente (su propio archivo, lock
+de escritura e `IndiceOrdenado` en disco), de modo que las escrituras en fragmentos distintos no
+compiten entre sí y una búsqueda por hash lee exactamente un fragmento.
+
+La lista de fragmentos vive en `fragmentos.json`: un conjunto de prefijos
+hexadecimales que cubre todos los hashes sin solaparse. Un fragmento se divide
+en 16 hijos (uno por cada siguiente dígito) sin detener las escrituras en el
+resto.
+
+Un único proceso puede tener abierto el almacén: `AlmacenRecibos` toma un
+bloqueo exclusivo sobre `.bloqueo` en su directorio. Las lecturas de solo
+consulta (`leer_manifiesto`, `iterar_almacen`) no lo necesitan.
+"""
+
+import json
+import os
+import threading
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: bloqueo de un byte con msvcrt
+    fcntl = None
+    import msvcrt
+
+from shared.registro_recibos import RegistroRecibos, leer_registro
+from shared.indice_recibos import IndiceOrdenado
+
+
+MANIFIESTO = 'fragmentos.json'
+ARCHIVO_BLOQUEO = '.bloqueo'
+DIGITOS_HEX = '0123456789abcdef'
+
+
+class AlmacenEnUsoError(Exception):
+    """Otro proceso (normalmente el servidor) tiene abierto el almacén."""
+
+
+def nombre_fragmento(prefijo):
+    """Nombre del archivo de un fragmento ('raiz' para el prefijo vacío)."""
+    return f"{prefijo or 'raiz'}.jsonl"
+
+
+def leer_manifiesto(directorio):
+    """
+    Lee la lista de prefijos de un almacén sin abrirlo para escritura.
+
+    Args:
+        directorio (str): Directorio del almacén
+
+    Returns:
+        list: Prefijos de los fragmentos, o None si el almacén no existe
+    """
+    ruta = os.path.join(directorio, MANIFIESTO)
+    if not os.path.exists(ruta):
+        return None
+    with open(ruta, 'r', encoding='utf-8') as f:
+        return json.load(f)['prefijos']
+
+
+def bloquear_almacen(directorio):
+    """
+    Toma el bloqueo exclusivo entre procesos de un almacén.
+
+    El sistema operativo lo libera al cerrar el archivo o al terminar el
+    proceso, así que un servidor caído no deja el almacén bloqueado.
+
+    Args:
+        directorio (str): Directorio del almacén
+
+    Returns:
+        file: Archivo de bloqueo abierto (cerrarlo libera el bloqueo)
+
+    Raises:
+        AlmacenEnUsoError: Si otro proceso tiene el almacén abierto
+    """
+    archivo = open(os.path.join(directorio, ARCHIVO_BLOQUEO), 'a+b')
+    try:
+        if fcntl is not None:
+            fcntl.flock(archivo.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            archivo.seek(0)
+            msvcrt.locking(archivo.fileno(), msvcrt.LK_NBLCK, 1)
+    except OSError:
+        archivo.close()
+        raise AlmacenEnUsoError(f"El almacén {directorio} está abierto por otro proceso "
+                                "(¿servidor en marcha?)")
+    return archivo
+
+
+def iterar_almacen(directorio):
+    """
+    Recorre todos los recibos de un almacén en modo de solo lectura.
+
+    Args:
+        directorio (str): Directorio del almacén
+
+    Yields:
+        dict: Recibos, fragmento a fragmento
+    """
+    for prefijo in leer_manifiesto(directorio) or []:
+        ruta = os.path.join(directorio, nombre_fragmento(prefijo))
+        if os.path.exists(ruta):
+            for _, linea in leer_registro(ruta):
+                if linea.strip():
+                    yield json.loads(linea)
+
+
+class FragmentoRecibos:
+    """
+    Un fragmento del almacén: registro append-only más índice ordenado por hash.
+
+    El índice en disco cubre el fragmento hasta un desplazamiento; la cola
+    que falte (recibos escritos tras la última fusión) se indexa en segundo
+    plano al abrir el almacén, o en la primera búsqueda si llega antes, y
+    después se mantiene con cada escritura.
+    """
+
+    def __init__(self, prefijo, ruta, fsync=False, limite_buffer_indice=50000):
+        """
+        Args:
+            prefijo (str): Prefijo hexadecimal que cubre el fragmento
+            ruta (str): Archivo del fragmento
+            fsync (bool): Forzar cada escritura a disco
+            limite_buffer_indice (int): Entradas del índice en memoria antes de fusionar
+        """
+        self.prefijo = prefijo
+        self.registro = RegistroRecibos(ruta, fsync=fsync)
+        self.indice = IndiceOrdenado(os.path.splitext(ruta)[0] + '.idx', limite_buffer_indice)
+        self.indice_al_dia = False
+        self.cerrado = False
+        # Marcado al dividirse: las escrituras deben ir a los hijos
+        self.retirado = False
+        self.lock = threading.Lock()
+
+    def agregar(self, recibo):
+        """
+        Anexa un recibo.
+
+        Returns:
+            int: Desplazamiento del recibo, o None si el fragmento se dividió
+        """
+        with self.lock:
+            if self.retirado:
+                return None
+            desplazamiento = self.registro.agregar(recibo)
+            if self.indice_al_dia:
+                self.indice.agregar(recibo['hash'], desplazamiento, recibo['timestamp'], self.registro.tamano())
+            return desplazamiento
+
+    def anexar_lineas(self, lineas):
+        """
+        Anexa líneas ya serializadas (réplicas e importación).
+
+        Args:
+            lineas (list): Líneas JSON completas en bytes
+
+        Returns:
+            bool: False si el fragmento se dividió y no se escribió nada
+        """
+        with self.lock:
+            if self.retirado:
+                return False
+            desplazamiento = self.registro.tamano()
+            self.registro.anexar_lineas(b''.join(lineas))
+            if self.indice_al_dia:
+                for linea in lineas:
+                    self._indexar(linea, desplazamiento)
+                    desplazamiento += len(linea)
+            return True
+
+    def buscar(self, hash_hex):
+        """
+        Busca los recibos de un hash en este fragmento.
+
+        Returns:
+            list: Recibos, o None si el fragmento se dividió
+        """
+        with self.lock:
+            if self.retirado:
+                return None
+            if not self.indice_al_dia:
+                self._poner_indice_al_dia()
+            desplazamientos = [d for d, _ in self.indice.buscar(hash_hex)]
+            return self.registro.leer(desplazamientos) if desplazamientos else []
+
+    def preparar_indice(self):
+        """Pone el índice al día si aún no lo está (sin esperar a una búsqueda)."""
+        with self.lock:
+            if not (self.retirado or self.cerrado or self.indice_al_dia):
+                self._poner_indice_al_dia()
+
+    def tamano(self):
+        """Tamaño del fragmento en bytes (0 si se dividió)."""
+        with self.lock:
+            return 0 if self.retirado else self.registro.tamano()
+
+    def ultimo(self):
+        """Último recibo del fragmento (None si está vacío o se dividió)."""
+        with self.lock:
+            return None if self.retirado else self.registro.ultimo()
+
+    def _indexar(self, linea, desplazamiento):
+        recibo = json.loads(linea)
+        self.indice.agregar(recibo['hash'], desplazamiento, recibo['timestamp'], desplazamiento + len(linea))
+
+    def _poner_indice_al_dia(self):
+        """Indexa los recibos que el índice en disco aún no cubre."""
+        if self.indice.cubierto > self.registro.tamano():
+            # El índice no corresponde a este fragmento: reconstruirlo
+            self.indice.reiniciar()
+        inicio = self.indice.cubierto
+        for siguiente, linea in leer_registro(self.registro.ruta, inicio):
+            if linea.strip():
+                self._indexar(linea, inicio)
+            inicio = siguiente
+        self.indice_al_dia = True
+
+    def cerrar(self, fusionar_indice=True):
+        """
+        Cierra el registro y el índice del fragmento.
+
+        Args:
+            fusionar_indice (bool): Volcar el búfer del índice a disco
+        """
+        self.cerrado = True
+        self.registro.cerrar()
+        self.indice.cerrar(fusionar=fusionar_indice)
+
+
+class AlmacenRecibos:
+    """
+    Almacén de recibos repartido en fragmentos por prefijo del hash.
+
+    Las escrituras se enrutan sin lock global: solo se bloquea el fragmento
+    destino. Con `tamano_maximo`, un fragmento que lo supera se divide en
+    segundo plano mientras el almacén sigue atendiendo escrituras. Los
+    índices de los fragmentos se ponen al día en segundo plano al abrir el
+    almacén y tras cada división.
+    """
+
+    def __init__(self, directorio, fragmentos=16, tamano_maximo=None, fsync=False,
+                 limite_buffer_indice=50000):
+        """
+        Args:
+            directorio (str): Directorio del almacén (se crea si no existe)
+            fragmentos (int): Fragmentos iniciales (1, 16, 256 o 4096); se
+                              ignora si el almacén ya existe
+            tamano_maximo (int, optional): Bytes a partir de los que un
+                                           fragmento se divide automáticamente
+            fsync (bool): Forzar cada escritura a disco
+            limite_buffer_indice (int): Entradas en memoria por índice de
+                                        fragmento antes de fusionarlas a disco
+
+        Raises:
+            AlmacenEnUsoError: Si otro proceso tiene el almacén abierto
+        """
+        self.directorio = directorio
+        self.tamano_maximo = tamano_maximo
+        self.fsync = fsync
+        self.limite_buffer_indice = limite_buffer_indice
+        os.makedirs(directorio, exist_ok=True)
+        self._bloqueo = bloquear_almacen(directorio)
+        self._lock = threading.Lock()
+        self._dividiendo = set()
+        self._cerrado = False
+
+        prefijos = leer_manifiesto(directorio)
+        if prefijos is None:
+            longitud = 0
+            while 16 ** longitud < fragmentos:
+                longitud += 1
+            if 16 ** longitud != fragmentos:
+                self._bloqueo.close()
+                raise ValueError("El número de fragmentos debe ser una potencia de 16 (1, 16, 256, 4096)")
+            prefijos = self._expandir('', longitud)
+            self._guardar_manifiesto(prefijos)
+
+        self._fragmentos = {p: self._abrir(p) for p in prefijos}
+        self._longitudes = sorted({len(p) for p in prefijos}, reverse=True)
+        self._preparar_indices_en_segundo_plano(prefijos)
+
+    @staticmethod
+    def _expandir(prefijo, longitud):
+        prefijos = [prefijo]
+        for _ in range(longitud):
+            prefijos = [p + d for p in prefijos for d in DIGITOS_HEX]
+        return prefijos
+
+    def _abrir(self, prefijo):
+        return FragmentoRecibos(prefijo, self.ruta_fragmento(prefijo), fsync=self.fsync,
+                                limite_buffer_indice=self.limite_buffer_indice)
+
+    def _guardar_manifiesto(self, prefijos):
+        ruta = os.path.join(self.directorio, MANIFIESTO)
+        with open(ruta + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump({"version": 1, "prefijos": sorted(prefijos)}, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(ruta + '.tmp', ruta)
+
+    def ruta_fragmento(self, prefijo):
+        """Ruta del archivo de un fragmento."""
+        return os.path.join(self.directorio, nombre_fragmento(prefijo))
+
+    def prefijos(self):
+        """Prefijos de los fragmentos actuales, ordenados."""
+        return sorted(self._fragmentos)
+
+    def fragmento(self, hash_hex):
+        """
+        Obtiene el fragmento que cubre un hash.
+
+        Args:
+            hash_hex (str): Hash en hexadecimal (minúsculas)
+
+        Returns:
+            FragmentoRecibos: Fragmento responsable del hash
+        """
+        fragmentos = self._fragmentos
+        for longitud in self._longitudes:
+            fragmento = fragmentos.get(hash_hex[:longitud])
+            if fragmento is not None:
+                return fragmento
+        raise KeyError(f"Ningún fragmento cubre el hash {hash_hex[:16]}...")
+
+    def agregar(self, recibo):
+        """
+        Anexa un recibo a su fragmento.
+
+        Args:
+            recibo (dict): Recibo a registrar
+
+        Returns:
+            tuple: (prefijo del fragmento, desplazamiento)
+        """
+        while True:
+            fragmento = self.fragmento(recibo['hash'])
+            desplazamiento = fragmento.agregar(recibo)
+            if desplazamiento is not None:
+                break
+
+        if self.tamano_maximo and desplazamiento >= self.tamano_maximo:
+            self._dividir_en_segundo_plano(fragmento.prefijo)
+        return fragmento.prefijo, desplazamiento
+
+    def anexar_lineas(self, prefijo, lineas):
+        """
+        Anexa líneas copiadas tal cual al fragmento `prefijo` (réplicas).
+
+        Args:
+            prefijo (str): Prefijo del fragmento
+            lineas (list): Líneas JSON completas en bytes
+        """
+        if not self._fragmentos[prefijo].anexar_lineas(lineas):
+            raise RuntimeError(f"El fragmento '{prefijo}' se dividió durante la escritura")
+
+    def buscar(self, hash_hex):
+        """
+        Busca los recibos emitidos para un hash (lee un único fragmento).
+
+        Args:
+            hash_hex (str): Hash en formato hexadecimal
+
+        Returns:
+            list: Recibos cuyo hash coincide
+        """
+        hash_hex = hash_hex.lower()
+        while True:
+            recibos = self.fragmento(hash_hex).buscar(hash_hex)
+            if recibos is not None:
+                return recibos
+
+    def iterar(self):
+        """
+        Recorre todos los recibos, fragmento a fragmento.
+
+        Yields:
+            tuple: (prefijo, recibo)
+        """
+        for prefijo in self.prefijos():
+            fragmento = self._fragmentos.get(prefijo)
+            if fragmento is None:
+                continue
+            for _, recibo in fragmento.registro.iterar():
+                yield prefijo, recibo
+
+    def ultimo(self):
+        """
+        Devuelve el recibo más reciente del almacén.
+
+        Returns:
+            dict: Recibo con mayor (timestamp, secuencia), o None si está vacío
+        """
+        ultimos = [f.ultimo() for f in list(self._fragmentos.values())]
+        ultimos = [r for r in ultimos if r is not None]
+        if not ultimos:
+            return None
+        return max(ultimos, key=lambda r: (r['timestamp'], r.get('secuencia', -1)))
+
+    def tamano(self):
+        """Tamaño total en bytes de todos los fragmentos."""
+        return sum(f.tamano() for f in list(self._fragmentos.values()))
+
+    def tamano_fragmento(self, prefijo):
+        """Tamaño en bytes de un fragmento."""
+        return self._fragmentos[prefijo].tamano()
+
+    def dividir(self, prefijo):
+        """
+        Divide un fragmento en 16 hijos según el siguiente dígito del hash.
+
+        Las escrituras dirigidas al fragmento esperan mientras se copia; las
+        del resto de fragmentos continúan. La división es determinista (cada
+        hijo conserva el orden de sus líneas), lo que permite a una réplica
+        reproducirla sobre su propia copia.
+
+        Args:
+            prefijo (str): Prefijo del fragmento a dividir
+
+        Returns:
+            list: Prefijos de los hijos
+        """
+        with self._lock:
+            if prefijo not in self._fragmentos:
+                raise ValueError(f"No existe el fragmento '{prefijo}'")
+            if len(prefijo) >= 64:
+                raise ValueError("El fragmento ya cubre un único hash")
+
+            padre = self._fragmentos[prefijo]
+            with padre.lock:
+                hijos = [prefijo + d for d in DIGITOS_HEX]
+                archivos = {h: open(self.ruta_fragmento(h), 'wb') for h in hijos}
+                try:
+                    for _, linea in leer_registro(padre.registro.ruta):
+                        if linea.strip():
+                            archivos[json.loads(linea)['hash'][:len(prefijo) + 1]].write(linea)
+                    for archivo in archivos.values():
+                        archivo.flush()
+                        os.fsync(archivo.fileno())
+                finally:
+                    for archivo in archivos.values():
+                        archivo.close()
+
+                # El manifiesto es el punto de confirmación de la división
+                self._guardar_manifiesto([p for p in self._fragmentos if p != prefijo] + hijos)
+                for hijo in hijos:
+                    # Un índice previo (división interrumpida) no corresponde al hijo nuevo
+                    indice_previo = os.path.splitext(self.ruta_fragmento(hijo))[0] + '.idx'
+                    if os.path.exists(indice_previo):
+                        os.remove(indice_previo)
+                    self._fragmentos[hijo] = self._abrir(hijo)
+                self._longitudes = sorted({len(p) for p in self._fragmentos if p != prefijo}, reverse=True)
+                padre.retirado = True
+                del self._fragmentos[prefijo]
+                padre.cerrar(fusionar_indice=False)
+                os.remove(padre.registro.ruta)
+                os.remove(padre.indice.ruta)
+            self._preparar_indices_en_segundo_plano(hijos)
+            return hijos
+
+    def dividir_mayores(self, limite):
+        """
+        Divide (recursivamente) los fragmentos mayores de `limite` bytes.
+
+        Args:
+            limite (int): Tamaño máximo en bytes
+
+        Returns:
+            list: Prefijos de los fragmentos divididos, en orden
+        """
+        divididos = []
+        while True:
+            grandes = sorted(p for p, f in list(self._fragmentos.items()) if f.tamano() > limite)
+            if not grandes:
+                return divididos
+            for prefijo in grandes:
+                if prefijo in self._fragmentos:
+                    self.dividir(prefijo)
+                    divididos.append(prefijo)
+
+    def _dividir_en_segundo_plano(self, prefijo):
+        with self._lock:
+            if prefijo in self._dividiendo:
+                return
+            self._dividiendo.add(prefijo)
+
+        def dividir():
+            try:
+                hijos = self.dividir(prefijo)
+                print(f"🪓 Fragmento '{prefijo}' dividido en {len(hijos)}")
+            except Exception as e:
+                print(f"❌ Error dividiendo el fragmento '{prefijo}': {e}")
+            finally:
+                with self._lock:
+                    self._dividiendo.discard(prefijo)
+
+        threading.Thread(target=dividir, name=f"dividir-{prefijo}", daemon=True).start()
+
+    def _preparar_indices_en_segundo_plano(self, prefijos):
+        """Indexa la cola pendiente de cada fragmento sin bloquear al llamante."""
+        def preparar():
+            for prefijo in prefijos:
+                if self._cerrado:
+                    return
+                fragmento = self._fragmentos.get(prefijo)
+                if fragmento is None:
+                    continue
+                try:
+                    fragmento.preparar_indice()
+                except Exception as e:
+                    print(f"❌ Error indexando el fragmento '{prefijo}': {e}")
+
+        threading.Thread(target=preparar, name="indexar-fragmentos", daemon=True).start()
+
+    def importar(self, ruta):
+        """
+        Importa un registro plano JSON Lines (formato anterior al fragmentado).
+
+        Args:
+            ruta (str): Ruta del registro
+
+        Returns:
+            int: Recibos importados
+        """
+        grupos = {}
+        importados = 0
+        for _, linea in leer_registro(ruta):
+            if linea.strip():
+                prefijo = self.fragmento(json.loads(linea)['hash']).prefijo
+                grupos.setdefault(prefijo, []).append(linea)
+                importados += 1
+        for prefijo, lineas in grupos.items():
+            self.anexar_lineas(prefijo, lineas)
+        return importados
+
+    def estadisticas(self):
+        """Resumen del almacén para el endpoint de métricas."""
+        fragmentos = list(self._fragmentos.values())
+        tamanos = [f.tamano() for f in fragmentos]
+        indices = [f.indice.estadisticas() for f in fragmentos if not f.retirado]
+        return {
+            "fragmentos": len(tamanos),
+            "bytes": sum(tamanos),
+            "bytes_fragmento_mayor": max(tamanos) if tamanos else 0,
+            "tamano_maximo": self.tamano_maximo,
+            "indice_entradas_disco": sum(i["entradas_disco"] for i in indices),
+            "indice_entradas_buffer": sum(i["entradas_buffer"] for i in indices)
+        }
+
+    def cerrar(self):
+        """Cierra los fragmentos volcando sus índices a disco y libera el bloqueo."""
+        with self._lock:
+            self._cerrado = True
+            for fragmento in self._fragmentos.values():
+                with fragmento.lock:
+                    fragmento.cerrar()
+            self._bloqueo.close()
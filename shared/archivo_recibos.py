@@ -0,0 +1,489 @@
+"""
+Archivo de recibos: muchos recibos en un único archivo comprimido.
+
+Un JSON por recibo en receipts/ se vuelve lento de copiar, listar y recorrer
+cuando hay millones. Este formato agrupa los recibos en bloques comprimidos
+con zlib (cada uno con sus recibos en JSON compacto, uno por línea) y termina
+con un índice ordenado por hash que apunta al bloque y a la posición de cada
+recibo:
+
+    NDARC001 | bloque | bloque | ... | fin de bloques | índice | pie
+
+- Buscar por hash es una búsqueda binaria sobre el índice mapeado con `mmap`
+  y la descompresión de un solo bloque.
+- Recorrerlo en orden no necesita el índice: los bloques se leen uno tras
+  otro, incluso desde una tubería.
+- Añadir recibos a un archivo existente reescribe solo el índice. Si el
+  proceso se interrumpió antes de escribirlo, al reabrir el archivo se
+  recuperan los bloques completos y se descarta el resto.
+
+Uso:
+    python shared/archivo_recibos.py empaquetar [receipts] recibos.ndarc
+    python shared/archivo_recibos.py desempaquetar recibos.ndarc [receipts]
+    python shared/archivo_recibos.py buscar recibos.ndarc HASH
+    python shared/archivo_recibos.py listar recibos.ndarc
+"""
+
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+import threading
+import zlib
+from collections import OrderedDict
+
+# Agregar el directorio shared al path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from shared.crypto_utils import es_archivo_recibo, guardar_recibo, nombre_archivo_recibo
+
+
+RAIZ = os.path.join(os.path.dirname(__file__), '..')
+
+_MAGIA = b'NDARC001'
+# Cabecera de bloque: bytes comprimidos y número de recibos (0 marca el fin de los bloques)
+_BLOQUE = struct.Struct('<II')
+# Registro del índice: hash, desplazamiento del bloque y posición del recibo en el bloque
+_REGISTRO = struct.Struct('<32sQI')
+TAMANO_REGISTRO = _REGISTRO.size
+# Pie: magia, inicio del índice, entradas del índice y número de bloques
+_MAGIA_PIE = b'NDARCFIN'
+_PIE = struct.Struct('<8sQQQ')
+
+
+def _recorrer_bloques(archivo):
+    """
+    Lee en orden los bloques de un archivo de recibos abierto tras la magia.
+
+    Se detiene en el marcador de fin de bloques o en el primer bloque
+    incompleto o dañado (archivo truncado).
+
+    Yields:
+        tuple: (desplazamiento, fin, líneas del bloque)
+    """
+    desplazamiento = len(_MAGIA)
+    while True:
+        cabecera = archivo.read(_BLOQUE.size)
+        if len(cabecera) < _BLOQUE.size:
+            return
+        longitud, cantidad = _BLOQUE.unpack(cabecera)
+        if cantidad == 0:
+            return
+        comprimido = archivo.read(longitud)
+        if len(comprimido) < longitud:
+            return
+        try:
+            lineas = zlib.decompress(comprimido).split(b'\n')
+        except zlib.error:
+            return
+        if len(lineas) != cantidad:
+            return
+        fin = desplazamiento + _BLOQUE.size + longitud
+        yield desplazamiento, fin, lineas
+        desplazamiento = fin
+
+
+def iterar_recibos(archivo):
+    """
+    Recorre en orden los recibos de un archivo de recibos sin usar su índice.
+
+    Args:
+        archivo: Ruta o archivo binario abierto al inicio (sirve una tubería)
+
+    Yields:
+        dict: Cada recibo, en el orden en que se añadió
+    """
+    if isinstance(archivo, (str, os.PathLike)):
+        with open(archivo, 'rb') as f:
+            yield from iterar_recibos(f)
+        return
+    if archivo.read(len(_MAGIA)) != _MAGIA:
+        raise ValueError("No es un archivo de recibos")
+    for _, _, lineas in _recorrer_bloques(archivo):
+        for linea in lineas:
+            yield json.loads(linea)
+
+
+class EscritorArchivoRecibos:
+    """
+    Añade recibos a un archivo de recibos (lo crea si no existe).
+
+    Los registros del índice se mantienen en memoria hasta `cerrar`, que
+    escribe el último bloque, el índice ordenado y el pie.
+    """
+
+    def __init__(self, ruta, tamano_bloque=64 * 1024, nivel=6):
+        """
+        Args:
+            ruta (str): Archivo de recibos
+            tamano_bloque (int): Bytes de JSON sin comprimir por bloque
+            nivel (int): Nivel de compresión de zlib (1-9)
+        """
+        self.ruta = ruta
+        self.tamano_bloque = tamano_bloque
+        self.nivel = nivel
+        self._registros = []
+        self._claves = []
+        self._lineas = []
+        self._tamano_pendiente = 0
+        self.bloques = 0
+
+        if os.path.exists(ruta) and os.path.getsize(ruta) > 0:
+            self._archivo = open(ruta, 'r+b')
+            self._reabrir()
+        else:
+            self._archivo = open(ruta, 'wb')
+            self._archivo.write(_MAGIA)
+
+    def _reabrir(self):
+        """Carga el índice existente y sitúa la escritura donde empezaba."""
+        f = self._archivo
+        if f.read(len(_MAGIA)) != _MAGIA:
+            f.close()
+            raise ValueError(f"{self.ruta} no es un archivo de recibos")
+
+        tamano = os.fstat(f.fileno()).st_size
+        pie = None
+        if tamano >= len(_MAGIA) + _PIE.size:
+            f.seek(tamano - _PIE.size)
+            pie = _PIE.unpack(f.read(_PIE.size))
+
+        if pie is not None and pie[0] == _MAGIA_PIE:
+            _, inicio_indice, entradas, self.bloques = pie
+            f.seek(inicio_indice)
+            datos = f.read(entradas * TAMANO_REGISTRO)
+            self._registros = list(_REGISTRO.iter_unpack(datos))
+            # Los bloques nuevos sustituyen al marcador de fin y al índice
+            fin = inicio_indice - _BLOQUE.size
+        else:
+            # Sin pie: el proceso que escribía no llegó a cerrarlo
+            f.seek(len(_MAGIA))
+            fin = len(_MAGIA)
+            for desplazamiento, fin, lineas in _recorrer_bloques(f):
+                for posicion, linea in enumerate(lineas):
+                    clave = bytes.fromhex(json.loads(linea)['hash'])
+                    self._registros.append((clave, desplazamiento, posicion))
+                self.bloques += 1
+            print(f"⚠️  {self.ruta} no se cerró correctamente; recuperados "
+                  f"{len(self._registros)} recibos en {self.bloques} bloques", file=sys.stderr)
+
+        f.truncate(fin)
+        f.seek(fin)
+
+    def agregar(self, recibo):
+        """
+        Añade un recibo.
+
+        Args:
+            recibo (dict): Recibo con al menos 'hash' (64 caracteres hexadecimales)
+        """
+        clave = bytes.fromhex(recibo['hash'])
+        if len(clave) != 32:
+            raise ValueError(f"Hash de recibo no válido: {recibo['hash']}")
+        linea = json.dumps(recibo, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        self._claves.append(clave)
+        self._lineas.append(linea)
+        self._tamano_pendiente += len(linea) + 1
+        if self._tamano_pendiente >= self.tamano_bloque:
+            self._vaciar_bloque()
+
+    def _vaciar_bloque(self):
+        if not self._lineas:
+            return
+        desplazamiento = self._archivo.tell()
+        comprimido = zlib.compress(b'\n'.join(self._lineas), self.nivel)
+        self._archivo.write(_BLOQUE.pack(len(comprimido), len(self._lineas)))
+        self._archivo.write(comprimido)
+        self._registros.extend((clave, desplazamiento, posicion)
+                               for posicion, clave in enumerate(self._claves))
+        self._claves = []
+        self._lineas = []
+        self._tamano_pendiente = 0
+        self.bloques += 1
+
+    def __len__(self):
+        return len(self._registros) + len(self._claves)
+
+    def cerrar(self):
+        """Escribe el último bloque, el índice y el pie, y cierra el archivo."""
+        if self._archivo is None:
+            return
+        self._vaciar_bloque()
+        self._archivo.write(_BLOQUE.pack(0, 0))
+        inicio_indice = self._archivo.tell()
+        self._registros.sort()
+        for primero in range(0, len(self._registros), 4096):
+            self._archivo.write(b''.join(_REGISTRO.pack(*registro)
+                                         for registro in self._registros[primero:primero + 4096]))
+        self._archivo.write(_PIE.pack(_MAGIA_PIE, inicio_indice, len(self._registros), self.bloques))
+        self._archivo.flush()
+        os.fsync(self._archivo.fileno())
+        self._archivo.close()
+        self._archivo = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.cerrar()
+
+
+class LectorArchivoRecibos:
+    """Acceso aleatorio por hash a un archivo de recibos cerrado."""
+
+    def __init__(self, ruta, bloques_en_cache=8):
+        """
+        Args:
+            ruta (str): Archivo de recibos
+            bloques_en_cache (int): Bloques descomprimidos que se conservan
+        """
+        self.ruta = ruta
+        self.bloques_en_cache = bloques_en_cache
+        self._archivo = open(ruta, 'rb')
+        tamano = os.fstat(self._archivo.fileno()).st_size
+        if self._archivo.read(len(_MAGIA)) != _MAGIA or tamano < len(_MAGIA) + _PIE.size:
+            self._archivo.close()
+            raise ValueError(f"{ruta} no es un archivo de recibos")
+        self._mapa = mmap.mmap(self._archivo.fileno(), 0, access=mmap.ACCESS_READ)
+        magia, self._inicio_indice, self.entradas, self.bloques = _PIE.unpack_from(
+            self._mapa, tamano - _PIE.size)
+        if magia != _MAGIA_PIE:
+            self.cerrar()
+            raise ValueError(f"{ruta} no tiene índice (no se cerró); "
+                             "reabrirlo con EscritorArchivoRecibos lo recupera")
+        self._lock = threading.Lock()
+        self._cache = OrderedDict()
+
+    def __len__(self):
+        return self.entradas
+
+    def _bloque(self, desplazamiento):
+        """Líneas de un bloque, desde la caché si se leyó hace poco."""
+        with self._lock:
+            lineas = self._cache.get(desplazamiento)
+            if lineas is not None:
+                self._cache.move_to_end(desplazamiento)
+                return lineas
+        longitud, _ = _BLOQUE.unpack_from(self._mapa, desplazamiento)
+        inicio = desplazamiento + _BLOQUE.size
+        lineas = zlib.decompress(self._mapa[inicio:inicio + longitud]).split(b'\n')
+        with self._lock:
+            self._cache[desplazamiento] = lineas
+            if len(self._cache) > self.bloques_en_cache:
+                self._cache.popitem(last=False)
+        return lineas
+
+    def _ubicaciones(self, clave):
+        """Búsqueda binaria del primer registro con el hash y recorrido de los iguales."""
+        mapa = self._mapa
+        bajo, alto = 0, self.entradas
+        while bajo < alto:
+            medio = (bajo + alto) // 2
+            inicio = self._inicio_indice + medio * TAMANO_REGISTRO
+            if mapa[inicio:inicio + 32] < clave:
+                bajo = medio + 1
+            else:
+                alto = medio
+
+        ubicaciones = []
+        inicio = self._inicio_indice + bajo * TAMANO_REGISTRO
+        while bajo < self.entradas and mapa[inicio:inicio + 32] == clave:
+            _, desplazamiento, posicion = _REGISTRO.unpack_from(mapa, inicio)
+            ubicaciones.append((desplazamiento, posicion))
+            bajo += 1
+            inicio += TAMANO_REGISTRO
+        return ubicaciones
+
+    def buscar(self, hash_hex):
+        """
+        Recibos de un hash.
+
+        Args:
+            hash_hex (str): Hash (o raíz Merkle) del documento
+
+        Returns:
+            list: Recibos en el orden en que se añadieron
+        """
+        try:
+            clave = bytes.fromhex(hash_hex)
+        except ValueError:
+            return []
+        return [json.loads(self._bloque(desplazamiento)[posicion])
+                for desplazamiento, posicion in self._ubicaciones(clave)]
+
+    def __contains__(self, hash_hex):
+        try:
+            return bool(self._ubicaciones(bytes.fromhex(hash_hex)))
+        except ValueError:
+            return False
+
+    def iterar(self):
+        """
+        Recorre todos los recibos en el orden en que se añadieron.
+
+        Yields:
+            dict: Cada recibo
+        """
+        with open(self.ruta, 'rb') as f:
+            yield from iterar_recibos(f)
+
+    def cerrar(self):
+        """Libera el mapa y el archivo."""
+        if self._mapa is not None:
+            self._mapa.close()
+            self._mapa = None
+        if self._archivo is not None:
+            self._archivo.close()
+            self._archivo = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.cerrar()
+
+
+def cargar_de_archivo(ruta_archivo, hash_hex):
+    """
+    Carga el recibo más reciente de un hash desde un archivo de recibos.
+
+    Args:
+        ruta_archivo (str): Archivo de recibos
+        hash_hex (str): Hash del documento
+
+    Returns:
+        dict: Recibo (si hay varios, el de timestamp más reciente)
+
+    Raises:
+        KeyError: Si el archivo no tiene recibos de ese hash
+    """
+    with LectorArchivoRecibos(ruta_archivo) as lector:
+        recibos = lector.buscar(hash_hex.lower())
+    if not recibos:
+        raise KeyError(f"{hash_hex} no está en {ruta_archivo}")
+    return max(reversed(recibos), key=lambda recibo: recibo.get('timestamp', ''))
+
+
+def _clave_recibo(recibo):
+    """Identidad compacta de un recibo: digest de su hash, timestamp y firma."""
+    texto = f"{recibo['hash'].lower()}|{recibo['timestamp']}|{recibo['firma']}"
+    return hashlib.blake2b(texto.encode('utf-8'), digest_size=16).digest()
+
+
+def empaquetar_directorio(directorio, ruta_archivo, tamano_bloque=64 * 1024):
+    """
+    Añade a un archivo de recibos los recibos JSON de un directorio.
+
+    Es idempotente: los recibos que ya están en el archivo (mismo hash,
+    timestamp y firma) no se vuelven a añadir, así que empaquetar dos veces
+    el mismo directorio no duplica nada.
+
+    Args:
+        directorio (str): Directorio con la estructura de receipts/
+        ruta_archivo (str): Archivo de recibos (se crea o se amplía)
+        tamano_bloque (int): Ver `EscritorArchivoRecibos`
+
+    Returns:
+        dict: Recibos empaquetados, repetidos (ya estaban) e ignorados (no válidos)
+    """
+    nombres = sorted(nombre for nombre in os.listdir(directorio)
+                     if es_archivo_recibo(nombre))
+    empaquetados = repetidos = ignorados = 0
+    with EscritorArchivoRecibos(ruta_archivo, tamano_bloque=tamano_bloque) as escritor:
+        # El escritor ya recuperó los bloques completos de un archivo existente
+        presentes = {_clave_recibo(r) for r in iterar_recibos(ruta_archivo)} if len(escritor) else set()
+        for nombre in nombres:
+            try:
+                with open(os.path.join(directorio, nombre), 'r', encoding='utf-8') as f:
+                    recibo = json.load(f)
+                clave = _clave_recibo(recibo)
+                if clave in presentes:
+                    repetidos += 1
+                    continue
+                escritor.agregar(recibo)
+                presentes.add(clave)
+                empaquetados += 1
+            except (OSError, ValueError, KeyError, TypeError, AttributeError):
+                ignorados += 1
+    return {"empaquetados": empaquetados, "repetidos": repetidos, "ignorados": ignorados}
+
+
+def desempaquetar_archivo(ruta_archivo, directorio):
+    """
+    Escribe cada recibo de un archivo de recibos como un JSON en un directorio.
+
+    Los nombres se generan igual que al guardar un recibo recibido del servidor.
+
+    Args:
+        ruta_archivo (str): Archivo de recibos
+        directorio (str): Directorio de destino (se crea si no existe)
+
+    Returns:
+        int: Recibos escritos
+    """
+    os.makedirs(directorio, exist_ok=True)
+    escritos = 0
+    for recibo in iterar_recibos(ruta_archivo):
+        guardar_recibo(recibo, os.path.join(directorio, nombre_archivo_recibo(recibo)))
+        escritos += 1
+    return escritos
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Archivos de recibos comprimidos con índice por hash")
+    subparsers = parser.add_subparsers(dest='orden', required=True)
+
+    empaquetar = subparsers.add_parser('empaquetar', help="Empaqueta un directorio de recibos")
+    empaquetar.add_argument('directorio', nargs='?', default=os.path.join(RAIZ, 'receipts'),
+                            help="Directorio de recibos (por defecto: receipts)")
+    empaquetar.add_argument('archivo', help="Archivo de recibos (se crea o se amplía)")
+    empaquetar.add_argument('--bloque-kb', type=int, default=64,
+                            help="KB de recibos sin comprimir por bloque (por defecto: 64)")
+
+    desempaquetar = subparsers.add_parser('desempaquetar', help="Extrae los recibos a un directorio")
+    desempaquetar.add_argument('archivo', help="Archivo de recibos")
+    desempaquetar.add_argument('directorio', nargs='?', default=os.path.join(RAIZ, 'receipts'),
+                               help="Directorio de destino (por defecto: receipts)")
+
+    buscar = subparsers.add_parser('buscar', help="Muestra los recibos de un hash")
+    buscar.add_argument('archivo', help="Archivo de recibos")
+    buscar.add_argument('hash', help="Hash del documento")
+
+    listar = subparsers.add_parser('listar', help="Escribe todos los recibos como líneas JSON")
+    listar.add_argument('archivo', help="Archivo de recibos")
+
+    args = parser.parse_args()
+
+    try:
+        if args.orden == 'empaquetar':
+            resultado = empaquetar_directorio(args.directorio, args.archivo,
+                                              tamano_bloque=args.bloque_kb * 1024)
+            print(f"📦 {resultado['empaquetados']} recibos empaquetados en {args.archivo}")
+            if resultado['repetidos']:
+                print(f"↩️  {resultado['repetidos']} recibos ya estaban en el archivo")
+            if resultado['ignorados']:
+                print(f"⚠️  {resultado['ignorados']} archivos no válidos ignorados")
+        elif args.orden == 'desempaquetar':
+            escritos = desempaquetar_archivo(args.archivo, args.directorio)
+            print(f"📂 {escritos} recibos escritos en {args.directorio}")
+        elif args.orden == 'buscar':
+            with LectorArchivoRecibos(args.archivo) as lector:
+                recibos = lector.buscar(args.hash.lower())
+            for recibo in recibos:
+                print(json.dumps(recibo, indent=2, ensure_ascii=False))
+            if not recibos:
+                print(f"❌ No hay recibos de {args.hash}", file=sys.stderr)
+                return 1
+        else:
+            for recibo in iterar_recibos(args.archivo):
+                print(json.dumps(recibo, ensure_ascii=False))
+    except (OSError, ValueError) as e:
+        print(f"❌ {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,285 @@
+"""
+Auditoría de la cadena de recibos del Notario Digital.
+
+Divide la cadena en segmentos y verifica las firmas y el encadenamiento
+interno de cada segmento en paralelo (un proceso por núcleo). Después
+comprueba secuencialmente el enlace en las fronteras entre segmentos y los
+extremos: la cadena debe empezar en el génesis (o en el ancla indicada) y,
+si se indica la cabeza esperada, terminar en ella.
+
+Uso:
+    python shared/auditar_cadena.py [datos/recibos | registro.jsonl] [--claves DIR] [--procesos N]
+                                    [--desde SECUENCIA:DIGEST] [--cabeza SECUENCIA:DIGEST]
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+# Agregar el directorio shared al path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from shared.crypto_utils import NotarioCrypto, CURVAS_SOPORTADAS, DESCRIPCION_MOTIVOS
+from shared.cadena_recibos import DIGEST_GENESIS, digest_recibo, es_encadenado
+from shared.almacen_recibos import iterar_almacen
+from shared.recibo import ColeccionRecibos
+
+
+RAIZ = os.path.join(os.path.dirname(__file__), '..')
+
+# Verificadores por curva, cacheados en cada proceso trabajador
+_verificadores = {}
+
+# Ancla implícita del inicio de la cadena: el "recibo -1" cuyo digest es el génesis
+ANCLA_GENESIS = (-1, DIGEST_GENESIS)
+
+
+def cargar_claves_publicas(directorio):
+    """
+    Lee las claves públicas del notario de un directorio.
+
+    Args:
+        directorio (str): Carpeta con archivos notario_public_{curva}.pem
+
+    Returns:
+        dict: {curva: clave pública PEM}
+    """
+    claves = {}
+    for curva in CURVAS_SOPORTADAS:
+        ruta = os.path.join(directorio, f'notario_public_{curva.lower()}.pem')
+        if os.path.exists(ruta):
+            with open(ruta, 'r', encoding='utf-8') as f:
+                claves[curva] = f.read()
+    return claves
+
+
+def cargar_cadena(ruta):
+    """
+    Lee los recibos encadenados de un almacén fragmentado o de un registro JSON Lines.
+
+    Args:
+        ruta (str): Directorio del almacén o ruta de un registro plano
+
+    Returns:
+        ColeccionRecibos: Recibos encadenados ordenados por secuencia
+    """
+    recibos = ColeccionRecibos()
+    if os.path.isdir(ruta):
+        for recibo in iterar_almacen(ruta):
+            if es_encadenado(recibo):
+                recibos.agregar(recibo)
+    else:
+        with open(ruta, 'rb') as f:
+            for linea in f:
+                if linea.endswith(b'\n') and linea.strip():
+                    recibo = json.loads(linea)
+                    if es_encadenado(recibo):
+                        recibos.agregar(recibo)
+    # Los fragmentos reparten la cadena por hash: reordenar por secuencia
+    recibos.ordenar_por_secuencia()
+    return recibos
+
+
+def obtener_verificador(curva, claves_pem):
+    """Obtiene el verificador de una curva (uno por proceso)."""
+    if curva not in _verificadores:
+        crypto = NotarioCrypto(curva=curva)
+        crypto.importar_clave_publica_str(claves_pem[curva])
+        _verificadores[curva] = crypto
+    return _verificadores[curva]
+
+
+def verificar_segmento(tarea):
+    """
+    Verifica las firmas y el encadenamiento interno de un segmento.
+
+    Args:
+        tarea (tuple): (índice, recibos, claves_pem)
+
+    Returns:
+        dict: Extremos del segmento y lista de errores
+    """
+    indice, recibos, claves_pem = tarea
+    errores = []
+    previo = None
+
+    # Verificar las firmas por curva con una llamada por lote
+    por_curva = defaultdict(list)
+    for posicion, recibo in enumerate(recibos):
+        por_curva[recibo.get('curva', 'SECP256R1')].append(posicion)
+    motivos = [None] * len(recibos)
+    for curva, posiciones in por_curva.items():
+        if curva not in claves_pem:
+            for posicion in posiciones:
+                motivos[posicion] = f"sin clave pública para {curva}"
+            continue
+        resultados = obtener_verificador(curva, claves_pem).verificar_lote(recibos[p] for p in posiciones)
+        for posicion, motivo in zip(posiciones, resultados):
+            if motivo is not None:
+                motivos[posicion] = DESCRIPCION_MOTIVOS[motivo]
+
+    for recibo, motivo in zip(recibos, motivos):
+        secuencia = recibo['secuencia']
+        if motivo is not None:
+            errores.append({"secuencia": secuencia, "motivo": motivo})
+
+        digest = digest_recibo(recibo)
+        if previo is not None:
+            if secuencia != previo[0] + 1:
+                errores.append({"secuencia": secuencia,
+                                "motivo": f"secuencia discontinua (anterior: {previo[0]})"})
+            if recibo['anterior'] != previo[1]:
+                errores.append({"secuencia": secuencia, "motivo": "enlace roto con el recibo anterior"})
+        previo = (secuencia, digest)
+
+    return {
+        "indice": indice,
+        "primera_secuencia": recibos[0]['secuencia'],
+        "primer_anterior": recibos[0]['anterior'],
+        "ultima_secuencia": previo[0],
+        "ultimo_digest": previo[1],
+        "errores": errores,
+    }
+
+
+def parsear_extremo(texto):
+    """
+    Interpreta un extremo de la cadena escrito como 'SECUENCIA:DIGEST'.
+
+    Args:
+        texto (str): Extremo en texto
+
+    Returns:
+        tuple: (secuencia, digest)
+    """
+    secuencia, separador, digest = texto.partition(':')
+    if not separador or len(digest) != 64:
+        raise ValueError(f"Extremo inválido (se espera SECUENCIA:DIGEST): {texto}")
+    return int(secuencia), digest.lower()
+
+
+def auditar_cadena(recibos, claves_pem, procesos=None, segmentos=None, ancla=None, cabeza=None):
+    """
+    Audita una cadena completa de recibos.
+
+    Sin `ancla`, el primer recibo debe ser el génesis (secuencia 0 enlazada
+    con DIGEST_GENESIS): si falta la cabeza de la cadena, la auditoría falla.
+    Un recorte del final solo se detecta indicando la `cabeza` esperada (por
+    ejemplo, la que publica el servidor en /metricas).
+
+    Args:
+        recibos (list | ColeccionRecibos): Recibos encadenados en orden
+        claves_pem (dict): {curva: clave pública PEM}
+        procesos (int, optional): Procesos trabajadores (por defecto, núcleos de CPU)
+        segmentos (int, optional): Número de segmentos (por defecto, 4 por proceso)
+        ancla (tuple, optional): (secuencia, digest) del recibo inmediatamente
+                                 anterior al primero auditado, para auditar
+                                 un tramo que no empieza en el génesis
+        cabeza (tuple, optional): (secuencia, digest) del último recibo esperado
+
+    Returns:
+        dict: Resumen con {recibos, segmentos, valida, errores, segundos}
+    """
+    inicio = time.perf_counter()
+    ancla = ancla or ANCLA_GENESIS
+    procesos = procesos or os.cpu_count() or 1
+    segmentos = max(1, min(segmentos or procesos * 4, len(recibos)))
+    errores = []
+
+    if recibos:
+        tamano = -(-len(recibos) // segmentos)
+        tareas = [(i, recibos[desde:desde + tamano], claves_pem)
+                  for i, desde in enumerate(range(0, len(recibos), tamano))]
+
+        if procesos > 1 and len(tareas) > 1:
+            with ProcessPoolExecutor(max_workers=procesos) as ejecutor:
+                resultados = list(ejecutor.map(verificar_segmento, tareas))
+        else:
+            resultados = [verificar_segmento(t) for t in tareas]
+
+        # Inicio de la cadena: el génesis o el ancla indicada
+        primero = resultados[0]
+        if primero["primera_secuencia"] != ancla[0] + 1:
+            errores.append({"secuencia": primero["primera_secuencia"],
+                            "motivo": f"faltan recibos al inicio (se esperaba la secuencia {ancla[0] + 1})"})
+        elif primero["primer_anterior"] != ancla[1]:
+            errores.append({"secuencia": primero["primera_secuencia"],
+                            "motivo": "el primer recibo no enlaza con el génesis" if ancla == ANCLA_GENESIS
+                            else "el primer recibo no enlaza con el ancla"})
+
+        # Fronteras entre segmentos (secuencial)
+        for previo, actual in zip(resultados, resultados[1:]):
+            if actual["primera_secuencia"] != previo["ultima_secuencia"] + 1:
+                errores.append({"secuencia": actual["primera_secuencia"],
+                                "motivo": f"secuencia discontinua (anterior: {previo['ultima_secuencia']})"})
+            if actual["primer_anterior"] != previo["ultimo_digest"]:
+                errores.append({"secuencia": actual["primera_secuencia"],
+                                "motivo": "enlace roto con el recibo anterior"})
+
+        for resultado in resultados:
+            errores.extend(resultado["errores"])
+        final = (resultados[-1]["ultima_secuencia"], resultados[-1]["ultimo_digest"])
+    else:
+        final = ancla
+
+    # Final de la cadena
+    if cabeza is not None and final != (cabeza[0], cabeza[1].lower()):
+        if final[0] < cabeza[0]:
+            motivo = f"faltan recibos al final (se esperaba llegar a la secuencia {cabeza[0]})"
+        else:
+            motivo = "el último recibo no coincide con la cabeza esperada"
+        errores.append({"secuencia": final[0], "motivo": motivo})
+    errores.sort(key=lambda e: e["secuencia"])
+
+    return {
+        "recibos": len(recibos),
+        "segmentos": segmentos if recibos else 0,
+        "procesos": procesos,
+        "valida": not errores,
+        "errores": errores,
+        "segundos": time.perf_counter() - inicio,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Audita la cadena de recibos del Notario Digital")
+    parser.add_argument('registro', nargs='?',
+                        default=os.path.join(RAIZ, 'datos', 'recibos'),
+                        help="Almacén de recibos o registro JSON Lines (por defecto: datos/recibos)")
+    parser.add_argument('--claves', default=os.path.join(RAIZ, 'keys'),
+                        help="Directorio con las claves públicas del notario")
+    parser.add_argument('--procesos', type=int, default=None, help="Procesos trabajadores")
+    parser.add_argument('--segmentos', type=int, default=None, help="Número de segmentos")
+    parser.add_argument('--desde', type=parsear_extremo, default=None, metavar='SECUENCIA:DIGEST',
+                        help="Recibo anterior al primero auditado (por defecto, el génesis)")
+    parser.add_argument('--cabeza', type=parsear_extremo, default=None, metavar='SECUENCIA:DIGEST',
+                        help="Último recibo esperado, para detectar recortes del final")
+    parser.add_argument('--json', action='store_true', help="Imprime el resultado en JSON")
+    args = parser.parse_args()
+
+    recibos = cargar_cadena(args.registro)
+    resumen = auditar_cadena(recibos, cargar_claves_publicas(args.claves),
+                             procesos=args.procesos, segmentos=args.segmentos,
+                             ancla=args.desde, cabeza=args.cabeza)
+
+    if args.json:
+        print(json.dumps(resumen, indent=2, ensure_ascii=False))
+    else:
+        print("=" * 60)
+        print("Auditoría de la cadena de recibos - Notario Digital")
+        print("=" * 60)
+        print(f"Recibos encadenados: {resumen['recibos']}")
+        print(f"Segmentos: {resumen['segmentos']} • Procesos: {resumen['procesos']}")
+        print(f"Tiempo: {resumen['segundos']:.2f} s")
+        for error in resumen['errores']:
+            print(f"❌ Secuencia {error['secuencia']}: {error['motivo']}")
+        print("✅ Cadena íntegra" if resumen['valida'] else f"❌ {len(resumen['errores'])} errores encontrados")
+
+    return 0 if resumen['valida'] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
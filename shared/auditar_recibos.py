@@ -0,0 +1,252 @@
+"""
+Auditoría completa de un archivo de recibos del Notario Digital.
+
+Recorre un directorio de recibos (por defecto `receipts/`), los carga con un
+parser rápido, los agrupa por curva y verifica sus firmas localmente con las
+claves públicas del notario usando un pool de procesos. Opcionalmente vuelve
+a calcular en paralelo el hash de los documentos referenciados.
+
+Uso:
+    python shared/auditar_recibos.py [directorio] [--claves DIR] [--documentos DIR]
+                                     [--procesos N] [--fallos fallos.json]
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+# Agregar el directorio shared al path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from shared.crypto_utils import CURVAS_SOPORTADAS, DESCRIPCION_MOTIVOS, es_archivo_recibo
+from shared.motor_hash import hashear_segun_modo
+from shared.auditar_cadena import cargar_claves_publicas, obtener_verificador
+
+try:
+    # Parser JSON opcional, bastante más rápido que el módulo estándar
+    import orjson
+
+    def _parsear(datos):
+        return orjson.loads(datos)
+except ImportError:
+    def _parsear(datos):
+        return json.loads(datos)
+
+
+RAIZ = os.path.join(os.path.dirname(__file__), '..')
+
+CAMPOS_OBLIGATORIOS = ('timestamp', 'hash', 'firma')
+
+
+def listar_recibos(directorio):
+    """
+    Recorre recursivamente un directorio buscando recibos (recibo_*.json).
+
+    Otros JSON del directorio (resúmenes de lote, índices) no son recibos y
+    se ignoran.
+
+    Args:
+        directorio (str): Directorio raíz
+
+    Yields:
+        str: Ruta de cada recibo
+    """
+    pendientes = [directorio]
+    while pendientes:
+        with os.scandir(pendientes.pop()) as entradas:
+            for entrada in entradas:
+                if entrada.is_dir(follow_symlinks=False):
+                    pendientes.append(entrada.path)
+                elif es_archivo_recibo(entrada.name):
+                    yield entrada.path
+
+
+def auditar_lote(tarea):
+    """
+    Carga y verifica un lote de recibos (se ejecuta en un proceso trabajador).
+
+    Args:
+        tarea (tuple): (rutas, claves_pem)
+
+    Returns:
+        dict: {por_curva: {curva: [validos, invalidos]}, fallos: [...], documentos: [...]}
+    """
+    rutas, claves_pem = tarea
+    por_curva = defaultdict(lambda: [0, 0])
+    fallos = []
+    documentos = []
+    grupos = defaultdict(list)
+
+    # 1. Cargar y agrupar por curva
+    for ruta in rutas:
+        try:
+            with open(ruta, 'rb') as f:
+                recibo = _parsear(f.read())
+        except (OSError, ValueError) as e:
+            fallos.append({"recibo": ruta, "motivo": f"no se pudo leer: {e}"})
+            continue
+
+        if not isinstance(recibo, dict):
+            fallos.append({"recibo": ruta, "motivo": "no es un objeto JSON"})
+            continue
+        faltantes = [c for c in CAMPOS_OBLIGATORIOS if c not in recibo]
+        if faltantes:
+            fallos.append({"recibo": ruta, "motivo": f"campos faltantes: {', '.join(faltantes)}"})
+            continue
+        grupos[recibo.get('curva', 'SECP256R1')].append((ruta, recibo))
+
+    # 2. Verificar cada grupo con el verificador de su curva
+    for curva, recibos in grupos.items():
+        if curva not in CURVAS_SOPORTADAS:
+            motivo = f"curva no soportada: {curva}"
+        elif curva not in claves_pem:
+            motivo = f"sin clave pública para {curva}"
+        else:
+            motivo = None
+
+        if motivo is None:
+            motivos = obtener_verificador(curva, claves_pem).verificar_lote(r for _, r in recibos)
+        else:
+            motivos = [None] * len(recibos)
+        for (ruta, recibo), motivo_recibo in zip(recibos, motivos):
+            if motivo is None and motivo_recibo is None:
+                por_curva[curva][0] += 1
+                if recibo.get('archivo_original'):
+                    documentos.append((ruta, recibo['archivo_original'], recibo['hash'],
+                                       recibo.get('modo_hash'), recibo.get('bloque_hash')))
+            else:
+                por_curva[curva][1] += 1
+                fallos.append({"recibo": ruta, "curva": curva,
+                               "motivo": motivo or DESCRIPCION_MOTIVOS[motivo_recibo]})
+
+    return {"por_curva": dict(por_curva), "fallos": fallos, "documentos": documentos}
+
+
+def _rehashear(tarea):
+    """Compara el hash actual de un documento con el del recibo."""
+    ruta_recibo, ruta_documento, hash_esperado, modo_hash, bloque_hash = tarea
+    if not os.path.isfile(ruta_documento):
+        return {"recibo": ruta_recibo, "documento": ruta_documento, "motivo": "documento no encontrado"}
+    try:
+        hash_actual = hashear_segun_modo(ruta_documento, modo_hash, bloque_hash)
+    except ValueError as e:
+        return {"recibo": ruta_recibo, "documento": ruta_documento, "motivo": str(e)}
+    if hash_actual != hash_esperado.lower():
+        return {"recibo": ruta_recibo, "documento": ruta_documento, "motivo": "el hash del documento no coincide"}
+    return None
+
+
+def auditar_recibos(directorio, claves_pem, documentos=None, procesos=None, tamano_lote=256):
+    """
+    Audita todos los recibos de un directorio.
+
+    Args:
+        directorio (str): Directorio de recibos
+        claves_pem (dict): {curva: clave pública PEM}
+        documentos (str, optional): Directorio con los documentos originales;
+                                    si se indica, se vuelven a hashear
+        procesos (int, optional): Procesos trabajadores (por defecto, núcleos de CPU)
+        tamano_lote (int): Recibos por tarea enviada al pool
+
+    Returns:
+        dict: Resumen con totales, desglose por curva, fallos y rendimiento
+    """
+    inicio = time.perf_counter()
+    procesos = procesos or os.cpu_count() or 1
+    rutas = list(listar_recibos(directorio))
+    tareas = [(rutas[i:i + tamano_lote], claves_pem) for i in range(0, len(rutas), tamano_lote)]
+
+    por_curva = defaultdict(lambda: {"validos": 0, "invalidos": 0})
+    fallos = []
+    pendientes_documento = []
+
+    if procesos > 1 and len(tareas) > 1:
+        with ProcessPoolExecutor(max_workers=procesos) as ejecutor:
+            resultados = list(ejecutor.map(auditar_lote, tareas))
+    else:
+        resultados = [auditar_lote(t) for t in tareas]
+
+    for resultado in resultados:
+        for curva, (validos, invalidos) in resultado["por_curva"].items():
+            por_curva[curva]["validos"] += validos
+            por_curva[curva]["invalidos"] += invalidos
+        fallos.extend(resultado["fallos"])
+        pendientes_documento.extend(resultado["documentos"])
+    segundos_firmas = time.perf_counter() - inicio
+
+    documentos_revisados = 0
+    if documentos:
+        # Hashear es E/S + hashlib (libera el GIL): basta con hilos
+        tareas_doc = [(ruta, os.path.join(documentos, nombre), *resto)
+                      for ruta, nombre, *resto in pendientes_documento]
+        with ThreadPoolExecutor(max_workers=max(4, procesos)) as ejecutor:
+            for fallo in ejecutor.map(_rehashear, tareas_doc):
+                if fallo is not None:
+                    fallos.append(fallo)
+        documentos_revisados = len(pendientes_documento)
+
+    segundos = time.perf_counter() - inicio
+    return {
+        "directorio": os.path.abspath(directorio),
+        "recibos": len(rutas),
+        "validos": sum(c["validos"] for c in por_curva.values()),
+        "fallidos": len({f["recibo"] for f in fallos}),
+        "por_curva": dict(por_curva),
+        "documentos_revisados": documentos_revisados,
+        "procesos": procesos,
+        "segundos": segundos,
+        "recibos_por_segundo": len(rutas) / segundos_firmas if segundos_firmas > 0 else 0.0,
+        "fallos": sorted(fallos, key=lambda f: f["recibo"]),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Audita un directorio de recibos del Notario Digital")
+    parser.add_argument('directorio', nargs='?', default=os.path.join(RAIZ, 'receipts'),
+                        help="Directorio de recibos (por defecto: receipts/)")
+    parser.add_argument('--claves', default=os.path.join(RAIZ, 'keys'),
+                        help="Directorio con las claves públicas del notario")
+    parser.add_argument('--documentos', default=None,
+                        help="Directorio con los documentos originales para volver a hashearlos")
+    parser.add_argument('--procesos', type=int, default=None, help="Procesos trabajadores")
+    parser.add_argument('--fallos', default=None,
+                        help="Archivo JSON donde escribir la lista de fallos")
+    parser.add_argument('--json', action='store_true', help="Imprime el resumen completo en JSON")
+    args = parser.parse_args()
+
+    resumen = auditar_recibos(args.directorio, cargar_claves_publicas(args.claves),
+                              documentos=args.documentos, procesos=args.procesos)
+
+    if args.fallos:
+        with open(args.fallos, 'w', encoding='utf-8') as f:
+            json.dump(resumen['fallos'], f, indent=2, ensure_ascii=False)
+
+    if args.json:
+        print(json.dumps(resumen, indent=2, ensure_ascii=False))
+    else:
+        print("=" * 60)
+        print("Auditoría de recibos - Notario Digital")
+        print("=" * 60)
+        print(f"Directorio: {resumen['directorio']}")
+        print(f"Recibos: {resumen['recibos']} • Válidos: {resumen['validos']} • Con fallos: {resumen['fallidos']}")
+        for curva, totales in sorted(resumen['por_curva'].items()):
+            print(f"   {curva:10s} válidos: {totales['validos']:8d}  inválidos: {totales['invalidos']:8d}")
+        if args.documentos:
+            print(f"Documentos re-hasheados: {resumen['documentos_revisados']}")
+        print(f"Tiempo: {resumen['segundos']:.2f} s • "
+              f"{resumen['recibos_por_segundo']:.0f} recibos/s • {resumen['procesos']} procesos")
+        for fallo in resumen['fallos'][:20]:
+            print(f"❌ {fallo['recibo']}: {fallo['motivo']}")
+        if len(resumen['fallos']) > 20:
+            print(f"   ... y {len(resumen['fallos']) - 20} fallos más")
+        if args.fallos:
+            print(f"📄 Lista de fallos: {args.fallos}")
+
+    return 0 if not resumen['fallos'] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,144 @@
+"""
+Benchmark de la firma y verificación de recibos.
+
+Compara, para una curva, el camino original (ECDSA con SHA-256 sobre el
+mensaje de texto, un recibo por llamada) con las versiones 1 y 2 del mensaje
+firmadas con `Prehashed`, una a una y por lotes. También mide por separado el
+cálculo de los digests, que es la parte que los lotes pueden adelantar, y
+compara el tamaño y la verificación de las firmas DER y raw (r||s).
+
+Uso:
+    python shared/benchmark_firmas.py [--curva SECP256R1] [--recibos 5000] [--repeticiones 3]
+"""
+
+import argparse
+import base64
+import os
+import sys
+import time
+
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.asymmetric import ec
+
+# Agregar el directorio shared al path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from shared.crypto_utils import (NotarioCrypto, CURVAS_SOPORTADAS, VERSION_RECIBO_TEXTO,
+                                 VERSION_RECIBO_BINARIO, CODIFICACION_FIRMA_RAW, construir_mensaje,
+                                 digest_firma, firma_raw_a_der)
+
+
+TIMESTAMP = "2025-11-10T12:00:00.123456Z"
+
+
+def firmar_original(crypto, hashes_hex):
+    """Firma como lo hacía firmar_hash originalmente (la biblioteca hashea el texto)."""
+    recibos = []
+    for hash_hex in hashes_hex:
+        recibo = {"timestamp": TIMESTAMP, "hash": hash_hex}
+        firma = crypto.private_key.sign(construir_mensaje(recibo), ec.ECDSA(hashes.SHA256()))
+        recibo["firma"] = base64.b64encode(firma).decode()
+        recibo["curva"] = crypto.curva_nombre
+        recibos.append(recibo)
+    return recibos
+
+
+def verificar_original(crypto, recibos):
+    """Verifica como lo hacía verificar_firma originalmente."""
+    validos = 0
+    for recibo in recibos:
+        crypto.public_key.verify(base64.b64decode(recibo['firma']), construir_mensaje(recibo),
+                                 ec.ECDSA(hashes.SHA256()))
+        validos += 1
+    return validos
+
+
+def medir(funcion, repeticiones):
+    """Mejor tiempo de varias repeticiones y el último resultado."""
+    mejor = None
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        resultado = funcion()
+        transcurrido = time.perf_counter() - inicio
+        mejor = transcurrido if mejor is None else min(mejor, transcurrido)
+    return mejor, resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de firma y verificación de recibos")
+    parser.add_argument('--curva', default='SECP256R1', choices=list(CURVAS_SOPORTADAS))
+    parser.add_argument('--recibos', type=int, default=5000)
+    parser.add_argument('--repeticiones', type=int, default=3)
+    args = parser.parse_args()
+
+    crypto = NotarioCrypto(curva=args.curva)
+    crypto.generar_par_claves()
+    hashes_hex = [os.urandom(32).hex() for _ in range(args.recibos)]
+    n = args.recibos
+
+    print(f"🔑 Curva {args.curva} • {n} recibos • mejor de {args.repeticiones}")
+
+    # Firma
+    base, _ = medir(lambda: firmar_original(crypto, hashes_hex), args.repeticiones)
+    print(f"\n{'firma':28s} {'recibos/s':>10s} {'µs/recibo':>10s} {'aceleración':>12s}")
+    candidatas = [
+        ('original (texto)', None),
+        ('v1 firmar_hash', lambda: [crypto.firmar_hash(h, TIMESTAMP, version=VERSION_RECIBO_TEXTO)
+                                    for h in hashes_hex]),
+        ('v2 firmar_hash', lambda: [crypto.firmar_hash(h, TIMESTAMP, version=VERSION_RECIBO_BINARIO)
+                                    for h in hashes_hex]),
+        ('v1 firmar_lote', lambda: crypto.firmar_lote(hashes_hex, TIMESTAMP, version=VERSION_RECIBO_TEXTO)[0]),
+        ('v2 firmar_lote', lambda: crypto.firmar_lote(hashes_hex, TIMESTAMP, version=VERSION_RECIBO_BINARIO)[0]),
+    ]
+    recibos = {}
+    for nombre, funcion in candidatas:
+        segundos = base if funcion is None else None
+        if funcion is not None:
+            segundos, recibos[nombre] = medir(funcion, args.repeticiones)
+        print(f"{nombre:28s} {n / segundos:10,.0f} {segundos / n * 1e6:10.1f} {base / segundos:11.2f}x")
+
+    # Digests: la parte separable de la firma
+    print(f"\n{'digest (sin ECDSA)':28s} {'recibos/s':>10s} {'µs/recibo':>10s}")
+    for nombre in ('v1 firmar_lote', 'v2 firmar_lote'):
+        segundos, _ = medir(lambda: [digest_firma(r) for r in recibos[nombre]], args.repeticiones)
+        print(f"{nombre.split()[0] + ' digest_firma':28s} {n / segundos:10,.0f} {segundos / n * 1e6:10.2f}")
+
+    # Verificación
+    textos = recibos['v1 firmar_lote']
+    binarios = recibos['v2 firmar_lote']
+    base, _ = medir(lambda: verificar_original(crypto, textos), args.repeticiones)
+    print(f"\n{'verificación':28s} {'recibos/s':>10s} {'µs/recibo':>10s} {'aceleración':>12s}")
+    candidatas = [
+        ('original (texto)', None),
+        ('v1 verificar_firma', lambda: sum(map(crypto.verificar_firma, textos))),
+        ('v2 verificar_firma', lambda: sum(map(crypto.verificar_firma, binarios))),
+        ('v1 verificar_lote', lambda: crypto.verificar_lote(textos).count(None)),
+        ('v2 verificar_lote', lambda: crypto.verificar_lote(binarios).count(None)),
+    ]
+    for nombre, funcion in candidatas:
+        segundos = base
+        if funcion is not None:
+            segundos, validos = medir(funcion, args.repeticiones)
+            if validos != n:
+                print(f"❌ {nombre}: {n - validos} recibos no verificaron")
+                return 1
+        print(f"{nombre:28s} {n / segundos:10,.0f} {segundos / n * 1e6:10.1f} {base / segundos:11.2f}x")
+
+    # Codificación de la firma
+    crudas, _ = crypto.firmar_lote(hashes_hex, TIMESTAMP, codificacion=CODIFICACION_FIRMA_RAW)
+    print(f"\n{'codificación':28s} {'bytes/firma':>11s} {'verif. µs':>10s} {'a DER µs':>10s}")
+    for nombre, lote in (('der', textos), ('raw', crudas)):
+        firmas = [base64.b64decode(r['firma']) for r in lote]
+        segundos, validos = medir(lambda: crypto.verificar_lote(lote).count(None), args.repeticiones)
+        if validos != n:
+            print(f"❌ {nombre}: {n - validos} recibos no verificaron")
+            return 1
+        conversion = ''
+        if nombre == 'raw':
+            convertir, _ = medir(lambda: [firma_raw_a_der(f, args.curva) for f in firmas], args.repeticiones)
+            conversion = f"{convertir / n * 1e6:10.2f}"
+        print(f"{nombre:28s} {sum(map(len, firmas)) / n:11.1f} {segundos / n * 1e6:10.1f} {conversion:>10s}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,98 @@
+"""
+Benchmark de escritura del almacén de recibos según el número de fragmentos.
+
+Escribe recibos sintéticos desde varios hilos sobre almacenes de 1, 16 y 256
+fragmentos y mide recibos escritos por segundo; después mide búsquedas por
+hash. Con --fsync cada escritura espera al disco, que es donde más se nota
+repartir las escrituras entre archivos independientes.
+
+Uso:
+    python shared/benchmark_fragmentos.py [--recibos N] [--hilos N] [--fragmentos 1,16,256] [--fsync]
+"""
+
+import argparse
+import base64
+import os
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Agregar el directorio shared al path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from shared.almacen_recibos import AlmacenRecibos
+
+
+def generar_recibos(cantidad):
+    """Recibos sintéticos con el tamaño de uno real (sin firmar)."""
+    firma = base64.b64encode(os.urandom(72)).decode()
+    return [{
+        "timestamp": "2025-11-10T12:00:00.000000Z",
+        "hash": os.urandom(32).hex(),
+        "firma": firma,
+        "curva": "SECP256R1",
+        "indice_log": i
+    } for i in range(cantidad)]
+
+
+def medir(fragmentos, recibos, hilos, fsync):
+    """
+    Mide escritura y búsqueda sobre un almacén temporal.
+
+    Returns:
+        dict: {escrituras_por_segundo, busquedas_por_segundo}
+    """
+    directorio = tempfile.mkdtemp(prefix='almacen_bench_')
+    try:
+        almacen = AlmacenRecibos(directorio, fragmentos=fragmentos, fsync=fsync)
+        lotes = [recibos[i::hilos] for i in range(hilos)]
+
+        def escribir(lote):
+            for recibo in lote:
+                almacen.agregar(recibo)
+
+        inicio = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=hilos) as ejecutor:
+            list(ejecutor.map(escribir, lotes))
+        escritura = time.perf_counter() - inicio
+
+        muestra = recibos[::max(1, len(recibos) // 1000)]
+        inicio = time.perf_counter()
+        for recibo in muestra:
+            assert almacen.buscar(recibo['hash'])
+        busqueda = time.perf_counter() - inicio
+
+        almacen.cerrar()
+        return {
+            "escrituras_por_segundo": len(recibos) / escritura,
+            "busquedas_por_segundo": len(muestra) / busqueda
+        }
+    finally:
+        shutil.rmtree(directorio, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del almacén de recibos fragmentado")
+    parser.add_argument('--recibos', type=int, default=20000, help="Recibos a escribir")
+    parser.add_argument('--hilos', type=int, default=8, help="Hilos escritores")
+    parser.add_argument('--fragmentos', default='1,16,256',
+                        help="Números de fragmentos a comparar, separados por comas")
+    parser.add_argument('--fsync', action='store_true', help="Forzar cada escritura a disco")
+    args = parser.parse_args()
+
+    recibos = generar_recibos(args.recibos)
+    print("=" * 60)
+    print("Benchmark del almacén de recibos - Notario Digital")
+    print("=" * 60)
+    print(f"Recibos: {args.recibos} • Hilos: {args.hilos} • fsync: {'sí' if args.fsync else 'no'}")
+    print(f"{'Fragmentos':>10s} {'Escrituras/s':>14s} {'Búsquedas/s':>14s}")
+    for fragmentos in (int(n) for n in args.fragmentos.split(',')):
+        resultado = medir(fragmentos, recibos, args.hilos, args.fsync)
+        print(f"{fragmentos:>10d} {resultado['escrituras_por_segundo']:>14.0f} "
+              f"{resultado['busquedas_por_segundo']:>14.0f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,130 @@
+"""
+Recibos encadenados del Notario Digital.
+En modo encadenado cada recibo firma su número de secuencia y el digest del
+recibo anterior, de modo que borrar o reordenar recibos rompe la cadena.
+"""
+
+import hashlib
+import json
+import threading
+
+
+# Valor de `anterior` para el primer recibo de la cadena
+DIGEST_GENESIS = '0' * 64
+
+# Campos del recibo cubiertos por su digest (los campos añadidos por el
+# cliente, como `archivo_original`, no forman parte de la cadena)
+CAMPOS_DIGEST = ('timestamp', 'hash', 'secuencia', 'anterior', 'firma', 'curva',
+                 'modo_hash', 'bloque_hash', 'version', 'codificacion_firma')
+
+
+def serializar_canonico(recibo):
+    """
+    Serializa los campos firmados de un recibo en JSON canónico.
+
+    Args:
+        recibo (dict): Recibo firmado
+
+    Returns:
+        bytes: JSON con claves ordenadas y sin espacios
+    """
+    canonico = {campo: recibo[campo] for campo in CAMPOS_DIGEST if campo in recibo}
+    return json.dumps(canonico, sort_keys=True, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+
+def digest_recibo(recibo):
+    """
+    Calcula el digest SHA-256 de un recibo sobre su forma JSON canónica.
+
+    Args:
+        recibo (dict): Recibo firmado
+
+    Returns:
+        str: Digest en formato hexadecimal
+    """
+    return hashlib.sha256(serializar_canonico(recibo)).hexdigest()
+
+
+def es_encadenado(recibo):
+    """Indica si un recibo pertenece a una cadena."""
+    return recibo.get('secuencia') is not None
+
+
+class CadenaRecibos:
+    """
+    Estado del extremo de la cadena: siguiente secuencia y digest anterior.
+
+    La firma y el registro de cada recibo ocurren bajo un lock para que el
+    orden de la cadena coincida con el orden del registro. Esto serializa las
+    firmas en modo encadenado, incluso entre curvas distintas.
+    """
+
+    def __init__(self, secuencia=0, anterior=DIGEST_GENESIS):
+        """
+        Args:
+            secuencia (int): Secuencia que recibirá el próximo recibo
+            anterior (str): Digest del último recibo emitido
+        """
+        self.secuencia = secuencia
+        self.anterior = anterior
+        self._lock = threading.Lock()
+
+    @classmethod
+    def desde_registro(cls, registro):
+        """
+        Recupera el extremo de la cadena a partir del registro de recibos.
+
+        Args:
+            registro (AlmacenRecibos): Almacén (o `RegistroRecibos`) con los recibos emitidos
+
+        Returns:
+            CadenaRecibos: Cadena lista para continuar
+        """
+        ultimo = registro.ultimo()
+        if ultimo is not None and not es_encadenado(ultimo):
+            # El modo encadenado estuvo desactivado: buscar el último eslabón
+            ultimo = None
+            for _, recibo in registro.iterar():
+                if es_encadenado(recibo) and (ultimo is None or recibo['secuencia'] > ultimo['secuencia']):
+                    ultimo = recibo
+        if ultimo is None:
+            return cls()
+        return cls(ultimo['secuencia'] + 1, digest_recibo(ultimo))
+
+    def extremo(self):
+        """
+        Último eslabón emitido.
+
+        Returns:
+            tuple: (secuencia, digest); (-1, DIGEST_GENESIS) si la cadena está vacía
+        """
+        with self._lock:
+            return self.secuencia - 1, self.anterior
+
+    def emitir(self, notario, hash_hex, timestamp, registrar=None, modo_hash=None, bloque_hash=None):
+        """
+        Firma el siguiente eslabón de la cadena.
+
+        Args:
+            notario (NotarioCrypto): Instancia con la clave privada
+            hash_hex (str): Hash a notarizar
+            timestamp (str): Timestamp ISO 8601
+            registrar (callable, optional): Función que persiste el recibo;
+                                            se llama antes de avanzar la cadena
+            modo_hash (str, optional): Modo de hash no plano
+            bloque_hash (int, optional): Tamaño de bloque del modo de hash
+
+        Returns:
+            dict: Recibo encadenado
+        """
+        with self._lock:
+            recibo = notario.firmar_hash(hash_hex, timestamp,
+                                         secuencia=self.secuencia,
+                                         anterior=self.anterior,
+                                         modo_hash=modo_hash,
+                                         bloque_hash=bloque_hash)
+            if registrar is not None:
+                registrar(recibo)
+            self.secuencia += 1
+            self.anterior = digest_recibo(recibo)
+            return recibo
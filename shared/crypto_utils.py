@@ -5,6 +5,8 @@ Soporta múltiples curvas elípticas estándar.
 """
 
 from cryptography.hazmat.primitives.asymmetric import ec, ed25519
+from cryptography.hazmat.primitives.asymmetric.utils import (Prehashed, decode_dss_signature,
+                                                              encode_dss_signature)
 from cryptography.hazmat.primitives import hashes, serialization
 from cryptography.hazmat.backends import default_backend
 from cryptography.exceptions import InvalidSignature
@@ -12,6 +14,12 @@ import hashlib
 import base64
 from datetime import datetime
 import json
+import os
+import struct
+import threading
+import time
+
+from shared.motor_hash import hashear_archivo, HashCancelado
 
 
 # Curvas elípticas soportadas
@@ -42,6 +50,166 @@ CURVAS_SOPORTADAS = {
     },
 }
 
+# Versiones del mensaje firmado de un recibo. La 1 es el texto
+# "hash|timestamp|..."; la 2 es una estructura binaria canónica. En ambas se
+# firma el SHA-256 del mensaje (ver `digest_firma`); los recibos de versión 1
+# no llevan el campo 'version'.
+VERSION_RECIBO_TEXTO = 1
+VERSION_RECIBO_BINARIO = 2
+VERSIONES_RECIBO = (VERSION_RECIBO_TEXTO, VERSION_RECIBO_BINARIO)
+
+# Prefijo de dominio del mensaje binario, distinto de cualquier mensaje de texto
+_DOMINIO_BINARIO = b'notario-recibo-v2\x00'
+
+# Codificaciones de la firma. 'der' es la estructura ASN.1 de longitud variable
+# que produce la biblioteca; 'raw' es r||s en big-endian con anchura fija por
+# curva (64 bytes en P-256, 132 en P-521). Los recibos DER no llevan el campo
+# 'codificacion_firma'.
+CODIFICACION_FIRMA_DER = 'der'
+CODIFICACION_FIRMA_RAW = 'raw'
+CODIFICACIONES_FIRMA = (CODIFICACION_FIRMA_DER, CODIFICACION_FIRMA_RAW)
+
+# Motivos de fallo por elemento de firmar_lote y verificar_lote
+MOTIVO_HASH_INVALIDO = 'hash_invalido'
+MOTIVO_RECIBO_MAL_FORMADO = 'recibo_mal_formado'
+MOTIVO_FIRMA_MAL_CODIFICADA = 'firma_mal_codificada'
+MOTIVO_FIRMA_INVALIDA = 'firma_invalida'
+
+DESCRIPCION_MOTIVOS = {
+    MOTIVO_HASH_INVALIDO: "hash no hexadecimal",
+    MOTIVO_RECIBO_MAL_FORMADO: "recibo mal formado o con campos faltantes",
+    MOTIVO_FIRMA_MAL_CODIFICADA: "firma mal codificada",
+    MOTIVO_FIRMA_INVALIDA: "firma inválida",
+}
+
+
+class RegistroClaves:
+    """
+    Claves PEM ya interpretadas, compartidas por todo el proceso.
+
+    Cada entrada se identifica por ruta, identidad del archivo (inodo, tamaño,
+    mtime y ctime) y huella SHA-256 de su contenido. Si el archivo no ha
+    cambiado, la clave se devuelve sin leerlo ni repetir la derivación de la
+    contraseña de una clave cifrada; si cambió, se vuelve a interpretar.
+    """
+
+    def __init__(self, margen_reciente=2.0):
+        """
+        Args:
+            margen_reciente (float): Archivos modificados hace menos de estos
+                                     segundos se releen para comparar su huella,
+                                     porque una reescritura en el mismo tick de
+                                     mtime no cambiaría su identidad
+        """
+        self.margen_reciente = margen_reciente
+        self._lock = threading.Lock()
+        self._entradas = {}
+        self.aciertos = 0
+        self.fallos = 0
+
+    def _obtener(self, clave_registro, ruta, interpretar):
+        estado = os.stat(ruta)
+        identidad = (estado.st_dev, estado.st_ino, estado.st_size, estado.st_mtime_ns, estado.st_ctime_ns)
+        with self._lock:
+            entrada = self._entradas.get(clave_registro)
+            if entrada is not None and entrada[0] == identidad \
+                    and time.time() - estado.st_mtime >= self.margen_reciente:
+                self.aciertos += 1
+                return entrada[2]
+
+        with open(ruta, 'rb') as f:
+            pem_data = f.read()
+        huella = hashlib.sha256(pem_data).digest()
+        if entrada is not None and entrada[1] == huella:
+            # Mismo contenido (p. ej. el archivo solo se tocó o se copió encima)
+            clave = entrada[2]
+            with self._lock:
+                self.aciertos += 1
+        else:
+            clave = interpretar(pem_data)
+            with self._lock:
+                self.fallos += 1
+        with self._lock:
+            self._entradas[clave_registro] = (identidad, huella, clave)
+        return clave
+
+    def privada(self, ruta, password=None):
+        """
+        Clave privada de un archivo PEM.
+
+        Args:
+            ruta (str): Ruta del archivo de clave privada
+            password (str, optional): Contraseña si la clave está cifrada
+
+        Returns:
+            Clave privada (el mismo objeto para todas las instancias)
+        """
+        pwd = password.encode() if password else None
+        # La contraseña forma parte de la entrada: una contraseña incorrecta
+        # nunca obtiene la clave descifrada con otra
+        secreto = hashlib.sha256(pwd).digest() if pwd else None
+        return self._obtener(
+            (os.path.abspath(ruta), 'privada', secreto), ruta,
+            lambda pem_data: serialization.load_pem_private_key(pem_data, password=pwd,
+                                                                backend=default_backend())
+        )
+
+    def publica(self, ruta):
+        """
+        Clave pública de un archivo PEM.
+
+        Args:
+            ruta (str): Ruta del archivo de clave pública
+
+        Returns:
+            Clave pública (el mismo objeto para todas las instancias)
+        """
+        return self._obtener(
+            (os.path.abspath(ruta), 'publica', None), ruta,
+            lambda pem_data: serialization.load_pem_public_key(pem_data, backend=default_backend())
+        )
+
+    def publica_pem(self, pem_str):
+        """
+        Clave pública a partir de un PEM en memoria, por la huella de su contenido.
+
+        Args:
+            pem_str (str): Clave pública en formato PEM
+
+        Returns:
+            Clave pública
+        """
+        huella = hashlib.sha256(pem_str.encode()).digest()
+        with self._lock:
+            clave = self._entradas.get(('pem', huella))
+            if clave is not None:
+                self.aciertos += 1
+                return clave
+        clave = serialization.load_pem_public_key(pem_str.encode(), backend=default_backend())
+        with self._lock:
+            self._entradas[('pem', huella)] = clave
+            self.fallos += 1
+        return clave
+
+    def invalidar(self, ruta=None):
+        """Olvida las claves de un archivo, o todas si no se indica ruta."""
+        with self._lock:
+            if ruta is None:
+                self._entradas.clear()
+                return
+            ruta = os.path.abspath(ruta)
+            for clave_registro in [c for c in self._entradas if c[0] == ruta]:
+                del self._entradas[clave_registro]
+
+    def estadisticas(self):
+        """Entradas, aciertos y fallos del registro."""
+        with self._lock:
+            return {"entradas": len(self._entradas), "aciertos": self.aciertos, "fallos": self.fallos}
+
+
+# Registro único del proceso, usado por todas las instancias de NotarioCrypto
+REGISTRO_CLAVES = RegistroClaves()
+
 
 class NotarioCrypto:
     """
@@ -49,13 +217,20 @@ class NotarioCrypto:
     Utiliza ECDSA (Elliptic Curve Digital Signature Algorithm) con soporte para múltiples curvas.
     """
     
-    def __init__(self, curva='SECP256R1'):
+    def __init__(self, curva='SECP256R1', version_recibo=VERSION_RECIBO_TEXTO,
+                 codificacion_firma=CODIFICACION_FIRMA_DER):
         """
         Inicializa el objeto de criptografía.
         
         Args:
             curva (str): Nombre de la curva a utilizar. Por defecto 'SECP256R1'.
                         Opciones: 'SECP256R1', 'SECP256K1', 'SECP384R1', 'SECP521R1'
+            version_recibo (int): Versión del mensaje firmado de los recibos que
+                                  emite (ver VERSIONES_RECIBO); la verificación
+                                  acepta todas
+            codificacion_firma (str): Codificación de las firmas que emite
+                                      (ver CODIFICACIONES_FIRMA); la verificación
+                                      acepta todas
         """
         self.private_key = None
         self.public_key = None
@@ -63,6 +238,12 @@ class NotarioCrypto:
         
         if curva not in CURVAS_SOPORTADAS:
             raise ValueError(f"Curva no soportada: {curva}. Usa una de: {list(CURVAS_SOPORTADAS.keys())}")
+        if version_recibo not in VERSIONES_RECIBO:
+            raise ValueError(f"Versión de recibo no soportada: {version_recibo}")
+        self.version_recibo = version_recibo
+        if codificacion_firma not in CODIFICACIONES_FIRMA:
+            raise ValueError(f"Codificación de firma no soportada: {codificacion_firma}")
+        self.codificacion_firma = codificacion_firma
         
         self.curva_info = CURVAS_SOPORTADAS[curva]
         self.tipo_curva = self.curva_info['tipo']
@@ -108,6 +289,7 @@ class NotarioCrypto:
         
         with open(filepath, 'wb') as f:
             f.write(pem)
+        REGISTRO_CLAVES.invalidar(filepath)
     
     def cargar_clave_privada(self, filepath, password=None):
         """
@@ -117,15 +299,8 @@ class NotarioCrypto:
             filepath (str): Ruta del archivo de clave privada
             password (str, optional): Contraseña si la clave está cifrada
         """
-        with open(filepath, 'rb') as f:
-            pem_data = f.read()
-        
-        pwd = password.encode() if password else None
-        self.private_key = serialization.load_pem_private_key(
-            pem_data,
-            password=pwd,
-            backend=default_backend()
-        )
+        # El registro del proceso evita releer y descifrar una clave ya cargada
+        self.private_key = REGISTRO_CLAVES.privada(filepath, password)
         self.public_key = self.private_key.public_key()
     
     def guardar_clave_publica(self, filepath):
@@ -145,6 +320,7 @@ class NotarioCrypto:
         
         with open(filepath, 'wb') as f:
             f.write(pem)
+        REGISTRO_CLAVES.invalidar(filepath)
     
     def cargar_clave_publica(self, filepath):
         """
@@ -153,41 +329,47 @@ class NotarioCrypto:
         Args:
             filepath (str): Ruta del archivo de clave pública
         """
-        with open(filepath, 'rb') as f:
-            pem_data = f.read()
-        
-        self.public_key = serialization.load_pem_public_key(
-            pem_data,
-            backend=default_backend()
-        )
+        self.public_key = REGISTRO_CLAVES.publica(filepath)
     
-    def calcular_hash_archivo(self, filepath):
+    def calcular_hash_archivo(self, filepath, progreso=None, cancelado=None):
         """
         Calcula el hash SHA-256 de un archivo.
         
         Args:
             filepath (str): Ruta del archivo a hashear
+            progreso (callable, optional): Se llama con (bytes_leidos, total) tras cada bloque
+            cancelado (callable, optional): Devuelve True para interrumpir el cálculo
             
         Returns:
             str: Hash SHA-256 en formato hexadecimal
+            
+        Raises:
+            HashCancelado: Si `cancelado()` devuelve True antes de terminar
         """
-        sha256_hash = hashlib.sha256()
-        with open(filepath, 'rb') as f:
-            # Leer en bloques para archivos grandes
-            for byte_block in iter(lambda: f.read(4096), b""):
-                sha256_hash.update(byte_block)
-        return sha256_hash.hexdigest()
+        # El motor elige la lectura (mmap, readinto...) según tamaño y sistema de archivos
+        return hashear_archivo(filepath, progreso=progreso, cancelado=cancelado)
     
-    def firmar_hash(self, hash_hex, timestamp=None):
+    def firmar_hash(self, hash_hex, timestamp=None, secuencia=None, anterior=None,
+                    modo_hash=None, bloque_hash=None, version=None, codificacion=None):
         """
         Firma un hash usando ECDSA con la clave privada del notario.
         
         Args:
             hash_hex (str): Hash en formato hexadecimal
             timestamp (str, optional): Timestamp ISO format. Si no se provee, usa el actual
+            secuencia (int, optional): Número de secuencia en modo encadenado
+            anterior (str, optional): Digest del recibo anterior en modo encadenado
+            modo_hash (str, optional): Modo de hash no plano (p. ej. 'arbol-sha256')
+            bloque_hash (int, optional): Tamaño de bloque del modo de hash
+            version (int, optional): Versión del mensaje firmado (por defecto, la
+                                     de la instancia)
+            codificacion (str, optional): Codificación de la firma (por defecto,
+                                          la de la instancia)
             
         Returns:
-            dict: Recibo digital con {timestamp, hash, firma, curva}
+            dict: Recibo digital con {timestamp, hash, firma, curva} y, en modo
+                  encadenado, {secuencia, anterior}; en modo árbol, {modo_hash, bloque_hash};
+                  a partir de la versión 2, {version}; con firma raw, {codificacion_firma}
         """
         if self.private_key is None:
             raise ValueError("No hay clave privada cargada")
@@ -196,68 +378,228 @@ class NotarioCrypto:
         if timestamp is None:
             timestamp = datetime.utcnow().isoformat() + "Z"
         
-        # Crear el mensaje a firmar: hash + timestamp
-        mensaje = f"{hash_hex}|{timestamp}".encode()
+        recibo = _recibo_sin_firma(hash_hex, timestamp, version or self.version_recibo,
+                                   secuencia, anterior, modo_hash, bloque_hash)
         
-        # Firmar con ECDSA
+        # Firmar con ECDSA el digest del mensaje: hash + timestamp (+ secuencia +
+        # anterior) (+ modo de hash), sin que la biblioteca lo vuelva a hashear
         if self.tipo_curva == 'ecdsa':
             firma = self.private_key.sign(
-                mensaje,
-                ec.ECDSA(hashes.SHA256())
+                digest_firma(recibo),
+                ec.ECDSA(Prehashed(hashes.SHA256()))
             )
         else:
             raise ValueError(f"Tipo de curva no soportado para firma: {self.tipo_curva}")
         
-        # Codificar firma en base64 para facilitar transmisión
-        firma_b64 = base64.b64encode(firma).decode()
+        self._completar_recibo(recibo, firma, codificacion or self.codificacion_firma)
+        return recibo
+    
+    def _completar_recibo(self, recibo, firma_der, codificacion):
+        """Añade al recibo la firma en la codificación pedida y la curva."""
+        if codificacion == CODIFICACION_FIRMA_RAW:
+            firma_der = firma_der_a_raw(firma_der, self.curva_nombre)
+        elif codificacion != CODIFICACION_FIRMA_DER:
+            raise ValueError(f"Codificación de firma no soportada: {codificacion}")
         
-        return {
-            "timestamp": timestamp,
-            "hash": hash_hex,
-            "firma": firma_b64,
-            "curva": self.curva_nombre
-        }
+        # Codificar firma en base64 para facilitar transmisión
+        recibo["firma"] = base64.b64encode(firma_der).decode()
+        recibo["curva"] = self.curva_nombre
+        if codificacion != CODIFICACION_FIRMA_DER:
+            recibo["codificacion_firma"] = codificacion
     
     def verificar_firma(self, recibo, clave_publica=None):
         """
         Verifica la autenticidad de un recibo digital.
         
         Args:
-            recibo (dict): Recibo con {timestamp, hash, firma, curva (opcional)}
+            recibo (dict): Recibo con {timestamp, hash, firma, curva (opcional),
+                           secuencia y anterior (opcionales, modo encadenado),
+                           modo_hash y bloque_hash (opcionales, modo árbol),
+                           version (opcional, 1 si no está),
+                           codificacion_firma (opcional, 'der' si no está)}
             clave_publica: Clave pública a usar (opcional, usa la cargada si no se provee)
             
         Returns:
-            bool: True si la firma es válida, False en caso contrario
+            bool: True si la firma es válida, False en caso contrario (también
+                  si no hay clave pública; informar de ello queda en manos
+                  del llamante)
         """
         try:
-            # Usar la clave pública provista o la interna
-            pub_key = clave_publica if clave_publica else self.public_key
+            return self.verificar_lote([recibo], clave_publica)[0] is None
+        except ValueError:
+            return False
+    
+    def firmar_lote(self, hashes_hex, timestamp=None, modo_hash=None, bloque_hash=None,
+                    ejecutor=None, tamano_tramo=256, version=None, codificacion=None):
+        """
+        Firma muchos hashes de una vez.
+        
+        Todos los recibos comparten el timestamp, que se toma una sola vez. En
+        cada tramo se calculan primero todos los digests y después las firmas.
+        
+        Args:
+            hashes_hex (iterable): Hashes en formato hexadecimal (lista o iterador)
+            timestamp (str, optional): Timestamp ISO común. Si no se provee, usa el actual
+            modo_hash (str, optional): Modo de hash no plano de todos los hashes
+            bloque_hash (int, optional): Tamaño de bloque del modo de hash
+            ejecutor (Executor, optional): Pool de hilos al que repartir los tramos
+            tamano_tramo (int): Hashes por tarea enviada al ejecutor
+            version (int, optional): Versión del mensaje firmado (por defecto, la
+                                     de la instancia)
+            codificacion (str, optional): Codificación de las firmas (por defecto,
+                                          la de la instancia)
             
-            if pub_key is None:
-                raise ValueError("No hay clave pública disponible")
+        Returns:
+            tuple: (recibos, fallos). `recibos` sigue el orden de entrada, con None
+                   en los hashes que no se firmaron; `fallos` es {índice: motivo}
+        """
+        if self.private_key is None:
+            raise ValueError("No hay clave privada cargada")
+        if self.tipo_curva != 'ecdsa':
+            raise ValueError(f"Tipo de curva no soportado para firma: {self.tipo_curva}")
+        
+        if timestamp is None:
+            timestamp = datetime.utcnow().isoformat() + "Z"
+        version = version or self.version_recibo
+        codificacion = codificacion or self.codificacion_firma
+        if codificacion not in CODIFICACIONES_FIRMA:
+            raise ValueError(f"Codificación de firma no soportada: {codificacion}")
+        hashes_hex = list(hashes_hex)
+        
+        def firmar_tramo(inicio):
+            recibos, digests, fallos = [], [], {}
+            for indice in range(inicio, min(inicio + tamano_tramo, len(hashes_hex))):
+                try:
+                    recibo = _recibo_sin_firma(hashes_hex[indice], timestamp, version,
+                                               None, None, modo_hash, bloque_hash)
+                    digests.append(digest_firma(recibo))
+                except (TypeError, ValueError):
+                    recibo = None
+                    fallos[indice] = MOTIVO_HASH_INVALIDO
+                recibos.append(recibo)
             
-            # Reconstruir el mensaje original
-            mensaje = f"{recibo['hash']}|{recibo['timestamp']}".encode()
+            firmar = self.private_key.sign
+            algoritmo = ec.ECDSA(Prehashed(hashes.SHA256()))
+            digests = iter(digests)
+            for recibo in recibos:
+                if recibo is not None:
+                    self._completar_recibo(recibo, firmar(next(digests), algoritmo), codificacion)
+            return recibos, fallos
+        
+        return _unir_tramos(firmar_tramo, len(hashes_hex), tamano_tramo, ejecutor)
+    
+    def verificar_lote(self, recibos, clave_publica=None, ejecutor=None, tamano_tramo=256):
+        """
+        Verifica muchos recibos de una vez con la misma clave.
+        
+        A diferencia de `verificar_firma`, no imprime nada: cada recibo recibe
+        un motivo de fallo estructurado (una de las constantes MOTIVO_*). En
+        cada tramo se calculan primero todos los digests y después se
+        comprueban las firmas. Las firmas raw se convierten a DER antes de
+        verificarlas; una firma raw de longitud distinta a la de la curva es
+        una firma mal codificada.
+        
+        Args:
+            recibos (iterable): Recibos como los de `verificar_firma` (lista, iterador,
+                                o Recibo / ColeccionRecibos de shared.recibo)
+            clave_publica: Clave pública a usar (opcional, usa la cargada si no se provee)
+            ejecutor (Executor, optional): Pool de hilos al que repartir los tramos
+            tamano_tramo (int): Recibos por tarea enviada al ejecutor
             
-            # Decodificar la firma
-            firma = base64.b64decode(recibo['firma'])
+        Returns:
+            list: Un motivo por recibo, en el orden de entrada (None si es válido)
+        """
+        pub_key = clave_publica if clave_publica else self.public_key
+        if pub_key is None:
+            raise ValueError("No hay clave pública disponible")
+        if self.tipo_curva != 'ecdsa':
+            raise ValueError(f"Tipo de curva no soportado para verificación: {self.tipo_curva}")
+        
+        # Las colecciones indexables (como ColeccionRecibos) se recorren sin copiarlas
+        if not hasattr(recibos, '__getitem__'):
+            recibos = list(recibos)
+        
+        ancho = _ancho_escalar(pub_key.curve)
+        
+        def verificar_tramo(inicio):
+            motivos, pendientes = [], []
+            for posicion in range(min(tamano_tramo, len(recibos) - inicio)):
+                recibo = recibos[inicio + posicion]
+                try:
+                    digest = digest_firma(recibo)
+                    # Un Recibo compacto ya tiene la firma en bytes
+                    firma = recibo['firma'] if isinstance(recibo, dict) else recibo.firma
+                    codificacion = recibo.get('codificacion_firma', CODIFICACION_FIRMA_DER)
+                except (KeyError, TypeError, AttributeError, ValueError, struct.error):
+                    motivos.append(MOTIVO_RECIBO_MAL_FORMADO)
+                    continue
+                try:
+                    if not isinstance(firma, bytes):
+                        firma = base64.b64decode(firma, validate=True)
+                    if codificacion == CODIFICACION_FIRMA_RAW:
+                        firma = _raw_a_der(firma, ancho)
+                    elif codificacion != CODIFICACION_FIRMA_DER:
+                        raise ValueError(f"Codificación de firma no soportada: {codificacion}")
+                except (TypeError, ValueError):
+                    motivos.append(MOTIVO_FIRMA_MAL_CODIFICADA)
+                    continue
+                motivos.append(None)
+                pendientes.append((posicion, firma, digest))
             
-            # Verificar la firma
-            if self.tipo_curva == 'ecdsa':
-                pub_key.verify(
-                    firma,
-                    mensaje,
-                    ec.ECDSA(hashes.SHA256())
-                )
-            else:
-                raise ValueError(f"Tipo de curva no soportado para verificación: {self.tipo_curva}")
+            verificar = pub_key.verify
+            algoritmo = ec.ECDSA(Prehashed(hashes.SHA256()))
+            for posicion, firma, digest in pendientes:
+                try:
+                    verificar(firma, digest, algoritmo)
+                except InvalidSignature:
+                    motivos[posicion] = MOTIVO_FIRMA_INVALIDA
+            return motivos, {}
+        
+        return _unir_tramos(verificar_tramo, len(recibos), tamano_tramo, ejecutor)[0]
+    
+    def firmar_datos(self, datos):
+        """
+        Firma datos arbitrarios con la clave privada del notario.
+        
+        Se usa para estructuras distintas de los recibos (por ejemplo, las
+        cabezas firmadas del registro de transparencia); el llamador debe
+        incluir un prefijo de dominio para que no se confundan con un recibo.
+        
+        Args:
+            datos (bytes): Datos a firmar
             
-            return True
+        Returns:
+            str: Firma en base64
+        """
+        if self.private_key is None:
+            raise ValueError("No hay clave privada cargada")
+        
+        if self.tipo_curva != 'ecdsa':
+            raise ValueError(f"Tipo de curva no soportado para firma: {self.tipo_curva}")
+        
+        firma = self.private_key.sign(datos, ec.ECDSA(hashes.SHA256()))
+        return base64.b64encode(firma).decode()
+    
+    def verificar_datos(self, datos, firma_b64, clave_publica=None):
+        """
+        Verifica una firma producida con `firmar_datos`.
+        
+        Args:
+            datos (bytes): Datos firmados
+            firma_b64 (str): Firma en base64
+            clave_publica: Clave pública a usar (opcional, usa la cargada si no se provee)
             
-        except InvalidSignature:
-            return False
-        except Exception as e:
-            print(f"Error en verificación: {e}")
+        Returns:
+            bool: True si la firma es válida
+        """
+        pub_key = clave_publica if clave_publica else self.public_key
+        if pub_key is None:
+            raise ValueError("No hay clave pública disponible")
+        
+        try:
+            pub_key.verify(base64.b64decode(firma_b64), datos, ec.ECDSA(hashes.SHA256()))
+            return True
+        except (InvalidSignature, ValueError):
             return False
     
     def exportar_clave_publica_str(self):
@@ -284,10 +626,237 @@ class NotarioCrypto:
         Args:
             pem_str (str): Clave pública en formato PEM
         """
-        self.public_key = serialization.load_pem_public_key(
-            pem_str.encode(),
-            backend=default_backend()
+        self.public_key = REGISTRO_CLAVES.publica_pem(pem_str)
+
+    def huella_clave_publica(self):
+        """
+        Calcula la huella de la clave pública (SHA-256 de su codificación DER).
+
+        Sirve para fijar (pin) la clave del notario y detectar si cambia.
+
+        Returns:
+            str: Huella en formato hexadecimal
+        """
+        if self.public_key is None:
+            raise ValueError("No hay clave pública cargada")
+
+        der = self.public_key.public_bytes(
+            encoding=serialization.Encoding.DER,
+            format=serialization.PublicFormat.SubjectPublicKeyInfo
         )
+        return hashlib.sha256(der).hexdigest()
+
+
+def _unir_tramos(procesar_tramo, total, tamano_tramo, ejecutor=None):
+    """
+    Procesa [0, total) por tramos, en serie o repartidos en un ejecutor.
+    
+    Args:
+        procesar_tramo (callable): Recibe el índice inicial de un tramo y
+                                   devuelve (resultados, {índice: motivo})
+        total (int): Número de elementos
+        tamano_tramo (int): Elementos por tramo
+        ejecutor (Executor, optional): Pool en el que repartir los tramos
+        
+    Returns:
+        tuple: (resultados en orden, {índice: motivo} de todos los tramos)
+    """
+    inicios = range(0, total, max(tamano_tramo, 1))
+    if ejecutor is not None and len(inicios) > 1:
+        partes = ejecutor.map(procesar_tramo, inicios)
+    else:
+        partes = map(procesar_tramo, inicios)
+    resultados, fallos = [], {}
+    for parte, fallos_parte in partes:
+        resultados.extend(parte)
+        fallos.update(fallos_parte)
+    return resultados, fallos
+
+
+def _ancho_escalar(curva):
+    """Bytes de r (o de s) en una firma raw de la curva."""
+    return (curva.key_size + 7) // 8
+
+
+def _raw_a_der(firma_raw, ancho):
+    if len(firma_raw) != 2 * ancho:
+        raise ValueError(f"Una firma raw de esta curva ocupa {2 * ancho} bytes, no {len(firma_raw)}")
+    return encode_dss_signature(int.from_bytes(firma_raw[:ancho], 'big'),
+                                int.from_bytes(firma_raw[ancho:], 'big'))
+
+
+def longitud_firma_raw(curva):
+    """
+    Longitud fija de una firma raw (r||s) en una curva.
+    
+    Args:
+        curva (str): Nombre de la curva (p. ej. 'SECP256R1')
+        
+    Returns:
+        int: Bytes de la firma (64 en SECP256R1, 132 en SECP521R1)
+    """
+    return 2 * _ancho_escalar(CURVAS_SOPORTADAS[curva]['curva'])
+
+
+def firma_der_a_raw(firma_der, curva):
+    """
+    Convierte una firma ECDSA DER a r||s de anchura fija.
+    
+    Args:
+        firma_der (bytes): Firma en DER
+        curva (str): Nombre de la curva de la firma
+        
+    Returns:
+        bytes: r||s en big-endian, de `longitud_firma_raw(curva)` bytes
+        
+    Raises:
+        ValueError: Si la firma no es DER válido o no cabe en la curva
+    """
+    ancho = _ancho_escalar(CURVAS_SOPORTADAS[curva]['curva'])
+    r, s = decode_dss_signature(firma_der)
+    try:
+        return r.to_bytes(ancho, 'big') + s.to_bytes(ancho, 'big')
+    except OverflowError:
+        raise ValueError(f"La firma no corresponde a la curva {curva}") from None
+
+
+def firma_raw_a_der(firma_raw, curva):
+    """
+    Convierte una firma r||s de anchura fija a DER.
+    
+    Args:
+        firma_raw (bytes): Firma r||s en big-endian
+        curva (str): Nombre de la curva de la firma
+        
+    Returns:
+        bytes: Firma en DER
+        
+    Raises:
+        ValueError: Si la longitud no es la de la curva
+    """
+    return _raw_a_der(firma_raw, _ancho_escalar(CURVAS_SOPORTADAS[curva]['curva']))
+
+
+def recodificar_firma(recibo, codificacion):
+    """
+    Copia de un recibo con la firma en otra codificación.
+    
+    La firma sigue siendo la misma (mismos r y s), así que el recibo
+    recodificado verifica igual. El digest de la cadena y del registro de
+    transparencia, en cambio, cubre la firma tal como está escrita: solo
+    los recibos no encadenados ni registrados se pueden recodificar sin
+    romper esas pruebas.
+    
+    Args:
+        recibo (dict): Recibo con {firma, curva} y opcionalmente {codificacion_firma}
+        codificacion (str): Codificación de destino (ver CODIFICACIONES_FIRMA)
+        
+    Returns:
+        dict: Recibo nuevo con la firma recodificada
+    """
+    if codificacion not in CODIFICACIONES_FIRMA:
+        raise ValueError(f"Codificación de firma no soportada: {codificacion}")
+    curva = recibo.get('curva', 'SECP256R1')
+    firma = base64.b64decode(recibo['firma'], validate=True)
+    if recibo.get('codificacion_firma', CODIFICACION_FIRMA_DER) == CODIFICACION_FIRMA_RAW:
+        firma = firma_raw_a_der(firma, curva)
+    if codificacion == CODIFICACION_FIRMA_RAW:
+        firma = firma_der_a_raw(firma, curva)
+    
+    nuevo = {campo: valor for campo, valor in recibo.items() if campo != 'codificacion_firma'}
+    nuevo['firma'] = base64.b64encode(firma).decode()
+    if codificacion != CODIFICACION_FIRMA_DER:
+        nuevo['codificacion_firma'] = codificacion
+    return nuevo
+
+
+def _recibo_sin_firma(hash_hex, timestamp, version, secuencia=None, anterior=None,
+                      modo_hash=None, bloque_hash=None):
+    """Campos firmados de un recibo nuevo; comprueba que el hash sea hexadecimal."""
+    bytes.fromhex(hash_hex)
+    recibo = {
+        "timestamp": timestamp,
+        "hash": hash_hex
+    }
+    if version != VERSION_RECIBO_TEXTO:
+        recibo["version"] = version
+    if secuencia is not None:
+        recibo["secuencia"] = secuencia
+        recibo["anterior"] = anterior
+    if modo_hash is not None:
+        recibo["modo_hash"] = modo_hash
+        recibo["bloque_hash"] = bloque_hash
+    return recibo
+
+
+def construir_mensaje(recibo):
+    """
+    Construye el mensaje firmado de un recibo.
+    
+    En la versión 1 el mensaje es "hash|timestamp"; los recibos encadenados
+    añaden "|secuencia|anterior" para que la firma cubra su posición en la
+    cadena, y los de hash en árbol "|modo_hash|bloque_hash" para que cubra cómo
+    se calculó el hash.
+    
+    En la versión 2 los mismos campos se codifican en binario, con longitud
+    explícita: el prefijo de dominio, el hash (1 byte de longitud y sus bytes),
+    el timestamp (2 bytes de longitud y su UTF-8), un byte de indicadores
+    (1: encadenado, 2: modo de hash) y, según ellos, la secuencia (8 bytes) con
+    el digest anterior, y el modo de hash con el tamaño de bloque (8 bytes).
+    Los enteros van en little-endian.
+    
+    Args:
+        recibo (dict): Recibo con {hash, timestamp} y opcionalmente {version},
+                       {secuencia, anterior} y {modo_hash, bloque_hash}
+        
+    Returns:
+        bytes: Mensaje a firmar o verificar
+        
+    Raises:
+        ValueError: Si la versión no está soportada o un campo binario no es válido
+    """
+    version = recibo.get('version', VERSION_RECIBO_TEXTO)
+    if version == VERSION_RECIBO_TEXTO:
+        mensaje = f"{recibo['hash']}|{recibo['timestamp']}"
+        if recibo.get('secuencia') is not None:
+            mensaje += f"|{recibo['secuencia']}|{recibo['anterior']}"
+        if recibo.get('modo_hash') is not None:
+            mensaje += f"|{recibo['modo_hash']}|{recibo['bloque_hash']}"
+        return mensaje.encode()
+    if version != VERSION_RECIBO_BINARIO:
+        raise ValueError(f"Versión de recibo no soportada: {version}")
+    
+    hash_bytes = bytes.fromhex(recibo['hash'])
+    timestamp = recibo['timestamp'].encode('utf-8')
+    encadenado = recibo.get('secuencia') is not None
+    modo_hash = recibo.get('modo_hash')
+    partes = [_DOMINIO_BINARIO,
+              struct.pack('<B', len(hash_bytes)), hash_bytes,
+              struct.pack('<H', len(timestamp)), timestamp,
+              struct.pack('<B', (1 if encadenado else 0) | (2 if modo_hash is not None else 0))]
+    if encadenado:
+        anterior = bytes.fromhex(recibo['anterior'])
+        partes += [struct.pack('<QB', recibo['secuencia'], len(anterior)), anterior]
+    if modo_hash is not None:
+        modo = modo_hash.encode('ascii')
+        partes += [struct.pack('<B', len(modo)), modo, struct.pack('<Q', recibo['bloque_hash'])]
+    return b''.join(partes)
+
+
+def digest_firma(recibo):
+    """
+    Digest SHA-256 que firma ECDSA para un recibo (de cualquier versión).
+    
+    Separarlo de la firma permite calcular los digests de muchos recibos por
+    adelantado y firmar o verificar con `Prehashed`.
+    
+    Args:
+        recibo (dict): Recibo (ver `construir_mensaje`)
+        
+    Returns:
+        bytes: Digest de 32 bytes
+    """
+    return hashlib.sha256(construir_mensaje(recibo)).digest()
 
 
 def guardar_recibo(recibo, filepath):
@@ -302,16 +871,43 @@ def guardar_recibo(recibo, filepath):
         json.dump(recibo, f, indent=2, ensure_ascii=False)
 
 
+def nombre_archivo_recibo(recibo):
+    """
+    Nombre de archivo con el que se guarda un recibo en receipts/.
+    
+    Args:
+        recibo (dict): Recibo con {timestamp, archivo_original} y opcionalmente curva
+        
+    Returns:
+        str: recibo_{archivo}_{curva}_{timestamp}.json
+    """
+    timestamp_str = recibo['timestamp'].replace(':', '-').replace('.', '-')
+    curva = recibo.get('curva', 'SECP256R1')
+    nombre = recibo.get('archivo_original', '').replace(os.sep, '_').replace('/', '_')
+    return f"recibo_{nombre}_{curva}_{timestamp_str}.json"
+
+
+def es_archivo_recibo(nombre):
+    """Indica si un nombre de archivo de receipts/ es el de un recibo (ver `nombre_archivo_recibo`)."""
+    return nombre.startswith('recibo_') and nombre.endswith('.json')
+
+
 def cargar_recibo(filepath):
     """
-    Carga un recibo digital desde un archivo JSON.
+    Carga un recibo digital desde un archivo JSON o desde un archivo de recibos.
     
     Args:
-        filepath (str): Ruta del archivo de recibo
+        filepath (str | tuple): Ruta del archivo de recibo, o una referencia
+                                (ruta del archivo de recibos, hash) que carga el
+                                recibo más reciente de ese hash
         
     Returns:
         dict: Recibo cargado
     """
+    if isinstance(filepath, tuple):
+        # Importación diferida: archivo_recibos depende de este módulo
+        from shared.archivo_recibos import cargar_de_archivo
+        return cargar_de_archivo(*filepath)
     with open(filepath, 'r', encoding='utf-8') as f:
         return json.load(f)
 
@@ -0,0 +1,171 @@
+"""
+Filtro de Bloom para consultas de pertenencia sobre hashes notarizados.
+Responde "seguro que no" sin tocar el almacenamiento y "quizás sí" con una
+tasa de falsos positivos configurable.
+"""
+
+import hashlib
+import math
+import os
+import struct
+import threading
+
+
+# Cabecera del archivo persistido: magia, versión, m (bits), k, capacidad,
+# tasa de falsos positivos, elementos insertados, bits activos y desplazamiento
+# del registro de recibos cubierto por el filtro.
+_MAGIA = b'NDBLOOM1'
+_CABECERA = struct.Struct('<8sIQIQdQQQ')
+
+
+class FiltroBloom:
+    """
+    Filtro de Bloom dimensionado a partir del volumen esperado.
+
+    El número de bits (m) y de funciones hash (k) se calculan para que, con
+    `capacidad` elementos insertados, la tasa de falsos positivos sea
+    `tasa_falsos_positivos`.
+    """
+
+    def __init__(self, capacidad=1000000, tasa_falsos_positivos=0.001):
+        """
+        Args:
+            capacidad (int): Número esperado de elementos
+            tasa_falsos_positivos (float): Tasa objetivo de falsos positivos (0 < p < 1)
+        """
+        if capacidad < 1:
+            raise ValueError("La capacidad debe ser al menos 1")
+        if not 0 < tasa_falsos_positivos < 1:
+            raise ValueError("La tasa de falsos positivos debe estar entre 0 y 1")
+
+        self.capacidad = capacidad
+        self.tasa_falsos_positivos = tasa_falsos_positivos
+        self.num_bits = max(8, math.ceil(-capacidad * math.log(tasa_falsos_positivos) / (math.log(2) ** 2)))
+        self.num_hashes = max(1, round(self.num_bits / capacidad * math.log(2)))
+        self.bits = bytearray((self.num_bits + 7) // 8)
+        self.elementos = 0
+        self.bits_activos = 0
+        # Desplazamiento del registro de recibos hasta el que el filtro está al día
+        self.desplazamiento = 0
+        self._lock = threading.Lock()
+
+    def _posiciones(self, elemento):
+        """Calcula las k posiciones de bit mediante doble hashing."""
+        if isinstance(elemento, str):
+            elemento = elemento.lower().encode()
+        digest = hashlib.blake2b(elemento, digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+
+    def agregar(self, elemento):
+        """
+        Agrega un elemento (str o bytes) al filtro.
+
+        Returns:
+            bool: True si el elemento no estaba (algún bit cambió)
+        """
+        nuevo = False
+        with self._lock:
+            for pos in self._posiciones(elemento):
+                byte, mascara = pos >> 3, 1 << (pos & 7)
+                if not self.bits[byte] & mascara:
+                    self.bits[byte] |= mascara
+                    self.bits_activos += 1
+                    nuevo = True
+            if nuevo:
+                self.elementos += 1
+        return nuevo
+
+    def __contains__(self, elemento):
+        bits = self.bits
+        for pos in self._posiciones(elemento):
+            if not bits[pos >> 3] & (1 << (pos & 7)):
+                return False
+        return True
+
+    def saturacion(self):
+        """Fracción de bits activos (0.0 - 1.0)."""
+        return self.bits_activos / self.num_bits
+
+    def tasa_falsos_positivos_estimada(self):
+        """Tasa de falsos positivos esperada con la ocupación actual."""
+        return self.saturacion() ** self.num_hashes
+
+    def elementos_estimados(self):
+        """Estimación del número de elementos distintos a partir de los bits activos."""
+        if self.bits_activos >= self.num_bits:
+            return float('inf')
+        return -self.num_bits / self.num_hashes * math.log(1 - self.bits_activos / self.num_bits)
+
+    def estadisticas(self):
+        """
+        Resume el estado del filtro.
+
+        Returns:
+            dict: Dimensiones, saturación y estimaciones de falsos positivos
+        """
+        return {
+            "capacidad": self.capacidad,
+            "tasa_falsos_positivos_objetivo": self.tasa_falsos_positivos,
+            "tasa_falsos_positivos_estimada": self.tasa_falsos_positivos_estimada(),
+            "saturacion": self.saturacion(),
+            "elementos": self.elementos,
+            "elementos_estimados": self.elementos_estimados(),
+            "bits": self.num_bits,
+            "funciones_hash": self.num_hashes,
+            "memoria_bytes": len(self.bits),
+        }
+
+    def compatible(self, capacidad, tasa_falsos_positivos):
+        """Indica si el filtro se dimensionó con los parámetros indicados."""
+        return self.capacidad == capacidad and self.tasa_falsos_positivos == tasa_falsos_positivos
+
+    def guardar(self, filepath):
+        """
+        Persiste el filtro en disco de forma atómica.
+
+        Args:
+            filepath (str): Ruta del archivo de destino
+        """
+        temporal = filepath + '.tmp'
+        with self._lock:
+            cabecera = _CABECERA.pack(
+                _MAGIA, 1, self.num_bits, self.num_hashes, self.capacidad,
+                self.tasa_falsos_positivos, self.elementos, self.bits_activos,
+                self.desplazamiento
+            )
+            with open(temporal, 'wb') as f:
+                f.write(cabecera)
+                f.write(self.bits)
+        os.replace(temporal, filepath)
+
+    @classmethod
+    def cargar(cls, filepath):
+        """
+        Carga un filtro persistido con `guardar`.
+
+        Args:
+            filepath (str): Ruta del archivo
+
+        Returns:
+            FiltroBloom: Filtro restaurado
+        """
+        with open(filepath, 'rb') as f:
+            datos = f.read()
+
+        (magia, version, num_bits, num_hashes, capacidad, tasa,
+         elementos, bits_activos, desplazamiento) = _CABECERA.unpack_from(datos)
+        if magia != _MAGIA or version != 1:
+            raise ValueError(f"Archivo de filtro de Bloom inválido: {filepath}")
+
+        filtro = cls(capacidad, tasa)
+        bits = datos[_CABECERA.size:]
+        if filtro.num_bits != num_bits or filtro.num_hashes != num_hashes or len(bits) != len(filtro.bits):
+            raise ValueError(f"Dimensiones del filtro de Bloom inconsistentes: {filepath}")
+
+        filtro.bits = bytearray(bits)
+        filtro.elementos = elementos
+        filtro.bits_activos = bits_activos
+        filtro.desplazamiento = desplazamiento
+        return filtro
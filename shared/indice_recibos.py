@@ -0,0 +1,256 @@
+"""
+Índice en disco de los recibos de un fragmento, ordenado por hash.
+
+El índice es un archivo de registros de ancho fijo (hash de 32 bytes,
+desplazamiento de 8 bytes y timestamp de 8 bytes) ordenados por hash, que se
+consulta con búsqueda binaria sobre un `mmap`: no se carga nada en memoria de
+Python y abrirlo es instantáneo aunque tenga cientos de millones de entradas.
+
+Las altas recientes esperan en un búfer pequeño en memoria que se fusiona con
+el archivo (al estilo de un LSM) cuando alcanza su límite y al cerrar.
+"""
+
+import heapq
+import mmap
+import os
+import struct
+import threading
+from datetime import datetime, timedelta, timezone
+
+
+# Cabecera: magia y desplazamiento del fragmento hasta el que el archivo está al día
+_MAGIA = b'NDIDX001'
+_CABECERA = struct.Struct('<8sQ')
+# Registro: hash, desplazamiento del recibo y timestamp en microsegundos desde epoch
+_REGISTRO = struct.Struct('<32sQq')
+TAMANO_REGISTRO = _REGISTRO.size
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def timestamp_a_micros(timestamp):
+    """
+    Convierte un timestamp ISO 8601 de recibo a microsegundos desde epoch.
+
+    Args:
+        timestamp (str): Timestamp del recibo (UTC, con o sin 'Z')
+
+    Returns:
+        int: Microsegundos desde epoch (0 si no se puede interpretar)
+    """
+    try:
+        fecha = datetime.fromisoformat(timestamp.rstrip('Z'))
+    except (AttributeError, ValueError):
+        return 0
+    if fecha.tzinfo is None:
+        fecha = fecha.replace(tzinfo=timezone.utc)
+    return (fecha - _EPOCH) // timedelta(microseconds=1)
+
+
+class IndiceOrdenado:
+    """
+    Índice hash -> (desplazamiento, timestamp) con base en disco y búfer en memoria.
+
+    Las búsquedas consultan el archivo mapeado, el búfer que se está fusionando
+    (si lo hay) y el búfer activo. La fusión escribe un archivo nuevo en
+    segundo plano y lo sustituye de forma atómica.
+    """
+
+    def __init__(self, ruta, limite_buffer=50000):
+        """
+        Args:
+            ruta (str): Archivo del índice (se crea si no existe)
+            limite_buffer (int): Entradas en memoria que disparan una fusión
+        """
+        self.ruta = ruta
+        self.limite_buffer = limite_buffer
+        self._lock = threading.Lock()
+        self._buffer = {}
+        self._pendientes = 0
+        self._congelado = {}
+        self._fusionando = False
+        self._hilo_fusion = None
+        self._archivo = None
+        self._mapa = None
+        self._abrir_base()
+        # Desplazamiento del fragmento cubierto por la base y los búferes
+        self.cubierto = self._base_cubierto
+
+    def _abrir_base(self):
+        if not os.path.exists(self.ruta):
+            with open(self.ruta, 'wb') as f:
+                f.write(_CABECERA.pack(_MAGIA, 0))
+
+        self._archivo = open(self.ruta, 'rb')
+        magia, cubierto = _CABECERA.unpack(self._archivo.read(_CABECERA.size))
+        if magia != _MAGIA:
+            self._archivo.close()
+            raise ValueError(f"{self.ruta} no es un índice de recibos")
+        tamano = os.fstat(self._archivo.fileno()).st_size
+        self._base_cubierto = cubierto
+        self.entradas_base = (tamano - _CABECERA.size) // TAMANO_REGISTRO
+        self._mapa = (mmap.mmap(self._archivo.fileno(), 0, access=mmap.ACCESS_READ)
+                      if self.entradas_base else None)
+
+    def _cerrar_base(self):
+        if self._mapa is not None:
+            self._mapa.close()
+            self._mapa = None
+        if self._archivo is not None:
+            self._archivo.close()
+            self._archivo = None
+
+    def agregar(self, hash_hex, desplazamiento, timestamp, fin):
+        """
+        Registra un recibo recién anexado al fragmento.
+
+        Args:
+            hash_hex (str): Hash del documento
+            desplazamiento (int): Inicio del recibo en el fragmento
+            timestamp (str): Timestamp ISO 8601 del recibo
+            fin (int): Desplazamiento donde termina el recibo
+        """
+        entrada = (desplazamiento, timestamp_a_micros(timestamp))
+        with self._lock:
+            self._buffer.setdefault(bytes.fromhex(hash_hex), []).append(entrada)
+            self._pendientes += 1
+            self.cubierto = fin
+            if self._pendientes >= self.limite_buffer and not self._fusionando \
+                    and (self._hilo_fusion is None or not self._hilo_fusion.is_alive()):
+                self._hilo_fusion = threading.Thread(target=self.fusionar, name="fusionar-indice", daemon=True)
+                self._hilo_fusion.start()
+
+    def buscar(self, hash_hex):
+        """
+        Busca las entradas de un hash.
+
+        Args:
+            hash_hex (str): Hash en hexadecimal
+
+        Returns:
+            list: Tuplas (desplazamiento, timestamp en µs) ordenadas por desplazamiento
+        """
+        clave = bytes.fromhex(hash_hex)
+        with self._lock:
+            entradas = self._buscar_base(clave)
+            entradas.extend(self._congelado.get(clave, ()))
+            entradas.extend(self._buffer.get(clave, ()))
+        entradas.sort()
+        return entradas
+
+    def _buscar_base(self, clave):
+        """Búsqueda binaria del primer registro con el hash y recorrido de los iguales."""
+        mapa = self._mapa
+        if mapa is None:
+            return []
+        bajo, alto = 0, self.entradas_base
+        while bajo < alto:
+            medio = (bajo + alto) // 2
+            inicio = _CABECERA.size + medio * TAMANO_REGISTRO
+            if mapa[inicio:inicio + 32] < clave:
+                bajo = medio + 1
+            else:
+                alto = medio
+
+        entradas = []
+        inicio = _CABECERA.size + bajo * TAMANO_REGISTRO
+        while bajo < self.entradas_base and mapa[inicio:inicio + 32] == clave:
+            _, desplazamiento, micros = _REGISTRO.unpack_from(mapa, inicio)
+            entradas.append((desplazamiento, micros))
+            bajo += 1
+            inicio += TAMANO_REGISTRO
+        return entradas
+
+    def _registros_base(self, mapa, entradas, bloque=4096):
+        """Recorre los registros de la base en orden, leyendo por bloques."""
+        for primero in range(0, entradas, bloque):
+            inicio = _CABECERA.size + primero * TAMANO_REGISTRO
+            datos = mapa[inicio:inicio + min(bloque, entradas - primero) * TAMANO_REGISTRO]
+            for desde in range(0, len(datos), TAMANO_REGISTRO):
+                yield datos[desde:desde + TAMANO_REGISTRO]
+
+    def fusionar(self):
+        """
+        Fusiona el búfer con el archivo del índice.
+
+        Returns:
+            bool: True si se escribió un índice nuevo
+        """
+        with self._lock:
+            if self._fusionando or not self._buffer:
+                return False
+            self._fusionando = True
+            self._congelado, self._buffer = self._buffer, {}
+            self._pendientes = 0
+            cubierto = self.cubierto
+            mapa, entradas = self._mapa, self.entradas_base
+
+        try:
+            nuevos = sorted(_REGISTRO.pack(clave, desplazamiento, micros)
+                            for clave, lista in self._congelado.items()
+                            for desplazamiento, micros in lista)
+            registros = nuevos if mapa is None else heapq.merge(self._registros_base(mapa, entradas), nuevos)
+
+            temporal = self.ruta + '.tmp'
+            with open(temporal, 'wb') as f:
+                f.write(_CABECERA.pack(_MAGIA, cubierto))
+                lote = []
+                for registro in registros:
+                    lote.append(registro)
+                    if len(lote) >= 4096:
+                        f.write(b''.join(lote))
+                        lote = []
+                f.write(b''.join(lote))
+                f.flush()
+                os.fsync(f.fileno())
+
+            with self._lock:
+                self._cerrar_base()
+                os.replace(temporal, self.ruta)
+                self._abrir_base()
+                self._congelado = {}
+            return True
+        except Exception:
+            # Devolver las entradas al búfer para no perderlas
+            with self._lock:
+                for clave, lista in self._congelado.items():
+                    self._buffer.setdefault(clave, [])[:0] = lista
+                self._congelado = {}
+            raise
+        finally:
+            with self._lock:
+                self._fusionando = False
+
+    def reiniciar(self):
+        """Vacía el índice (el fragmento se volverá a indexar desde el inicio)."""
+        with self._lock:
+            self._cerrar_base()
+            with open(self.ruta, 'wb') as f:
+                f.write(_CABECERA.pack(_MAGIA, 0))
+            self._buffer, self._congelado, self._pendientes = {}, {}, 0
+            self._abrir_base()
+            self.cubierto = 0
+
+    def estadisticas(self):
+        """Entradas en disco y en memoria."""
+        with self._lock:
+            return {
+                "entradas_disco": self.entradas_base,
+                "entradas_buffer": sum(len(l) for l in self._buffer.values())
+                                   + sum(len(l) for l in self._congelado.values())
+            }
+
+    def cerrar(self, fusionar=True):
+        """
+        Cierra el índice.
+
+        Args:
+            fusionar (bool): Volcar antes el búfer para que el próximo arranque
+                             no tenga que reindexar la cola del fragmento
+        """
+        if self._hilo_fusion is not None:
+            self._hilo_fusion.join()
+        if fusionar:
+            self.fusionar()
+        with self._lock:
+            self._cerrar_base()
@@ -0,0 +1,329 @@
+"""
+Motor de hashing de archivos para el Notario Digital.
+
+Elige cómo leer cada archivo según su tamaño y su sistema de archivos:
+- Archivos pequeños: una sola lectura.
+- Archivos grandes en disco local: mmap, sin copiar los datos a un búfer
+  intermedio.
+- Sistemas de archivos de red: `readinto` sobre un búfer reutilizable. Con
+  mmap, un archivo truncado en otro equipo provoca SIGBUS en este proceso.
+- Sin progreso ni cancelación y sin mmap: `hashlib.file_digest` (Python 3.11+),
+  que hace el mismo bucle `readinto` en C.
+
+Además del SHA-256 plano ofrece un modo árbol para archivos muy grandes: el
+archivo se parte en bloques de tamaño fijo que se hashean en paralelo y se
+combinan en una raíz de Merkle (RFC 6962, como el registro de transparencia).
+"""
+
+import hashlib
+import mmap
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from shared.transparencia import hash_nodo
+
+# Tamaño de bloque por defecto (1 MiB): múltiplo de página y lo bastante
+# grande para amortizar las llamadas al sistema
+TAMANO_BLOQUE = 1024 * 1024
+
+# Por debajo de este tamaño se lee el archivo de una vez
+LIMITE_LECTURA_UNICA = 1024 * 1024
+
+# A partir de este tamaño se usa mmap en sistemas de archivos locales
+LIMITE_MMAP = 4 * 1024 * 1024
+
+ESTRATEGIAS = ('unica', 'readinto', 'mmap', 'file_digest')
+
+# Tipos de sistema de archivos en los que no se usa mmap
+SISTEMAS_RED = {
+    'nfs', 'nfs4', 'cifs', 'smb3', 'smbfs', '9p', 'afs', 'ceph', 'glusterfs',
+    'fuse.sshfs', 'fuse.rclone', 'davfs', 'fuse.s3fs'
+}
+
+# Modos de hash de un recibo: SHA-256 del archivo completo, o raíz de Merkle
+# de los SHA-256 de bloques de `bloque_hash` bytes
+MODO_PLANO = 'sha256'
+MODO_ARBOL = 'arbol-sha256'
+MODOS_HASH = (MODO_PLANO, MODO_ARBOL)
+
+# Tamaño de bloque del modo árbol: potencia de 2 entre 64 KiB y 1 GiB
+BLOQUE_ARBOL = 4 * 1024 * 1024
+BLOQUE_ARBOL_MIN = 64 * 1024
+BLOQUE_ARBOL_MAX = 1024 * 1024 * 1024
+# Los bloques del árbol se leen en tramos de como mucho este tamaño: el
+# bloque lo fija el recibo que se verifica, y no debe decidir cuánta memoria
+# reserva cada hilo
+TRAMO_LECTURA_ARBOL = 4 * 1024 * 1024
+
+# Prefijo de dominio de RFC 6962 para las hojas
+_PREFIJO_HOJA = b'\x00'
+
+_locales = threading.local()
+
+
+class HashCancelado(Exception):
+    """El cálculo del hash de un archivo se canceló antes de terminar."""
+
+
+def _buffer(tamano):
+    """Búfer reutilizable por hilo para `readinto`."""
+    buffer = getattr(_locales, 'buffer', None)
+    if buffer is None or len(buffer) != tamano:
+        buffer = bytearray(tamano)
+        _locales.buffer = buffer
+    return buffer
+
+
+def _puntos_montaje():
+    """Puntos de montaje y su tipo (solo Linux), del más largo al más corto."""
+    try:
+        with open('/proc/self/mounts', 'r', encoding='utf-8') as f:
+            montajes = [linea.split()[1:3] for linea in f if len(linea.split()) >= 3]
+    except OSError:
+        return []
+    # Los espacios en la ruta de montaje vienen escapados como \040
+    montajes = [(punto.replace('\\040', ' '), tipo) for punto, tipo in montajes]
+    return sorted(montajes, key=lambda m: len(m[0]), reverse=True)
+
+
+def sistema_archivos(ruta):
+    """
+    Tipo del sistema de archivos que contiene una ruta.
+
+    Args:
+        ruta (str): Ruta de un archivo
+
+    Returns:
+        str: Tipo (ext4, nfs4, ...) o None si no se puede determinar
+    """
+    real = os.path.realpath(ruta)
+    for punto, tipo in _puntos_montaje():
+        if real == punto or real.startswith(punto.rstrip('/') + '/'):
+            return tipo
+    return None
+
+
+def elegir_estrategia(ruta, tamano, con_avance=False):
+    """
+    Elige la estrategia de lectura para un archivo.
+
+    Args:
+        ruta (str): Ruta del archivo
+        tamano (int): Tamaño en bytes
+        con_avance (bool): Si hay que informar de progreso o permitir cancelar
+
+    Returns:
+        str: Una de ESTRATEGIAS
+    """
+    if tamano < LIMITE_LECTURA_UNICA:
+        return 'unica'
+    if tamano >= LIMITE_MMAP and sistema_archivos(ruta) not in SISTEMAS_RED:
+        return 'mmap'
+    if con_avance or not hasattr(hashlib, 'file_digest'):
+        return 'readinto'
+    return 'file_digest'
+
+
+def hashear_archivo(ruta, progreso=None, cancelado=None, estrategia=None,
+                    tamano_bloque=TAMANO_BLOQUE, algoritmo='sha256'):
+    """
+    Calcula el hash de un archivo.
+
+    Args:
+        ruta (str): Ruta del archivo
+        progreso (callable, optional): Se llama con (bytes_leidos, total) tras cada bloque
+        cancelado (callable, optional): Devuelve True para interrumpir el cálculo
+        estrategia (str, optional): Fuerza una de ESTRATEGIAS (por defecto se elige sola)
+        tamano_bloque (int): Bytes por bloque en `readinto` y mmap
+        algoritmo (str): Algoritmo de hashlib
+
+    Returns:
+        str: Hash en hexadecimal
+
+    Raises:
+        HashCancelado: Si `cancelado()` devuelve True antes de terminar
+    """
+    con_avance = progreso is not None or cancelado is not None
+    with open(ruta, 'rb') as f:
+        total = os.fstat(f.fileno()).st_size
+        estrategia = estrategia or elegir_estrategia(ruta, total, con_avance)
+        if estrategia not in ESTRATEGIAS:
+            raise ValueError(f"Estrategia de hash desconocida: {estrategia}")
+        if estrategia == 'mmap' and total == 0:
+            estrategia = 'unica'  # mmap no admite archivos vacíos
+        if estrategia == 'file_digest' and con_avance:
+            estrategia = 'readinto'  # file_digest no informa de progreso
+
+        if estrategia == 'file_digest':
+            return hashlib.file_digest(f, algoritmo).hexdigest()
+
+        h = hashlib.new(algoritmo)
+        leidos = 0
+
+        def avance(n):
+            nonlocal leidos
+            leidos += n
+            if cancelado is not None and cancelado():
+                raise HashCancelado(ruta)
+            if progreso is not None:
+                progreso(leidos, total)
+
+        if estrategia == 'unica':
+            datos = f.read()
+            h.update(datos)
+            avance(len(datos))
+        elif estrategia == 'mmap':
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapa:
+                if hasattr(mapa, 'madvise') and hasattr(mmap, 'MADV_SEQUENTIAL'):
+                    mapa.madvise(mmap.MADV_SEQUENTIAL)
+                with memoryview(mapa) as vista:
+                    for inicio in range(0, len(vista), tamano_bloque):
+                        # Liberar cada vista antes de cerrar el mapa, también si se cancela
+                        with vista[inicio:inicio + tamano_bloque] as bloque:
+                            h.update(bloque)
+                            n = len(bloque)
+                        avance(n)
+        else:
+            buffer = _buffer(tamano_bloque)
+            with memoryview(buffer) as vista:
+                while True:
+                    n = f.readinto(buffer)
+                    if not n:
+                        break
+                    h.update(vista[:n])
+                    avance(n)
+        return h.hexdigest()
+
+
+def validar_modo_hash(modo_hash, bloque_hash):
+    """
+    Comprueba el modo de hash de un recibo.
+
+    Args:
+        modo_hash (str): Uno de MODOS_HASH (None equivale a MODO_PLANO)
+        bloque_hash (int): Tamaño de bloque (solo en MODO_ARBOL)
+
+    Raises:
+        ValueError: Si el modo o el tamaño de bloque no son válidos
+    """
+    if modo_hash in (None, MODO_PLANO):
+        if bloque_hash is not None:
+            raise ValueError("bloque_hash solo se admite en el modo árbol")
+        return
+    if modo_hash != MODO_ARBOL:
+        raise ValueError(f"Modo de hash no soportado: {modo_hash}. Modos disponibles: {list(MODOS_HASH)}")
+    if not isinstance(bloque_hash, int) or bloque_hash & (bloque_hash - 1) \
+            or not BLOQUE_ARBOL_MIN <= bloque_hash <= BLOQUE_ARBOL_MAX:
+        raise ValueError(f"bloque_hash debe ser una potencia de 2 entre "
+                         f"{BLOQUE_ARBOL_MIN} y {BLOQUE_ARBOL_MAX} bytes")
+
+
+def raiz_merkle(hojas):
+    """
+    Raíz de Merkle (RFC 6962) de una lista de hashes de hoja.
+
+    Emparejar de abajo arriba subiendo sin cambios el nodo impar del final da
+    la misma raíz que la partición recursiva de RFC 6962.
+
+    Args:
+        hojas (list): Hashes de hoja de 32 bytes (al menos uno)
+
+    Returns:
+        bytes: Raíz de 32 bytes
+    """
+    nivel = list(hojas)
+    while len(nivel) > 1:
+        siguiente = [hash_nodo(nivel[i], nivel[i + 1]) for i in range(0, len(nivel) - 1, 2)]
+        if len(nivel) % 2:
+            siguiente.append(nivel[-1])
+        nivel = siguiente
+    return nivel[0]
+
+
+def hashear_arbol(ruta, bloque=BLOQUE_ARBOL, hilos=None, progreso=None, cancelado=None):
+    """
+    Calcula el hash en árbol de un archivo.
+
+    Cada bloque de `bloque` bytes (el último puede ser menor; un archivo vacío
+    es un único bloque vacío) da una hoja SHA-256(0x00 || bloque), y la raíz
+    de Merkle de las hojas es el hash del archivo. Los bloques se leen y
+    hashean en paralelo: hashlib y las lecturas liberan el GIL.
+
+    Args:
+        ruta (str): Ruta del archivo
+        bloque (int): Tamaño de bloque (ver `validar_modo_hash`)
+        hilos (int, optional): Hilos de trabajo (por defecto, núcleos disponibles)
+        progreso (callable, optional): Se llama con (bytes_leidos, total)
+        cancelado (callable, optional): Devuelve True para interrumpir el cálculo
+
+    Returns:
+        str: Raíz en hexadecimal
+
+    Raises:
+        HashCancelado: Si `cancelado()` devuelve True antes de terminar
+    """
+    validar_modo_hash(MODO_ARBOL, bloque)
+    hilos = hilos or os.cpu_count() or 1
+    total = os.path.getsize(ruta)
+    cantidad = max(1, -(-total // bloque))
+    hojas = [None] * cantidad
+
+    tramo = min(bloque, TRAMO_LECTURA_ARBOL)
+
+    def hashear_bloque(indice):
+        inicio = indice * bloque
+        largo = min(bloque, total - inicio)
+        h = hashlib.sha256(_PREFIJO_HOJA)
+        with open(ruta, 'rb', buffering=0) as f, memoryview(_buffer(tramo)) as vista:
+            f.seek(inicio)
+            leidos = 0
+            while leidos < largo:
+                n = f.readinto(vista[:min(tramo, largo - leidos)])
+                if not n:
+                    raise IOError(f"El archivo se truncó mientras se hasheaba: {ruta}")
+                h.update(vista[:n])
+                leidos += n
+        hojas[indice] = h.digest()
+        return largo
+
+    with ThreadPoolExecutor(max_workers=hilos, thread_name_prefix='hash-arbol') as ejecutor:
+        pendientes = set()
+        siguiente = 0
+        hechos = 0
+        # Ventana acotada de bloques en vuelo: la memoria no crece con el archivo
+        while siguiente < cantidad or pendientes:
+            while siguiente < cantidad and len(pendientes) < 2 * hilos:
+                pendientes.add(ejecutor.submit(hashear_bloque, siguiente))
+                siguiente += 1
+            listos, pendientes = wait(pendientes, return_when=FIRST_COMPLETED)
+            for futuro in listos:
+                hechos += futuro.result()
+            if cancelado is not None and cancelado():
+                for futuro in pendientes:
+                    futuro.cancel()
+                raise HashCancelado(ruta)
+            if progreso is not None:
+                progreso(hechos, total)
+
+    return raiz_merkle(hojas).hex()
+
+
+def hashear_segun_modo(ruta, modo_hash=None, bloque_hash=None, progreso=None, cancelado=None):
+    """
+    Calcula el hash de un archivo en el modo indicado por un recibo.
+
+    Args:
+        ruta (str): Ruta del archivo
+        modo_hash (str, optional): Uno de MODOS_HASH (por defecto MODO_PLANO)
+        bloque_hash (int, optional): Tamaño de bloque del modo árbol
+        progreso (callable, optional): Se llama con (bytes_leidos, total)
+        cancelado (callable, optional): Devuelve True para interrumpir el cálculo
+
+    Returns:
+        str: Hash en hexadecimal
+    """
+    validar_modo_hash(modo_hash, bloque_hash)
+    if modo_hash == MODO_ARBOL:
+        return hashear_arbol(ruta, bloque_hash, progreso=progreso, cancelado=cancelado)
+    return hashear_archivo(ruta, progreso=progreso, cancelado=cancelado)
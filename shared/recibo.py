@@ -0,0 +1,383 @@
+"""
+Representación compacta de los recibos para procesarlos en bloque.
+
+Un recibo en forma de dict con cadenas hexadecimales y base64 ocupa más de un
+kilobyte de objetos de Python. `Recibo` guarda el hash y la firma como bytes,
+el timestamp como microsegundos desde epoch y el resto en `__slots__`, y solo
+vuelve a la forma JSON cuando se le pide (`a_dict`, o campo a campo con
+`recibo['hash']`, de modo que `construir_mensaje` y `digest_recibo` lo aceptan
+sin convertirlo entero).
+
+`ColeccionRecibos` va más allá para colecciones grandes: guarda cada campo en
+una columna (`bytearray` o `array`), del orden de 200 bytes por recibo, y
+crea los `Recibo` al acceder a ellos.
+
+Los campos cuya representación textual no se puede reconstruir exactamente
+(un hash en mayúsculas, un timestamp con otro formato...) se conservan tal
+cual, porque la firma de la versión 1 cubre el texto original.
+"""
+
+import base64
+import json
+from array import array
+from datetime import datetime, timedelta
+
+from shared.indice_recibos import timestamp_a_micros
+
+try:
+    # Parser JSON opcional, bastante más rápido que el módulo estándar
+    import orjson
+
+    def _parsear(datos):
+        return orjson.loads(datos)
+except ImportError:
+    def _parsear(datos):
+        return json.loads(datos)
+
+
+_EPOCH = datetime(1970, 1, 1)
+
+# Campos con atributo propio; el resto se guarda en `_extra`
+_CAMPOS = ('timestamp', 'hash', 'version', 'secuencia', 'anterior', 'modo_hash', 'bloque_hash',
+           'firma', 'curva', 'codificacion_firma', 'indice_log', 'archivo_original')
+_ENTEROS = ('version', 'secuencia', 'bloque_hash', 'indice_log')
+
+
+def micros_a_timestamp(micros):
+    """
+    Convierte microsegundos desde epoch al timestamp ISO 8601 de los recibos.
+
+    Args:
+        micros (int): Microsegundos desde epoch (UTC)
+
+    Returns:
+        str: Timestamp como lo genera el servidor ('...Z', con microsegundos si no son 0)
+    """
+    return (_EPOCH + timedelta(microseconds=micros)).isoformat() + "Z"
+
+
+def _es_entero(valor):
+    return isinstance(valor, int) and not isinstance(valor, bool)
+
+
+class Recibo:
+    """
+    Recibo con el hash y la firma en bytes y el timestamp como entero.
+
+    Se comporta como un mapeo de solo lectura con las claves y valores del
+    recibo JSON (`recibo['hash']` devuelve el hexadecimal, `'secuencia' in
+    recibo`, `recibo.get('curva')`).
+    """
+
+    __slots__ = ('hash', 'firma', 'timestamp', 'curva', 'codificacion_firma', 'version', 'secuencia', 'anterior',
+                 'modo_hash', 'bloque_hash', 'indice_log', 'archivo_original', '_crudos', '_extra')
+
+    @classmethod
+    def desde_dict(cls, datos):
+        """
+        Crea un recibo compacto a partir de su forma JSON.
+
+        Args:
+            datos (dict): Recibo con al menos {timestamp, hash, firma}
+
+        Returns:
+            Recibo: Recibo compacto
+
+        Raises:
+            ValueError: Si falta un campo obligatorio o no tiene el tipo esperado
+        """
+        try:
+            texto_hash, texto_firma, texto_timestamp = datos['hash'], datos['firma'], datos['timestamp']
+            recibo = cls.__new__(cls)
+            recibo.hash = bytes.fromhex(texto_hash)
+            recibo.firma = base64.b64decode(texto_firma, validate=True)
+        except (KeyError, TypeError, ValueError) as e:
+            raise ValueError(f"Recibo no válido: {e!r}") from None
+        crudos = {}
+        if recibo.hash.hex() != texto_hash:
+            crudos['hash'] = texto_hash
+        if base64.b64encode(recibo.firma).decode() != texto_firma:
+            crudos['firma'] = texto_firma
+
+        recibo.timestamp = timestamp_a_micros(texto_timestamp)
+        if not isinstance(texto_timestamp, str):
+            raise ValueError(f"Timestamp no válido: {texto_timestamp!r}")
+        if micros_a_timestamp(recibo.timestamp) != texto_timestamp:
+            crudos['timestamp'] = texto_timestamp
+
+        for campo in _ENTEROS:
+            valor = datos.get(campo)
+            if valor is not None and not _es_entero(valor):
+                raise ValueError(f"{campo} no es un entero: {valor!r}")
+        recibo.version = datos.get('version')
+        recibo.secuencia = datos.get('secuencia')
+        recibo.bloque_hash = datos.get('bloque_hash')
+        recibo.indice_log = datos.get('indice_log')
+
+        anterior = datos.get('anterior')
+        try:
+            recibo.anterior = None if anterior is None else bytes.fromhex(anterior)
+        except (TypeError, ValueError):
+            raise ValueError(f"anterior no es hexadecimal: {anterior!r}") from None
+        if anterior is not None and recibo.anterior.hex() != anterior:
+            crudos['anterior'] = anterior
+
+        for campo in ('curva', 'codificacion_firma', 'modo_hash', 'archivo_original'):
+            valor = datos.get(campo)
+            if valor is not None and not isinstance(valor, str):
+                raise ValueError(f"{campo} no es texto: {valor!r}")
+        recibo.curva = datos.get('curva')
+        recibo.codificacion_firma = datos.get('codificacion_firma')
+        recibo.modo_hash = datos.get('modo_hash')
+        recibo.archivo_original = datos.get('archivo_original')
+
+        recibo._crudos = crudos or None
+        extra = {campo: valor for campo, valor in datos.items() if campo not in _CAMPOS}
+        # Un campo conocido con valor null también se conserva
+        extra.update((campo, None) for campo in _CAMPOS if campo in datos and datos[campo] is None)
+        recibo._extra = extra or None
+        return recibo
+
+    @classmethod
+    def desde_json(cls, datos):
+        """
+        Crea un recibo compacto a partir de su JSON (usa orjson si está instalado).
+
+        Args:
+            datos (bytes | str): JSON del recibo
+
+        Returns:
+            Recibo: Recibo compacto
+        """
+        try:
+            return cls.desde_dict(_parsear(datos))
+        except AttributeError:
+            raise ValueError("El JSON no es un objeto") from None
+
+    def __getitem__(self, campo):
+        crudos = self._crudos
+        if crudos is not None and campo in crudos:
+            return crudos[campo]
+        if campo == 'hash':
+            return self.hash.hex()
+        if campo == 'timestamp':
+            return micros_a_timestamp(self.timestamp)
+        if campo == 'firma':
+            return base64.b64encode(self.firma).decode()
+        if campo == 'anterior':
+            valor = None if self.anterior is None else self.anterior.hex()
+        elif campo in _CAMPOS:
+            valor = getattr(self, campo)
+        else:
+            valor = None
+        if valor is None:
+            if self._extra is not None and campo in self._extra:
+                return self._extra[campo]
+            raise KeyError(campo)
+        return valor
+
+    def get(self, campo, defecto=None):
+        try:
+            return self[campo]
+        except KeyError:
+            return defecto
+
+    def __contains__(self, campo):
+        try:
+            self[campo]
+            return True
+        except KeyError:
+            return False
+
+    def keys(self):
+        """Claves del recibo JSON, en el orden de `a_dict`."""
+        claves = [campo for campo in _CAMPOS if campo in self]
+        if self._extra is not None:
+            claves.extend(campo for campo in self._extra if campo not in claves)
+        return claves
+
+    def a_dict(self):
+        """
+        Forma JSON del recibo.
+
+        Returns:
+            dict: Recibo como lo devuelve el servidor y lo guarda `guardar_recibo`
+        """
+        return {campo: self[campo] for campo in self.keys()}
+
+    def __eq__(self, otro):
+        if isinstance(otro, (Recibo, dict)):
+            return self.a_dict() == (otro.a_dict() if isinstance(otro, Recibo) else otro)
+        return NotImplemented
+
+    def __repr__(self):
+        return f"Recibo({self.hash.hex()[:16]}..., {self['timestamp']}, {self.curva})"
+
+
+class ColeccionRecibos:
+    """
+    Muchos recibos guardados por columnas.
+
+    Los recibos que no encajan en las columnas (hash o `anterior` que no son
+    de 32 bytes, texto no reconstruible, campos adicionales, recibos mal
+    formados) se guardan aparte tal cual; son la excepción.
+    """
+
+    def __init__(self, recibos=()):
+        """
+        Args:
+            recibos (iterable, optional): Recibos (dict o Recibo) a añadir
+        """
+        self._hashes = bytearray()
+        self._firmas = bytearray()
+        self._fin_firmas = array('Q')
+        self._timestamps = array('q')
+        self._secuencias = array('q')
+        self._anteriores = bytearray()
+        self._bloques = array('q')
+        self._indices_log = array('q')
+        self._versiones = array('B')
+        self._curvas = array('B')
+        self._codificaciones = array('B')
+        self._modos = array('B')
+        self._archivos = []
+        # Valores distintos de curva, codificación y modo de hash; el código 0 es "sin valor"
+        self._textos = [None]
+        self._codigos = {None: 0}
+        # Recibos guardados fuera de las columnas, por posición
+        self._aparte = {}
+        for recibo in recibos:
+            self.agregar(recibo)
+
+    def __len__(self):
+        return len(self._timestamps)
+
+    def _codigo(self, texto):
+        codigo = self._codigos.get(texto)
+        if codigo is None:
+            codigo = len(self._textos)
+            self._textos.append(texto)
+            self._codigos[texto] = codigo
+        return codigo
+
+    def agregar(self, recibo):
+        """
+        Añade un recibo al final.
+
+        Args:
+            recibo (dict | Recibo): Recibo a añadir. Un dict que no se puede
+                                    compactar se guarda tal cual.
+        """
+        if isinstance(recibo, dict):
+            try:
+                compacto = Recibo.desde_dict(recibo)
+            except ValueError:
+                compacto = None
+        elif isinstance(recibo, Recibo):
+            compacto = recibo
+        else:
+            compacto = None
+
+        en_columnas = (compacto is not None and compacto._crudos is None and compacto._extra is None
+                       and len(compacto.hash) == 32
+                       and (compacto.anterior is None if compacto.secuencia is None
+                            else compacto.anterior is not None and len(compacto.anterior) == 32)
+                       and (compacto.version is None or 0 < compacto.version < 256)
+                       and all(valor is None or 0 <= valor < 1 << 63 for valor in
+                               (compacto.secuencia, compacto.bloque_hash, compacto.indice_log))
+                       # Los códigos de texto son de un byte
+                       and (len(self._textos) <= 253 or all(
+                           texto in self._codigos for texto in
+                           (compacto.curva, compacto.codificacion_firma, compacto.modo_hash))))
+        # La secuencia de los recibos aparte sí se guarda, para poder ordenarlos
+        secuencia = compacto.secuencia if compacto is not None else (
+            recibo.get('secuencia') if isinstance(recibo, dict) else None)
+        if not en_columnas:
+            self._aparte[len(self)] = compacto if compacto is not None else recibo
+            compacto = None
+
+        self._hashes += compacto.hash if compacto else bytes(32)
+        self._firmas += compacto.firma if compacto else b''
+        self._fin_firmas.append(len(self._firmas))
+        self._timestamps.append(compacto.timestamp if compacto else 0)
+        self._secuencias.append(secuencia if _es_entero(secuencia) and 0 <= secuencia < 1 << 63 else -1)
+        self._anteriores += (compacto.anterior if compacto and compacto.anterior else bytes(32))
+        self._bloques.append(compacto.bloque_hash if compacto and compacto.bloque_hash is not None else -1)
+        self._indices_log.append(compacto.indice_log if compacto and compacto.indice_log is not None else -1)
+        self._versiones.append(compacto.version or 0 if compacto else 0)
+        self._curvas.append(self._codigo(compacto.curva) if compacto else 0)
+        self._codificaciones.append(self._codigo(compacto.codificacion_firma) if compacto else 0)
+        self._modos.append(self._codigo(compacto.modo_hash) if compacto else 0)
+        self._archivos.append(compacto.archivo_original if compacto else None)
+
+    def __getitem__(self, indice):
+        """
+        Recibo en una posición, o una colección nueva si se pide un tramo.
+
+        Returns:
+            Recibo: Recibo compacto (o el dict original si no se pudo compactar)
+        """
+        if isinstance(indice, slice):
+            desde, hasta, paso = indice.indices(len(self))
+            if paso != 1:
+                raise ValueError("Solo se admiten tramos contiguos")
+            return self.tramo(desde, hasta)
+        if indice < 0:
+            indice += len(self)
+        if not 0 <= indice < len(self):
+            raise IndexError(indice)
+        # Un recibo aparte puede ser cualquier valor JSON, incluido None
+        if indice in self._aparte:
+            return self._aparte[indice]
+
+        recibo = Recibo.__new__(Recibo)
+        recibo.hash = bytes(self._hashes[indice * 32:(indice + 1) * 32])
+        inicio = self._fin_firmas[indice - 1] if indice else 0
+        recibo.firma = bytes(self._firmas[inicio:self._fin_firmas[indice]])
+        recibo.timestamp = self._timestamps[indice]
+        secuencia = self._secuencias[indice]
+        recibo.secuencia = secuencia if secuencia >= 0 else None
+        recibo.anterior = (bytes(self._anteriores[indice * 32:(indice + 1) * 32])
+                           if secuencia >= 0 else None)
+        bloque = self._bloques[indice]
+        recibo.bloque_hash = bloque if bloque >= 0 else None
+        indice_log = self._indices_log[indice]
+        recibo.indice_log = indice_log if indice_log >= 0 else None
+        recibo.version = self._versiones[indice] or None
+        recibo.curva = self._textos[self._curvas[indice]]
+        recibo.codificacion_firma = self._textos[self._codificaciones[indice]]
+        recibo.modo_hash = self._textos[self._modos[indice]]
+        recibo.archivo_original = self._archivos[indice]
+        recibo._crudos = None
+        recibo._extra = None
+        return recibo
+
+    def __iter__(self):
+        for indice in range(len(self)):
+            yield self[indice]
+
+    def tramo(self, desde, hasta):
+        """
+        Copia de los recibos [desde, hasta) como una colección nueva.
+
+        Es barata de enviar a otro proceso: se serializan las columnas, no
+        los recibos.
+        """
+        return ColeccionRecibos(self[i] for i in range(desde, min(hasta, len(self))))
+
+    def ordenar_por_secuencia(self):
+        """Reordena la colección por secuencia (los recibos sin secuencia, al principio)."""
+        secuencias = self._secuencias
+        if all(secuencias[i] <= secuencias[i + 1] for i in range(len(secuencias) - 1)):
+            return
+        orden = sorted(range(len(self)), key=secuencias.__getitem__)
+        recibos = [self[i] for i in orden]
+        self.__init__(recibos)
+
+    def bytes_en_memoria(self):
+        """Tamaño aproximado de las columnas en bytes (sin los recibos aparte)."""
+        columnas = (self._hashes, self._firmas, self._anteriores)
+        arrays = (self._fin_firmas, self._timestamps, self._secuencias, self._bloques,
+                  self._indices_log, self._versiones, self._curvas, self._codificaciones, self._modos)
+        return (sum(len(c) for c in columnas) + sum(len(a) * a.itemsize for a in arrays)
+                + 8 * len(self._archivos))
@@ -0,0 +1,109 @@
+"""
+Herramienta de refragmentación del almacén de recibos.
+
+Divide fragmentos del almacén en 16 hijos, ya sea indicando sus prefijos o
+todos los que superen un tamaño. Con `--servidor` pide la división al
+servidor en marcha, que la hace en línea sin detener las escrituras. Sin él
+trabaja directamente sobre el directorio del almacén, lo que solo es posible
+con el servidor detenido: el servidor tiene el bloqueo exclusivo del almacén
+y la herramienta se niega a abrirlo mientras lo tenga.
+
+Las réplicas no necesitan intervención: repiten las divisiones del primario
+en su siguiente sincronización.
+
+Uso:
+    python shared/refragmentar.py [datos/recibos] [--prefijo P ...] [--max-mb N]
+    python shared/refragmentar.py --servidor http://127.0.0.1:8000 [--prefijo P ...] [--max-mb N]
+"""
+
+import argparse
+import os
+import sys
+
+# Agregar el directorio shared al path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from shared.almacen_recibos import AlmacenRecibos, AlmacenEnUsoError, leer_manifiesto
+from client.cliente_api import ClienteNotario, ErrorApi
+
+
+RAIZ = os.path.join(os.path.dirname(__file__), '..')
+
+
+def mostrar_estado(tamanos):
+    """Imprime los fragmentos con su tamaño ({prefijo: bytes})."""
+    for prefijo, tamano in sorted(tamanos.items()):
+        print(f"   {prefijo or '(raíz)':8s} {tamano / 1024 / 1024:10.2f} MB")
+    print(f"Fragmentos: {len(tamanos)} • Total: {sum(tamanos.values()) / 1024 / 1024:.2f} MB")
+
+
+def dividir_en_servidor(args):
+    """Pide la división al servidor en marcha."""
+    if not args.token:
+        print("❌ Falta el token de administración (--token o NOTARIO_ADMIN_TOKEN)")
+        return 1
+    cliente = ClienteNotario(args.servidor)
+    try:
+        respuesta = cliente.dividir_fragmentos(args.token, args.prefijo, args.max_mb)
+    except ErrorApi as e:
+        print(f"❌ {e}")
+        return 1
+    except Exception as e:
+        print(f"❌ Servidor no disponible: {e}")
+        return 1
+    finally:
+        cliente.cerrar()
+    for prefijo in respuesta['divididos']:
+        print(f"🪓 '{prefijo}' dividido en 16")
+    mostrar_estado(respuesta['fragmentos'])
+    return 0
+
+
+def dividir_en_disco(args):
+    """Divide los fragmentos directamente sobre el directorio (servidor detenido)."""
+    if leer_manifiesto(args.directorio) is None:
+        print(f"❌ No hay un almacén de recibos en {args.directorio}")
+        return 1
+
+    try:
+        almacen = AlmacenRecibos(args.directorio)
+    except AlmacenEnUsoError as e:
+        print(f"❌ {e}")
+        print("   Use --servidor URL para que el servidor divida los fragmentos en línea")
+        return 1
+    try:
+        for prefijo in args.prefijo:
+            hijos = almacen.dividir(prefijo.lower())
+            print(f"🪓 '{prefijo}' dividido en {', '.join(hijos)}")
+
+        if args.max_mb:
+            for prefijo in almacen.dividir_mayores(int(args.max_mb * 1024 * 1024)):
+                print(f"🪓 '{prefijo}' dividido en 16")
+
+        mostrar_estado({p: almacen.tamano_fragmento(p) for p in almacen.prefijos()})
+    except ValueError as e:
+        print(f"❌ {e}")
+        return 1
+    finally:
+        almacen.cerrar()
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Divide fragmentos del almacén de recibos")
+    parser.add_argument('directorio', nargs='?', default=os.path.join(RAIZ, 'datos', 'recibos'),
+                        help="Directorio del almacén (por defecto: datos/recibos)")
+    parser.add_argument('--prefijo', action='append', default=[],
+                        help="Prefijo del fragmento a dividir (se puede repetir)")
+    parser.add_argument('--max-mb', type=float, default=None,
+                        help="Divide (recursivamente) los fragmentos mayores de N MB")
+    parser.add_argument('--servidor', default=None,
+                        help="URL del servidor en marcha que debe hacer la división en línea")
+    parser.add_argument('--token', default=os.environ.get('NOTARIO_ADMIN_TOKEN'),
+                        help="Token de administración del servidor (por defecto: NOTARIO_ADMIN_TOKEN)")
+    args = parser.parse_args()
+
+    return dividir_en_servidor(args) if args.servidor else dividir_en_disco(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,186 @@
+"""
+Registro append-only de los recibos emitidos por el Notario Digital.
+Cada recibo se guarda como una línea JSON compacta.
+"""
+
+import json
+import os
+import threading
+
+
+def leer_registro(ruta, desde=0):
+    """
+    Recorre las líneas completas de un registro a partir de un desplazamiento.
+
+    Sirve también para leer el registro de otro proceso (por ejemplo, el del
+    servidor primario desde una réplica) sin abrirlo para escritura.
+
+    Args:
+        ruta (str): Ruta del registro
+        desde (int): Desplazamiento inicial en bytes (inicio de una línea)
+
+    Yields:
+        tuple: (desplazamiento_siguiente, línea en bytes)
+    """
+    with open(ruta, 'rb') as f:
+        f.seek(desde)
+        posicion = desde
+        for linea in f:
+            if not linea.endswith(b'\n'):
+                # Línea incompleta: escritura en curso o interrumpida
+                break
+            posicion += len(linea)
+            yield posicion, linea
+
+
+class RegistroRecibos:
+    """
+    Registro de recibos en un archivo JSON Lines de solo anexado.
+
+    Las escrituras están serializadas con un lock; las lecturas abren su
+    propio descriptor y solo consideran líneas completas, de modo que un
+    lector nunca observa un recibo a medio escribir.
+    """
+
+    def __init__(self, ruta, fsync=False):
+        """
+        Args:
+            ruta (str): Ruta del archivo de registro (se crea si no existe)
+            fsync (bool): Forzar cada escritura a disco antes de confirmarla
+        """
+        self.ruta = ruta
+        self.fsync = fsync
+        directorio = os.path.dirname(ruta)
+        if directorio:
+            os.makedirs(directorio, exist_ok=True)
+        self._lock = threading.Lock()
+        self._archivo = open(ruta, 'ab')
+
+    def agregar(self, recibo):
+        """
+        Anexa un recibo al registro.
+
+        Args:
+            recibo (dict): Recibo a registrar
+
+        Returns:
+            int: Desplazamiento en bytes donde comienza el recibo
+        """
+        linea = (json.dumps(recibo, separators=(',', ':'), ensure_ascii=False) + '\n').encode('utf-8')
+        with self._lock:
+            desplazamiento = self._archivo.tell()
+            self._archivo.write(linea)
+            self._volcar()
+        return desplazamiento
+
+    def anexar_lineas(self, datos):
+        """
+        Anexa líneas ya serializadas (copiadas tal cual de otro registro).
+
+        Args:
+            datos (bytes): Una o más líneas JSON completas terminadas en salto de línea
+
+        Returns:
+            int: Tamaño del registro tras anexar
+        """
+        with self._lock:
+            self._archivo.write(datos)
+            self._volcar()
+            return self._archivo.tell()
+
+    def _volcar(self):
+        self._archivo.flush()
+        if self.fsync:
+            os.fsync(self._archivo.fileno())
+
+    def tamano(self):
+        """Tamaño actual del registro en bytes."""
+        with self._lock:
+            return self._archivo.tell()
+
+    def iterar(self, desde=0):
+        """
+        Recorre los recibos a partir de un desplazamiento.
+
+        Args:
+            desde (int): Desplazamiento inicial en bytes (inicio de una línea)
+
+        Yields:
+            tuple: (desplazamiento_siguiente, recibo)
+        """
+        for posicion, linea in leer_registro(self.ruta, desde):
+            if linea.strip():
+                yield posicion, json.loads(linea)
+
+    def leer(self, desplazamientos):
+        """
+        Lee los recibos que comienzan en los desplazamientos indicados.
+
+        Args:
+            desplazamientos (list): Desplazamientos devueltos por `agregar`
+
+        Returns:
+            list: Recibos en el mismo orden
+        """
+        recibos = []
+        with open(self.ruta, 'rb') as f:
+            for desplazamiento in desplazamientos:
+                f.seek(desplazamiento)
+                recibos.append(json.loads(f.readline()))
+        return recibos
+
+    def ultimo(self):
+        """
+        Devuelve el último recibo completo del registro.
+
+        Returns:
+            dict: Último recibo, o None si el registro está vacío
+        """
+        bloque = 4096
+        with open(self.ruta, 'rb') as f:
+            f.seek(0, os.SEEK_END)
+            fin = f.tell()
+            inicio = fin
+            datos = b''
+            while inicio > 0:
+                inicio = max(0, inicio - bloque)
+                f.seek(inicio)
+                datos = f.read(fin - inicio)
+                # Se necesitan al menos dos saltos de línea (o el inicio del archivo)
+                if datos.count(b'\n') >= 2 or inicio == 0:
+                    break
+                bloque *= 2
+
+        # Descartar una posible línea incompleta al final
+        completas = datos[:datos.rfind(b'\n') + 1] if b'\n' in datos else b''
+        lineas = [l for l in completas.split(b'\n') if l.strip()]
+        if not lineas:
+            return None
+        return json.loads(lineas[-1])
+
+    def buscar(self, hash_hex):
+        """
+        Busca los recibos emitidos para un hash recorriendo el registro.
+
+        Args:
+            hash_hex (str): Hash en formato hexadecimal
+
+        Returns:
+            list: Recibos cuyo hash coincide
+        """
+        hash_hex = hash_hex.lower()
+        # Filtrar por texto antes de decodificar JSON
+        clave = f'"hash":"{hash_hex}"'.encode()
+        encontrados = []
+        with open(self.ruta, 'rb') as f:
+            for linea in f:
+                if clave in linea and linea.endswith(b'\n'):
+                    recibo = json.loads(linea)
+                    if recibo.get('hash') == hash_hex:
+                        encontrados.append(recibo)
+        return encontrados
+
+    def cerrar(self):
+        """Cierra el descriptor de escritura."""
+        with self._lock:
+            self._archivo.close()
@@ -0,0 +1,174 @@
+"""
+Script de prueba para el almacén de recibos fragmentado.
+"""
+
+import sys
+import os
+import hashlib
+import tempfile
+import threading
+import time
+
+# Agregar el directorio shared al path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from shared.almacen_recibos import AlmacenRecibos, AlmacenEnUsoError, iterar_almacen
+from shared.indice_recibos import IndiceOrdenado, TAMANO_REGISTRO, timestamp_a_micros
+
+
+def recibo_de(i):
+    """Genera un recibo de prueba (sin firma real)."""
+    return {
+        "timestamp": f"2025-11-10T12:00:{i % 60:02d}Z",
+        "hash": hashlib.sha256(str(i).encode()).hexdigest(),
+        "firma": f"firma-{i}",
+        "curva": "SECP256R1"
+    }
+
+
+def test_enrutado_y_busqueda():
+    """Prueba que cada recibo cae en el fragmento de su prefijo y se encuentra."""
+    print(f"\n{'='*60}")
+    print("Probando enrutado por prefijo y búsqueda")
+    print(f"{'='*60}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        almacen = AlmacenRecibos(tmp, fragmentos=16)
+        for i in range(500):
+            prefijo, _ = almacen.agregar(recibo_de(i))
+            if not recibo_de(i)["hash"].startswith(prefijo):
+                print(f"   ❌ Recibo {i} en el fragmento equivocado '{prefijo}'")
+                return False
+        almacen.agregar(recibo_de(7))
+
+        print(f"1. Fragmentos: {len(almacen.prefijos())}")
+        if len(almacen.buscar(recibo_de(7)["hash"])) != 2 or almacen.buscar(recibo_de(9999)["hash"]):
+            print("   ❌ Búsqueda incorrecta")
+            return False
+        almacen.cerrar()
+
+        reabierto = AlmacenRecibos(tmp, fragmentos=256)
+        print(f"2. Reabierto con {len(reabierto.prefijos())} fragmentos")
+        try:
+            AlmacenRecibos(tmp)
+            print("   ❌ Se pudo abrir dos veces el almacén en uso")
+            return False
+        except AlmacenEnUsoError:
+            pass
+        if len(reabierto.prefijos()) != 16 or sum(1 for _ in reabierto.iterar()) != 501:
+            print("   ❌ El almacén reabierto no coincide")
+            return False
+        fragmento = reabierto.fragmento(recibo_de(7)["hash"])
+        for _ in range(100):
+            if fragmento.indice_al_dia:
+                break
+            time.sleep(0.05)
+        if not fragmento.indice_al_dia:
+            print("   ❌ El índice no se puso al día en segundo plano")
+            return False
+        reabierto.cerrar()
+
+    print("\n✅ ENRUTADO - TODAS LAS PRUEBAS PASARON")
+    return True
+
+
+def test_division_en_linea():
+    """Prueba dividir un fragmento mientras otros hilos siguen escribiendo."""
+    print(f"\n{'='*60}")
+    print("Probando división de fragmentos en línea")
+    print(f"{'='*60}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        almacen = AlmacenRecibos(tmp, fragmentos=1)
+        for i in range(300):
+            almacen.agregar(recibo_de(i))
+
+        def escribir(desde):
+            for i in range(desde, desde + 200):
+                almacen.agregar(recibo_de(i))
+
+        hilos = [threading.Thread(target=escribir, args=(1000 * (h + 1),)) for h in range(4)]
+        for hilo in hilos:
+            hilo.start()
+        almacen.dividir('')
+        almacen.dividir('a')
+        for hilo in hilos:
+            hilo.join()
+
+        prefijos = almacen.prefijos()
+        print(f"1. Fragmentos tras dividir: {len(prefijos)}")
+        if len(prefijos) != 31 or 'a' in prefijos or 'a7' not in prefijos:
+            print("   ❌ Prefijos incorrectos tras la división")
+            return False
+
+        total = sum(1 for _ in iterar_almacen(tmp))
+        print(f"2. Recibos tras dividir: {total}")
+        if total != 1100:
+            print("   ❌ Se perdieron o duplicaron recibos")
+            return False
+
+        faltantes = [i for i in list(range(300)) + list(range(1000, 1200))
+                     if len(almacen.buscar(recibo_de(i)["hash"])) != 1]
+        if faltantes:
+            print(f"   ❌ {len(faltantes)} recibos no se encuentran")
+            return False
+        almacen.cerrar()
+
+    print("\n✅ DIVISIÓN - TODAS LAS PRUEBAS PASARON")
+    return True
+
+
+def test_indice_ordenado():
+    """Prueba el índice en disco: fusiones, duplicados y reapertura."""
+    print(f"\n{'='*60}")
+    print("Probando índice ordenado con mmap y búfer")
+    print(f"{'='*60}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        ruta = os.path.join(tmp, 'fragmento.idx')
+        indice = IndiceOrdenado(ruta, limite_buffer=10**9)
+        for i in range(1000):
+            indice.agregar(recibo_de(i)["hash"], i * 100, recibo_de(i)["timestamp"], (i + 1) * 100)
+            if i % 300 == 299:
+                indice.fusionar()
+        indice.agregar(recibo_de(5)["hash"], 100000, recibo_de(5)["timestamp"], 100100)
+
+        estadisticas = indice.estadisticas()
+        print(f"1. Entradas en disco: {estadisticas['entradas_disco']} • en búfer: {estadisticas['entradas_buffer']}")
+        if indice.buscar(recibo_de(5)["hash"]) != [(500, timestamp_a_micros(recibo_de(5)["timestamp"])),
+                                                   (100000, timestamp_a_micros(recibo_de(5)["timestamp"]))]:
+            print("   ❌ Entradas duplicadas entre disco y búfer incorrectas")
+            return False
+        indice.cerrar()
+
+        reabierto = IndiceOrdenado(ruta)
+        print(f"2. Reabierto: {reabierto.entradas_base} entradas, cubre {reabierto.cubierto} bytes")
+        if os.path.getsize(ruta) != 16 + 1001 * TAMANO_REGISTRO or reabierto.cubierto != 100100:
+            print("   ❌ Tamaño o cobertura del índice incorrectos")
+            return False
+        faltantes = [i for i in range(1000) if reabierto.buscar(recibo_de(i)["hash"])[0][0] != i * 100]
+        if faltantes or reabierto.buscar(recibo_de(5000)["hash"]):
+            print("   ❌ Búsqueda binaria incorrecta")
+            return False
+        reabierto.cerrar()
+
+    print("\n✅ ÍNDICE - TODAS LAS PRUEBAS PASARON")
+    return True
+
+
+def main():
+    """Ejecuta todas las pruebas."""
+    resultados = {
+        'Enrutado': test_enrutado_y_busqueda(),
+        'División': test_division_en_linea(),
+        'Índice': test_indice_ordenado(),
+    }
+
+    print("\n" + "="*60)
+    for nombre, resultado in resultados.items():
+        print(f"{nombre:20s} : {'✅ PASÓ' if resultado else '❌ FALLÓ'}")
+    print("="*60)
+    return 0 if all(resultados.values()) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,163 @@
+"""
+Script de prueba para el archivo de recibos comprimido.
+"""
+
+import sys
+import os
+import hashlib
+import tempfile
+
+# Agregar el directorio shared al path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from shared.archivo_recibos import (EscritorArchivoRecibos, LectorArchivoRecibos, iterar_recibos,
+                                    empaquetar_directorio, desempaquetar_archivo)
+from shared.crypto_utils import cargar_recibo, guardar_recibo, nombre_archivo_recibo
+
+
+def recibo_de(i, segundo=None):
+    """Genera un recibo de prueba (sin firma real)."""
+    return {
+        "timestamp": f"2025-11-10T12:00:{(i if segundo is None else segundo) % 60:02d}Z",
+        "hash": hashlib.sha256(str(i).encode()).hexdigest(),
+        "firma": f"firma-{i}",
+        "curva": "SECP256R1",
+        "archivo_original": f"documento_{i}.pdf"
+    }
+
+
+def test_busqueda_y_recorrido():
+    """Prueba la búsqueda por hash, el recorrido en orden y la ampliación."""
+    print(f"\n{'='*60}")
+    print("Probando búsqueda, recorrido y ampliación")
+    print(f"{'='*60}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        ruta = os.path.join(tmp, 'recibos.ndarc')
+        with EscritorArchivoRecibos(ruta, tamano_bloque=4096) as escritor:
+            for i in range(1000):
+                escritor.agregar(recibo_de(i))
+
+        with EscritorArchivoRecibos(ruta, tamano_bloque=4096) as escritor:
+            escritor.agregar(recibo_de(7, segundo=59))
+
+        with LectorArchivoRecibos(ruta) as lector:
+            print(f"1. {len(lector)} recibos en {lector.bloques} bloques")
+            if len(lector) != 1001 or lector.bloques < 2:
+                print("   ❌ Número de recibos o bloques incorrecto")
+                return False
+            if lector.buscar(recibo_de(500)['hash']) != [recibo_de(500)] or recibo_de(5000)['hash'] in lector:
+                print("   ❌ Búsqueda incorrecta")
+                return False
+            orden = [recibo['firma'] for recibo in lector.iterar()]
+            if orden != [f"firma-{i}" for i in range(1000)] + ["firma-7"]:
+                print("   ❌ El recorrido no conserva el orden")
+                return False
+
+        print("2. cargar_recibo con (archivo, hash)")
+        if cargar_recibo((ruta, recibo_de(7)['hash'])) != recibo_de(7, segundo=59):
+            print("   ❌ No devolvió el recibo más reciente")
+            return False
+
+    print("\n✅ BÚSQUEDA - TODAS LAS PRUEBAS PASARON")
+    return True
+
+
+def test_recuperacion():
+    """Prueba reabrir un archivo que no se cerró (sin índice ni pie)."""
+    print(f"\n{'='*60}")
+    print("Probando recuperación de un archivo sin cerrar")
+    print(f"{'='*60}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        ruta = os.path.join(tmp, 'recibos.ndarc')
+        escritor = EscritorArchivoRecibos(ruta, tamano_bloque=2048)
+        for i in range(200):
+            escritor.agregar(recibo_de(i))
+        escritor._archivo.flush()
+        escritos = sum(1 for _ in iterar_recibos(ruta))
+        escritor._archivo.close()
+        # Simular un corte a mitad del último bloque
+        with open(ruta, 'r+b') as f:
+            f.truncate(os.path.getsize(ruta) - 10)
+        completos = sum(1 for _ in iterar_recibos(ruta))
+
+        try:
+            LectorArchivoRecibos(ruta)
+            print("   ❌ Se abrió un archivo sin índice")
+            return False
+        except ValueError:
+            pass
+
+        with EscritorArchivoRecibos(ruta) as reparado:
+            recuperados = len(reparado)
+        print(f"1. Recuperados {recuperados} de {escritos} recibos en bloques completos")
+        with LectorArchivoRecibos(ruta) as lector:
+            if not 0 < recuperados == completos < escritos or len(lector) != recuperados:
+                print("   ❌ El índice recuperado no coincide")
+                return False
+            if not all(recibo_de(i)['hash'] in lector for i in range(recuperados)):
+                print("   ❌ Faltan recibos recuperados en el índice")
+                return False
+
+    print("\n✅ RECUPERACIÓN - TODAS LAS PRUEBAS PASARON")
+    return True
+
+
+def test_conversion_directorio():
+    """Prueba empaquetar receipts/ y desempaquetarlo con los mismos archivos."""
+    print(f"\n{'='*60}")
+    print("Probando conversión desde y hacia un directorio")
+    print(f"{'='*60}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        origen = os.path.join(tmp, 'receipts')
+        destino = os.path.join(tmp, 'extraidos')
+        os.makedirs(origen)
+        for i in range(50):
+            guardar_recibo(recibo_de(i), os.path.join(origen, nombre_archivo_recibo(recibo_de(i))))
+        with open(os.path.join(origen, 'recibo_roto.json'), 'w') as f:
+            f.write('{')
+
+        ruta = os.path.join(tmp, 'recibos.ndarc')
+        resultado = empaquetar_directorio(origen, ruta)
+        escritos = desempaquetar_archivo(ruta, destino)
+        print(f"1. Empaquetados {resultado['empaquetados']}, ignorados {resultado['ignorados']}, "
+              f"extraídos {escritos}")
+        if resultado != {"empaquetados": 50, "repetidos": 0, "ignorados": 1} or escritos != 50:
+            print("   ❌ Recuentos incorrectos")
+            return False
+
+        print("2. Empaquetar otra vez el mismo directorio no duplica recibos")
+        resultado = empaquetar_directorio(origen, ruta)
+        with LectorArchivoRecibos(ruta) as lector:
+            if resultado["repetidos"] != 50 or len(lector) != 50 or len(lector.buscar(recibo_de(7)["hash"])) != 1:
+                print(f"   ❌ Recibos duplicados: {resultado}, {len(lector)} en el índice")
+                return False
+
+        for nombre in os.listdir(destino):
+            with open(os.path.join(origen, nombre), 'rb') as a, open(os.path.join(destino, nombre), 'rb') as b:
+                if a.read() != b.read():
+                    print(f"   ❌ {nombre} no es idéntico al original")
+                    return False
+
+    print("\n✅ CONVERSIÓN - TODAS LAS PRUEBAS PASARON")
+    return True
+
+
+def main():
+    """Ejecuta todas las pruebas."""
+    resultados = {
+        'Búsqueda': test_busqueda_y_recorrido(),
+        'Recuperación': test_recuperacion(),
+        'Conversión': test_conversion_directorio(),
+    }
+
+    print("\n" + "="*60)
+    for nombre, resultado in resultados.items():
+        print(f"{nombre:20s} : {'✅ PASÓ' if resultado else '❌ FALLÓ'}")
+    print("="*60)
+    return 0 if all(resultados.values()) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
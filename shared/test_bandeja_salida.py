@@ -0,0 +1,227 @@
+"""
+Script de prueba para la bandeja de salida de notarizaciones pendientes.
+Usa un cliente de prueba que simula el servidor: caídas, rechazos y los
+recibos ya emitidos que devuelve /consultar.
+"""
+
+import sys
+import os
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import requests
+
+# Agregar el directorio shared al path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from client.bandeja_salida import BandejaSalida, MARGEN_RELOJ
+from client.cliente_api import ErrorApi
+from shared.motor_hash import MODO_PLANO, MODO_ARBOL
+
+
+HASH = "ab" * 32
+
+
+def timestamp_de(instante):
+    """Timestamp con el formato del servidor."""
+    return datetime.fromtimestamp(instante, timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+
+
+def recibo_de(hash_hex, curva="SECP256R1", modo_hash=None, bloque_hash=None, instante=None):
+    """Recibo como lo devuelve el servidor."""
+    recibo = {"timestamp": timestamp_de(time.time() if instante is None else instante),
+              "hash": hash_hex, "firma": "MEUCIQ==", "curva": curva}
+    if modo_hash is not None:
+        recibo["modo_hash"] = modo_hash
+        recibo["bloque_hash"] = bloque_hash
+    return recibo
+
+
+class ClienteDePrueba:
+    """
+    Cliente que responde con una lista de resultados preparada.
+
+    Cada elemento de `respuestas` es una excepción a lanzar o None para
+    firmar; cuando se agotan, firma siempre. Los recibos firmados quedan
+    disponibles en `consultar`, como en el servidor.
+    """
+
+    def __init__(self, respuestas=()):
+        self.respuestas = list(respuestas)
+        self.emitidos = {}
+        self.envios = []
+        self.consultas = 0
+
+    def notarizar(self, hash_hex, curva="SECP256R1", clave_idempotencia=None,
+                  modo_hash=None, bloque_hash=None):
+        self.envios.append(time.monotonic())
+        error = self.respuestas.pop(0) if self.respuestas else None
+        if error is not None:
+            raise error
+        recibo = recibo_de(hash_hex, curva, modo_hash, bloque_hash)
+        self.emitidos.setdefault(hash_hex, []).append(recibo)
+        return recibo
+
+    def consultar(self, hash_hex):
+        self.consultas += 1
+        recibos = self.emitidos.get(hash_hex, [])
+        return {"hash": hash_hex, "notarizado": bool(recibos), "recibos": list(recibos)}
+
+
+def esperar(condicion, timeout=10):
+    """Espera a que se cumpla una condición; devuelve si se cumplió."""
+    limite = time.monotonic() + timeout
+    while time.monotonic() < limite:
+        if condicion():
+            return True
+        time.sleep(0.01)
+    return condicion()
+
+
+def test_reintentos_y_rechazos():
+    """Prueba el retroceso ante errores transitorios y el paso a fallido de los permanentes."""
+    print(f"\n{'='*60}")
+    print("Probando reintentos con retroceso y errores permanentes")
+    print(f"{'='*60}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        recibos = os.path.join(tmp, 'receipts')
+
+        print("1. Servidor caído y luego saturado (Retry-After)")
+        cliente = ClienteDePrueba([requests.exceptions.ConnectionError("sin conexión"),
+                                   ErrorApi(503, "saturado", "0.3")])
+        bandeja = BandejaSalida(os.path.join(tmp, 'a.db'), cliente, recibos, espera_inicial=0.05)
+        bandeja.iniciar()
+        bandeja.encolar(HASH, "SECP256R1", "documento.pdf")
+        if not esperar(lambda: bandeja.pendientes() == 0):
+            print("   ❌ La entrada no se envió tras los fallos transitorios")
+            return False
+        bandeja.detener()
+        envios = cliente.envios
+        print(f"   Envíos: {len(envios)} • consultas previas: {cliente.consultas}")
+        if len(envios) != 3 or cliente.consultas != 2 or len(os.listdir(recibos)) != 1:
+            print("   ❌ Recuento de envíos, consultas o recibos incorrecto")
+            return False
+        if envios[1] - envios[0] < 0.05 * 0.8 or envios[2] - envios[1] < 0.3:
+            print("   ❌ No se respetó el retroceso o el Retry-After")
+            return False
+
+        print("2. Rechazo permanente (400)")
+        cliente = ClienteDePrueba([ErrorApi(400, "hash inválido")])
+        bandeja = BandejaSalida(os.path.join(tmp, 'b.db'), cliente, recibos, espera_inicial=0.05)
+        bandeja.iniciar()
+        bandeja.encolar(HASH, "SECP256R1", "otro.pdf")
+        if not esperar(lambda: bandeja.fallidas()):
+            print("   ❌ La entrada rechazada no quedó como fallida")
+            return False
+        fallidas = bandeja.fallidas()
+        pendientes = bandeja.pendientes()
+        bandeja.detener()
+        if pendientes != 0 or len(cliente.envios) != 1 or "400" not in fallidas[0]["ultimo_error"]:
+            print(f"   ❌ Estado incorrecto tras el rechazo: {fallidas}")
+            return False
+
+    print("\n✅ REINTENTOS - TODAS LAS PRUEBAS PASARON")
+    return True
+
+
+def test_recibo_sin_guardar():
+    """Prueba que un recibo que no se pudo guardar deja la entrada pendiente y no se vuelve a firmar."""
+    print(f"\n{'='*60}")
+    print("Probando un fallo al guardar el recibo")
+    print(f"{'='*60}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        recibos = os.path.join(tmp, 'receipts')
+        cliente = ClienteDePrueba()
+        bandeja = BandejaSalida(os.path.join(tmp, 'c.db'), cliente, recibos, espera_inicial=0.05)
+        # Un archivo en lugar del directorio hace fallar el guardado
+        os.rmdir(recibos)
+        with open(recibos, 'w') as f:
+            f.write('')
+        bandeja.iniciar()
+        bandeja.encolar(HASH, "SECP256R1", "documento.pdf")
+
+        print("1. El guardado falla")
+        if not esperar(lambda: bandeja.proximo_intento > 0):
+            print("   ❌ El fallo al guardar no programó un reintento")
+            return False
+        if bandeja.pendientes() != 1:
+            print("   ❌ La entrada desapareció sin recibo en disco")
+            return False
+
+        print("2. Al reintentar se recupera el recibo ya emitido")
+        os.remove(recibos)
+        os.makedirs(recibos)
+        bandeja.despertar()
+        if not esperar(lambda: bandeja.pendientes() == 0):
+            print("   ❌ La entrada no se completó al poder guardar")
+            return False
+        bandeja.detener()
+        print(f"   Firmas: {len(cliente.envios)} • consultas: {cliente.consultas}")
+        if len(cliente.envios) != 1 or cliente.consultas < 1 or len(os.listdir(recibos)) != 1:
+            print("   ❌ El servidor firmó dos veces el mismo documento")
+            return False
+
+    print("\n✅ GUARDADO - TODAS LAS PRUEBAS PASARON")
+    return True
+
+
+def test_recibo_emitido():
+    """Prueba qué recibos de /consultar cuentan como ya emitidos para una entrada."""
+    print(f"\n{'='*60}")
+    print("Probando la búsqueda de recibos ya emitidos")
+    print(f"{'='*60}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cliente = ClienteDePrueba()
+        bandeja = BandejaSalida(os.path.join(tmp, 'd.db'), cliente, os.path.join(tmp, 'receipts'))
+        creado = time.time()
+        antiguo = creado - MARGEN_RELOJ - 3600
+        cliente.emitidos[HASH] = [
+            recibo_de(HASH, curva="SECP384R1"),
+            recibo_de(HASH, modo_hash=MODO_ARBOL, bloque_hash=1024 * 1024),
+            recibo_de(HASH, instante=antiguo),
+        ]
+
+        print("1. Ningún recibo coincide en curva, modo y fecha")
+        if bandeja._recibo_emitido(HASH, "SECP256R1", None, None, creado) is not None:
+            print("   ❌ Se aceptó un recibo que no corresponde a la entrada")
+            return False
+
+        print("2. Coincidencias por curva, modo de árbol y modo plano explícito")
+        casos = [
+            ("SECP384R1", None, None),
+            ("SECP256R1", MODO_ARBOL, 1024 * 1024),
+        ]
+        for curva, modo_hash, bloque_hash in casos:
+            if bandeja._recibo_emitido(HASH, curva, modo_hash, bloque_hash, creado) is None:
+                print(f"   ❌ No se encontró el recibo de {curva}/{modo_hash}")
+                return False
+        cliente.emitidos[HASH].append(recibo_de(HASH, instante=creado - MARGEN_RELOJ / 2))
+        if bandeja._recibo_emitido(HASH, "SECP256R1", MODO_PLANO, None, creado) is None:
+            print("   ❌ No se encontró el recibo plano dentro del margen de reloj")
+            return False
+        bandeja.detener()
+
+    print("\n✅ RECIBOS EMITIDOS - TODAS LAS PRUEBAS PASARON")
+    return True
+
+
+def main():
+    """Ejecuta todas las pruebas."""
+    resultados = {
+        'Reintentos': test_reintentos_y_rechazos(),
+        'Guardado': test_recibo_sin_guardar(),
+        'Recibos emitidos': test_recibo_emitido(),
+    }
+
+    print("\n" + "="*60)
+    for nombre, resultado in resultados.items():
+        print(f"{nombre:20s} : {'✅ PASÓ' if resultado else '❌ FALLÓ'}")
+    print("="*60)
+    return 0 if all(resultados.values()) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,148 @@
+"""
+Script de prueba para el filtro de Bloom de hashes notarizados.
+"""
+
+import sys
+import os
+import hashlib
+import tempfile
+
+# Agregar el directorio shared al path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from shared.filtro_bloom import FiltroBloom
+from server import filtro_notarizados
+from server.filtro_notarizados import FiltroNotarizados
+
+
+def hash_de(i):
+    """Genera un hash SHA-256 de prueba."""
+    return hashlib.sha256(str(i).encode()).hexdigest()
+
+
+def test_pertenencia_y_falsos_positivos():
+    """Prueba que no haya falsos negativos y que la tasa de FP sea cercana a la objetivo."""
+    print(f"\n{'='*60}")
+    print("Probando pertenencia y tasa de falsos positivos")
+    print(f"{'='*60}")
+
+    n, p = 20000, 0.01
+    filtro = FiltroBloom(n, p)
+    for i in range(n):
+        filtro.agregar(hash_de(i))
+
+    falsos_negativos = sum(1 for i in range(n) if hash_de(i) not in filtro)
+    print(f"1. Falsos negativos: {falsos_negativos}")
+    if falsos_negativos:
+        print("   ❌ El filtro negó hashes insertados")
+        return False
+
+    pruebas = 20000
+    falsos_positivos = sum(1 for i in range(n, n + pruebas) if hash_de(i) in filtro)
+    tasa = falsos_positivos / pruebas
+    estimada = filtro.tasa_falsos_positivos_estimada()
+    print(f"2. Tasa observada: {tasa:.4f} • estimada: {estimada:.4f} • objetivo: {p}")
+    if tasa > 2 * p:
+        print("   ❌ Tasa de falsos positivos muy superior a la objetivo")
+        return False
+
+    print(f"3. Saturación: {filtro.saturacion():.3f} • elementos estimados: {filtro.elementos_estimados():.0f}")
+    if abs(filtro.elementos_estimados() - n) > 0.05 * n:
+        print("   ❌ Estimación de elementos fuera de rango")
+        return False
+
+    print("\n✅ PERTENENCIA - TODAS LAS PRUEBAS PASARON")
+    return True
+
+
+def test_persistencia():
+    """Prueba guardar y cargar el filtro."""
+    print(f"\n{'='*60}")
+    print("Probando persistencia del filtro")
+    print(f"{'='*60}")
+
+    filtro = FiltroBloom(1000, 0.001)
+    for i in range(500):
+        filtro.agregar(hash_de(i))
+    filtro.desplazamiento = 12345
+
+    with tempfile.TemporaryDirectory() as tmp:
+        ruta = os.path.join(tmp, 'filtro.bin')
+        filtro.guardar(ruta)
+        cargado = FiltroBloom.cargar(ruta)
+
+    if cargado.bits != filtro.bits or cargado.desplazamiento != 12345 or cargado.elementos != filtro.elementos:
+        print("   ❌ El filtro cargado no coincide con el guardado")
+        return False
+    if not cargado.compatible(1000, 0.001) or cargado.compatible(2000, 0.001):
+        print("   ❌ Comprobación de parámetros incorrecta")
+        return False
+
+    print("\n✅ PERSISTENCIA - TODAS LAS PRUEBAS PASARON")
+    return True
+
+
+class RegistroInestable:
+    """Registro de prueba cuyo recorrido falla las primeras `fallos` veces."""
+
+    def __init__(self, hashes, fallos):
+        self.hashes = hashes
+        self.fallos = fallos
+
+    def iterar(self):
+        for i, hash_hex in enumerate(self.hashes):
+            if i == len(self.hashes) // 2 and self.fallos:
+                self.fallos -= 1
+                raise FileNotFoundError("fragmento dividido durante el recorrido")
+            yield '', {"hash": hash_hex}
+
+    def tamano(self):
+        return len(self.hashes)
+
+
+def test_reconstruccion_con_errores():
+    """Prueba que la reconstrucción reintenta y que se marca fallida al agotar los intentos."""
+    print(f"\n{'='*60}")
+    print("Probando errores durante la reconstrucción")
+    print(f"{'='*60}")
+
+    filtro_notarizados.ESPERA_RECONSTRUCCION = 0.01
+    hashes = [hash_de(i) for i in range(100)]
+    with tempfile.TemporaryDirectory() as tmp:
+        print("1. Un fallo transitorio se reintenta")
+        frente = FiltroNotarizados(RegistroInestable(hashes, 1), os.path.join(tmp, 'f.bin'), capacidad=1000)
+        frente.iniciar()
+        if not frente.listo.wait(5) or not all(h in frente.filtro for h in hashes) or \
+                frente.estadisticas()["intentos_fallidos"] != 1:
+            print(f"   ❌ La reconstrucción no se recuperó: {frente.estadisticas()}")
+            return False
+
+        print("2. Un fallo persistente deja el filtro marcado como fallido")
+        frente = FiltroNotarizados(RegistroInestable(hashes, 99), os.path.join(tmp, 'g.bin'), capacidad=1000)
+        frente.iniciar()
+        frente._hilo.join(5)
+        estadisticas = frente.estadisticas()
+        if frente.listo.is_set() or not estadisticas["fallido"] or not estadisticas["ultimo_error"]:
+            print(f"   ❌ El fallo no se refleja en las estadísticas: {estadisticas}")
+            return False
+
+    print("\n✅ RECONSTRUCCIÓN - TODAS LAS PRUEBAS PASARON")
+    return True
+
+
+def main():
+    """Ejecuta todas las pruebas."""
+    resultados = {
+        'Pertenencia': test_pertenencia_y_falsos_positivos(),
+        'Persistencia': test_persistencia(),
+        'Reconstrucción': test_reconstruccion_con_errores(),
+    }
+
+    print("\n" + "="*60)
+    for nombre, resultado in resultados.items():
+        print(f"{nombre:20s} : {'✅ PASÓ' if resultado else '❌ FALLÓ'}")
+    print("="*60)
+    return 0 if all(resultados.values()) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,136 @@
+"""
+Script de prueba para el motor de hashing de archivos.
+"""
+
+import sys
+import os
+import hashlib
+import tempfile
+
+# Agregar el directorio shared al path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from shared.motor_hash import (hashear_archivo, elegir_estrategia, ESTRATEGIAS, HashCancelado,
+                               hashear_arbol, MODO_ARBOL, hashear_segun_modo, validar_modo_hash)
+from shared.transparencia import hash_hoja, hash_nodo
+
+
+def test_estrategias():
+    """Prueba que todas las estrategias dan el mismo hash que hashlib."""
+    print(f"\n{'='*60}")
+    print("Probando estrategias de lectura")
+    print(f"{'='*60}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for tamano in (0, 100, 1024 * 1024, 6 * 1024 * 1024 + 17):
+            ruta = os.path.join(tmp, f'archivo_{tamano}')
+            with open(ruta, 'wb') as f:
+                f.write(os.urandom(tamano))
+            with open(ruta, 'rb') as f:
+                esperado = hashlib.sha256(f.read()).hexdigest()
+
+            print(f"{tamano:>10,d} bytes • automática: {elegir_estrategia(ruta, tamano)}")
+            for estrategia in ESTRATEGIAS + (None,):
+                avances = []
+                if hashear_archivo(ruta, estrategia=estrategia) != esperado \
+                        or hashear_archivo(ruta, estrategia=estrategia,
+                                           progreso=lambda l, t: avances.append((l, t))) != esperado:
+                    print(f"   ❌ Hash incorrecto con '{estrategia}'")
+                    return False
+                if tamano and avances[-1] != (tamano, tamano):
+                    print(f"   ❌ Progreso incompleto con '{estrategia}': {avances[-1]}")
+                    return False
+
+    print("\n✅ ESTRATEGIAS - TODAS LAS PRUEBAS PASARON")
+    return True
+
+
+def test_cancelacion():
+    """Prueba que el cálculo se interrumpe al cancelarlo."""
+    print(f"\n{'='*60}")
+    print("Probando cancelación")
+    print(f"{'='*60}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        ruta = os.path.join(tmp, 'grande')
+        with open(ruta, 'wb') as f:
+            f.write(os.urandom(8 * 1024 * 1024))
+
+        for estrategia in ('readinto', 'mmap'):
+            bloques = []
+            try:
+                hashear_archivo(ruta, estrategia=estrategia,
+                                cancelado=lambda: bloques.append(1) or len(bloques) > 2)
+                print(f"   ❌ '{estrategia}' no se canceló")
+                return False
+            except HashCancelado:
+                print(f"1. '{estrategia}' cancelado tras {len(bloques)} bloques")
+
+    print("\n✅ CANCELACIÓN - TODAS LAS PRUEBAS PASARON")
+    return True
+
+
+def _raiz_rfc6962(hojas):
+    """Raíz Merkle de referencia, recursiva como en RFC 6962."""
+    if len(hojas) == 1:
+        return hojas[0]
+    k = 1
+    while k * 2 < len(hojas):
+        k *= 2
+    return hash_nodo(_raiz_rfc6962(hojas[:k]), _raiz_rfc6962(hojas[k:]))
+
+
+def test_arbol():
+    """Prueba el modo árbol contra una raíz de referencia y su validación."""
+    print(f"\n{'='*60}")
+    print("Probando hash en árbol")
+    print(f"{'='*60}")
+
+    bloque = 64 * 1024
+    with tempfile.TemporaryDirectory() as tmp:
+        for tamano in (0, 1, bloque, 5 * bloque + 3, 12 * bloque):
+            ruta = os.path.join(tmp, f'archivo_{tamano}')
+            datos = os.urandom(tamano)
+            with open(ruta, 'wb') as f:
+                f.write(datos)
+            trozos = [datos[i:i + bloque] for i in range(0, tamano, bloque)] or [b'']
+            esperado = _raiz_rfc6962([hash_hoja(t) for t in trozos]).hex()
+
+            for hilos in (1, 4):
+                if hashear_arbol(ruta, bloque=bloque, hilos=hilos) != esperado:
+                    print(f"   ❌ Raíz incorrecta para {tamano} bytes con {hilos} hilos")
+                    return False
+            if hashear_segun_modo(ruta, MODO_ARBOL, bloque) != esperado:
+                print(f"   ❌ hashear_segun_modo no coincide para {tamano} bytes")
+                return False
+            print(f"{tamano:>10,d} bytes • {len(trozos)} bloques • raíz OK")
+
+    for modo, tamano_bloque in (('md5', None), (MODO_ARBOL, 1000), (MODO_ARBOL, 1024)):
+        try:
+            validar_modo_hash(modo, tamano_bloque)
+            print(f"   ❌ Se aceptó modo={modo} bloque={tamano_bloque}")
+            return False
+        except ValueError:
+            pass
+    print("1. Modos y bloques inválidos rechazados")
+
+    print("\n✅ ÁRBOL - TODAS LAS PRUEBAS PASARON")
+    return True
+
+
+def main():
+    """Ejecuta todas las pruebas."""
+    resultados = {
+        'Estrategias': test_estrategias(),
+        'Cancelación': test_cancelacion(),
+        'Árbol': test_arbol(),
+    }
+
+    print("\n" + "="*60)
+    for nombre, resultado in resultados.items():
+        print(f"{nombre:20s} : {'✅ PASÓ' if resultado else '❌ FALLÓ'}")
+    print("="*60)
+    return 0 if all(resultados.values()) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
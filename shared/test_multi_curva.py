@@ -148,6 +148,243 @@ def test_guardado_y_carga_recibo():
         return False
 
 
+def test_recibos_encadenados():
+    """Prueba el modo encadenado y la auditoría de la cadena."""
+    print(f"\n{'='*60}")
+    print("Probando recibos encadenados")
+    print(f"{'='*60}")
+    
+    try:
+        from shared.cadena_recibos import CadenaRecibos
+        from shared.auditar_cadena import auditar_cadena
+        
+        claves = {}
+        notarios = {}
+        for curva in ("SECP256R1", "SECP384R1"):
+            notarios[curva] = NotarioCrypto(curva=curva)
+            notarios[curva].generar_par_claves()
+            claves[curva] = notarios[curva].exportar_clave_publica_str()
+        
+        # 1. Emitir una cadena alternando curvas
+        print("1. Emitiendo 40 recibos encadenados...")
+        cadena = CadenaRecibos()
+        recibos = []
+        for i in range(40):
+            curva = "SECP256R1" if i % 2 == 0 else "SECP384R1"
+            recibos.append(cadena.emitir(notarios[curva], f"{i:064x}", None))
+        if not notarios["SECP256R1"].verificar_firma(recibos[0]):
+            print("   ❌ Firma de recibo encadenado inválida")
+            return False
+        print("   ✅ Recibos emitidos")
+        
+        # 2. Auditar la cadena íntegra
+        print("2. Auditando cadena íntegra...")
+        resumen = auditar_cadena(recibos, claves, procesos=1, segmentos=5)
+        if not resumen['valida']:
+            print(f"   ❌ Cadena íntegra marcada como inválida: {resumen['errores']}")
+            return False
+        print("   ✅ Cadena válida")
+        
+        # 3. Detectar borrado y reordenamiento
+        print("3. Probando detección de borrado y reordenamiento...")
+        borrada = recibos[:17] + recibos[18:]
+        reordenada = recibos[:10] + [recibos[11], recibos[10]] + recibos[12:]
+        if auditar_cadena(borrada, claves, procesos=1, segmentos=5)['valida'] or \
+                auditar_cadena(reordenada, claves, procesos=1, segmentos=5)['valida']:
+            print("   ❌ ERROR: No se detectó la alteración de la cadena")
+            return False
+        print("   ✅ Alteraciones detectadas")
+        
+        # 4. La secuencia forma parte de la firma
+        print("4. Probando alteración de la secuencia...")
+        alterado = dict(recibos[4])
+        alterado['secuencia'] = 99
+        if notarios["SECP256R1"].verificar_firma(alterado):
+            print("   ❌ ERROR: La firma no cubre la secuencia")
+            return False
+        print("   ✅ Secuencia protegida por la firma")
+        
+        print("\n✅ RECIBOS ENCADENADOS - TODAS LAS PRUEBAS PASARON")
+        return True
+        
+    except Exception as e:
+        print(f"\n❌ ERROR en recibos encadenados: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+
+def test_lotes():
+    """Prueba firmar_lote y verificar_lote con motivos de fallo por recibo."""
+    print(f"\n{'='*60}")
+    print("Probando firma y verificación por lotes")
+    print(f"{'='*60}")
+    
+    try:
+        from concurrent.futures import ThreadPoolExecutor
+        from shared.crypto_utils import (MOTIVO_HASH_INVALIDO, MOTIVO_FIRMA_INVALIDA,
+                                         MOTIVO_FIRMA_MAL_CODIFICADA, MOTIVO_RECIBO_MAL_FORMADO)
+        
+        crypto = NotarioCrypto(curva='SECP384R1')
+        crypto.generar_par_claves()
+        
+        # 1. Firmar con un hash no válido en medio
+        print("1. Firmando 300 hashes por lotes...")
+        hashes_hex = [f"{i:064x}" for i in range(300)]
+        hashes_hex[5] = "no-es-hex"
+        with ThreadPoolExecutor(max_workers=2) as ejecutor:
+            recibos, fallos = crypto.firmar_lote(iter(hashes_hex), ejecutor=ejecutor, tamano_tramo=64)
+        if fallos != {5: MOTIVO_HASH_INVALIDO} or recibos[5] is not None or len(recibos) != 300:
+            print(f"   ❌ Fallos inesperados: {fallos}")
+            return False
+        print("   ✅ 299 firmados, 1 rechazado")
+        
+        # 2. Verificar con recibos alterados de distintas formas
+        print("2. Verificando por lotes...")
+        validos = [r for r in recibos if r is not None]
+        alterados = [dict(validos[0], hash="f" * 64), dict(validos[1], firma="%%%"), {"hash": "ab"}]
+        with ThreadPoolExecutor(max_workers=2) as ejecutor:
+            motivos = crypto.verificar_lote(validos + alterados, ejecutor=ejecutor, tamano_tramo=64)
+        esperado = [None] * len(validos) + [MOTIVO_FIRMA_INVALIDA, MOTIVO_FIRMA_MAL_CODIFICADA,
+                                            MOTIVO_RECIBO_MAL_FORMADO]
+        if motivos != esperado:
+            print(f"   ❌ Motivos inesperados: {motivos[-3:]}")
+            return False
+        print("   ✅ Motivos correctos")
+        
+        # 3. Recibos de la versión binaria (firma Prehashed)
+        print("3. Probando recibos de la versión 2...")
+        binarios, _ = crypto.firmar_lote(hashes_hex[:10] + hashes_hex[6:10], version=2)
+        binarios = [r for r in binarios if r is not None]
+        degradado = dict(binarios[0])
+        del degradado['version']
+        if crypto.verificar_lote(binarios) != [None] * 13 or crypto.verificar_firma(degradado):
+            print("   ❌ ERROR: Verificación de la versión 2 incorrecta")
+            return False
+        print("   ✅ Versión 2 verificada y protegida frente a la degradación")
+        
+        print("\n✅ LOTES - TODAS LAS PRUEBAS PASARON")
+        return True
+        
+    except Exception as e:
+        print(f"\n❌ ERROR en lotes: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+
+def test_firmas_raw():
+    """Prueba las firmas raw (r||s de anchura fija) en todas las curvas."""
+    print(f"\n{'='*60}")
+    print("Probando firmas raw de anchura fija")
+    print(f"{'='*60}")
+    
+    try:
+        import base64
+        from shared.crypto_utils import (CODIFICACION_FIRMA_DER, CODIFICACION_FIRMA_RAW, MOTIVO_FIRMA_INVALIDA,
+                                         MOTIVO_FIRMA_MAL_CODIFICADA, longitud_firma_raw, recodificar_firma)
+        
+        for curva in CURVAS_SOPORTADAS:
+            crypto = NotarioCrypto(curva=curva, codificacion_firma=CODIFICACION_FIRMA_RAW)
+            crypto.generar_par_claves()
+            recibos, _ = crypto.firmar_lote([f"{i:064x}" for i in range(20)])
+            recibos.append(crypto.firmar_hash("ab" * 32, version=2))
+            longitudes = {len(base64.b64decode(r['firma'])) for r in recibos}
+            print(f"   {curva}: firmas de {longitudes} bytes")
+            if longitudes != {longitud_firma_raw(curva)} or crypto.verificar_lote(recibos) != [None] * 21:
+                print("   ❌ ERROR: Firma raw de longitud o validez incorrecta")
+                return False
+            
+            # Ida y vuelta a DER con la misma firma
+            der = recodificar_firma(recibos[0], CODIFICACION_FIRMA_DER)
+            if 'codificacion_firma' in der or not crypto.verificar_firma(der) or \
+                    recodificar_firma(der, CODIFICACION_FIRMA_RAW) != recibos[0]:
+                print("   ❌ ERROR: La recodificación no conserva la firma")
+                return False
+            
+            # Firma truncada, o raw sin la codificación indicada (no es DER válido)
+            truncada = dict(recibos[0], firma=base64.b64encode(base64.b64decode(recibos[0]['firma'])[:-1]).decode())
+            sin_marca = {k: v for k, v in recibos[0].items() if k != 'codificacion_firma'}
+            if crypto.verificar_lote([truncada, sin_marca]) != [MOTIVO_FIRMA_MAL_CODIFICADA, MOTIVO_FIRMA_INVALIDA]:
+                print("   ❌ ERROR: Firma raw mal codificada no detectada")
+                return False
+        
+        print("\n✅ FIRMAS RAW - TODAS LAS PRUEBAS PASARON")
+        return True
+        
+    except Exception as e:
+        print(f"\n❌ ERROR en firmas raw: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+
+def test_registro_claves():
+    """Prueba que las claves se comparten entre instancias y se releen al cambiar."""
+    print(f"\n{'='*60}")
+    print("Probando el registro de claves del proceso")
+    print(f"{'='*60}")
+    
+    try:
+        import tempfile
+        import time
+        from shared.crypto_utils import REGISTRO_CLAVES
+        
+        with tempfile.TemporaryDirectory() as tmp:
+            ruta = os.path.join(tmp, 'privada.pem')
+            original = NotarioCrypto()
+            original.generar_par_claves()
+            original.guardar_clave_privada(ruta, "secreto")
+            # Fuera del margen de reescritura reciente
+            antiguo = time.time() - 60
+            os.utime(ruta, (antiguo, antiguo))
+            
+            # 1. La segunda carga reutiliza el objeto sin descifrar de nuevo
+            print("1. Cargando la clave cifrada desde dos instancias...")
+            primera, segunda = NotarioCrypto(), NotarioCrypto()
+            inicio = time.perf_counter()
+            primera.cargar_clave_privada(ruta, "secreto")
+            t_primera = time.perf_counter() - inicio
+            inicio = time.perf_counter()
+            segunda.cargar_clave_privada(ruta, "secreto")
+            t_segunda = time.perf_counter() - inicio
+            if primera.private_key is not segunda.private_key:
+                print("   ❌ La clave no se compartió")
+                return False
+            print(f"   ✅ {t_primera*1000:.1f} ms la primera vez, {t_segunda*1000:.3f} ms la segunda")
+            
+            # 2. Una contraseña incorrecta sigue fallando
+            print("2. Probando contraseña incorrecta...")
+            try:
+                NotarioCrypto().cargar_clave_privada(ruta, "otra")
+                print("   ❌ ERROR: Se aceptó una contraseña incorrecta")
+                return False
+            except ValueError:
+                print("   ✅ Rechazada")
+            
+            # 3. Reemplazar el archivo invalida la entrada
+            print("3. Reemplazando la clave en disco...")
+            nueva = NotarioCrypto()
+            nueva.generar_par_claves()
+            nueva.guardar_clave_privada(ruta, "secreto")
+            recargada = NotarioCrypto()
+            recargada.cargar_clave_privada(ruta, "secreto")
+            if recargada.huella_clave_publica() != nueva.huella_clave_publica():
+                print("   ❌ ERROR: Se devolvió la clave anterior")
+                return False
+            print("   ✅ Clave nueva cargada")
+        
+        REGISTRO_CLAVES.invalidar()
+        print("\n✅ REGISTRO DE CLAVES - TODAS LAS PRUEBAS PASARON")
+        return True
+        
+    except Exception as e:
+        print(f"\n❌ ERROR en registro de claves: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+
 def main():
     """Ejecuta todas las pruebas."""
     print("\n" + "="*60)
@@ -164,6 +401,18 @@ def main():
     # Probar guardado y carga
     resultados['Guardado/Carga'] = test_guardado_y_carga_recibo()
     
+    # Probar recibos encadenados
+    resultados['Encadenados'] = test_recibos_encadenados()
+    
+    # Probar firma y verificación por lotes
+    resultados['Lotes'] = test_lotes()
+    
+    # Probar las firmas raw
+    resultados['Firmas raw'] = test_firmas_raw()
+    
+    # Probar el registro de claves
+    resultados['Registro claves'] = test_registro_claves()
+    
     # Resumen
     print("\n" + "="*60)
     print("RESUMEN DE PRUEBAS")
@@ -0,0 +1,128 @@
+"""
+Script de prueba para los recibos compactos y la colección por columnas.
+"""
+
+import sys
+import os
+import pickle
+import tracemalloc
+
+# Agregar el directorio shared al path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from shared.recibo import Recibo, ColeccionRecibos
+from shared.crypto_utils import NotarioCrypto, MOTIVO_FIRMA_INVALIDA, MOTIVO_RECIBO_MAL_FORMADO
+from shared.cadena_recibos import CadenaRecibos, digest_recibo
+from shared.auditar_cadena import auditar_cadena
+
+
+def test_ida_y_vuelta():
+    """Prueba que la forma compacta reproduce el recibo JSON exacto."""
+    print(f"\n{'='*60}")
+    print("Probando conversión de recibos compactos")
+    print(f"{'='*60}")
+
+    crypto = NotarioCrypto(curva="SECP256R1")
+    crypto.generar_par_claves()
+    recibo = crypto.firmar_hash("ab" * 32, version=2)
+    recibo["archivo_original"] = "documento.pdf"
+    irregular = dict(recibo, hash="AB" * 32, timestamp="2025-11-10T12:00:00+00:00", nota="extra")
+
+    print("1. Recibo normal e irregular")
+    for original in (recibo, irregular):
+        compacto = Recibo.desde_dict(original)
+        if compacto.a_dict() != original or digest_recibo(compacto) != digest_recibo(original):
+            print(f"   ❌ El recibo compacto no coincide: {compacto.a_dict()}")
+            return False
+    if not crypto.verificar_firma(Recibo.desde_dict(recibo)):
+        print("   ❌ La firma del recibo compacto no verifica")
+        return False
+
+    print("2. Colección con recibos mal formados")
+    roto = {"firma": recibo["firma"], "timestamp": recibo["timestamp"]}
+    coleccion = ColeccionRecibos([recibo, irregular, roto, recibo, None])
+    if [coleccion[i] == r for i, r in enumerate((recibo, irregular))] != [True, True] or \
+            coleccion[2] is not roto or coleccion[4] is not None:
+        print("   ❌ La colección no devuelve los recibos originales")
+        return False
+    motivos = crypto.verificar_lote(coleccion)
+    if motivos != [None, MOTIVO_FIRMA_INVALIDA, MOTIVO_RECIBO_MAL_FORMADO, None, MOTIVO_RECIBO_MAL_FORMADO]:
+        print(f"   ❌ Motivos inesperados: {motivos}")
+        return False
+    if pickle.loads(pickle.dumps(coleccion[1:]))[0] != irregular:
+        print("   ❌ El tramo no sobrevive a pickle")
+        return False
+
+    print("3. Más textos distintos de los que caben en un código de un byte")
+    variados = [dict(recibo, modo_hash=f"modo-{i}", bloque_hash=i) for i in range(300)]
+    if [r.a_dict() for r in ColeccionRecibos(variados)] != variados:
+        print("   ❌ Los recibos con textos variados no se conservan")
+        return False
+
+    print("\n✅ CONVERSIÓN - TODAS LAS PRUEBAS PASARON")
+    return True
+
+
+def test_auditoria_coleccion():
+    """Prueba la auditoría de una cadena cargada como colección y su tamaño en memoria."""
+    print(f"\n{'='*60}")
+    print("Probando auditoría sobre una colección de recibos")
+    print(f"{'='*60}")
+
+    crypto = NotarioCrypto(curva="SECP256R1")
+    crypto.generar_par_claves()
+    claves = {"SECP256R1": crypto.exportar_clave_publica_str()}
+    cadena = CadenaRecibos()
+    recibos = [cadena.emitir(crypto, f"{i:064x}", None) for i in range(300)]
+
+    tracemalloc.start()
+    antes = tracemalloc.get_traced_memory()[0]
+    coleccion = ColeccionRecibos(recibos)
+    ocupado = tracemalloc.get_traced_memory()[0] - antes
+    tracemalloc.stop()
+    print(f"1. {len(coleccion)} recibos en {ocupado / len(coleccion):.0f} bytes/recibo")
+    if ocupado / len(coleccion) > 400:
+        print("   ❌ La colección ocupa demasiado")
+        return False
+
+    print("2. Auditando la colección desordenada, con borrados y recortada")
+    desordenada = ColeccionRecibos(recibos[150:] + recibos[:150])
+    desordenada.ordenar_por_secuencia()
+    if not auditar_cadena(desordenada, claves, procesos=1, segmentos=4)['valida']:
+        print("   ❌ Cadena íntegra marcada como inválida")
+        return False
+    if auditar_cadena(ColeccionRecibos(recibos[:99] + recibos[100:]), claves, procesos=1, segmentos=4)['valida']:
+        print("   ❌ No se detectó el borrado")
+        return False
+    if auditar_cadena(ColeccionRecibos(recibos[1:]), claves, procesos=1, segmentos=4)['valida'] or \
+            auditar_cadena(ColeccionRecibos(recibos[3:]), claves, procesos=1, segmentos=4)['valida']:
+        print("   ❌ No se detectó el borrado del inicio")
+        return False
+    ancla = (recibos[2]['secuencia'], digest_recibo(recibos[2]))
+    if not auditar_cadena(ColeccionRecibos(recibos[3:]), claves, procesos=1, segmentos=4, ancla=ancla)['valida']:
+        print("   ❌ Tramo con ancla marcado como inválido")
+        return False
+    cabeza = (recibos[-1]['secuencia'], digest_recibo(recibos[-1]))
+    if auditar_cadena(ColeccionRecibos(recibos[:-2]), claves, procesos=1, segmentos=4, cabeza=cabeza)['valida']:
+        print("   ❌ No se detectó el recorte del final")
+        return False
+
+    print("\n✅ AUDITORÍA - TODAS LAS PRUEBAS PASARON")
+    return True
+
+
+def main():
+    """Ejecuta todas las pruebas."""
+    resultados = {
+        'Conversión': test_ida_y_vuelta(),
+        'Auditoría': test_auditoria_coleccion(),
+    }
+
+    print("\n" + "="*60)
+    for nombre, resultado in resultados.items():
+        print(f"{nombre:20s} : {'✅ PASÓ' if resultado else '❌ FALLÓ'}")
+    print("="*60)
+    return 0 if all(resultados.values()) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
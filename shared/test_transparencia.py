@@ -0,0 +1,99 @@
+"""
+Script de prueba para el registro de transparencia (árbol de Merkle).
+Compara raíces y pruebas contra una implementación directa de RFC 6962.
+"""
+
+import sys
+import os
+import tempfile
+
+# Agregar el directorio shared al path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from shared.transparencia import (
+    RegistroTransparencia, hash_hoja, hash_nodo,
+    verificar_inclusion, verificar_consistencia
+)
+
+
+def mth(hojas):
+    """Raíz de Merkle calculada directamente (RFC 6962)."""
+    if len(hojas) == 1:
+        return hojas[0]
+    k = 1
+    while k * 2 < len(hojas):
+        k *= 2
+    return hash_nodo(mth(hojas[:k]), mth(hojas[k:]))
+
+
+def test_raices_y_pruebas():
+    """Prueba raíces, inclusión y consistencia para todos los tamaños pequeños."""
+    print(f"\n{'='*60}")
+    print("Probando raíces y pruebas del árbol de Merkle")
+    print(f"{'='*60}")
+
+    hojas = [hash_hoja(str(i).encode()) for i in range(70)]
+    with tempfile.TemporaryDirectory() as tmp:
+        registro = RegistroTransparencia(tmp)
+        for hoja in hojas:
+            registro.anexar(hoja)
+
+        print("1. Comparando raíces con la definición de RFC 6962...")
+        for n in range(1, len(hojas) + 1):
+            if registro.raiz(n) != mth(hojas[:n]):
+                print(f"   ❌ Raíz incorrecta para tamaño {n}")
+                return False
+        print("   ✅ Raíces correctas")
+
+        print("2. Verificando pruebas de inclusión...")
+        for n in range(1, len(hojas) + 1):
+            raiz = registro.raiz(n)
+            for i in range(n):
+                if not verificar_inclusion(hojas[i], i, n, registro.prueba_inclusion(i, n), raiz):
+                    print(f"   ❌ Inclusión inválida: hoja {i}, tamaño {n}")
+                    return False
+        if verificar_inclusion(hojas[3], 4, 10, registro.prueba_inclusion(3, 10), registro.raiz(10)):
+            print("   ❌ Se aceptó una prueba con índice incorrecto")
+            return False
+        print("   ✅ Pruebas de inclusión correctas")
+
+        print("3. Verificando pruebas de consistencia...")
+        for n in range(1, len(hojas) + 1):
+            for m in range(1, n + 1):
+                prueba = registro.prueba_consistencia(m, n)
+                if not verificar_consistencia(m, n, registro.raiz(m), registro.raiz(n), prueba):
+                    print(f"   ❌ Consistencia inválida: {m} -> {n}")
+                    return False
+        if verificar_consistencia(5, 9, registro.raiz(4), registro.raiz(9), registro.prueba_consistencia(5, 9)):
+            print("   ❌ Se aceptó una consistencia con raíz incorrecta")
+            return False
+        print("   ✅ Pruebas de consistencia correctas")
+
+        print("4. Reabriendo el registro sin reconstruir...")
+        raiz = registro.raiz()
+        registro.cerrar()
+        reabierto = RegistroTransparencia(tmp)
+        if reabierto.tamano != len(hojas) or reabierto.raiz() != raiz:
+            print("   ❌ El registro reabierto no coincide")
+            return False
+        if reabierto.buscar_hoja(hojas[42]) != 42 or reabierto.localizar_hoja(hojas[42], [7, 42]) != 42 \
+                or reabierto.localizar_hoja(hojas[42], [7, len(hojas)]) is not None:
+            print("   ❌ No se encontró la hoja por su hash")
+            return False
+        reabierto.cerrar()
+        print("   ✅ Estado incremental restaurado")
+
+    print("\n✅ TRANSPARENCIA - TODAS LAS PRUEBAS PASARON")
+    return True
+
+
+def main():
+    """Ejecuta todas las pruebas."""
+    resultado = test_raices_y_pruebas()
+    print("\n" + "="*60)
+    print(f"{'Transparencia':20s} : {'✅ PASÓ' if resultado else '❌ FALLÓ'}")
+    print("="*60)
+    return 0 if resultado else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,451 @@
+"""
+Registro de transparencia del Notario Digital.
+
+Árbol de Merkle (RFC 6962) sobre todos los recibos emitidos, con pruebas de
+inclusión y de consistencia en O(log n). El árbol se guarda de forma
+incremental: un archivo por nivel con los nodos de los subárboles completos,
+así que anexar cuesta O(log n) y el arranque no reconstruye nada.
+"""
+
+import hashlib
+import os
+import threading
+from datetime import datetime
+
+from shared.cadena_recibos import serializar_canonico
+
+
+TAMANO_NODO = 32
+
+# Prefijos de dominio de RFC 6962 para hojas y nodos internos
+_PREFIJO_HOJA = b'\x00'
+_PREFIJO_NODO = b'\x01'
+
+
+def hash_hoja(datos):
+    """Hash de una hoja del árbol."""
+    return hashlib.sha256(_PREFIJO_HOJA + datos).digest()
+
+
+def hash_nodo(izquierdo, derecho):
+    """Hash de un nodo interno del árbol."""
+    return hashlib.sha256(_PREFIJO_NODO + izquierdo + derecho).digest()
+
+
+def hoja_recibo(recibo):
+    """
+    Calcula la hoja del árbol correspondiente a un recibo.
+
+    Args:
+        recibo (dict): Recibo firmado
+
+    Returns:
+        bytes: Hash de hoja (32 bytes)
+    """
+    return hash_hoja(serializar_canonico(recibo))
+
+
+def _potencia_menor(n):
+    """Mayor potencia de 2 estrictamente menor que n (n > 1)."""
+    return 1 << ((n - 1).bit_length() - 1)
+
+
+class RegistroTransparencia:
+    """
+    Árbol de Merkle de solo anexado persistido por niveles.
+
+    El archivo `nivel_k.bin` contiene, en orden, los hashes de los subárboles
+    completos de 2**k hojas alineados (el nodo i cubre las hojas
+    [i * 2**k, (i + 1) * 2**k)). Cualquier rango se resuelve combinando
+    O(log n) de estos nodos.
+    """
+
+    def __init__(self, directorio):
+        """
+        Args:
+            directorio (str): Carpeta donde se guardan los niveles del árbol
+        """
+        self.directorio = directorio
+        os.makedirs(directorio, exist_ok=True)
+        self._lock = threading.RLock()
+        self._niveles = []
+        self._tamanos = []
+        self._abrir_niveles()
+        self._reparar()
+
+    def _ruta_nivel(self, nivel):
+        return os.path.join(self.directorio, f'nivel_{nivel}.bin')
+
+    def _abrir_niveles(self):
+        nivel = 0
+        while nivel == 0 or os.path.exists(self._ruta_nivel(nivel)):
+            self._abrir_nivel(nivel)
+            nivel += 1
+
+    def _abrir_nivel(self, nivel):
+        ruta = self._ruta_nivel(nivel)
+        archivo = open(ruta, 'a+b')
+        archivo.seek(0, os.SEEK_END)
+        tamano = archivo.tell()
+        if tamano % TAMANO_NODO:
+            # Escritura interrumpida: descartar el nodo incompleto
+            tamano -= tamano % TAMANO_NODO
+            archivo.truncate(tamano)
+        self._niveles.append(archivo)
+        self._tamanos.append(tamano // TAMANO_NODO)
+
+    def _reparar(self):
+        """Completa los nodos padre que falten tras una interrupción."""
+        nivel = 0
+        while self._tamanos[nivel] >= 2:
+            if nivel + 1 == len(self._niveles):
+                self._abrir_nivel(nivel + 1)
+            esperados = self._tamanos[nivel] // 2
+            for i in range(self._tamanos[nivel + 1], esperados):
+                padre = hash_nodo(self._leer(nivel, 2 * i), self._leer(nivel, 2 * i + 1))
+                self._escribir(nivel + 1, padre)
+            nivel += 1
+
+    def _leer(self, nivel, indice):
+        archivo = self._niveles[nivel]
+        archivo.seek(indice * TAMANO_NODO)
+        return archivo.read(TAMANO_NODO)
+
+    def _escribir(self, nivel, nodo):
+        archivo = self._niveles[nivel]
+        archivo.seek(0, os.SEEK_END)
+        archivo.write(nodo)
+        archivo.flush()
+        self._tamanos[nivel] += 1
+
+    @property
+    def tamano(self):
+        """Número de hojas del árbol."""
+        return self._tamanos[0]
+
+    def anexar(self, hoja):
+        """
+        Anexa una hoja y los nodos padre que se completan (O(log n)).
+
+        Args:
+            hoja (bytes): Hash de hoja (ver `hoja_recibo`)
+
+        Returns:
+            int: Índice de la hoja en el registro
+        """
+        with self._lock:
+            indice = self.tamano
+            self._escribir(0, hoja)
+            nivel, nodo, posicion = 0, hoja, indice
+            while posicion % 2 == 1:
+                izquierdo = self._leer(nivel, posicion - 1)
+                nodo = hash_nodo(izquierdo, nodo)
+                nivel += 1
+                posicion //= 2
+                if nivel == len(self._niveles):
+                    self._abrir_nivel(nivel)
+                self._escribir(nivel, nodo)
+            return indice
+
+    def _subarbol(self, inicio, fin):
+        """Hash de Merkle de las hojas [inicio, fin)."""
+        n = fin - inicio
+        if n & (n - 1) == 0 and inicio % n == 0:
+            # Subárbol completo y alineado: está almacenado
+            return self._leer(n.bit_length() - 1, inicio // n)
+        k = _potencia_menor(n)
+        return hash_nodo(self._subarbol(inicio, inicio + k), self._subarbol(inicio + k, fin))
+
+    def raiz(self, tamano=None):
+        """
+        Raíz del árbol con las primeras `tamano` hojas.
+
+        Args:
+            tamano (int, optional): Tamaño del árbol (por defecto, el actual)
+
+        Returns:
+            bytes: Hash raíz (SHA-256 de la cadena vacía si el árbol está vacío)
+        """
+        with self._lock:
+            tamano = self.tamano if tamano is None else tamano
+            self._validar_tamano(tamano)
+            if tamano == 0:
+                return hashlib.sha256(b'').digest()
+            return self._subarbol(0, tamano)
+
+    def estado(self):
+        """
+        Tamaño y raíz actuales, leídos de forma atómica.
+
+        Returns:
+            tuple: (tamano, raiz)
+        """
+        with self._lock:
+            return self.tamano, self.raiz()
+
+    def hoja(self, indice):
+        """
+        Hash de la hoja en la posición indicada.
+
+        Args:
+            indice (int): Índice de la hoja
+
+        Returns:
+            bytes: Hash de hoja
+        """
+        with self._lock:
+            if not 0 <= indice < self.tamano:
+                raise ValueError(f"Índice {indice} fuera del árbol de tamaño {self.tamano}")
+            return self._leer(0, indice)
+
+    def prueba_inclusion(self, indice, tamano=None):
+        """
+        Prueba de inclusión (RFC 6962 PATH) de una hoja.
+
+        Args:
+            indice (int): Índice de la hoja
+            tamano (int, optional): Tamaño del árbol (por defecto, el actual)
+
+        Returns:
+            list: Hashes hermanos, de la hoja hacia la raíz
+        """
+        with self._lock:
+            tamano = self.tamano if tamano is None else tamano
+            self._validar_tamano(tamano)
+            if not 0 <= indice < tamano:
+                raise ValueError(f"Índice {indice} fuera del árbol de tamaño {tamano}")
+
+            ruta = []
+            inicio, fin = 0, tamano
+            while fin - inicio > 1:
+                k = _potencia_menor(fin - inicio)
+                if indice < inicio + k:
+                    ruta.append(self._subarbol(inicio + k, fin))
+                    fin = inicio + k
+                else:
+                    ruta.append(self._subarbol(inicio, inicio + k))
+                    inicio += k
+            ruta.reverse()
+            return ruta
+
+    def prueba_consistencia(self, primero, segundo=None):
+        """
+        Prueba de consistencia (RFC 6962 SUBPROOF) entre dos tamaños.
+
+        Args:
+            primero (int): Tamaño anterior del árbol
+            segundo (int, optional): Tamaño posterior (por defecto, el actual)
+
+        Returns:
+            list: Hashes de la prueba
+        """
+        with self._lock:
+            segundo = self.tamano if segundo is None else segundo
+            self._validar_tamano(segundo)
+            if not 0 < primero <= segundo:
+                raise ValueError(f"Tamaños inválidos para consistencia: {primero}, {segundo}")
+            if primero == segundo:
+                return []
+
+            prueba = []
+            inicio, fin, m, completo = 0, segundo, primero, True
+            while m != fin - inicio:
+                k = _potencia_menor(fin - inicio)
+                if m <= k:
+                    prueba.append(self._subarbol(inicio + k, fin))
+                    fin = inicio + k
+                else:
+                    prueba.append(self._subarbol(inicio, inicio + k))
+                    inicio += k
+                    m -= k
+                    completo = False
+            if not completo:
+                prueba.append(self._subarbol(inicio, fin))
+            prueba.reverse()
+            return prueba
+
+    def localizar_hoja(self, hoja, candidatos):
+        """
+        Comprueba si una hoja está en alguno de los índices candidatos.
+
+        Es O(1) por candidato; es lo que deben usar las solicitudes, con el
+        `indice_log` del recibo o el de los recibos del almacén con su hash.
+
+        Args:
+            hoja (bytes): Hash de hoja
+            candidatos (iterable): Índices en los que puede estar la hoja
+
+        Returns:
+            int: Índice de la hoja, o None si no está en ninguno
+        """
+        for indice in candidatos:
+            with self._lock:
+                if 0 <= indice < self.tamano and self._leer(0, indice) == hoja:
+                    return indice
+        return None
+
+    def buscar_hoja(self, hoja):
+        """
+        Busca el índice de una hoja recorriendo el nivel 0.
+
+        Recorre el registro entero, así que es para herramientas fuera de
+        línea; la lectura no retiene el lock, de modo que `anexar` no espera.
+
+        Args:
+            hoja (bytes): Hash de hoja
+
+        Returns:
+            int: Índice de la hoja, o None si no está
+        """
+        with self._lock:
+            total = self.tamano
+            descriptor = self._niveles[0].fileno()
+        # Las hojas ya escritas no cambian: se leen con pread, sin mover la
+        # posición del archivo que usan las demás operaciones
+        paso = 4096
+        for inicio in range(0, total, paso):
+            cantidad = min(paso, total - inicio)
+            bloque = os.pread(descriptor, cantidad * TAMANO_NODO, inicio * TAMANO_NODO)
+            posicion = bloque.find(hoja)
+            while posicion != -1:
+                if posicion % TAMANO_NODO == 0:
+                    return inicio + posicion // TAMANO_NODO
+                posicion = bloque.find(hoja, posicion + 1)
+        return None
+
+    def _validar_tamano(self, tamano):
+        if not 0 <= tamano <= self.tamano:
+            raise ValueError(f"Tamaño {tamano} fuera de rango (actual: {self.tamano})")
+
+    def cerrar(self):
+        """Cierra los archivos de los niveles."""
+        with self._lock:
+            for archivo in self._niveles:
+                archivo.close()
+
+
+def verificar_inclusion(hoja, indice, tamano, ruta, raiz):
+    """
+    Verifica una prueba de inclusión (RFC 9162, sección 2.1.3.2).
+
+    Args:
+        hoja (bytes): Hash de hoja
+        indice (int): Índice de la hoja
+        tamano (int): Tamaño del árbol
+        ruta (list): Hashes de la prueba
+        raiz (bytes): Raíz esperada
+
+    Returns:
+        bool: True si la prueba es válida
+    """
+    if not 0 <= indice < tamano:
+        return False
+    fn, sn = indice, tamano - 1
+    r = hoja
+    for p in ruta:
+        if sn == 0:
+            return False
+        if fn % 2 == 1 or fn == sn:
+            r = hash_nodo(p, r)
+            if fn % 2 == 0:
+                while fn % 2 == 0 and fn != 0:
+                    fn >>= 1
+                    sn >>= 1
+        else:
+            r = hash_nodo(r, p)
+        fn >>= 1
+        sn >>= 1
+    return sn == 0 and r == raiz
+
+
+def verificar_consistencia(primero, segundo, raiz_primero, raiz_segundo, prueba):
+    """
+    Verifica una prueba de consistencia (RFC 9162, sección 2.1.4.2).
+
+    Args:
+        primero (int): Tamaño anterior
+        segundo (int): Tamaño posterior
+        raiz_primero (bytes): Raíz del árbol anterior
+        raiz_segundo (bytes): Raíz del árbol posterior
+        prueba (list): Hashes de la prueba
+
+    Returns:
+        bool: True si el árbol posterior extiende al anterior
+    """
+    if not 0 < primero <= segundo:
+        return False
+    if primero == segundo:
+        return not prueba and raiz_primero == raiz_segundo
+    if primero & (primero - 1) == 0:
+        prueba = [raiz_primero] + list(prueba)
+    if not prueba:
+        return False
+
+    fn, sn = primero - 1, segundo - 1
+    while fn % 2 == 1:
+        fn >>= 1
+        sn >>= 1
+    fr = sr = prueba[0]
+    for c in prueba[1:]:
+        if sn == 0:
+            return False
+        if fn % 2 == 1 or fn == sn:
+            fr = hash_nodo(c, fr)
+            sr = hash_nodo(c, sr)
+            if fn % 2 == 0:
+                while fn % 2 == 0 and fn != 0:
+                    fn >>= 1
+                    sn >>= 1
+        else:
+            sr = hash_nodo(sr, c)
+        fn >>= 1
+        sn >>= 1
+    return sn == 0 and fr == raiz_primero and sr == raiz_segundo
+
+
+def mensaje_cabeza(tamano, raiz_hex, timestamp):
+    """
+    Mensaje firmado de una cabeza del árbol.
+
+    El prefijo "STH" no es hexadecimal, por lo que una cabeza firmada no puede
+    confundirse con un recibo ("hash|timestamp").
+    """
+    return f"STH|{tamano}|{raiz_hex}|{timestamp}".encode()
+
+
+def firmar_cabeza(notario, registro):
+    """
+    Firma la cabeza actual del árbol (signed tree head).
+
+    Args:
+        notario (NotarioCrypto): Instancia con la clave privada
+        registro (RegistroTransparencia): Registro de transparencia
+
+    Returns:
+        dict: {tamano, raiz, timestamp, curva, firma}
+    """
+    tamano, raiz = registro.estado()
+    raiz_hex = raiz.hex()
+    timestamp = datetime.utcnow().isoformat() + "Z"
+    return {
+        "tamano": tamano,
+        "raiz": raiz_hex,
+        "timestamp": timestamp,
+        "curva": notario.curva_nombre,
+        "firma": notario.firmar_datos(mensaje_cabeza(tamano, raiz_hex, timestamp)),
+    }
+
+
+def verificar_cabeza(cabeza, notario):
+    """
+    Verifica la firma de una cabeza del árbol.
+
+    Args:
+        cabeza (dict): Cabeza firmada
+        notario (NotarioCrypto): Instancia con la clave pública de la curva
+
+    Returns:
+        bool: True si la firma es válida
+    """
+    mensaje = mensaje_cabeza(cabeza['tamano'], cabeza['raiz'], cabeza['timestamp'])
+    return notario.verificar_datos(mensaje, cabeza['firma'])